@@ -1,4 +1,5 @@
 from django.contrib import admin
+from django.utils import timezone
 from django.utils.html import format_html
 from django.urls import reverse, path
 from django.utils.safestring import mark_safe
@@ -8,8 +9,8 @@ from django.http import HttpResponseRedirect
 from django import forms
 from django.contrib.admin.helpers import AdminForm
 from django.forms.formsets import formset_factory
-from .models import TelegramUser, BotMessage, ExchangeRate, Cityex24Transfer, AdminChat, ExchangeOrder
-from .bot import send_broadcast_message
+from .models import Branch, TelegramUser, BotMessage, ExchangeRate, Cityex24Transfer, AdminChat, ExchangeOrder, NotificationOutbox, BroadcastJob, BotLease
+from .broadcast import create_job as create_broadcast_job
 
 
 class SendMessageForm(forms.Form):
@@ -43,30 +44,20 @@ def send_message_view(request):
         if form.is_valid():
             message_text = form.cleaned_data['message'].strip()
             
-            if not user_ids:
-                # Отправить всем пользователям
-                users = TelegramUser.objects.all()
-                user_ids = list(users.values_list('telegram_id', flat=True))
-            
-            success_count = 0
-            error_count = 0
-            
-            for telegram_id in user_ids:
-                if send_broadcast_message(telegram_id, message_text):
-                    success_count += 1
-                else:
-                    error_count += 1
+            # Рассылка выполняется в фоне (bot.broadcast), запрос не ждет отправки
+            job = create_broadcast_job(message_text, recipient_ids=user_ids)
             
             messages.success(
                 request,
-                f'Сообщение отправлено: успешно {success_count}, ошибок {error_count}'
+                f'Рассылка #{job.pk} поставлена в очередь: {job.total_count} получателей. '
+                f'Прогресс отображается в разделе «Рассылки».'
             )
             
             # Очистить сессию
             if 'selected_user_ids' in request.session:
                 del request.session['selected_user_ids']
             
-            return redirect('admin:bot_telegramuser_changelist')
+            return redirect('admin:bot_broadcastjob_change', job.pk)
     else:
         form = SendMessageForm()
     
@@ -145,15 +136,15 @@ admin.site.get_urls = get_urls
 
 @admin.register(TelegramUser)
 class TelegramUserAdmin(admin.ModelAdmin):
-    list_display = ['telegram_id', 'username', 'first_name', 'last_name', 'created_at']
-    list_filter = ['created_at']
+    list_display = ['telegram_id', 'username', 'first_name', 'last_name', 'is_blocked', 'created_at']
+    list_filter = ['is_blocked', 'created_at']
     search_fields = ['telegram_id', 'username', 'first_name', 'last_name']
     readonly_fields = ['telegram_id', 'created_at', 'updated_at']
     actions = ['send_message_to_selected', 'send_message_to_all']
     
     fieldsets = (
         ('Основная информация', {
-            'fields': ('telegram_id', 'username', 'first_name', 'last_name')
+            'fields': ('telegram_id', 'username', 'first_name', 'last_name', 'is_blocked')
         }),
         ('Даты', {
             'fields': ('created_at', 'updated_at'),
@@ -190,16 +181,39 @@ class TelegramUserAdmin(admin.ModelAdmin):
     send_message_to_all.short_description = 'Отправить сообщение'
 
 
+@admin.register(Branch)
+class BranchAdmin(admin.ModelAdmin):
+    list_display = ['name', 'slug', 'is_active', 'created_at']
+    list_filter = ['is_active']
+    search_fields = ['name', 'slug']
+    prepopulated_fields = {'slug': ('name',)}
+    readonly_fields = ['created_at', 'updated_at']
+
+    fieldsets = (
+        ('Филиал', {
+            'fields': ('name', 'slug', 'is_active')
+        }),
+        ('Боты', {
+            'fields': ('bot_token', 'notification_bot_token'),
+            'description': 'Боты филиалов запускаются командой run_bot --multi (BOT_MULTI_TENANT=True)'
+        }),
+        ('Даты', {
+            'fields': ('created_at', 'updated_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+
 @admin.register(BotMessage)
 class BotMessageAdmin(admin.ModelAdmin):
-    list_display = ['message_type_display', 'text_preview', 'updated_at']
-    list_filter = ['message_type', 'updated_at']
+    list_display = ['message_type_display', 'branch', 'text_preview', 'updated_at']
+    list_filter = ['message_type', 'branch', 'updated_at']
     search_fields = ['text']
     readonly_fields = ['updated_at']
     
     fieldsets = (
         ('Настройка сообщения', {
-            'fields': ('message_type', 'text')
+            'fields': ('message_type', 'branch', 'text')
         }),
         ('Информация', {
             'fields': ('updated_at',),
@@ -234,14 +248,14 @@ class BotMessageAdmin(admin.ModelAdmin):
 
 @admin.register(ExchangeRate)
 class ExchangeRateAdmin(admin.ModelAdmin):
-    list_display = ['currency_from', 'currency_to', 'rate', 'is_active', 'updated_at']
-    list_filter = ['is_active', 'currency_from', 'currency_to', 'updated_at']
+    list_display = ['currency_from', 'currency_to', 'rate', 'branch', 'is_active', 'updated_at']
+    list_filter = ['is_active', 'branch', 'currency_from', 'currency_to', 'updated_at']
     search_fields = ['currency_from', 'currency_to']
     list_editable = ['is_active', 'rate']
     
     fieldsets = (
         ('Курс обмена', {
-            'fields': ('currency_from', 'currency_to', 'rate', 'is_active')
+            'fields': ('currency_from', 'currency_to', 'rate', 'branch', 'is_active')
         }),
         ('Даты', {
             'fields': ('created_at', 'updated_at'),
@@ -257,15 +271,15 @@ class ExchangeRateAdmin(admin.ModelAdmin):
 
 @admin.register(Cityex24Transfer)
 class Cityex24TransferAdmin(admin.ModelAdmin):
-    list_display = ['id', 'user_display', 'country_display', 'contact_display', 'status', 'created_at']
-    list_filter = ['status', 'country', 'created_at']
+    list_display = ['id', 'user_display', 'country_display', 'contact_display', 'branch', 'status', 'created_at']
+    list_filter = ['status', 'country', 'branch', 'created_at']
     search_fields = ['user__first_name', 'user__last_name', 'user__username', 'user__telegram_id', 'contact_phone']
     readonly_fields = ['created_at', 'updated_at']
     list_editable = ['status']
     
     fieldsets = (
         ('Информация о заявке', {
-            'fields': ('user', 'country', 'status')
+            'fields': ('user', 'country', 'branch', 'status')
         }),
         ('Контактная информация', {
             'fields': ('contact_phone', 'contact_first_name', 'contact_last_name')
@@ -303,19 +317,19 @@ class Cityex24TransferAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         qs = super().get_queryset(request)
-        return qs.select_related('user')
+        return qs.select_related('user', 'branch')
 
 
 @admin.register(AdminChat)
 class AdminChatAdmin(admin.ModelAdmin):
-    list_display = ['chat_id', 'name', 'is_active', 'created_at']
-    list_filter = ['is_active', 'created_at']
+    list_display = ['chat_id', 'name', 'branch', 'is_active', 'created_at']
+    list_filter = ['is_active', 'branch', 'created_at']
     search_fields = ['chat_id', 'name']
     list_editable = ['is_active']
     
     fieldsets = (
         ('Информация', {
-            'fields': ('chat_id', 'name', 'is_active')
+            'fields': ('chat_id', 'name', 'branch', 'is_active')
         }),
         ('Даты', {
             'fields': ('created_at', 'updated_at'),
@@ -374,3 +388,110 @@ class ExchangeOrderAdmin(admin.ModelAdmin):
         qs = super().get_queryset(request)
         return qs
 
+
+@admin.register(NotificationOutbox)
+class NotificationOutboxAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'object_id', 'status', 'attempts', 'next_attempt_at', 'created_at', 'sent_at']
+    list_filter = ['status', 'kind', 'created_at']
+    search_fields = ['object_id', 'last_error']
+    readonly_fields = ['kind', 'object_id', 'attempts', 'last_error', 'created_at', 'updated_at', 'sent_at']
+    actions = ['retry_notifications']
+    
+    fieldsets = (
+        ('Уведомление', {
+            'fields': ('kind', 'object_id', 'status', 'attempts', 'next_attempt_at')
+        }),
+        ('Ошибка', {
+            'fields': ('last_error',)
+        }),
+        ('Даты', {
+            'fields': ('created_at', 'updated_at', 'sent_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def retry_notifications(self, request, queryset):
+        """
+        Вернуть недоставленные уведомления в очередь.
+
+        Уведомления в статусе processing сейчас отправляет диспетчер: их не трогаем,
+        иначе другой диспетчер захватит их повторно и администраторы получат дубль.
+        """
+        count = queryset.filter(status__in=['dead', 'pending']).update(
+            status='pending', attempts=0, next_attempt_at=timezone.now(), updated_at=timezone.now()
+        )
+        self.message_user(request, f'Возвращено в очередь уведомлений: {count}')
+    
+    retry_notifications.short_description = 'Повторить отправку'
+
+
+@admin.register(BroadcastJob)
+class BroadcastJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'text_preview', 'audience', 'status', 'progress_display', 'sent_count', 'failed_count', 'blocked_count', 'eta_display', 'created_at']
+    list_filter = ['status', 'audience', 'created_at']
+    search_fields = ['text']
+    readonly_fields = [
+        'text', 'audience', 'status', 'progress_display', 'eta_display', 'total_count', 'sent_count',
+        'failed_count', 'blocked_count', 'last_user_pk', 'heartbeat_at', 'last_error',
+        'created_at', 'started_at', 'finished_at',
+    ]
+    actions = ['cancel_broadcasts']
+    
+    fieldsets = (
+        ('Рассылка', {
+            'fields': ('text', 'audience', 'status')
+        }),
+        ('Прогресс', {
+            'fields': ('progress_display', 'eta_display', 'total_count', 'sent_count', 'failed_count', 'blocked_count', 'last_error')
+        }),
+        ('Служебное', {
+            'fields': ('last_user_pk', 'heartbeat_at', 'created_at', 'started_at', 'finished_at'),
+            'classes': ('collapse',)
+        }),
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+    def text_preview(self, obj):
+        return obj.text[:60] + '...' if len(obj.text) > 60 else obj.text
+    text_preview.short_description = 'Текст'
+
+    def progress_display(self, obj):
+        return format_html('<strong>{}%</strong> ({} из {})', obj.get_progress(), obj.processed_count, obj.total_count)
+    progress_display.short_description = 'Прогресс'
+
+    def eta_display(self, obj):
+        eta = obj.get_eta_seconds()
+        if eta is None:
+            return '—'
+        minutes, seconds = divmod(eta, 60)
+        return f"~{minutes} мин {seconds} сек" if minutes else f"~{seconds} сек"
+    eta_display.short_description = 'Осталось'
+
+    def cancel_broadcasts(self, request, queryset):
+        """Отменить рассылки, которые еще не завершены"""
+        count = queryset.filter(status__in=['pending', 'running']).update(status='cancelled', finished_at=timezone.now())
+        self.message_user(request, f'Отменено рассылок: {count}')
+    
+    cancel_broadcasts.short_description = 'Отменить рассылку'
+
+
+@admin.register(BotLease)
+class BotLeaseAdmin(admin.ModelAdmin):
+    list_display = ['key', 'holder', 'epoch', 'is_held', 'expires_at', 'update_offset', 'renewed_at']
+    readonly_fields = ['key', 'holder', 'epoch', 'expires_at', 'update_offset', 'acquired_at', 'renewed_at']
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+    def is_held(self, obj):
+        return bool(obj.holder) and obj.expires_at > timezone.now()
+    is_held.boolean = True
+    is_held.short_description = 'Действует'
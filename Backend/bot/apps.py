@@ -5,3 +5,7 @@ class BotConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'bot'
 
+    def ready(self):
+        from bot import cache, users
+        cache.connect_signals()
+        users.connect_signals()
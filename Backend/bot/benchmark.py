@@ -0,0 +1,322 @@
+import asyncio
+import io
+import json
+import os
+import random
+import shutil
+import subprocess
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.core.management import call_command
+from django.db import connections
+from django.db.backends.signals import connection_created
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+from bot.menu import STATIC_SECTIONS, COURSES_BUTTON, COUNTRY_CODES
+
+# Начало диапазона telegram_id тестовых пользователей (в отдельной БД бенчмарка)
+BENCH_ID_BASE = 9_000_000_000
+BENCH_BOT_ID = 1
+
+MENU_BUTTONS = (*STATIC_SECTIONS, COURSES_BUTTON)
+COUNTRY_BUTTONS = tuple(COUNTRY_CODES)
+
+# Доли видов обновлений в синтетическом потоке по умолчанию
+DEFAULT_MIX = {'menu': 70, 'country': 12, 'contact': 10, 'start': 8}
+
+
+# Курсы справочника в БД бенчмарка: покупка и продажа USDT за рубли
+BENCH_RATES = {('Руб', 'USDT'): Decimal('95.1000'), ('USDT', 'Руб'): Decimal('92.5000')}
+
+
+@contextmanager
+def isolated_database():
+    """
+    Отдельная БД на время бенчмарка (django.test.utils.setup_databases).
+
+    Бенчмарки создают пользователей, заявки, уведомления в очереди, чаты
+    администраторов и индексы; в рабочей БД они попали бы к живому боту и
+    диспетчеру уведомлений. Тестовая БД создается миграциями и удаляется
+    целиком после прогона, поэтому созданное не нужно удалять по диапазону ID.
+    SQLite — во временном файле, как рабочая БД: к нему подключаются потоки
+    sync_to_async и дочерние процессы (bench_failover). Возвращает имя БД.
+    """
+    from django.test.utils import setup_databases, teardown_databases
+
+    settings_dict = connections['default'].settings_dict
+    test_settings = settings_dict.setdefault('TEST', {})
+    saved_name = test_settings.get('NAME')
+    workdir = None
+    if settings_dict['ENGINE'].endswith('sqlite3') and not saved_name:
+        workdir = tempfile.mkdtemp(prefix='bench_db_')
+        test_settings['NAME'] = os.path.join(workdir, 'db.sqlite3')
+    old_config = setup_databases(verbosity=0, interactive=False, aliases={'default'}, serialized_aliases=set())
+    try:
+        yield settings_dict['NAME']
+    finally:
+        teardown_databases(old_config, verbosity=0)
+        test_settings['NAME'] = saved_name
+        if workdir:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+
+def seed_reference_data():
+    """Сообщения бота (init_messages) и курсы — справочники, которые читают обработчики"""
+    from bot.models import ExchangeRate
+
+    call_command('init_messages', stdout=io.StringIO())
+    ExchangeRate.objects.bulk_create([
+        ExchangeRate(currency_from=currency_from, currency_to=currency_to, rate=rate)
+        for (currency_from, currency_to), rate in BENCH_RATES.items()
+    ])
+
+
+class OfflineBotRequest(BaseRequest):
+    """
+    Заглушка Bot API без сети: отвечает на вызовы методов так, как ответил бы Telegram.
+
+    latency — искусственная задержка ответа в секундах. Счетчик calls показывает,
+    сколько раз обработчики обращались к Bot API.
+    """
+
+    def __init__(self, latency=0.0):
+        self.latency = latency
+        self.calls = 0
+        self._message_id = 0
+
+    @property
+    def read_timeout(self):
+        return None
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        self.calls += 1
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        api_method = url.rsplit('/', 1)[-1]
+        params = request_data.parameters if request_data else {}
+        result = self.result(api_method, params)
+        return 200, json.dumps({'ok': True, 'result': result}).encode()
+
+    def result(self, api_method, params):
+        if api_method == 'getMe':
+            return {'id': BENCH_BOT_ID, 'is_bot': True, 'first_name': 'Bench', 'username': 'bench_bot'}
+        if api_method == 'getUpdates':
+            return []
+        if api_method == 'sendMessage':
+            self._message_id += 1
+            return {
+                'message_id': self._message_id,
+                'date': int(time.time()),
+                'chat': {'id': int(params['chat_id']), 'type': 'private'},
+                'text': params.get('text', ''),
+            }
+        return True
+
+
+def make_update(update_id, user_id, kind, text=None):
+    """Сырое обновление в формате Bot API"""
+    message = {
+        'message_id': update_id,
+        'date': int(time.time()),
+        'chat': {'id': user_id, 'type': 'private', 'first_name': f'Bench{user_id % 1000}'},
+        'from': {'id': user_id, 'is_bot': False, 'first_name': f'Bench{user_id % 1000}', 'username': f'bench{user_id}'},
+    }
+    if kind == 'contact':
+        message['contact'] = {'phone_number': f'+7900{user_id % 10_000_000:07d}', 'first_name': 'Bench', 'user_id': user_id}
+    elif kind == 'start':
+        message['text'] = '/start'
+        message['entities'] = [{'type': 'bot_command', 'offset': 0, 'length': 6}]
+    else:
+        message['text'] = text
+    return {'update_id': update_id, 'message': message}
+
+
+def synthetic_stream(count, users, mix=None, seed=0):
+    """
+    Синтетический поток обновлений от users пользователей.
+
+    Контакт отправляется только пользователем, уже выбравшим страну (иначе вместо
+    него генерируется выбор страны), поэтому поток проходит реальный сценарий заявки.
+    """
+    mix = mix or DEFAULT_MIX
+    rng = random.Random(seed)
+    kinds, weights = zip(*mix.items())
+    choosing = set()
+    stream = []
+    for update_id in range(1, count + 1):
+        user_id = BENCH_ID_BASE + rng.randrange(users)
+        kind = rng.choices(kinds, weights)[0]
+        if kind == 'contact' and user_id not in choosing:
+            kind = 'country'
+        text = None
+        if kind == 'menu':
+            text = rng.choice(MENU_BUTTONS)
+        elif kind == 'country':
+            text = rng.choice(COUNTRY_BUTTONS)
+            choosing.add(user_id)
+        elif kind == 'contact':
+            choosing.discard(user_id)
+        stream.append(make_update(update_id, user_id, kind, text))
+    return stream
+
+
+def update_kind(data):
+    """Вид обновления для группировки задержек: start, contact, country, menu или text"""
+    message = data.get('message') or {}
+    if 'contact' in message:
+        return 'contact'
+    text = message.get('text') or ''
+    if text.startswith('/start'):
+        return 'start'
+    if text in COUNTRY_CODES:
+        return 'country'
+    if text in MENU_BUTTONS:
+        return 'menu'
+    return 'text'
+
+
+def parse_mix(value):
+    """'menu=70,country=15,contact=10,start=5' -> dict"""
+    mix = {}
+    for part in value.split(','):
+        kind, _, weight = part.partition('=')
+        if kind.strip() not in DEFAULT_MIX:
+            raise ValueError(f"Неизвестный вид обновления: {kind}")
+        mix[kind.strip()] = float(weight)
+    return mix
+
+
+class QueryCounter:
+    """
+    Считает SQL-запросы во всех соединениях, в том числе в потоке sync_to_async.
+
+    Используется как async-контекст: обертка ставится на соединения текущего
+    потока, общего потока asgiref и на все соединения, созданные во время замера.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, execute, sql, params, many, context):
+        with self._lock:
+            self.count += 1
+        return execute(sql, params, many, context)
+
+    def attach(self):
+        for connection in connections.all():
+            if self not in connection.execute_wrappers:
+                connection.execute_wrappers.append(self)
+
+    def detach(self):
+        for connection in connections.all(initialized_only=True):
+            if self in connection.execute_wrappers:
+                connection.execute_wrappers.remove(self)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    async def __aenter__(self):
+        connection_created.connect(self._on_connection_created)
+        self.attach()
+        await sync_to_async(self.attach)()
+        return self
+
+    async def __aexit__(self, *exc):
+        connection_created.disconnect(self._on_connection_created)
+        self.detach()
+        await sync_to_async(self.detach)()
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * fraction), len(values) - 1)]
+
+
+def latency_summary(latencies):
+    """Перцентили задержки в миллисекундах"""
+    return {
+        'count': len(latencies),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 3),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 3),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3),
+        'max_ms': round(max(latencies, default=0) * 1000, 3),
+    }
+
+
+def git_revision():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, timeout=5, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return ''
+
+
+def result_header(name):
+    """Общие поля JSON-результата бенчмарка для сравнения запусков между коммитами"""
+    return {
+        'benchmark': name,
+        'commit': git_revision(),
+        'started_at': datetime.now(dt_timezone.utc).isoformat(),
+    }
+
+
+async def replay_updates(raw_updates, request, timeout=600):
+    """Подать обновления в update_queue того же Application, что и в run_polling, и дождаться обработки"""
+    from bot.bot import build_application
+
+    # Без Updater: обновления подаются напрямую в очередь, как в режиме webhook
+    application = build_application(webhook=True, request=request)
+    kinds = {data['update_id']: update_kind(data) for data in raw_updates}
+    started_at = {}
+    latencies = defaultdict(list)
+    remaining = [len(raw_updates)]
+    done = asyncio.Event()
+
+    async def _begin(update, context):
+        started_at[update.update_id] = time.perf_counter()
+
+    async def _end(update, context):
+        latencies[kinds[update.update_id]].append(time.perf_counter() - started_at.pop(update.update_id))
+        remaining[0] -= 1
+        if not remaining[0]:
+            done.set()
+
+    # Группы -1 и 100 выполняются до и после обработчиков бота (группа 0)
+    application.add_handler(TypeHandler(Update, _begin), group=-1)
+    application.add_handler(TypeHandler(Update, _end), group=100)
+
+    await application.initialize()
+    await application.start()
+    try:
+        updates = [Update.de_json(data, application.bot) for data in raw_updates]
+        async with QueryCounter() as queries:
+            started = time.perf_counter()
+            for update in updates:
+                await application.update_queue.put(update)
+            await asyncio.wait_for(done.wait(), timeout)
+            elapsed = time.perf_counter() - started
+    finally:
+        await application.stop()
+        await application.shutdown()
+    return elapsed, latencies, queries
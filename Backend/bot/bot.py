@@ -1,104 +1,64 @@
+import asyncio
 import logging
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardMarkup, KeyboardButton, ReplyKeyboardRemove
-from telegram.ext import Application, CommandHandler, MessageHandler, CallbackQueryHandler, ContextTypes, filters
+from telegram import Update
+from telegram.ext import Application, CommandHandler, MessageHandler, ContextTypes, filters
+from telegram.request import HTTPXRequest
 from django.conf import settings
-from asgiref.sync import sync_to_async
-from bot.models import TelegramUser, BotMessage, ExchangeRate, Cityex24Transfer, AdminChat, ExchangeOrder
-
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+from bot.models import TelegramUser
+from bot.cache import snapshot_cache
+from bot import repository
+from bot.dispatch import ChatOrderedUpdateProcessor
+from bot.clients import api_base_urls, bot_clients, get_main_bot, shutdown_bot_clients
+from bot.notifications import notify_admins
+from bot.outbox import outbox_dispatcher
+from bot.digest import notification_coalescer
+from bot.catchup import catch_up
+from bot.broadcast import broadcast_runner
+from bot.state import conversation_state
+from bot.users import run_blocked_sync
+from bot.metrics import bot_metrics, instrumented, measured_request
+from bot import tenants
+from bot.menu import menu_router, MAIN_KEYBOARD, COUNTRIES_KEYBOARD, CONTACT_KEYBOARD, COUNTRY_CODES
+
+# Вывод логов настраивается в settings.LOGGING (очередь с фоновым потоком, JSON)
 logger = logging.getLogger(__name__)
 
 
-@sync_to_async
-def get_or_create_user(update: Update) -> TelegramUser:
+async def get_or_create_user(update: Update) -> TelegramUser:
     """Получить или создать пользователя"""
-    user_data = update.effective_user
-    user, created = TelegramUser.objects.get_or_create(
-        telegram_id=user_data.id,
-        defaults={
-            'username': user_data.username,
-            'first_name': user_data.first_name,
-            'last_name': user_data.last_name,
-        }
-    )
-    if not created:
-        # Обновить данные пользователя
-        user.username = user_data.username
-        user.first_name = user_data.first_name
-        user.last_name = user_data.last_name
-        user.save()
-    return user
+    # Запись в БД происходит только если профиль изменился или еще не закеширован
+    return await repository.get_or_create_user(update.effective_user)
 
 
 def get_main_keyboard():
-    """Создать главную клавиатуру"""
-    keyboard = [
-        [
-            KeyboardButton("О нас"),
-            KeyboardButton("Курсы"),
-        ],
-        [
-            KeyboardButton("AML Проверка"),
-            KeyboardButton("Связаться с нами"),
-        ],
-        [
-            KeyboardButton("Как нас найти"),
-        ],
-        [
-            KeyboardButton("Международные переводы Cityex24"),
-        ],
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    """Главная клавиатура (собрана один раз)"""
+    return MAIN_KEYBOARD
 
 
 def get_countries_keyboard():
-    """Создать клавиатуру с выбором стран"""
-    keyboard = [
-        [
-            KeyboardButton("🇰🇬 Кыргызстан"),
-            KeyboardButton("🇺🇿 Узбекистан"),
-        ],
-        [
-            KeyboardButton("🇦🇪 ОАЭ"),
-            KeyboardButton("🇹🇷 Турция"),
-        ],
-        [
-            KeyboardButton("🇸🇦 Саудовская Аравия"),
-        ],
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+    """Клавиатура с выбором стран (собрана один раз)"""
+    return COUNTRIES_KEYBOARD
 
 
 def get_contact_keyboard():
-    """Создать клавиатуру с кнопкой запроса контакта"""
-    keyboard = [
-        [
-            KeyboardButton("Поделиться контактом", request_contact=True),
-        ],
-    ]
-    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True, one_time_keyboard=True)
+    """Клавиатура с кнопкой запроса контакта (собрана один раз)"""
+    return CONTACT_KEYBOARD
 
 
-@sync_to_async
-def get_start_message():
+async def get_start_message():
     """Получить стартовое сообщение"""
-    try:
-        return BotMessage.objects.get(message_type='start').text
-    except BotMessage.DoesNotExist:
-        return "Добро пожаловать в City Exchange! Выберите нужный раздел:"
+    return await repository.get_message('start', "Добро пожаловать в City Exchange! Выберите нужный раздел:")
 
+@instrumented("start")
 async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик команды /start"""
     try:
-        logger.info(f"Получена команда /start от пользователя {update.effective_user.id}")
+        logger.info("Получена команда /start от пользователя %s", update.effective_user.id)
         user = await get_or_create_user(update)
-        logger.info(f"Пользователь получен/создан: {user.telegram_id}")
+        logger.debug("Пользователь получен/создан: %s", user.telegram_id)
         
         start_message = await get_start_message()
-        logger.info(f"Стартовое сообщение получено: {start_message[:50]}...")
+        logger.debug("Стартовое сообщение получено: %.50s...", start_message)
         
         if not start_message or start_message == "Сообщение не настроено":
             start_message = "Добро пожаловать в City Exchange! Выберите нужный раздел:"
@@ -107,74 +67,47 @@ async def start(update: Update, context: ContextTypes.DEFAULT_TYPE):
             start_message,
             reply_markup=get_main_keyboard()
         )
-        logger.info("Стартовое сообщение отправлено успешно")
+        logger.debug("Стартовое сообщение отправлено успешно")
     except Exception as e:
-        logger.error(f"Ошибка в обработчике start: {e}", exc_info=True)
+        logger.error("Ошибка в обработчике start: %s", e, exc_info=True)
+        bot_metrics.error("start")
         try:
             await update.message.reply_text(
                 "Добро пожаловать в City Exchange! Выберите нужный раздел:",
                 reply_markup=get_main_keyboard()
             )
         except Exception as e2:
-            logger.error(f"Критическая ошибка при отправке сообщения: {e2}")
+            logger.error("Критическая ошибка при отправке сообщения: %s", e2)
 
 
-@sync_to_async
-def get_bot_message(message_type):
+async def get_bot_message(message_type):
     """Получить сообщение бота по типу"""
-    try:
-        return BotMessage.objects.get(message_type=message_type).text
-    except BotMessage.DoesNotExist:
-        return "Сообщение не настроено"
-
-@sync_to_async
-def get_exchange_rates():
-    """Получить активные курсы обмена"""
-    return list(ExchangeRate.objects.filter(is_active=True))
-
-@sync_to_async
-def create_cityex24_transfer(user, country_text):
-    """Создать заявку Cityex24"""
-    country_map = {
-        "🇰🇬 Кыргызстан": "kyrgyzstan",
-        "🇺🇿 Узбекистан": "uzbekistan",
-        "🇦🇪 ОАЭ": "uae",
-        "🇹🇷 Турция": "turkey",
-        "🇸🇦 Саудовская Аравия": "saudi_arabia",
-    }
-    country_code = country_map.get(country_text)
-    if not country_code:
-        return None
-    
-    transfer = Cityex24Transfer.objects.create(
-        user=user,
-        country=country_code,
-        status='new'
+    return await repository.get_message(message_type)
+
+def telegram_update_key(bot, update):
+    """Ключ обновления, уникальный среди ботов всех филиалов"""
+    return f"{bot.id}:{update.update_id}"
+
+async def create_cityex24_transfer(user, country_code, contact, telegram_update=None):
+    """Создать заявку Cityex24 из черновика и контакта (уведомление ставится в очередь в той же транзакции)"""
+    return await repository.create_transfer(
+        user, country_code, contact.phone_number, contact.first_name, contact.last_name, telegram_update
     )
-    return transfer
 
-@sync_to_async
-def save_contact_to_transfer(transfer_id, phone_number, first_name=None, last_name=None):
-    """Сохранить контакт в заявку"""
-    try:
-        transfer = Cityex24Transfer.objects.get(pk=transfer_id)
-        transfer.contact_phone = phone_number
-        transfer.contact_first_name = first_name
-        transfer.contact_last_name = last_name
-        transfer.save()
-        return transfer
-    except Cityex24Transfer.DoesNotExist:
-        return None
+async def save_contact_to_transfer(transfer_id, phone_number, first_name=None, last_name=None):
+    """Сохранить контакт в заявку, созданную до перехода на черновики"""
+    return await repository.save_contact(transfer_id, phone_number, first_name, last_name)
 
 async def handle_country_selection(update: Update, context: ContextTypes.DEFAULT_TYPE, country_text: str):
     """Обработать выбор страны"""
     try:
-        user = await get_or_create_user(update)
-        transfer = await create_cityex24_transfer(user, country_text)
+        await get_or_create_user(update)
+        country_code = COUNTRY_CODES.get(country_text)
         
-        if transfer:
-            # Сохраняем ID заявки в контексте для последующего сохранения контакта
-            context.user_data['pending_transfer_id'] = transfer.id
+        if country_code:
+            # Черновик заявки хранится в состоянии диалога (переживает перезапуск бота);
+            # строка в БД появится только после получения контакта
+            await conversation_state.set(update.effective_user.id, 'cityex24_country', country_code)
             
             # Отправляем запрос контакта
             contact_request_message = await get_bot_message('cityex24_contact_request')
@@ -191,80 +124,35 @@ async def handle_country_selection(update: Update, context: ContextTypes.DEFAULT
                 reply_markup=get_main_keyboard()
             )
     except Exception as e:
-        logger.error(f"Ошибка при обработке выбора страны: {e}", exc_info=True)
+        logger.error("Ошибка при обработке выбора страны: %s", e, exc_info=True)
+        bot_metrics.error("handle_text:country")
         await update.message.reply_text(
             "Произошла ошибка. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
 
+@instrumented("handle_text")
 async def handle_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик текстовых сообщений"""
     try:
-        text = update.message.text
-        user = await get_or_create_user(update)
-        
-        if text == "О нас":
-            message = await get_bot_message('about')
-            if message == "Сообщение не настроено":
-                message = "Информация о нас скоро будет добавлена."
-            await update.message.reply_text(message, reply_markup=get_main_keyboard())
-        
-        elif text == "Курсы":
-            rates = await get_exchange_rates()
-            courses_text = await get_bot_message('courses')
-            
-            if rates:
-                message = ""
-                if courses_text and courses_text != "Сообщение не настроено":
-                    message = f"{courses_text}\n\n"
-                message += "📊 Актуальные курсы обмена:\n\n"
-                for rate in rates:
-                    message += f"💱 {rate.currency_from} → {rate.currency_to}: {rate.rate}\n"
-            else:
-                message = courses_text if courses_text != "Сообщение не настроено" else "Курсы обмена скоро будут добавлены."
-            await update.message.reply_text(message, reply_markup=get_main_keyboard())
+        await get_or_create_user(update)
         
-        elif text == "AML Проверка":
-            message = await get_bot_message('aml')
-            if message == "Сообщение не настроено":
-                message = "Информация об AML проверке скоро будет добавлена."
-            await update.message.reply_text(message, reply_markup=get_main_keyboard())
-        
-        elif text == "Связаться с нами":
-            message = await get_bot_message('contact')
-            if message == "Сообщение не настроено":
-                message = "Контактная информация скоро будет добавлена."
-            await update.message.reply_text(message, reply_markup=get_main_keyboard())
-        
-        elif text == "Как нас найти":
-            message = await get_bot_message('location')
-            if message == "Сообщение не настроено":
-                message = "Информация о местоположении скоро будет добавлена."
-            await update.message.reply_text(message, reply_markup=get_main_keyboard())
-        
-        elif text == "Международные переводы Cityex24":
-            message = await get_bot_message('cityex24_question')
-            if message == "Сообщение не настроено":
-                message = "В какую страну нужно перевести деньги? По международным переводам работаем с 08:00 до 20:00 по МСК"
-            await update.message.reply_text(message, reply_markup=get_countries_keyboard())
-        
-        # Обработка выбора стран
-        elif text in ["🇰🇬 Кыргызстан", "🇺🇿 Узбекистан", "🇦🇪 ОАЭ", "🇹🇷 Турция", "🇸🇦 Саудовская Аравия"]:
-            await handle_country_selection(update, context, text)
-        
-        else:
+        # Кнопки меню и стран обрабатываются по таблице маршрутов (bot.menu)
+        if not await menu_router.dispatch(update, context):
             await update.message.reply_text(
                 "Пожалуйста, используйте кнопки меню для навигации.",
                 reply_markup=get_main_keyboard()
             )
     except Exception as e:
-        logger.error(f"Ошибка в обработчике handle_text: {e}")
+        logger.error("Ошибка в обработчике handle_text: %s", e)
+        bot_metrics.error("handle_text")
         await update.message.reply_text(
             "Произошла ошибка. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
 
 
+@instrumented("handle_contact")
 async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработать получение контакта от пользователя"""
     try:
@@ -272,22 +160,34 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
         if not contact:
             return
         
-        # Получаем ID заявки из контекста
-        transfer_id = context.user_data.get('pending_transfer_id')
-        if not transfer_id:
-            await update.message.reply_text(
-                "Произошла ошибка. Пожалуйста, начните заново.",
-                reply_markup=get_main_keyboard()
+        # Повтор обновления после смены ведущего узла: заявка по нему уже создана
+        user_id = update.effective_user.id
+        update_key = telegram_update_key(context.bot, update)
+        transfer = await repository.get_transfer_for_update(update_key)
+        
+        # Черновик заявки: выбранная страна (или ID заявки из диалога, начатого до обновления бота)
+        country_code = transfer_id = None
+        if transfer is None:
+            country_code = await conversation_state.get(user_id, 'cityex24_country')
+            transfer_id = None if country_code else await conversation_state.get(user_id, 'pending_transfer_id')
+            if not country_code and not transfer_id:
+                await update.message.reply_text(
+                    "Произошла ошибка. Пожалуйста, начните заново.",
+                    reply_markup=get_main_keyboard()
+                )
+                return
+        
+        if country_code:
+            # Одна вставка заявки вместе с контактом
+            user = await get_or_create_user(update)
+            transfer = await create_cityex24_transfer(user, country_code, contact, update_key)
+        elif transfer_id:
+            transfer = await save_contact_to_transfer(
+                transfer_id=transfer_id,
+                phone_number=contact.phone_number,
+                first_name=contact.first_name,
+                last_name=contact.last_name
             )
-            return
-        
-        # Сохраняем контакт
-        transfer = await save_contact_to_transfer(
-            transfer_id=transfer_id,
-            phone_number=contact.phone_number,
-            first_name=contact.first_name,
-            last_name=contact.last_name
-        )
         
         if transfer:
             # Отправляем подтверждение
@@ -300,34 +200,29 @@ async def handle_contact(update: Update, context: ContextTypes.DEFAULT_TYPE):
                 reply_markup=get_main_keyboard()
             )
             
-            # Очищаем контекст
-            context.user_data.pop('pending_transfer_id', None)
+            # Очищаем состояние диалога (при повторе черновик мог не успеть удалиться)
+            await conversation_state.pop(user_id, 'pending_transfer_id' if transfer_id else 'cityex24_country')
             
-            # Отправляем уведомление в другой бот
-            await send_notification_to_admin(transfer)
+            # Уведомление уже в очереди — будим диспетчер, не дожидаясь отправки
+            outbox_dispatcher.wake()
         else:
             await update.message.reply_text(
                 "Произошла ошибка при сохранении контакта. Попробуйте позже.",
                 reply_markup=get_main_keyboard()
             )
     except Exception as e:
-        logger.error(f"Ошибка при обработке контакта: {e}", exc_info=True)
+        logger.error("Ошибка при обработке контакта: %s", e, exc_info=True)
+        bot_metrics.error("handle_contact")
         await update.message.reply_text(
             "Произошла ошибка. Пожалуйста, попробуйте позже.",
             reply_markup=get_main_keyboard()
         )
 
 
-@sync_to_async
-def get_active_admin_chats():
-    """Получить список активных chat_id администраторов"""
-    return list(AdminChat.objects.filter(is_active=True).values_list('chat_id', flat=True))
-
-@sync_to_async
-def get_transfer_data(transfer):
+async def get_transfer_data(transfer):
     """Получить данные заявки для уведомления"""
-    # Загружаем связанные объекты
-    transfer = Cityex24Transfer.objects.select_related('user').get(pk=transfer.pk)
+    # Пользователь обычно уже загружен диспетчером очереди (select_related), повторного запроса нет
+    transfer = await repository.get_transfer(transfer)
     country_display = transfer.get_country_display_with_flag()
     
     # Формируем информацию о пользователе
@@ -360,23 +255,15 @@ def get_transfer_data(transfer):
 async def send_notification_to_admin(transfer):
     """Отправить уведомление о новой заявке в админский бот на все активные chat_id"""
     try:
-        from telegram import Bot
-        
-        logger.info("Начало отправки уведомления о новой заявке")
+        logger.debug("Начало отправки уведомления о новой заявке")
         
         if not settings.TELEGRAM_NOTIFICATION_BOT_TOKEN:
             logger.error("TELEGRAM_NOTIFICATION_BOT_TOKEN не установлен в настройках")
             return
         
-        logger.info(f"Токен бота уведомлений установлен: {settings.TELEGRAM_NOTIFICATION_BOT_TOKEN[:20]}...")
-        
         # Получаем данные заявки
         transfer_data = await get_transfer_data(transfer)
         
-        # Инициализируем бота
-        notification_bot = Bot(token=settings.TELEGRAM_NOTIFICATION_BOT_TOKEN)
-        await notification_bot.initialize()
-        
         message = f"🔔 Новая заявка Cityex24\n\n"
         message += f"👤 Пользователь: {transfer_data['user_info']}\n"
         message += f"🌍 Страна: {transfer_data['country_display']}\n"
@@ -385,57 +272,22 @@ async def send_notification_to_admin(transfer):
         message += f"📅 Дата: {transfer_data['created_at'].strftime('%d.%m.%Y %H:%M')}\n"
         message += f"🆔 ID заявки: {transfer_data['transfer_id']}"
         
-        logger.info(f"Текст уведомления подготовлен: {message[:100]}...")
-        
-        # Получаем список активных chat_id из базы данных
-        admin_chat_ids = await get_active_admin_chats()
-        logger.info(f"Найдено активных chat_id: {len(admin_chat_ids)} - {admin_chat_ids}")
+        logger.debug("Текст уведомления подготовлен: %.100s...", message)
         
-        if admin_chat_ids:
-            success_count = 0
-            error_count = 0
-            for chat_id in admin_chat_ids:
-                try:
-                    logger.info(f"Попытка отправить уведомление на chat_id: {chat_id}")
-                    await notification_bot.send_message(chat_id=int(chat_id), text=message)
-                    success_count += 1
-                    logger.info(f"✓ Уведомление успешно отправлено администратору (chat_id: {chat_id})")
-                except Exception as e:
-                    error_count += 1
-                    error_msg = str(e)
-                    logger.error(f"✗ Ошибка при отправке уведомления администратору (chat_id: {chat_id}): {error_msg}")
-                    logger.error(f"  Тип ошибки: {type(e).__name__}")
-                    # Проверяем специфичные ошибки
-                    if "chat not found" in error_msg.lower() or "chat_id is empty" in error_msg.lower():
-                        logger.error(f"  ВНИМАНИЕ: Пользователь с chat_id {chat_id} не начал диалог с ботом-уведомлений!")
-                    elif "unauthorized" in error_msg.lower():
-                        logger.error(f"  ВНИМАНИЕ: Неверный токен бота или бот заблокирован!")
-            
-            logger.info(f"Итог отправки уведомлений: успешно {success_count}, ошибок {error_count}")
-        else:
-            logger.warning("Нет активных chat_id администраторов для отправки уведомлений. Добавьте chat_id в админке!")
-        
-        await notification_bot.shutdown()
+        # Параллельная отправка во все активные чаты с учетом лимитов Bot API
+        return await notify_admins(message)
     except Exception as e:
-        logger.error(f"Критическая ошибка при отправке уведомления: {e}", exc_info=True)
+        logger.error("Критическая ошибка при отправке уведомления: %s", e, exc_info=True)
 
 async def send_exchange_order_notification(order):
     """Отправить уведомление о новой заявке на обмен в админский бот на все активные chat_id"""
     try:
-        from telegram import Bot
-        
-        logger.info("Начало отправки уведомления о новой заявке на обмен")
+        logger.debug("Начало отправки уведомления о новой заявке на обмен")
         
         if not settings.TELEGRAM_NOTIFICATION_BOT_TOKEN:
             logger.error("TELEGRAM_NOTIFICATION_BOT_TOKEN не установлен в настройках")
             return
         
-        logger.info(f"Токен бота уведомлений установлен: {settings.TELEGRAM_NOTIFICATION_BOT_TOKEN[:20]}...")
-        
-        # Инициализируем бота
-        notification_bot = Bot(token=settings.TELEGRAM_NOTIFICATION_BOT_TOKEN)
-        await notification_bot.initialize()
-        
         # Формируем сообщение
         order_type_display = "Покупка" if order.order_type == 'buy' else "Продажа"
         
@@ -459,82 +311,168 @@ async def send_exchange_order_notification(order):
         message += f"📅 Дата: {order.created_at.strftime('%d.%m.%Y %H:%M')}\n"
         message += f"📊 Статус: {order.get_status_display()}"
         
-        logger.info(f"Текст уведомления подготовлен: {message[:100]}...")
-        
-        # Получаем список активных chat_id из базы данных
-        admin_chat_ids = await get_active_admin_chats()
-        logger.info(f"Найдено активных chat_id: {len(admin_chat_ids)} - {admin_chat_ids}")
+        logger.debug("Текст уведомления подготовлен: %.100s...", message)
         
-        if admin_chat_ids:
-            success_count = 0
-            error_count = 0
-            for chat_id in admin_chat_ids:
-                try:
-                    logger.info(f"Попытка отправить уведомление на chat_id: {chat_id}")
-                    await notification_bot.send_message(chat_id=int(chat_id), text=message)
-                    success_count += 1
-                    logger.info(f"✓ Уведомление успешно отправлено администратору (chat_id: {chat_id})")
-                except Exception as e:
-                    error_count += 1
-                    error_msg = str(e)
-                    logger.error(f"✗ Ошибка при отправке уведомления администратору (chat_id: {chat_id}): {error_msg}")
-                    logger.error(f"  Тип ошибки: {type(e).__name__}")
-                    # Проверяем специфичные ошибки
-                    if "chat not found" in error_msg.lower() or "chat_id is empty" in error_msg.lower():
-                        logger.error(f"  ВНИМАНИЕ: Пользователь с chat_id {chat_id} не начал диалог с ботом-уведомлений!")
-                    elif "unauthorized" in error_msg.lower():
-                        logger.error(f"  ВНИМАНИЕ: Неверный токен бота или бот заблокирован!")
-            
-            logger.info(f"Итог отправки уведомлений: успешно {success_count}, ошибок {error_count}")
-        else:
-            logger.warning("Нет активных chat_id администраторов для отправки уведомлений. Добавьте chat_id в админке!")
-        
-        await notification_bot.shutdown()
+        # Параллельная отправка во все активные чаты с учетом лимитов Bot API
+        return await notify_admins(message)
     except Exception as e:
-        logger.error(f"Критическая ошибка при отправке уведомления о заявке на обмен: {e}", exc_info=True)
+        logger.error("Критическая ошибка при отправке уведомления о заявке на обмен: %s", e, exc_info=True)
 
 
 async def error_handler(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик ошибок"""
-    logger.error(f"Update {update} caused error {context.error}")
+    logger.error("Update %s caused error %s", update, context.error)
 
 
 def send_broadcast_message(telegram_id: int, message: str):
     """Отправить сообщение пользователю (для использования в админке)"""
-    from telegram import Bot
-    import asyncio
-    
     async def _send():
-        bot = Bot(token=settings.TELEGRAM_BOT_TOKEN)
+        bot = await get_main_bot()
         try:
             await bot.send_message(chat_id=telegram_id, text=message, reply_markup=get_main_keyboard())
             return True
         except Exception as e:
-            logger.error(f"Ошибка отправки сообщения пользователю {telegram_id}: {e}")
+            logger.error("Ошибка отправки сообщения пользователю %s: %s", telegram_id, e)
             return False
-        finally:
-            await bot.close()
     
     try:
-        return asyncio.run(_send())
+        return bot_clients.run_sync(_send())
     except Exception as e:
-        logger.error(f"Ошибка при отправке сообщения: {e}")
+        logger.error("Ошибка при отправке сообщения: %s", e)
         return False
 
 
-def run_polling():
-    """Запустить бота в режиме polling"""
-    if not settings.TELEGRAM_BOT_TOKEN:
+async def log_dispatch_stats(application, interval):
+    """Периодически писать в лог глубину очередей и состояние хранилища диалогов"""
+    while True:
+        await asyncio.sleep(interval)
+        if isinstance(application.update_processor, ChatOrderedUpdateProcessor):
+            stats = application.update_processor.stats(application.update_queue)
+            logger.info("Очередь обновлений: %s", stats)
+        logger.info("Состояние диалогов: %s", conversation_state.stats())
+        if settings.BOT_OUTBOX_IN_BOT_PROCESS:
+            logger.info("Уведомления администраторам: %s", notification_coalescer.stats())
+
+
+def process_tasks(application):
+    """Фоновые задачи процесса бота: список (корутина, имя задачи)"""
+    tasks = [
+        (conversation_state.run_flusher(), "conversation_state_flusher"),
+        (run_blocked_sync(), "profile_blocked_sync"),
+    ]
+    if settings.BOT_DISPATCH_STATS_INTERVAL > 0:
+        tasks.append((log_dispatch_stats(application, settings.BOT_DISPATCH_STATS_INTERVAL), "dispatch_stats"))
+    if settings.BOT_OUTBOX_IN_BOT_PROCESS:
+        tasks.append((outbox_dispatcher.run(), "outbox_dispatcher"))
+    if settings.BOT_BROADCAST_IN_BOT_PROCESS:
+        tasks.append((broadcast_runner.run(), "broadcast_runner"))
+    if settings.BOT_METRICS_ENABLED:
+        tasks.append((bot_metrics.run_loop_lag_probe(), "metrics_loop_lag"))
+        tasks.append((bot_metrics.run_exporter(), "metrics_exporter"))
+    return tasks
+
+
+async def run_catch_up(application):
+    if settings.BOT_CATCHUP_ENABLED and application.updater is not None:
+        # Только polling: в режиме webhook Telegram сам досылает накопившиеся обновления
+        try:
+            await catch_up(application)
+        except Exception as e:
+            logger.error("Ошибка догона накопившихся обновлений: %s", e, exc_info=True)
+
+
+async def on_startup(application):
+    """Хук post_init: догон накопившихся обновлений и фоновые задачи процесса бота"""
+    await run_catch_up(application)
+    for coroutine, name in process_tasks(application):
+        application.create_task(coroutine, name=name)
+
+
+async def on_branch_startup(application):
+    """Хук post_init остальных ботов хоста филиалов: фоновые задачи процесса запускает основной бот"""
+    await run_catch_up(application)
+
+
+async def on_stop(application):
+    """Хук post_stop: остановить фоновые задачи"""
+    outbox_dispatcher.stop()
+    broadcast_runner.stop()
+    # Дописываем несохраненное состояние диалогов перед выходом
+    await asyncio.to_thread(conversation_state.close)
+    if settings.BOT_METRICS_ENABLED:
+        try:
+            await asyncio.to_thread(bot_metrics.export)
+        except OSError as e:
+            logger.error("Не удалось сохранить метрики бота: %s", e)
+
+
+menu_router.add_countries(handle_country_selection)
+
+
+def build_application(webhook=False, request=None, branch=None, get_updates_request=None, primary=True):
+    """
+    Собрать Application с зарегистрированными обработчиками.
+
+    request — собственный BaseRequest для вызовов Bot API (например, заглушка в бенчмарках
+    или общий пул соединений хоста филиалов), get_updates_request — для getUpdates.
+    branch — филиал (bot.models.Branch), чей бот обслуживает Application; primary=False —
+    Application не запускает и не останавливает фоновые задачи процесса (bot.host).
+    """
+    token = branch.bot_token if branch is not None else settings.TELEGRAM_BOT_TOKEN
+    if not token:
         raise ValueError("TELEGRAM_BOT_TOKEN не установлен в настройках")
     
-    application = Application.builder().token(settings.TELEGRAM_BOT_TOKEN).build()
+    builder = Application.builder().token(token)
+    urls = api_base_urls()
+    if urls:
+        # Локальный Bot API (например, manage.py fake_bot_api для нагрузочных тестов)
+        builder = builder.base_url(urls['base_url']).base_file_url(urls['base_file_url'])
+    if request is None and settings.BOT_METRICS_ENABLED:
+        # Размер пула как у запроса, который ApplicationBuilder создает по умолчанию
+        request = HTTPXRequest(connection_pool_size=256)
+    if request is not None:
+        # Задержка вызовов Bot API по методам (bot.metrics)
+        builder = builder.request(measured_request(request))
+    if get_updates_request is not None:
+        builder = builder.get_updates_request(get_updates_request)
+    if settings.BOT_CONCURRENT_UPDATES > 1:
+        # Разные чаты обрабатываются параллельно, один чат — строго по порядку
+        builder = builder.concurrent_updates(ChatOrderedUpdateProcessor(
+            settings.BOT_CONCURRENT_UPDATES,
+            max_pending=settings.BOT_MAX_PENDING_UPDATES or None,
+        ))
+    if webhook:
+        # Обновления приходят через ASGI-эндпоинт, getUpdates не нужен
+        builder = builder.updater(None)
+    if primary:
+        builder = builder.post_init(on_startup).post_stop(on_stop)
+        # Закрываем общие клиенты Bot API вместе с приложением
+        builder = builder.post_shutdown(shutdown_bot_clients)
+    else:
+        builder = builder.post_init(on_branch_startup)
+    application = builder.build()
     
+    if branch is not None:
+        # Филиал обновления для кеша справочников, состояния диалогов и заявок
+        tenants.install(application, branch.pk)
     # Регистрация обработчиков
     application.add_handler(CommandHandler("start", start))
     application.add_handler(MessageHandler(filters.CONTACT, handle_contact))
     application.add_handler(MessageHandler(filters.TEXT & ~filters.COMMAND, handle_text))
     application.add_error_handler(error_handler)
+    if settings.BOT_METRICS_ENABLED:
+        # Время обновления целиком, SQL-запросы и вызовы Bot API на обновление
+        bot_metrics.install(application)
+    return application
+
+
+def run_polling():
+    """Запустить бота в режиме polling"""
+    application = build_application()
+    
+    # Прогреваем кеш справочников до приема первых обновлений
+    snapshot_cache.warm()
+    logger.info("Кеш справочников прогрет, версия %s", snapshot_cache.version)
     
     logger.info("Бот запущен и готов к работе")
     application.run_polling(allowed_updates=Update.ALL_TYPES)
-
@@ -0,0 +1,235 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from bot.clients import get_main_bot
+from bot.models import BroadcastJob, TelegramUser
+from bot.notifications import deliver
+from bot.ratelimit import TokenBucket, PerChatLimiter
+from bot.users import profile_cache
+
+logger = logging.getLogger(__name__)
+
+
+def audience_queryset(job):
+    """Получатели рассылки, упорядоченные по pk (по нему хранится контрольная точка)"""
+    users = TelegramUser.objects.filter(is_blocked=False)
+    if job.audience == 'selected':
+        users = users.filter(telegram_id__in=job.recipient_ids)
+    return users.order_by('pk')
+
+
+def create_job(text, recipient_ids=None):
+    """Создать задание на рассылку всем пользователям или выбранным telegram_id"""
+    job = BroadcastJob(
+        text=text,
+        audience='selected' if recipient_ids else 'all',
+        recipient_ids=list(recipient_ids or []),
+    )
+    job.total_count = audience_queryset(job).count()
+    job.save()
+    return job
+
+
+def claim_job(job_id=None):
+    """
+    Захватить задание для отправки.
+
+    Берется задание в очереди или «зависшее» в статусе running, чей исполнитель
+    не обновлял heartbeat дольше BOT_BROADCAST_STALE_AFTER секунд (упал процесс).
+    Такое задание продолжается с контрольной точки.
+    """
+    now = timezone.now()
+    stale_before = now - timedelta(seconds=settings.BOT_BROADCAST_STALE_AFTER)
+    jobs = BroadcastJob.objects.filter(
+        Q(status='pending') | Q(status='running', heartbeat_at__lt=stale_before)
+    ).order_by('created_at')
+    if job_id is not None:
+        jobs = jobs.filter(pk=job_id)
+
+    for job in jobs[:5]:
+        updated = BroadcastJob.objects.filter(
+            pk=job.pk, status=job.status, heartbeat_at=job.heartbeat_at
+        ).update(status='running', heartbeat_at=now, started_at=job.started_at or now)
+        if updated:
+            if job.status == 'running':
+                logger.warning("Рассылка #%s возобновлена с контрольной точки (pk > %s)", job.pk, job.last_user_pk)
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def fetch_chunk(job, size):
+    return list(
+        audience_queryset(job)
+        .filter(pk__gt=job.last_user_pk)
+        .values_list('pk', 'telegram_id')[:size]
+    )
+
+
+def save_checkpoint(job, last_user_pk, sent, failed, blocked_ids, error=''):
+    """
+    Сохранить прогресс пачки и пометить заблокировавших бота пользователей.
+
+    Прогресс записывается, только пока задание захвачено этим исполнителем (status
+    running и heartbeat_at, записанный им последним). Если захват потерян (задание
+    отменено или перехвачено другим исполнителем), возвращается False.
+    """
+    now = timezone.now()
+    fields = {
+        'last_user_pk': last_user_pk,
+        'sent_count': F('sent_count') + sent,
+        'failed_count': F('failed_count') + failed,
+        'blocked_count': F('blocked_count') + len(blocked_ids),
+        'heartbeat_at': now,
+    }
+    if error:
+        fields['last_error'] = error[:2000]
+    with transaction.atomic():
+        if not claimed(job).update(**fields):
+            return False
+        if blocked_ids:
+            # updated_at — по нему процесс бота уберет этих пользователей из своего кеша профилей
+            TelegramUser.objects.filter(telegram_id__in=blocked_ids).update(is_blocked=True, updated_at=now)
+    for telegram_id in blocked_ids:
+        profile_cache.discard(telegram_id)
+    job.refresh_from_db()
+    return True
+
+
+def beat(job):
+    """Обновить heartbeat посреди пачки; False, если захват задания потерян"""
+    now = timezone.now()
+    if not claimed(job).update(heartbeat_at=now):
+        return False
+    job.heartbeat_at = now
+    return True
+
+
+def claimed(job):
+    """Задание, пока оно захвачено этим исполнителем"""
+    return BroadcastJob.objects.filter(pk=job.pk, status='running', heartbeat_at=job.heartbeat_at)
+
+
+def finish_job(job, status='completed'):
+    BroadcastJob.objects.filter(pk=job.pk, status='running').update(status=status, finished_at=timezone.now())
+    job.refresh_from_db()
+
+
+def is_blocked_error(result):
+    error = result.error.lower()
+    return result.error_type == 'Forbidden' or 'chat not found' in error or 'user is deactivated' in error
+
+
+async def send_chunk(job, sends):
+    """
+    Отправить пачку, обновляя heartbeat каждую треть BOT_BROADCAST_STALE_AFTER.
+
+    Паузы RetryAfter могут растянуть пачку дольше BOT_BROADCAST_STALE_AFTER; без
+    heartbeat посреди пачки claim_job отдал бы задание второму исполнителю. Если
+    захват потерян (задание отменено или перехвачено), недоотправленные сообщения
+    отменяются и возвращается None.
+    """
+    sending = asyncio.ensure_future(asyncio.gather(*sends))
+    interval = settings.BOT_BROADCAST_STALE_AFTER / 3
+    while True:
+        done, _ = await asyncio.wait({sending}, timeout=interval)
+        if done:
+            return sending.result()
+        if not await sync_to_async(beat)(job):
+            sending.cancel()
+            await asyncio.gather(sending, return_exceptions=True)
+            return None
+
+
+async def run_job(job, on_progress=None):
+    """
+    Отправить рассылку пачками с контрольной точкой после каждой пачки.
+
+    Параллельность ограничена BOT_BROADCAST_CONCURRENCY, общая скорость —
+    token bucket на BOT_BROADCAST_RATE сообщений в секунду. RetryAfter
+    обрабатывается в deliver(). Пользователи, заблокировавшие бота, помечаются
+    is_blocked и исключаются из следующих рассылок. Потеряв захват задания
+    (отмена или перехват другим исполнителем), исполнитель останавливается.
+    """
+    from bot.bot import get_main_keyboard
+
+    bot = await get_main_bot()
+    limiters = (TokenBucket(settings.BOT_BROADCAST_RATE), PerChatLimiter())
+    semaphore = asyncio.Semaphore(settings.BOT_BROADCAST_CONCURRENCY)
+    reply_markup = get_main_keyboard()
+
+    async def _send(telegram_id):
+        async with semaphore:
+            return await deliver(bot, telegram_id, job.text, limiters=limiters, reply_markup=reply_markup)
+
+    logger.info("Рассылка #%s: старт, получателей %s", job.pk, job.total_count)
+    while True:
+        status = await sync_to_async(lambda: BroadcastJob.objects.values_list('status', flat=True).get(pk=job.pk))()
+        if status != 'running':
+            logger.info("Рассылка #%s остановлена (статус %s)", job.pk, status)
+            return job
+
+        chunk = await sync_to_async(fetch_chunk)(job, settings.BOT_BROADCAST_CHUNK_SIZE)
+        if not chunk:
+            break
+
+        results = await send_chunk(job, [_send(telegram_id) for _, telegram_id in chunk])
+        if results is None:
+            logger.warning("Рассылка #%s: захват потерян посреди пачки, отправка остановлена", job.pk)
+            return job
+        blocked_ids = [result.chat_id for result in results if not result.ok and is_blocked_error(result)]
+        sent = sum(1 for result in results if result.ok)
+        failed = len(results) - sent - len(blocked_ids)
+        errors = [f"{result.chat_id}: {result.error}" for result in results if not result.ok and not is_blocked_error(result)]
+        if not await sync_to_async(save_checkpoint)(job, chunk[-1][0], sent, failed, blocked_ids, '; '.join(errors[:5])):
+            logger.warning("Рассылка #%s: захват потерян, контрольная точка не сохранена", job.pk)
+            return job
+        if on_progress:
+            on_progress(job)
+
+    await sync_to_async(finish_job)(job)
+    logger.info(
+        "Рассылка #%s завершена: отправлено %s, ошибок %s, заблокировали бота %s",
+        job.pk, job.sent_count, job.failed_count, job.blocked_count,
+    )
+    return job
+
+
+class BroadcastRunner:
+    """Фоновый цикл: берет задания на рассылку из очереди и выполняет их по одному"""
+
+    def __init__(self, poll_interval=None):
+        self.poll_interval = poll_interval or settings.BOT_BROADCAST_POLL_INTERVAL
+        self._stopped = False
+
+    def stop(self):
+        self._stopped = True
+
+    async def run(self):
+        self._stopped = False
+        logger.info("Исполнитель рассылок запущен")
+        while not self._stopped:
+            job = None
+            try:
+                job = await sync_to_async(claim_job)()
+                if job is not None:
+                    await run_job(job)
+            except Exception as e:
+                logger.error("Ошибка исполнителя рассылок: %s", e, exc_info=True)
+                if job is not None:
+                    await sync_to_async(
+                        BroadcastJob.objects.filter(pk=job.pk).update
+                    )(status='failed', last_error=str(e)[:2000], finished_at=timezone.now())
+            if job is None:
+                await asyncio.sleep(self.poll_interval)
+        logger.info("Исполнитель рассылок остановлен")
+
+
+broadcast_runner = BroadcastRunner()
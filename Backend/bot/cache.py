@@ -0,0 +1,270 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+
+from bot.models import Branch, BotMessage, ExchangeRate, AdminChat, SnapshotRevision
+from bot.tenants import current_branch
+
+logger = logging.getLogger(__name__)
+
+NOT_CONFIGURED = "Сообщение не настроено"
+
+SNAPSHOT_MODELS = (BotMessage, ExchangeRate, AdminChat, Branch)
+
+
+class Snapshot:
+    """
+    Неизменяемый снимок справочных таблиц (сообщения, курсы, chat_id администраторов).
+
+    Снимок основного бота хранит в branches готовые снимки филиалов той же версии:
+    общие сообщения с переопределениями филиала, курсы филиала (или общие, если
+    своих нет) и общие chat_id вместе с chat_id филиала.
+
+    Ответ /api/exchange-rates/ кодируется один раз при сборке снимка (rates_payload),
+    там же строится таблица курсов по паре валют для котировок (rate_table).
+    rates_version (и rates_etag) и messages_version зависят только от содержимого своего раздела:
+    они одинаковы во всех процессах и не меняются при правке других таблиц.
+    """
+
+    __slots__ = (
+        'version', 'fingerprint', 'messages', 'rates', 'admin_chat_ids', 'built_at',
+        'branch_id', 'notification_bot_token', 'branches', 'rates_payload', 'rates_version',
+        'rates_etag', 'messages_version', 'rate_table',
+    )
+
+    def __init__(self, version, fingerprint, messages, rates, admin_chat_ids,
+                 branch_id=None, notification_bot_token='', branches=None):
+        self.version = version
+        self.fingerprint = fingerprint
+        self.messages = messages
+        self.rates = rates
+        self.admin_chat_ids = admin_chat_ids
+        self.built_at = time.monotonic()
+        self.branch_id = branch_id
+        self.notification_bot_token = notification_bot_token
+        self.branches = branches or {}
+        self.rates_payload = encode_rates(rates)
+        self.rates_version = content_version('rates', self.rates_payload)
+        self.rates_etag = f'"{self.rates_version}"'
+        self.messages_version = content_version('messages', json.dumps(messages, sort_keys=True).encode())
+        self.rate_table = {(rate.currency_from, rate.currency_to): rate.rate for rate in rates}
+
+    def for_branch(self, branch_id):
+        """Снимок филиала; основной снимок для None и неизвестных филиалов"""
+        if branch_id is None:
+            return self
+        return self.branches.get(branch_id, self)
+
+
+def content_version(section, payload):
+    """Версия раздела по его содержимому, например rates-1b581e41..."""
+    return f"{section}-{hashlib.sha1(payload).hexdigest()[:20]}"
+
+
+def encode_rates(rates):
+    """Тело ответа /api/exchange-rates/ (тот же JSON, что отдавал JsonResponse)"""
+    return json.dumps({
+        'success': True,
+        'rates': [
+            {'currency_from': rate.currency_from, 'currency_to': rate.currency_to, 'rate': str(rate.rate)}
+            for rate in rates
+        ],
+    }, cls=DjangoJSONEncoder).encode()
+
+
+def _table_fingerprint():
+    """
+    Отпечаток справочных таблиц — счетчик SnapshotRevision, один запрос по первичному ключу.
+
+    Счетчик увеличивают триггеры БД (миграция 0017), поэтому изменение видно и без
+    post_save: QuerySet.update(), массовые действия админки, правка из shell.
+    """
+    return SnapshotRevision.objects.filter(pk=1).values_list('revision', flat=True).first()
+
+
+class SnapshotCache:
+    """
+    Read-through кеш справочных таблиц.
+
+    Снимок пересобирается целиком и подменяется одной операцией присваивания,
+    поэтому читатели никогда не видят частично обновленных данных. В процессе,
+    где произошло изменение, снимок пересобирается по сигналам post_save/post_delete;
+    остальные процессы (бот, воркеры gunicorn) сверяют счетчик изменений
+    (SnapshotRevision) не чаще одного раза в BOT_SNAPSHOT_TTL секунд.
+    """
+
+    def __init__(self, ttl=None):
+        self._ttl = ttl
+        self._snapshot = None
+        self._checked_at = 0.0
+        self._version = 0
+        self._lock = threading.Lock()
+        self._listeners = []
+        self.hits = 0
+        self.misses = 0
+        self.rebuilds = 0
+
+    @property
+    def ttl(self):
+        if self._ttl is not None:
+            return self._ttl
+        return getattr(settings, 'BOT_SNAPSHOT_TTL', 5)
+
+    @property
+    def version(self):
+        return self._version
+
+    def _build(self, fingerprint=None):
+        if fingerprint is None:
+            fingerprint = _table_fingerprint()
+        messages, rates, admin_chat_ids = {}, {}, {}
+        for branch_id, message_type, text in BotMessage.objects.values_list('branch_id', 'message_type', 'text'):
+            messages.setdefault(branch_id, {})[message_type] = text
+        for rate in ExchangeRate.objects.filter(is_active=True):
+            rates.setdefault(rate.branch_id, []).append(rate)
+        for branch_id, chat_id in AdminChat.objects.filter(is_active=True).values_list('branch_id', 'chat_id'):
+            admin_chat_ids.setdefault(branch_id, []).append(chat_id)
+
+        self._version += 1
+        self.rebuilds += 1
+        default_messages = messages.get(None, {})
+        default_rates = tuple(rates.get(None, ()))
+        default_chats = tuple(admin_chat_ids.get(None, ()))
+        branches = {
+            branch_id: Snapshot(
+                self._version, fingerprint,
+                {**default_messages, **messages.get(branch_id, {})},
+                tuple(rates[branch_id]) if branch_id in rates else default_rates,
+                default_chats + tuple(admin_chat_ids.get(branch_id, ())),
+                branch_id=branch_id,
+                notification_bot_token=notification_bot_token,
+            )
+            for branch_id, notification_bot_token in Branch.objects.filter(is_active=True).values_list(
+                'pk', 'notification_bot_token'
+            )
+        }
+        logger.debug("Снимок справочников пересобран, версия %s, филиалов %s", self._version, len(branches))
+        return Snapshot(self._version, fingerprint, default_messages, default_rates, default_chats, branches=branches)
+
+    def get(self):
+        """Получить актуальный снимок текущего филиала, при необходимости пересобрав его"""
+        return self._get().for_branch(current_branch.get())
+
+    def _get(self):
+        snapshot = self._snapshot
+        now = time.monotonic()
+        if snapshot is not None and now - self._checked_at < self.ttl:
+            self.hits += 1
+            return snapshot
+
+        with self._lock:
+            snapshot = self._snapshot
+            if snapshot is not None and now - self._checked_at < self.ttl:
+                self.hits += 1
+                return snapshot
+            return self._check(snapshot)
+
+    def _check(self, snapshot):
+        fingerprint = _table_fingerprint()
+        if snapshot is not None and snapshot.fingerprint == fingerprint:
+            self.hits += 1
+        else:
+            self.misses += 1
+            snapshot = self._build(fingerprint)
+            self._replace(snapshot)
+        self._checked_at = time.monotonic()
+        return snapshot
+
+    def _replace(self, snapshot):
+        self._snapshot = snapshot
+        for listener in self._listeners:
+            try:
+                listener(snapshot)
+            except Exception as e:
+                logger.error("Ошибка подписчика кеша справочников: %s", e, exc_info=True)
+
+    async def aget(self):
+        """Асинхронный get(): свежий снимок отдается без перехода в поток, сверка с БД — через sync_to_async"""
+        snapshot = self._snapshot
+        if snapshot is not None and time.monotonic() - self._checked_at < self.ttl:
+            self.hits += 1
+            return snapshot.for_branch(current_branch.get())
+        return await sync_to_async(self.get)()
+
+    def check(self):
+        """Сверить снимок с БД сейчас, не дожидаясь BOT_SNAPSHOT_TTL (основной снимок)"""
+        with self._lock:
+            return self._check(self._snapshot)
+
+    def add_listener(self, callback):
+        """
+        Вызывать callback(snapshot) после каждой пересборки снимка.
+
+        Вызов происходит в потоке, который пересобрал снимок, под блокировкой кеша:
+        подписчик должен только передать снимок дальше (например, в event loop).
+        """
+        self._listeners.append(callback)
+
+    def remove_listener(self, callback):
+        if callback in self._listeners:
+            self._listeners.remove(callback)
+
+    def warm(self):
+        """Прогреть кеш (вызывается при старте процесса)"""
+        self.refresh()
+        return self._snapshot
+
+    def refresh(self):
+        """Пересобрать снимок; читатели получают старый снимок до момента подмены"""
+        with self._lock:
+            self._replace(self._build())
+            self._checked_at = time.monotonic()
+
+    def invalidate(self):
+        """Сбросить снимок; следующее обращение пересоберет его"""
+        with self._lock:
+            self._snapshot = None
+            self._checked_at = 0.0
+
+    def stats(self):
+        """Счетчики попаданий/промахов кеша"""
+        return {
+            'version': self._version,
+            'hits': self.hits,
+            'misses': self.misses,
+            'rebuilds': self.rebuilds,
+        }
+
+    # Удобные методы доступа
+
+    def get_message(self, message_type):
+        return self.get().messages.get(message_type, NOT_CONFIGURED)
+
+    def get_rates(self):
+        return self.get().rates
+
+    def get_admin_chat_ids(self):
+        return list(self.get().admin_chat_ids)
+
+
+snapshot_cache = SnapshotCache()
+
+
+def _refresh_snapshot(sender, **kwargs):
+    # Пересобираем после коммита, чтобы не закешировать откаченные изменения
+    transaction.on_commit(snapshot_cache.refresh)
+
+
+def connect_signals():
+    """Подключить пересборку снимка к изменениям справочных моделей"""
+    for model in SNAPSHOT_MODELS:
+        post_save.connect(_refresh_snapshot, sender=model, dispatch_uid=f'snapshot_cache_{model.__name__}_save')
+        post_delete.connect(_refresh_snapshot, sender=model, dispatch_uid=f'snapshot_cache_{model.__name__}_delete')
@@ -0,0 +1,136 @@
+import asyncio
+import logging
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+from telegram import Update
+
+from bot.menu import STATIC_SECTIONS, COURSES_BUTTON
+from bot.state import conversation_state
+
+logger = logging.getLogger(__name__)
+
+# Максимум обновлений за один getUpdates (ограничение Bot API)
+GET_UPDATES_LIMIT = 100
+
+MENU_BUTTONS = frozenset((*STATIC_SECTIONS, COURSES_BUTTON))
+
+
+def is_priority(update):
+    """Контакт и /start — обновления, ради которых пользователь ждет ответа"""
+    message = update.effective_message
+    if message is None:
+        return False
+    if message.contact is not None:
+        return True
+    words = (message.text or '').split()
+    return bool(words) and words[0].split('@')[0] == '/start'
+
+
+def is_menu_press(update):
+    message = update.effective_message
+    return message is not None and message.contact is None and message.text in MENU_BUTTONS
+
+
+def plan_backlog(updates, stale_after=None, now=None):
+    """
+    Упорядочить пачку накопившихся обновлений для обработки после перезапуска.
+
+    Навигация по меню схлопывается: в каждом чате остается только последнее
+    нажатие кнопки меню (предыдущие ответы пользователь все равно не увидит),
+    а нажатия старше stale_after секунд отбрасываются. Чаты, в бэклоге которых
+    есть контакт или /start, обрабатываются первыми. Внутри чата порядок
+    сохраняется, поэтому «выбор страны → контакт» не перемешивается.
+
+    Возвращает (обновления в порядке обработки, отброшено устаревших, объединено).
+    """
+    stale_after = settings.BOT_CATCHUP_STALE_AFTER if stale_after is None else stale_after
+    stale_before = (now or timezone.now()) - timedelta(seconds=stale_after)
+
+    chats = {}
+    for update in updates:
+        chat = update.effective_chat
+        key = chat.id if chat else update.update_id
+        chats.setdefault(key, []).append(update)
+
+    dropped = merged = 0
+    priority, regular = [], []
+    for chat_updates in chats.values():
+        last_menu = None
+        for update in chat_updates:
+            if is_menu_press(update):
+                last_menu = update
+        kept = []
+        for update in chat_updates:
+            if is_menu_press(update):
+                if update is not last_menu:
+                    merged += 1
+                    continue
+                if update.effective_message.date < stale_before:
+                    dropped += 1
+                    continue
+            kept.append(update)
+        target = priority if any(is_priority(update) for update in kept) else regular
+        target.append(kept)
+
+    ordered = [update for group in (priority, regular) for chat_updates in group for update in chat_updates]
+    return ordered, dropped, merged
+
+
+async def process_batch(application, updates):
+    """
+    Обработать пачку так же, как обновления из update_queue: через update_processor
+    (параллельно по чатам, по порядку внутри чата) — и дождаться завершения.
+    """
+    processor = application.update_processor
+    tasks = [
+        asyncio.create_task(processor.process_update(update, application.process_update(update)))
+        for update in updates
+    ]
+    # Ошибки обработчиков уже переданы error_handler внутри process_update
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def catch_up(application, max_updates=None):
+    """
+    Режим догона: вызывается из post_init до запуска polling.
+
+    Бэклог забирается пачками по 100 без подтверждения: каждая пачка
+    упорядочивается plan_backlog(), обрабатывается целиком, состояние диалогов
+    записывается в БД, и только следующий getUpdates с offset подтверждает ее в
+    Telegram. Если процесс упадет посреди догона, необработанные обновления
+    останутся в Telegram и придут после следующего запуска.
+    """
+    max_updates = max_updates or settings.BOT_CATCHUP_MAX_UPDATES
+    bot = application.bot
+    started = time.monotonic()
+    summary = {'received': 0, 'queued': 0, 'dropped_stale': 0, 'merged_menu': 0, 'priority': 0, 'batches': 0}
+    offset = 0
+    while summary['received'] < max_updates:
+        # offset подтверждает предыдущую, уже обработанную пачку
+        batch = await bot.get_updates(
+            offset=offset, limit=GET_UPDATES_LIMIT, timeout=0, allowed_updates=Update.ALL_TYPES
+        )
+        if not batch:
+            break
+        ordered, dropped, merged = plan_backlog(batch)
+        await process_batch(application, ordered)
+        await asyncio.to_thread(conversation_state.flush)
+        offset = batch[-1].update_id + 1
+        summary['received'] += len(batch)
+        summary['queued'] += len(ordered)
+        summary['dropped_stale'] += dropped
+        summary['merged_menu'] += merged
+        summary['priority'] += sum(1 for update in ordered if is_priority(update))
+        summary['batches'] += 1
+
+    if not summary['received']:
+        logger.info("Догон после перезапуска: накопившихся обновлений нет")
+        return None
+    # Подтверждаем последнюю пачку: Updater начнет с первого нового обновления
+    await bot.get_updates(offset=offset, limit=1, timeout=0)
+    summary['seconds'] = round(time.monotonic() - started, 2)
+    logger.info("Догон после перезапуска завершен: %s", summary)
+    return summary
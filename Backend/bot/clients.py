@@ -0,0 +1,119 @@
+import asyncio
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from telegram import Bot
+from telegram.request import HTTPXRequest
+
+from bot.metrics import measured_request
+
+logger = logging.getLogger(__name__)
+
+
+def api_base_urls():
+    """base_url/base_file_url для Bot и ApplicationBuilder, если задан TELEGRAM_API_BASE_URL"""
+    base = getattr(settings, 'TELEGRAM_API_BASE_URL', '').rstrip('/')
+    if not base:
+        return {}
+    return {'base_url': f"{base}/bot", 'base_file_url': f"{base}/file/bot"}
+
+
+class BotClientRegistry:
+    """
+    Процессный реестр долгоживущих клиентов Bot API.
+
+    Клиент создается лениво один раз на пару (токен, event loop): initialize()
+    (запрос getMe) выполняется один раз, а HTTP-соединения с api.telegram.org
+    переиспользуются между отправками. Синхронный код (views, админка,
+    management-команды) выполняет корутины в фоновом event loop процесса через
+    run_sync(), поэтому тоже работает с уже открытыми соединениями.
+    """
+
+    def __init__(self):
+        self._clients = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+        self._loop = None
+        self._thread = None
+
+    async def get(self, token):
+        """Получить инициализированный клиент для токена в текущем event loop"""
+        loop = asyncio.get_running_loop()
+        key = (token, loop)
+        bot = self._clients.get(key)
+        if bot is not None:
+            return bot
+
+        with self._lock:
+            lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            bot = self._clients.get(key)
+            if bot is None:
+                bot = Bot(token=token, request=measured_request(HTTPXRequest(
+                    connection_pool_size=getattr(settings, 'BOT_CLIENT_POOL_SIZE', 32),
+                )), **api_base_urls())
+                await bot.initialize()
+                self._clients[key] = bot
+                logger.info("Клиент Bot API инициализирован (@%s)", bot.username)
+        return bot
+
+    async def shutdown_loop(self):
+        """Закрыть клиенты, привязанные к текущему event loop"""
+        loop = asyncio.get_running_loop()
+        for key in [key for key in self._clients if key[1] is loop]:
+            bot = self._clients.pop(key)
+            self._locks.pop(key, None)
+            try:
+                await bot.shutdown()
+            except Exception as e:
+                logger.error("Ошибка при закрытии клиента Bot API: %s", e)
+
+    def _ensure_loop(self):
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(
+                    target=self._loop.run_forever, name='bot-clients-loop', daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+            return self._loop
+
+    def run_sync(self, coroutine, timeout=None):
+        """Выполнить корутину в фоновом event loop процесса и дождаться результата"""
+        loop = self._ensure_loop()
+        future = asyncio.run_coroutine_threadsafe(coroutine, loop)
+        return future.result(timeout)
+
+    def close(self):
+        """Закрыть все клиенты фонового event loop и остановить его"""
+        with self._lock:
+            loop, self._loop = self._loop, None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.shutdown_loop(), loop).result(10)
+        except Exception as e:
+            logger.error("Ошибка при остановке клиентов Bot API: %s", e)
+        loop.call_soon_threadsafe(loop.stop)
+        self._thread.join(5)
+
+
+bot_clients = BotClientRegistry()
+
+
+async def get_notification_bot(token=None):
+    """Клиент бота уведомлений администраторов (token — собственный бот уведомлений филиала)"""
+    return await bot_clients.get(token or settings.TELEGRAM_NOTIFICATION_BOT_TOKEN)
+
+
+async def get_main_bot():
+    """Клиент основного бота (рассылки пользователям)"""
+    return await bot_clients.get(settings.TELEGRAM_BOT_TOKEN)
+
+
+async def shutdown_bot_clients(application=None):
+    """Хук post_shutdown для Application: закрыть клиенты его event loop"""
+    await bot_clients.shutdown_loop()
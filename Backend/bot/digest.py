@@ -0,0 +1,137 @@
+import logging
+import time
+from collections import Counter, deque
+from decimal import Decimal
+
+from django.conf import settings
+
+from bot.models import ExchangeOrder, Cityex24Transfer
+
+logger = logging.getLogger(__name__)
+
+# Telegram ограничивает сообщение 4096 символами; список номеров заявок укорачиваем
+MAX_LISTED_IDS = 50
+
+
+class NotificationCoalescer:
+    """
+    Решает, отправлять уведомления администраторам по одному или сводкой.
+
+    Пока за последние BOT_NOTIFICATION_DIGEST_WINDOW секунд в чаты администраторов
+    ушло не больше BOT_NOTIFICATION_DIGEST_MAX_MESSAGES сообщений, каждая заявка
+    уведомляется отдельно, как раньше. При всплеске диспетчер ждет освобождения окна,
+    а накопившиеся за это время заявки уходят одним сообщением-сводкой. Уведомление
+    получают все чаты администраторов, поэтому общий счетчик сообщений — это и
+    нагрузка на каждый чат. Счетчик свой у каждого процесса-диспетчера.
+    """
+
+    def __init__(self, window=None, max_messages=None):
+        self._window = window
+        self._max_messages = max_messages
+        self._sent = deque()
+        self.single_messages = 0
+        self.digests = 0
+        self.digested_entries = 0
+
+    @property
+    def window(self):
+        return self._window if self._window is not None else settings.BOT_NOTIFICATION_DIGEST_WINDOW
+
+    @property
+    def max_messages(self):
+        return self._max_messages or settings.BOT_NOTIFICATION_DIGEST_MAX_MESSAGES
+
+    @property
+    def enabled(self):
+        return self.window > 0
+
+    def _recent(self, now):
+        while self._sent and now - self._sent[0] >= self.window:
+            self._sent.popleft()
+        return len(self._sent)
+
+    def should_coalesce(self, count):
+        """True, если count уведомлений по отдельности превысят лимит сообщений в окне"""
+        # Сводка из одной заявки ничем не лучше обычного уведомления
+        if not self.enabled or count < 2:
+            return False
+        return self._recent(time.monotonic()) + count > self.max_messages
+
+    def hold_for(self):
+        """Сколько секунд подождать, копя заявки, прежде чем отправлять следующее сообщение"""
+        if not self.enabled:
+            return 0.0
+        now = time.monotonic()
+        if self._recent(now) < self.max_messages:
+            return 0.0
+        return max(self._sent[0] + self.window - now, 0.0)
+
+    def record(self, messages, digested=0):
+        now = time.monotonic()
+        self._sent.extend([now] * messages)
+        if digested:
+            self.digests += messages
+            self.digested_entries += digested
+        else:
+            self.single_messages += messages
+
+    def stats(self):
+        return {
+            'recent_messages': self._recent(time.monotonic()),
+            'single_messages': self.single_messages,
+            'digests': self.digests,
+            'digested_entries': self.digested_entries,
+        }
+
+
+def _format_amount(value):
+    return f"{value:.2f}".replace('.', ',')
+
+
+def _format_ids(ids):
+    ids = sorted(ids)
+    listed = ', '.join(f"#{pk}" for pk in ids[:MAX_LISTED_IDS])
+    if len(ids) > MAX_LISTED_IDS:
+        listed += f" и еще {len(ids) - MAX_LISTED_IDS}"
+    return listed
+
+
+def build_digest(sources):
+    """Текст сводки по заявкам на обмен и заявкам Cityex24"""
+    orders = [source for source in sources if isinstance(source, ExchangeOrder)]
+    transfers = [source for source in sources if isinstance(source, Cityex24Transfer)]
+    created = [source.created_at for source in sources]
+
+    message = f"🔔 Сводка новых заявок: {len(sources)}\n"
+    if created:
+        message += f"🕒 {min(created).strftime('%d.%m.%Y %H:%M')} — {max(created).strftime('%H:%M')}\n"
+
+    if orders:
+        message += f"\n💱 Заявки на обмен: {len(orders)}\n"
+        for order_type, label, currency_from, currency_to in (
+            ('buy', 'Покупка', 'RUB', 'USDT'),
+            ('sell', 'Продажа', 'USDT', 'RUB'),
+        ):
+            typed = [order for order in orders if order.order_type == order_type]
+            if not typed:
+                continue
+            amount = sum((order.amount for order in typed), Decimal(0))
+            to_receive = sum((order.amount_to_receive for order in typed), Decimal(0))
+            message += (
+                f"📋 {label}: {len(typed)} — {_format_amount(amount)} {currency_from} → "
+                f"{_format_amount(to_receive)} {currency_to}\n"
+            )
+        message += f"🆔 {_format_ids(order.id for order in orders)}\n"
+
+    if transfers:
+        message += f"\n🌍 Заявки Cityex24: {len(transfers)}\n"
+        countries = Counter(transfer.get_country_display_with_flag() for transfer in transfers)
+        for country, count in countries.most_common():
+            message += f"{country}: {count}\n"
+        message += f"🆔 {_format_ids(transfer.id for transfer in transfers)}\n"
+
+    message += "\nПодробности — в админ-панели."
+    return message
+
+
+notification_coalescer = NotificationCoalescer()
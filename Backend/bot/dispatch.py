@@ -0,0 +1,99 @@
+import asyncio
+import contextlib
+import logging
+
+from telegram import Update
+from telegram.ext import BaseUpdateProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class ChatOrderedUpdateProcessor(BaseUpdateProcessor):
+    """
+    Обработка обновлений разных чатов параллельно, а одного чата — строго по очереди.
+
+    Application создает задачу на каждое обновление в порядке поступления; задача
+    сначала встает в очередь своего чата (asyncio.Lock выдается в порядке FIFO) и
+    только потом занимает один из max_concurrent_updates слотов выполнения. Поэтому
+    цепочка «выбор страны → контакт» одного пользователя не может перемешаться,
+    а медленный обработчик одного чата не занимает слоты других.
+
+    max_pending ограничивает общее число принятых, но еще не завершенных
+    обновлений, чтобы всплеск не держал в памяти неограниченное число задач.
+    """
+
+    __slots__ = ('_ceiling', '_running', '_chats', '_pending', '_in_flight', '_processed')
+
+    def __init__(self, max_concurrent_updates, max_pending=None):
+        super().__init__(max_pending or max_concurrent_updates * 4)
+        self._ceiling = max_concurrent_updates
+        self._running = asyncio.BoundedSemaphore(max_concurrent_updates)
+        # chat_id -> [Lock, число задач этого чата в работе/ожидании]
+        self._chats = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._processed = 0
+
+    @staticmethod
+    def chat_key(update):
+        if isinstance(update, Update):
+            if update.effective_chat:
+                return update.effective_chat.id
+            if update.effective_user:
+                return update.effective_user.id
+        return None
+
+    @contextlib.asynccontextmanager
+    async def _chat_turn(self, key):
+        """Дождаться очереди своего чата (обновления без чата не упорядочиваются)"""
+        if key is None:
+            yield
+            return
+        entry = self._chats.get(key)
+        if entry is None:
+            entry = self._chats[key] = [asyncio.Lock(), 0]
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._chats.pop(key, None)
+
+    async def do_process_update(self, update, coroutine):
+        self._pending += 1
+        started = False
+        try:
+            async with self._chat_turn(self.chat_key(update)):
+                async with self._running:
+                    self._pending -= 1
+                    started = True
+                    self._in_flight += 1
+                    try:
+                        await coroutine
+                    finally:
+                        self._in_flight -= 1
+        finally:
+            if not started:
+                self._pending -= 1
+            self._processed += 1
+
+    async def initialize(self):
+        pass
+
+    async def shutdown(self):
+        pass
+
+    def stats(self, update_queue=None):
+        """Глубина очередей и число обновлений в работе"""
+        data = {
+            'max_concurrent_updates': self._ceiling,
+            'in_flight': self._in_flight,
+            'pending': self._pending,
+            'active_chats': len(self._chats),
+            'processed': self._processed,
+        }
+        if update_queue is not None:
+            data['update_queue'] = update_queue.qsize()
+        return data
@@ -0,0 +1,259 @@
+import asyncio
+import json
+import logging
+import math
+import random
+import time
+import zlib
+from collections import Counter, deque
+from urllib.parse import parse_qsl, urlsplit
+
+logger = logging.getLogger(__name__)
+
+MAX_BODY_SIZE = 10 * 1024 * 1024
+REASONS = {200: 'OK', 400: 'Bad Request', 403: 'Forbidden', 404: 'Not Found', 429: 'Too Many Requests'}
+
+
+class FakeBotAPI:
+    """
+    Локальный HTTP-сервер с ответами в формате Bot API (getMe, sendMessage, getUpdates и др.).
+
+    Нужен для нагрузочных тестов доставки без обращения к Telegram:
+      latency / jitter        — задержка ответа, сек.;
+      global_rate             — сообщений в секунду на токен, сверх — 429 с retry_after;
+      per_chat_interval       — минимальный интервал между сообщениями в один чат, сек. (0 — без лимита);
+      retry_after             — значение retry_after в ответах 429 (не меньше реального остатка);
+      inject_429              — доля sendMessage, на которые случайно отвечается 429;
+      blocked_chat_ids        — чаты, заблокировавшие бота (403 Forbidden);
+      blocked_ratio           — доля чатов, заблокировавших бота (выбор детерминирован по chat_id).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, latency=0.0, jitter=0.0, global_rate=30.0,
+                 per_chat_interval=1.0, retry_after=1, inject_429=0.0, blocked_chat_ids=(),
+                 blocked_ratio=0.0, seed=0):
+        self.host = host
+        self.port = port
+        self.latency = latency
+        self.jitter = jitter
+        self.global_rate = global_rate
+        self.per_chat_interval = per_chat_interval
+        self.retry_after = retry_after
+        self.inject_429 = inject_429
+        self.blocked_chat_ids = {int(chat_id) for chat_id in blocked_chat_ids}
+        self.blocked_ratio = blocked_ratio
+        self._rng = random.Random(seed)
+        self._server = None
+        # Задачи открытых соединений: длинный getUpdates может ждать, когда клиента уже нет
+        self._connections = set()
+        # token -> время последних отправок (окно в 1 секунду)
+        self._sent = {}
+        # (token, chat_id) -> время последней отправки
+        self._last_by_chat = {}
+        self._updates = []
+        self._update_id = 0
+        self._new_updates = None
+        self._message_id = 0
+        self.stats = Counter()
+        self.delivered = Counter()
+
+    @property
+    def url(self):
+        return f"http://{self.host}:{self.port}"
+
+    async def start(self):
+        self._new_updates = asyncio.Condition()
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info("Локальный Bot API слушает %s", self.url)
+        return self
+
+    async def stop(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+        for task in list(self._connections):
+            task.cancel()
+        await asyncio.gather(*self._connections, return_exceptions=True)
+
+    def reset_stats(self):
+        self.stats.clear()
+        self.delivered.clear()
+
+    def snapshot(self):
+        """Счетчики для отчета и GET /stats"""
+        return {
+            **dict(self.stats),
+            'chats_delivered': len(self.delivered),
+            'max_per_chat': max(self.delivered.values(), default=0),
+        }
+
+    async def push_update(self, update):
+        """Добавить обновление, которое получит getUpdates (update_id назначается автоматически)"""
+        async with self._new_updates:
+            self._update_id += 1
+            self._updates.append({**update, 'update_id': self._update_id})
+            self._new_updates.notify_all()
+
+    # HTTP
+
+    async def _handle(self, reader, writer):
+        task = asyncio.current_task()
+        self._connections.add(task)
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length') or 0)
+                if length > MAX_BODY_SIZE:
+                    break
+                body = await reader.readexactly(length) if length else b''
+
+                status, payload = await self.dispatch(method, target, headers, body)
+                data = json.dumps(payload, ensure_ascii=False).encode()
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                writer.write(
+                    f"HTTP/1.1 {status} {REASONS.get(status, 'Error')}\r\n"
+                    f"Content-Type: application/json\r\nContent-Length: {len(data)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode() + data
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        except asyncio.CancelledError:
+            # Соединение закрыто в stop(): задача завершается штатно, иначе asyncio пишет ошибку
+            pass
+        finally:
+            self._connections.discard(task)
+            writer.close()
+
+    async def dispatch(self, http_method, target, headers, body):
+        path = urlsplit(target).path
+        if path == '/stats':
+            return 200, self.snapshot()
+
+        parts = path.strip('/').split('/')
+        if len(parts) != 2 or not parts[0].startswith('bot'):
+            return 404, self.error(404, 'Not Found')
+        token, api_method = parts[0][3:], parts[1]
+        params = self.parse_params(headers.get('content-type', ''), body, target)
+        self.stats['requests'] += 1
+
+        if self.latency or self.jitter:
+            await asyncio.sleep(self.latency + self._rng.uniform(0, self.jitter))
+
+        handler = getattr(self, f"api_{api_method}", None)
+        if handler is None:
+            return 200, {'ok': True, 'result': True}
+        return await handler(token, params)
+
+    @staticmethod
+    def parse_params(content_type, body, target):
+        if 'application/json' in content_type:
+            params = json.loads(body or b'{}')
+        else:
+            # Форма или query string; сложные значения PTB передает строкой JSON
+            params = dict(parse_qsl(body.decode() if body else urlsplit(target).query))
+        return params
+
+    @staticmethod
+    def error(code, description, retry_after=None):
+        payload = {'ok': False, 'error_code': code, 'description': description}
+        if retry_after is not None:
+            payload['parameters'] = {'retry_after': retry_after}
+        return payload
+
+    # Лимиты и ошибки
+
+    def is_blocked(self, chat_id):
+        if chat_id in self.blocked_chat_ids:
+            return True
+        if not self.blocked_ratio:
+            return False
+        return zlib.crc32(str(chat_id).encode()) % 10_000 < self.blocked_ratio * 10_000
+
+    def throttle(self, token, chat_id):
+        """Секунды до разрешенной отправки (0 — можно отправлять)"""
+        now = time.monotonic()
+        wait = 0.0
+        if self.global_rate:
+            sent = self._sent.setdefault(token, deque())
+            while sent and now - sent[0] >= 1:
+                sent.popleft()
+            if len(sent) >= self.global_rate:
+                wait = 1 - (now - sent[0])
+        if self.per_chat_interval:
+            last = self._last_by_chat.get((token, chat_id))
+            if last is not None and now - last < self.per_chat_interval:
+                wait = max(wait, self.per_chat_interval - (now - last))
+        if not wait:
+            self._sent.setdefault(token, deque()).append(now)
+            self._last_by_chat[(token, chat_id)] = now
+        return wait
+
+    # Методы Bot API
+
+    async def api_getMe(self, token, params):
+        bot_id = int(token.split(':')[0]) if token.split(':')[0].isdigit() else 1
+        return 200, {'ok': True, 'result': {
+            'id': bot_id, 'is_bot': True, 'first_name': 'Fake', 'username': f'fake_{bot_id}_bot',
+            'can_join_groups': True, 'can_read_all_group_messages': False, 'supports_inline_queries': False,
+        }}
+
+    async def api_sendMessage(self, token, params):
+        self.stats['send_message'] += 1
+        try:
+            chat_id = int(params['chat_id'])
+        except (KeyError, ValueError):
+            self.stats['bad_request'] += 1
+            return 400, self.error(400, 'Bad Request: chat_id is empty')
+
+        if self.is_blocked(chat_id):
+            self.stats['blocked'] += 1
+            return 403, self.error(403, 'Forbidden: bot was blocked by the user')
+
+        wait = self.throttle(token, chat_id)
+        if not wait and self.inject_429 and self._rng.random() < self.inject_429:
+            wait = self.retry_after
+        if wait:
+            retry_after = max(self.retry_after, math.ceil(wait))
+            self.stats['rate_limited'] += 1
+            return 429, self.error(429, f'Too Many Requests: retry after {retry_after}', retry_after)
+
+        self._message_id += 1
+        self.stats['delivered'] += 1
+        self.delivered[chat_id] += 1
+        return 200, {'ok': True, 'result': {
+            'message_id': self._message_id,
+            'date': int(time.time()),
+            'chat': {'id': chat_id, 'type': 'private' if chat_id > 0 else 'group'},
+            'text': params.get('text', ''),
+        }}
+
+    async def api_getUpdates(self, token, params):
+        offset = int(params.get('offset') or 0)
+        timeout = min(float(params.get('timeout') or 0), 30)
+        async with self._new_updates:
+            # Подтвержденные (update_id < offset) обновления удаляются, как в Telegram
+            self._updates = [update for update in self._updates if update['update_id'] >= offset]
+            if not self._updates and timeout:
+                try:
+                    await asyncio.wait_for(self._new_updates.wait(), timeout)
+                except asyncio.TimeoutError:
+                    pass
+            limit = int(params.get('limit') or 100)
+            return 200, {'ok': True, 'result': self._updates[:limit]}
+
+    async def api_getWebhookInfo(self, token, params):
+        return 200, {'ok': True, 'result': {'url': '', 'has_custom_certificate': False, 'pending_update_count': len(self._updates)}}
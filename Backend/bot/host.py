@@ -0,0 +1,208 @@
+import asyncio
+import logging
+import os
+import signal
+import time
+
+from django.conf import settings
+from telegram import Update
+from telegram.request import BaseRequest, HTTPXRequest
+
+from bot.cache import snapshot_cache
+from bot.models import Branch
+
+logger = logging.getLogger(__name__)
+
+# Пул соединений вызовов Bot API, общий для всех ботов хоста (как у ApplicationBuilder по умолчанию)
+HOST_POOL_SIZE = 256
+
+
+def current_rss():
+    """Резидентная память процесса, байт (None, если /proc недоступен)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+class SharedRequest(BaseRequest):
+    """
+    Один HTTP-клиент на несколько Bot.
+
+    Каждый Bot вызывает initialize()/shutdown() своего запроса; клиент
+    создается первым ботом и закрывается, когда его отпустил последний.
+    """
+
+    def __init__(self, request):
+        self.request = request
+        self.users = 0
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self):
+        if not self.users:
+            await self.request.initialize()
+        self.users += 1
+
+    async def shutdown(self):
+        if not self.users:
+            return
+        self.users -= 1
+        if not self.users:
+            await self.request.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        return await self.request.do_request(
+            url, method, request_data=request_data, read_timeout=read_timeout,
+            write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+        )
+
+
+class BotHost:
+    """
+    Несколько ботов (основной и боты филиалов) в одном процессе и одном event loop.
+
+    Боты делят соединения с БД, кеш справочников, LRU профилей, состояние
+    диалогов, очередь уведомлений и HTTP-пулы Bot API; на каждого бота
+    приходится только собственный Application. Фоновые задачи процесса
+    запускает первый успешно запущенный бот (основной). Накладные расходы
+    каждого бота (время запуска и прирост памяти) пишутся в лог и доступны
+    в overhead.
+    """
+
+    def __init__(self, branches, include_default=True, polling=True, request=None):
+        self.tenants = ([None] if include_default else []) + list(branches)
+        self.polling = polling
+        self.request = SharedRequest(request or HTTPXRequest(connection_pool_size=HOST_POOL_SIZE))
+        # Длинный опрос getUpdates занимает по соединению на бота
+        self.get_updates_request = SharedRequest(
+            HTTPXRequest(connection_pool_size=max(len(self.tenants), 1))
+        ) if polling else None
+        self.applications = []
+        self.overhead = []
+        self.base_rss = None
+
+    @staticmethod
+    def tenant_name(branch):
+        return branch.slug if branch is not None else 'default'
+
+    async def start_tenant(self, branch):
+        from bot.bot import build_application
+
+        if self.base_rss is None:
+            self.base_rss = current_rss()
+        rss, started = current_rss(), time.perf_counter()
+        application = build_application(
+            webhook=not self.polling,
+            request=self.request,
+            get_updates_request=self.get_updates_request,
+            branch=branch,
+            primary=not self.applications,
+        )
+        await application.initialize()
+        if application.post_init:
+            await application.post_init(application)
+        if self.polling:
+            await application.updater.start_polling(allowed_updates=Update.ALL_TYPES)
+        await application.start()
+        self.applications.append(application)
+
+        after = current_rss()
+        stats = {
+            'tenant': self.tenant_name(branch),
+            'bot': application.bot.username,
+            'startup_s': round(time.perf_counter() - started, 3),
+            'rss_delta_bytes': after - rss if rss is not None and after is not None else None,
+        }
+        self.overhead.append(stats)
+        logger.info(
+            "Бот %s (@%s) запущен за %.2f сек., память процесса +%s",
+            stats['tenant'], stats['bot'], stats['startup_s'], format_bytes(stats['rss_delta_bytes']),
+        )
+        return application
+
+    async def start(self):
+        for branch in self.tenants:
+            try:
+                await self.start_tenant(branch)
+            except Exception as e:
+                # Неверный токен одного филиала не должен останавливать остальных ботов
+                logger.error("Не удалось запустить бота %s: %s", self.tenant_name(branch), e, exc_info=True)
+        if not self.applications:
+            raise RuntimeError("Ни один бот не запущен")
+        logger.info("Хост ботов: %s", self.summary())
+
+    async def stop(self):
+        # Основной бот останавливается последним: его post_stop закрывает общие фоновые задачи
+        for application in reversed(self.applications):
+            try:
+                if application.updater is not None and application.updater.running:
+                    await application.updater.stop()
+                if application.running:
+                    await application.stop()
+                if application.post_stop:
+                    await application.post_stop(application)
+                await application.shutdown()
+                if application.post_shutdown:
+                    await application.post_shutdown(application)
+            except Exception as e:
+                logger.error("Ошибка при остановке бота @%s: %s", application.bot.username, e, exc_info=True)
+        self.applications = []
+
+    async def run(self):
+        """Запустить всех ботов и работать до SIGINT/SIGTERM"""
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stopped.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await self.start()
+        try:
+            await stopped.wait()
+        finally:
+            await self.stop()
+
+    def summary(self):
+        """Итог по накладным расходам: сколько стоит каждый следующий бот по сравнению с первым"""
+        first, rest = self.overhead[:1], self.overhead[1:]
+        rss = current_rss()
+        per_tenant = [stats['rss_delta_bytes'] for stats in rest if stats['rss_delta_bytes'] is not None]
+        return {
+            'bots': len(self.overhead),
+            'process_rss_bytes': rss,
+            # Процесс с одним ботом: примерно столько же стоил бы каждый отдельный процесс
+            'single_bot_rss_bytes': (self.base_rss + first[0]['rss_delta_bytes'])
+            if first and self.base_rss is not None and first[0]['rss_delta_bytes'] is not None else None,
+            'extra_bot_rss_bytes': round(sum(per_tenant) / len(per_tenant)) if per_tenant else None,
+            'extra_bot_startup_s': round(sum(stats['startup_s'] for stats in rest) / len(rest), 3) if rest else None,
+        }
+
+
+def format_bytes(value):
+    if value is None:
+        return 'н/д'
+    if abs(value) < 1024 * 1024:
+        return f"{value / 1024:.0f} КБ"
+    return f"{value / 1024 / 1024:.1f} МБ"
+
+
+def run_host(slugs=None):
+    """Запустить основной бот и боты активных филиалов (или только филиалов slugs) в одном процессе"""
+    branches = Branch.objects.filter(is_active=True)
+    if slugs:
+        branches = branches.filter(slug__in=slugs)
+    branches = list(branches)
+
+    # Прогреваем кеш справочников (с филиалами) до приема первых обновлений
+    snapshot_cache.warm()
+    host = BotHost(branches, include_default=bool(settings.TELEGRAM_BOT_TOKEN) and not slugs)
+    if not host.tenants:
+        raise ValueError("Нет активных филиалов и не задан TELEGRAM_BOT_TOKEN")
+    logger.info("Запуск %s ботов в одном процессе", len(host.tenants))
+    asyncio.run(host.run())
@@ -0,0 +1,364 @@
+"""
+Горячий резерв бота: run_bot на нескольких узлах с общей БД.
+
+getUpdates по одному токену может вести только один процесс, поэтому узлы
+соревнуются за аренду (BotLease). Держатель аренды принимает обновления и
+продлевает ее каждую треть срока; остальные узлы держат Application
+инициализированным и раз в BOT_LEASE_RETRY_INTERVAL пробуют захватить
+истекшую аренду.
+
+Offset getUpdates сдвигается только за полностью обработанные обновления
+(OffsetTracker) и сразу записывается в аренду, поэтому новый ведущий
+продолжает с того места, где остановился прежний: Telegram не подтверждает
+необработанное, а уже обработанное не запрашивается повторно. Состояние
+диалогов (bot.state) записывается в общую БД до сдвига offset, а повтор
+обновления, по которому заявка уже создана, не создает вторую. Продление и
+запись offset проходят только при совпадении epoch аренды — узел, у которого
+аренду перехватили, не может ее затереть. Ведущий прекращает прием за треть
+срока до истечения аренды, если не смог ее продлить.
+"""
+
+import asyncio
+import logging
+import os
+import signal
+import socket
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F
+from django.utils import timezone
+from telegram import Update
+from telegram.error import Conflict, NetworkError, RetryAfter
+
+from bot.catchup import GET_UPDATES_LIMIT
+from bot.models import BotLease
+from bot.ratelimit import retry_after_seconds
+from bot.state import conversation_state
+
+logger = logging.getLogger(__name__)
+
+# Длинный опрос getUpdates, сек. (не дольше оставшегося срока аренды)
+POLL_TIMEOUT = 10
+# Сколько ждать завершения фоновых задач при передаче ведущей роли, сек.
+STOP_TIMEOUT = 5
+# Фоновые задачи (bot.bot.process_tasks), которые после on_stop завершаются сами
+GRACEFUL_TASKS = ('outbox_dispatcher', 'broadcast_runner')
+
+
+def default_node_id():
+    return settings.BOT_NODE_ID or f"{socket.gethostname()}:{os.getpid()}"
+
+
+def lease_key(token):
+    """Ключ аренды — ID бота из токена (сам токен в БД не пишется)"""
+    return f"bot:{token.split(':')[0]}"
+
+
+def acquire_lease(key, holder, ttl):
+    """Захватить свободную (истекшую или освобожденную) аренду; вернуть BotLease или None"""
+    now = timezone.now()
+    BotLease.objects.get_or_create(key=key, defaults={'expires_at': now - timedelta(seconds=1)})
+    taken = BotLease.objects.filter(key=key, expires_at__lt=now).update(
+        holder=holder,
+        epoch=F('epoch') + 1,
+        expires_at=now + timedelta(seconds=ttl),
+        acquired_at=now,
+        renewed_at=now,
+    )
+    if not taken:
+        return None
+    lease = BotLease.objects.get(key=key)
+    return lease if lease.holder == holder else None
+
+
+def renew_lease(key, holder, epoch, ttl, offset):
+    """Продлить аренду и сохранить offset; False — аренду перехватил другой узел"""
+    now = timezone.now()
+    return bool(BotLease.objects.filter(key=key, holder=holder, epoch=epoch).update(
+        expires_at=now + timedelta(seconds=ttl), renewed_at=now, update_offset=offset,
+    ))
+
+
+def save_offset(key, holder, epoch, offset):
+    return bool(BotLease.objects.filter(key=key, holder=holder, epoch=epoch).update(update_offset=offset))
+
+
+def release_lease(key, holder, epoch, offset):
+    """Освободить аренду при штатной остановке: резервный узел захватит ее сразу"""
+    return bool(BotLease.objects.filter(key=key, holder=holder, epoch=epoch).update(
+        holder='', expires_at=timezone.now(), update_offset=offset,
+    ))
+
+
+class OffsetTracker:
+    """
+    Offset getUpdates, до которого все обновления обработаны.
+
+    Обработка идет параллельно (ChatOrderedUpdateProcessor), поэтому offset —
+    наименьший update_id среди принятых, но еще не обработанных. getUpdates
+    запрашивается с этим offset: обновления в работе приходят повторно и
+    пропускаются, а Telegram подтверждает только обработанные.
+    """
+
+    def __init__(self, offset):
+        self.offset = offset
+        self.last_seen = offset - 1
+        self.pending = set()
+        # Сдвиг offset (для записи в аренду) и завершение любого обновления (для опроса)
+        self.offset_changed = asyncio.Event()
+        self.progress = asyncio.Event()
+
+    def accept(self, updates):
+        """Отобрать из ответа getUpdates новые обновления"""
+        new = [update for update in updates if update.update_id > self.last_seen]
+        if new:
+            self.last_seen = new[-1].update_id
+            self.pending.update(update.update_id for update in new)
+        return new
+
+    def done(self, update_id):
+        if update_id not in self.pending:
+            return
+        self.pending.discard(update_id)
+        offset = min(self.pending) if self.pending else self.last_seen + 1
+        if offset != self.offset:
+            self.offset = offset
+            self.offset_changed.set()
+        self.progress.set()
+
+
+class LeaderElectedBot:
+    """Узел горячего резерва: один Application, который запускается, пока узел держит аренду"""
+
+    def __init__(self, application, node_id=None, ttl=None, retry_interval=None):
+        self.application = application
+        self.node_id = node_id or default_node_id()
+        self.key = lease_key(application.bot.token)
+        self.ttl = ttl or settings.BOT_LEASE_TTL
+        self.retry_interval = retry_interval or settings.BOT_LEASE_RETRY_INTERVAL
+        # Запас на задержку продления и расхождение часов узлов
+        self.margin = self.ttl / 3
+        self.tracker = None
+        self.epoch = None
+        self.valid_until = 0.0
+        self.terms = 0
+        self.stepping_down = False
+
+    async def process(self, tracker, update):
+        """
+        Обработать обновление и отметить его в tracker.
+
+        Отметка стоит после обработки, а не в последней группе обработчиков: обработчик,
+        прервавший цепочку (ApplicationHandlerStop), не оставит обновление в pending
+        навсегда. Отмененное при остановке обновление не отмечается — его получит
+        следующий ведущий.
+        """
+        application = self.application
+        try:
+            await application.update_processor.process_update(update, application.process_update(update))
+        except Exception as e:
+            logger.error("Ошибка обработки обновления %s: %s", update.update_id, e, exc_info=True)
+        # Состояние диалога записывается в БД до сдвига offset: следующий getUpdates
+        # подтвердит обновление, и новый ведущий его уже не получит
+        if conversation_state.dirty:
+            try:
+                await asyncio.to_thread(conversation_state.flush)
+            except Exception as e:
+                logger.error("Не удалось записать состояние диалогов: %s", e)
+        tracker.done(update.update_id)
+
+    async def run(self, stopped):
+        """Ждать аренду и вести polling, пока не выставлен stopped"""
+        loop = asyncio.get_running_loop()
+        await self.application.initialize()
+        logger.info("Узел %s в резерве: ожидание аренды %s", self.node_id, self.key)
+        try:
+            while not stopped.is_set():
+                started = loop.time()
+                try:
+                    lease = await sync_to_async(acquire_lease)(self.key, self.node_id, self.ttl)
+                except Exception as e:
+                    logger.error("Ошибка захвата аренды %s: %s", self.key, e)
+                    lease = None
+                if lease is None:
+                    try:
+                        await asyncio.wait_for(stopped.wait(), self.retry_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+                self.valid_until = started + self.ttl
+                await self.lead(lease, stopped)
+        finally:
+            await self.application.shutdown()
+            if self.application.post_shutdown:
+                await self.application.post_shutdown(self.application)
+
+    async def lead(self, lease, stopped):
+        """Один срок ведущего: прием обновлений до потери аренды или остановки узла"""
+        from bot.bot import process_tasks
+
+        application = self.application
+        self.epoch = lease.epoch
+        self.tracker = tracker = OffsetTracker(lease.update_offset)
+        self.terms += 1
+        self.stepping_down = False
+        logger.warning(
+            "Узел %s стал ведущим для %s (поколение %s, offset %s)", self.node_id, self.key, self.epoch, lease.update_offset
+        )
+
+        await application.start()
+        tasks = [asyncio.create_task(coroutine, name=name) for coroutine, name in process_tasks(application)]
+        keeper = asyncio.create_task(self.keep_lease(tracker), name="lease_keeper")
+        poller = asyncio.create_task(self.poll(tracker), name="leader_poller")
+        stop_wait = asyncio.create_task(stopped.wait())
+        await asyncio.wait({keeper, poller, stop_wait}, return_when=asyncio.FIRST_COMPLETED)
+        # Остановка флагом, а не только cancel(): в Python 3.11 wait_for может проглотить
+        # отмену, и задача продолжила бы продлевать аренду или принимать обновления
+        self.stepping_down = True
+        poller.cancel()
+        stop_wait.cancel()
+
+        # Обновления в работе дорабатываются, новые уже не принимаются
+        await self.drain(tracker, self.margin)
+        tracker.offset_changed.set()
+        held = await keeper
+        await asyncio.gather(poller, stop_wait, return_exceptions=True)
+        if held:
+            try:
+                if await sync_to_async(release_lease)(self.key, self.node_id, self.epoch, tracker.offset):
+                    logger.info("Аренда %s освобождена, offset %s", self.key, tracker.offset)
+            except Exception as e:
+                logger.error("Не удалось освободить аренду %s: %s", self.key, e)
+        if tracker.pending:
+            logger.warning("Передача роли ведущего: не дождались обработки %s обновлений", len(tracker.pending))
+
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        # Диспетчер уведомлений и рассылки дорабатывают текущую пачку, остальные циклы бесконечны
+        graceful = [task for task in tasks if task.get_name() in GRACEFUL_TASKS]
+        if graceful:
+            await asyncio.wait(graceful, timeout=STOP_TIMEOUT)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.tracker = None
+        logger.warning("Узел %s больше не ведущий для %s", self.node_id, self.key)
+
+    async def keep_lease(self, tracker):
+        """Продлевать аренду и записывать offset до передачи роли; вернуть False, если аренда потеряна"""
+        loop = asyncio.get_running_loop()
+        renew_every = self.ttl / 3
+        next_renew = loop.time() + renew_every
+        saved = tracker.offset
+        while not self.stepping_down:
+            try:
+                await asyncio.wait_for(tracker.offset_changed.wait(), max(0.0, next_renew - loop.time()))
+            except asyncio.TimeoutError:
+                pass
+            if self.stepping_down:
+                break
+            tracker.offset_changed.clear()
+            offset = tracker.offset
+            started = loop.time()
+            renew = started >= next_renew
+            if not renew and offset == saved:
+                continue
+            try:
+                if renew:
+                    held = await sync_to_async(renew_lease)(self.key, self.node_id, self.epoch, self.ttl, offset)
+                else:
+                    held = await sync_to_async(save_offset)(self.key, self.node_id, self.epoch, offset)
+            except Exception as e:
+                logger.error("Ошибка продления аренды %s: %s", self.key, e)
+                if loop.time() >= self.valid_until - self.margin:
+                    return False
+                await asyncio.sleep(min(1.0, renew_every))
+                continue
+            if not held:
+                logger.warning("Аренду %s перехватил другой узел: прием обновлений остановлен", self.key)
+                return False
+            saved = offset
+            if renew:
+                self.valid_until = started + self.ttl
+                next_renew = started + renew_every
+        return True
+
+    async def poll(self, tracker):
+        """Принимать обновления, пока аренда действительна"""
+        loop = asyncio.get_running_loop()
+        bot = self.application.bot
+        while not self.stepping_down:
+            remaining = self.valid_until - self.margin - loop.time()
+            if remaining <= 0:
+                logger.warning("Аренда %s не продлена вовремя: прием обновлений остановлен", self.key)
+                return
+            offset = tracker.offset
+            # Пока есть обновления в работе, getUpdates вернет их сразу: длинный опрос не нужен
+            timeout = 0 if tracker.pending else max(0, int(min(POLL_TIMEOUT, remaining)))
+            try:
+                updates = await bot.get_updates(
+                    offset=offset, limit=GET_UPDATES_LIMIT, timeout=timeout, allowed_updates=Update.ALL_TYPES
+                )
+            except RetryAfter as e:
+                await asyncio.sleep(retry_after_seconds(e))
+                continue
+            except Conflict:
+                # Прежний ведущий еще дожидается ответа на свой getUpdates
+                logger.warning("getUpdates %s: опрос другим процессом, повтор", self.key)
+                await asyncio.sleep(1)
+                continue
+            except NetworkError as e:
+                logger.warning("getUpdates %s: %s", self.key, e)
+                await asyncio.sleep(1)
+                continue
+
+            if self.stepping_down:
+                # Не подтвержденные нами обновления получит следующий ведущий
+                return
+            new = tracker.accept(updates)
+            for update in new:
+                # Задачи Application: stop() дождется обновлений в работе
+                self.application.create_task(self.process(tracker, update), update=update)
+            if not new and tracker.pending and tracker.offset == offset:
+                tracker.progress.clear()
+                try:
+                    await asyncio.wait_for(tracker.progress.wait(), 1)
+                except asyncio.TimeoutError:
+                    pass
+
+    @staticmethod
+    async def drain(tracker, timeout):
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while tracker.pending and loop.time() < deadline:
+            tracker.progress.clear()
+            try:
+                await asyncio.wait_for(tracker.progress.wait(), deadline - loop.time())
+            except asyncio.TimeoutError:
+                pass
+
+
+def run_leader_elected():
+    """Запустить бота в режиме горячего резерва (до SIGINT/SIGTERM)"""
+    from bot.bot import build_application
+    from bot.cache import snapshot_cache
+
+    # Обновления забирает LeaderElectedBot, Updater не нужен
+    application = build_application(webhook=True)
+    snapshot_cache.warm()
+    node = LeaderElectedBot(application)
+
+    async def _run():
+        stopped = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            try:
+                loop.add_signal_handler(sig, stopped.set)
+            except (NotImplementedError, RuntimeError):
+                pass
+        await node.run(stopped)
+
+    asyncio.run(_run())
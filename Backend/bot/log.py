@@ -0,0 +1,171 @@
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+
+from django.utils.module_loading import import_string
+
+# Стандартные атрибуты LogRecord; все остальные (extra=...) попадают в JSON как есть
+RECORD_ATTRS = frozenset(logging.LogRecord('', 0, '', 0, '', (), None).__dict__) | {'message', 'asctime'}
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна строка JSON на запись: время, уровень, логгер, сообщение и поля из extra"""
+
+    def format(self, record):
+        data = {
+            'ts': datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec='milliseconds'),
+            'level': record.levelname,
+            'logger': record.name,
+            'message': record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in RECORD_ATTRS and not key.startswith('_'):
+                data[key] = value
+        if record.exc_info:
+            data['exc'] = self.formatException(record.exc_info)
+        elif record.exc_text:
+            data['exc'] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class SamplingFilter(logging.Filter):
+    """
+    Ограничение частоты повторяющихся информационных записей.
+
+    Записи ниже WARNING пропускаются не чаще rate в секунду на логгер (rates
+    переопределяет лимит для отдельных логгеров, 0 — без ограничения).
+    Предупреждения и ошибки проходят всегда. Число отброшенных записей
+    добавляется к следующей пропущенной записи в поле suppressed.
+    """
+
+    def __init__(self, rate=50, rates=None, name=''):
+        super().__init__(name)
+        self.rate = rate
+        self.rates = rates or {}
+        # логгер -> [начало секунды, пропущено, отброшено]
+        self._windows = {}
+        self._lock = threading.Lock()
+
+    def _rate_for(self, name):
+        while True:
+            if name in self.rates:
+                return self.rates[name]
+            if '.' not in name:
+                return self.rate
+            name = name.rsplit('.', 1)[0]
+
+    def filter(self, record):
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate_for(record.name)
+        if not rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            window = self._windows.get(record.name)
+            if window is None or now - window[0] >= 1:
+                suppressed = window[2] if window else 0
+                window = self._windows[record.name] = [now, 0, 0]
+                if suppressed:
+                    record.suppressed = suppressed
+            if window[1] >= rate:
+                window[2] += 1
+                return False
+            window[1] += 1
+        return True
+
+
+class QueueListenerHandler(logging.handlers.QueueHandler):
+    """
+    Неблокирующий обработчик: запись кладется в очередь, а форматирование и
+    вывод выполняет фоновый поток (QueueListener) с целевыми обработчиками.
+
+    Аргументы %-формата подставляются в сообщение в потоке вызывающего кода,
+    как в QueueHandler.prepare: объекты в args могут измениться, пока запись
+    ждет в очереди. Форматтер (JSON или текст) применяется уже в фоне. При
+    переполнении очереди запись отбрасывается и учитывается в счетчике
+    dropped — обработчик бота никогда не ждет вывода.
+
+    Фоновый поток запускается при первой записи, а не при загрузке настроек:
+    manage.py-команды без логов обходятся без него, а процесс, созданный fork
+    (воркеры ASGI/WSGI-сервера), запускает собственный поток. После stop()
+    записи выводятся сразу в потоке вызывающего кода.
+
+    Настраивается из settings.LOGGING:
+        'queue': {
+            '()': 'bot.log.QueueListenerHandler',
+            'handler_class': 'logging.StreamHandler',
+            'formatter': 'json',
+        }
+    """
+
+    def __init__(self, handler_class='logging.StreamHandler', handler_kwargs=None, maxsize=10000):
+        super().__init__(queue.Queue(maxsize))
+        target = import_string(handler_class)(**(handler_kwargs or {}))
+        self.targets = [target]
+        self.dropped = 0
+        self.listener = None
+        self.stopped = False
+        # PID процесса, в котором запущен фоновый поток
+        self._pid = None
+
+    def setFormatter(self, fmt):
+        # Форматирует фоновый поток, поэтому formatter из конфигурации передается целевым обработчикам
+        for target in self.targets:
+            target.setFormatter(fmt)
+
+    def prepare(self, record):
+        # Очередь внутри процесса: exc_info и extra передаются как есть, подставляются только аргументы
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        return record
+
+    def start(self):
+        """Запустить фоновый поток в текущем процессе"""
+        if self._pid is None:
+            atexit.register(self.stop)
+        else:
+            # Потомок после fork: поток родителя не скопирован, а очередь может хранить его записи
+            self.queue = queue.Queue(self.queue.maxsize)
+        self.listener = logging.handlers.QueueListener(self.queue, *self.targets, respect_handler_level=True)
+        self.listener.start()
+        self._pid = os.getpid()
+
+    def enqueue(self, record):
+        # emit вызывается под блокировкой обработчика, поэтому запуск потока не гонится сам с собой
+        if self.stopped:
+            self.handle_now(record)
+            return
+        if self._pid != os.getpid():
+            self.start()
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+    def handle_now(self, record):
+        for target in self.targets:
+            if record.levelno >= target.level:
+                target.handle(record)
+
+    def stop(self):
+        """Дописать оставшиеся записи и остановить фоновый поток"""
+        self.stopped = True
+        if self.listener is not None and self._pid == os.getpid() and self.listener._thread is not None:
+            self.listener.stop()
+        for target in self.targets:
+            target.flush()
+
+    def close(self):
+        self.stop()
+        for target in self.targets:
+            target.close()
+        super().close()
@@ -0,0 +1,106 @@
+import json
+import time
+from decimal import Decimal
+from urllib.parse import urlencode
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from bot.benchmark import (
+    BENCH_ID_BASE, QueryCounter, isolated_database, latency_summary, result_header, seed_reference_data,
+)
+from bot.cache import snapshot_cache
+from bot.management.commands.bench_rates import Command as BenchRatesCommand
+from bot.models import ExchangeOrder
+
+BENCH_USER_ID = BENCH_ID_BASE
+# Запросы Mini App при запуске до /api/bootstrap/: курсы, тексты разделов и заявки
+SEPARATE_URLS = (
+    '/api/exchange-rates/',
+    '/api/bot-message/?message_type=about',
+    '/api/bot-message/?message_type=support',
+    f'/api/orders/user/?telegram_user_id={BENCH_USER_ID}',
+)
+
+
+class Command(BaseCommand):
+    help = 'Сравнить запуск Mini App отдельными запросами и одним /api/bootstrap/: время, запросы к БД, байты'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=2000, help='Число запусков в каждом сценарии')
+        parser.add_argument('--orders', type=int, default=50, help='Заявок у пользователя')
+        parser.add_argument('--rtt', type=float, default=150.0,
+                            help='Время сетевого круга Mini App -> ngrok/nginx -> сервер для оценки, мс')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        # Заявки пользователя и справочники — в отдельной БД, рабочая не затрагивается
+        with isolated_database():
+            seed_reference_data()
+            ExchangeOrder.objects.bulk_create([
+                ExchangeOrder(
+                    telegram_user_id=BENCH_USER_ID, order_type='buy', amount=Decimal('1000'),
+                    exchange_rate=Decimal('92.5'), amount_to_receive=Decimal('10.81'),
+                    full_name='Bench User', wallet_address='TBenchWallet',
+                )
+                for _ in range(options['orders'])
+            ])
+            handler = WSGIHandler()
+            bootstrap_url = f"/api/bootstrap/?{urlencode({'telegram_user_id': BENCH_USER_ID})}"
+            snapshot_cache.refresh()
+            with override_settings(ALLOWED_HOSTS=['localhost']):
+                versions = json.loads(BenchRatesCommand.request(handler, bootstrap_url)[2])['versions']
+                known_url = f"{bootstrap_url}&{urlencode({'known': ','.join(versions.values())})}"
+                scenarios = {
+                    'separate': SEPARATE_URLS,
+                    'bootstrap': (bootstrap_url,),
+                    'bootstrap_known': (known_url,),
+                }
+                result = {
+                    **result_header('bench_bootstrap'),
+                    'config': {key: options[key] for key in ('iterations', 'orders', 'rtt')},
+                    'scenarios': {
+                        name: self.run_scenario(handler, urls, options) for name, urls in scenarios.items()
+                    },
+                }
+
+        for name, data in result['scenarios'].items():
+            self.report(name, data)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    @staticmethod
+    def run_scenario(handler, urls, options):
+        """Один запуск Mini App — последовательные запросы urls, как их делает клиент"""
+        latencies, sizes = [], []
+        counter = QueryCounter()
+        counter.attach()
+        try:
+            for _ in range(options['iterations']):
+                started = time.perf_counter()
+                size = 0
+                for url in urls:
+                    size += len(BenchRatesCommand.request(handler, url)[2])
+                latencies.append(time.perf_counter() - started)
+                sizes.append(size)
+        finally:
+            counter.detach()
+        server = latency_summary(latencies)
+        return {
+            'round_trips': len(urls),
+            'response_bytes': round(sum(sizes) / len(sizes)),
+            'queries_per_launch': round(counter.count / options['iterations'], 2),
+            'server': server,
+            # Последовательные круги через ngrok/nginx складываются до первой отрисовки
+            'estimated_first_paint_ms': round(server['p50_ms'] + len(urls) * options['rtt'], 1),
+        }
+
+    def report(self, name, data):
+        self.stdout.write(
+            f"{name:>16}: кругов {data['round_trips']}, ответ {data['response_bytes']} байт, "
+            f"запросов к БД {data['queries_per_launch']}, сервер p50 {data['server']['p50_ms']} мс, "
+            f"до первой отрисовки ~{data['estimated_first_paint_ms']} мс"
+        )
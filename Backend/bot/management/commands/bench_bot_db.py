@@ -0,0 +1,105 @@
+import asyncio
+import statistics
+import time
+from types import SimpleNamespace
+
+from asgiref.sync import sync_to_async
+from django.core.management.base import BaseCommand
+
+from bot import repository
+from bot.benchmark import BENCH_ID_BASE, isolated_database, seed_reference_data
+from bot.cache import snapshot_cache
+from bot.models import Cityex24Transfer
+from bot.users import profile_cache, upsert_telegram_user
+
+
+# Прежний способ: каждый хелпер обернут в sync_to_async и всегда уходит в поток;
+# заявка Cityex24 создается при выборе страны и дописывается при получении контакта
+
+async def legacy_menu_press(user_data):
+    await sync_to_async(upsert_telegram_user)(
+        user_data.id, username=user_data.username, first_name=user_data.first_name,
+        last_name=user_data.last_name, is_blocked=False,
+    )
+    await sync_to_async(snapshot_cache.get_message)('about')
+
+
+async def legacy_transfer(user_data):
+    user = await sync_to_async(upsert_telegram_user)(
+        user_data.id, username=user_data.username, first_name=user_data.first_name,
+        last_name=user_data.last_name, is_blocked=False,
+    )
+    transfer = await sync_to_async(Cityex24Transfer.objects.create)(user=user, country='kyrgyzstan', status='new')
+    await sync_to_async(repository._save_contact)(transfer.pk, '+70000000000', user_data.first_name, None)
+    await sync_to_async(snapshot_cache.get_message)('cityex24_confirmation')
+
+
+# Новый слой доступа к данным (bot.repository)
+
+async def repository_menu_press(user_data):
+    await repository.get_or_create_user(user_data)
+    await repository.get_message('about')
+
+
+async def repository_transfer(user_data):
+    user = await repository.get_or_create_user(user_data)
+    await repository.create_transfer(user, 'kyrgyzstan', '+70000000000', user_data.first_name, None)
+    await repository.get_message('cityex24_confirmation')
+
+
+SCENARIOS = {
+    'menu': (legacy_menu_press, repository_menu_press),
+    'transfer': (legacy_transfer, repository_transfer),
+}
+
+
+class Command(BaseCommand):
+    help = 'Сравнить пропускную способность доступа к БД из обработчиков бота: sync_to_async и bot.repository'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=SCENARIOS, default='menu', help='Нажатие кнопки меню или заявка Cityex24')
+        parser.add_argument('--updates', type=int, default=2000, help='Число имитируемых обновлений')
+        parser.add_argument('--users', type=int, default=200, help='Число различных пользователей')
+        parser.add_argument('--concurrency', type=int, default=50, help='Одновременно обрабатываемых обновлений')
+
+    def handle(self, *args, **options):
+        users = [
+            SimpleNamespace(id=BENCH_ID_BASE + i, username=f'bench{i}', first_name='Bench', last_name=None)
+            for i in range(options['users'])
+        ]
+        legacy, current = SCENARIOS[options['scenario']]
+        # Пользователи, заявки и уведомления в очереди — в отдельной БД, рабочая не затрагивается
+        with isolated_database():
+            seed_reference_data()
+            try:
+                for name, handler in (('sync_to_async', legacy), ('repository', current)):
+                    # Одинаковые стартовые условия: холодный LRU профилей и свежий снимок справочников
+                    profile_cache.clear()
+                    snapshot_cache.refresh()
+                    result = asyncio.run(self.run(handler, users, options['updates'], options['concurrency']))
+                    self.report(name, result)
+            finally:
+                profile_cache.clear()
+
+    async def run(self, handler, users, updates, concurrency):
+        semaphore = asyncio.Semaphore(concurrency)
+        latencies = []
+
+        async def _one(i):
+            async with semaphore:
+                started = time.perf_counter()
+                await handler(users[i % len(users)])
+                latencies.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        await asyncio.gather(*(_one(i) for i in range(updates)))
+        return time.perf_counter() - started, sorted(latencies)
+
+    def report(self, name, result):
+        elapsed, latencies = result
+        p95 = latencies[int(len(latencies) * 0.95) - 1] if latencies else 0
+        self.stdout.write(
+            f'{name:>14}: {len(latencies) / elapsed:8.0f} обн/сек, '
+            f'p50 {statistics.median(latencies) * 1000:7.2f} мс, p95 {p95 * 1000:7.2f} мс, '
+            f'всего {elapsed:.2f} сек.'
+        )
@@ -0,0 +1,162 @@
+import asyncio
+import json
+import time
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+from django.utils import timezone
+
+from bot.benchmark import BENCH_ID_BASE, isolated_database, latency_summary, result_header
+from bot.broadcast import claim_job, create_job, run_job
+from bot.cache import snapshot_cache
+from bot.clients import bot_clients
+from bot.management.commands.fake_bot_api import add_fake_api_arguments, fake_api_from_options
+from bot.models import AdminChat, Cityex24Transfer, ExchangeOrder, TelegramUser
+
+SCENARIOS = ('admin', 'broadcast_message', 'broadcast_job')
+
+
+class Command(BaseCommand):
+    help = 'Нагрузочный тест доставки уведомлений и рассылок через локальный Bot API'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scenario', choices=SCENARIOS, nargs='*', default=list(SCENARIOS), help='Сценарии теста')
+        parser.add_argument('--admins', type=int, default=5, help='Число чатов администраторов')
+        parser.add_argument('--notifications', type=int, default=40, help='Число уведомлений о заявках (поровну обмен и Cityex24)')
+        parser.add_argument('--users', type=int, default=300, help='Число получателей рассылки')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+        add_fake_api_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = fake_api_from_options(options)
+        bot_clients.run_sync(server.start())
+        self.stdout.write(f'Локальный Bot API: {server.url}')
+
+        result = {
+            **result_header('bench_delivery'),
+            'config': {key: options[key] for key in (
+                'admins', 'notifications', 'users', 'latency', 'jitter', 'global_rate',
+                'per_chat_interval', 'retry_after', 'inject_429', 'blocked_ratio',
+            )},
+            'scenarios': {},
+        }
+        # Тестовые токены и адрес локального сервера: к Telegram не уходит ни одного запроса.
+        # Чаты администраторов, получатели и задания рассылок — в отдельной БД: живой бот их не видит
+        with isolated_database(), override_settings(
+            TELEGRAM_API_BASE_URL=server.url,
+            TELEGRAM_BOT_TOKEN='1001:bench',
+            TELEGRAM_NOTIFICATION_BOT_TOKEN='1002:bench',
+        ):
+            try:
+                for scenario in options['scenario']:
+                    server.reset_stats()
+                    data = getattr(self, f'run_{scenario}')(options)
+                    data['server'] = server.snapshot()
+                    result['scenarios'][scenario] = data
+                    self.report(scenario, data)
+            finally:
+                bot_clients.run_sync(bot_clients.shutdown_loop())
+                bot_clients.run_sync(server.stop())
+                snapshot_cache.refresh()
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    def run_admin(self, options):
+        """send_notification_to_admin / send_exchange_order_notification параллельно, как пачка диспетчера очереди"""
+        from bot.bot import send_exchange_order_notification, send_notification_to_admin
+
+        AdminChat.objects.bulk_create([
+            AdminChat(chat_id=BENCH_ID_BASE + i, name='bench', is_active=True) for i in range(options['admins'])
+        ])
+        snapshot_cache.refresh()
+        now = timezone.now()
+
+        async def _one(i):
+            started = time.perf_counter()
+            if i % 2:
+                order = ExchangeOrder(
+                    id=i, order_type='buy', amount=Decimal('10000'), exchange_rate=Decimal('95.5'),
+                    amount_to_receive=Decimal('104.71'), full_name='Bench', wallet_address='T' * 34,
+                    status='pending', created_at=now,
+                )
+                report = await send_exchange_order_notification(order)
+            else:
+                transfer = Cityex24Transfer(
+                    id=i, country='uae', status='new', contact_phone='+70000000000',
+                    contact_first_name='Bench', created_at=now,
+                )
+                report = await send_notification_to_admin(transfer)
+            return report, time.perf_counter() - started
+
+        async def _run():
+            started = time.perf_counter()
+            results = await asyncio.gather(*(_one(i) for i in range(options['notifications'])))
+            return time.perf_counter() - started, results
+
+        elapsed, results = bot_clients.run_sync(_run())
+        deliveries = [delivery for report, _ in results if report for delivery in report.results]
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'messages': len(deliveries),
+            'messages_per_s': round(len(deliveries) / elapsed, 1) if elapsed else 0,
+            'delivered': sum(1 for delivery in deliveries if delivery.ok),
+            'failed': sum(1 for delivery in deliveries if not delivery.ok),
+            'attempts': sum(delivery.attempts for delivery in deliveries),
+            'notification_latency': latency_summary([elapsed for _, elapsed in results]),
+        }
+
+    def run_broadcast_message(self, options):
+        """send_broadcast_message по одному получателю, как отправка из админки"""
+        from bot.bot import send_broadcast_message
+
+        latencies = []
+        ok = 0
+        started = time.perf_counter()
+        for i in range(options['users']):
+            sent_at = time.perf_counter()
+            ok += bool(send_broadcast_message(BENCH_ID_BASE + i, 'Тестовая рассылка'))
+            latencies.append(time.perf_counter() - sent_at)
+        elapsed = time.perf_counter() - started
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'messages': options['users'],
+            'messages_per_s': round(options['users'] / elapsed, 1) if elapsed else 0,
+            'delivered': ok,
+            'failed': options['users'] - ok,
+            'message_latency': latency_summary(latencies),
+        }
+
+    def run_broadcast_job(self, options):
+        """Фоновая рассылка (bot.broadcast.run_job) по пользователям из БД"""
+        TelegramUser.objects.bulk_create([
+            TelegramUser(telegram_id=BENCH_ID_BASE + i, first_name='Bench') for i in range(options['users'])
+        ])
+        job = create_job('Тестовая рассылка', recipient_ids=[BENCH_ID_BASE + i for i in range(options['users'])])
+        job = claim_job(job.pk)
+
+        started = time.perf_counter()
+        job = bot_clients.run_sync(run_job(job))
+        elapsed = time.perf_counter() - started
+        return {
+            'elapsed_s': round(elapsed, 3),
+            'messages': job.total_count,
+            'messages_per_s': round(job.processed_count / elapsed, 1) if elapsed else 0,
+            'delivered': job.sent_count,
+            'failed': job.failed_count,
+            'blocked': job.blocked_count,
+            'broadcast_rate_setting': settings.BOT_BROADCAST_RATE,
+        }
+
+    def report(self, scenario, data):
+        server = data['server']
+        self.stdout.write(
+            f"{scenario}: {data['messages']} сообщений за {data['elapsed_s']} сек. "
+            f"({data['messages_per_s']} в сек.), доставлено {data['delivered']}, ошибок {data['failed']}; "
+            f"сервер: 429 — {server.get('rate_limited', 0)}, 403 — {server.get('blocked', 0)}, "
+            f"запросов {server.get('requests', 0)}"
+        )
@@ -0,0 +1,213 @@
+import json
+import os
+import signal
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from bot.benchmark import BENCH_ID_BASE, isolated_database, make_update, result_header, seed_reference_data
+from bot.clients import bot_clients
+from bot.fakeapi import FakeBotAPI
+from bot.leader import lease_key
+from bot.models import BotLease
+
+# Отдельный токен: аренда демонстрации не пересекается с арендой настоящего бота
+FAILOVER_TOKEN = '1003:failover'
+MENU_TEXT = 'О нас'
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка горячего резерва: несколько процессов run_bot --standby на общей БД и локальном Bot API, '
+        'аварийное (SIGKILL) и штатное (SIGTERM) отключение ведущего, подсчет потерянных и повторных обновлений'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--nodes', type=int, default=3, help='Число процессов бота')
+        parser.add_argument('--updates', type=int, default=600, help='Число обновлений (каждое — отдельный чат)')
+        parser.add_argument('--rate', type=float, default=40.0, help='Обновлений в секунду')
+        parser.add_argument('--ttl', type=float, default=3.0, help='Срок аренды, сек. (BOT_LEASE_TTL узлов)')
+        parser.add_argument('--latency', type=float, default=20.0, help='Задержка ответа локального Bot API, мс')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        key = lease_key(FAILOVER_TOKEN)
+        # Узлы работают с отдельной БД прогона (DATABASE_PATH): аренда, пользователи и состояние
+        # диалогов демонстрации не попадают в рабочую БД и удаляются вместе с ней
+        with isolated_database() as database:
+            seed_reference_data()
+            workdir = tempfile.mkdtemp(prefix='bench_failover_')
+            server = FakeBotAPI(latency=options['latency'] / 1000, global_rate=0, per_chat_interval=0)
+            bot_clients.run_sync(server.start())
+            self.stdout.write(f'Локальный Bot API: {server.url}, логи узлов: {workdir}')
+
+            nodes = {}
+            monitor = LeaseMonitor(key)
+            try:
+                for i in range(options['nodes']):
+                    nodes[f'node-{i}'] = self.spawn(f'node-{i}', server.url, workdir, database, options)
+                monitor.start()
+                leader = monitor.wait_leader(timeout=30)
+                if leader is None:
+                    self.stderr.write(self.style.ERROR(f'Ни один узел не захватил аренду, см. логи в {workdir}'))
+                    return
+                self.stdout.write(f'Ведущий: {leader}')
+
+                events = self.stream(server, nodes, monitor, options)
+                delivered = self.wait_delivered(server, options)
+            finally:
+                for process in nodes.values():
+                    if process.poll() is None:
+                        process.send_signal(signal.SIGTERM)
+                for process in nodes.values():
+                    try:
+                        process.wait(timeout=options['ttl'] * 3 + 10)
+                    except subprocess.TimeoutExpired:
+                        process.kill()
+                monitor.stop()
+                bot_clients.run_sync(server.stop())
+
+        chats = [BENCH_ID_BASE + i for i in range(options['updates'])]
+        result = {
+            **result_header('bench_failover'),
+            'config': {key: options[key] for key in ('nodes', 'updates', 'rate', 'ttl', 'latency')},
+            'updates': options['updates'],
+            'processed': sum(1 for chat_id in chats if delivered[chat_id]),
+            'lost': sum(1 for chat_id in chats if not delivered[chat_id]),
+            'duplicated': sum(1 for chat_id in chats if delivered[chat_id] > 1),
+            'duplicated_updates': [chat_id - BENCH_ID_BASE for chat_id in chats if delivered[chat_id] > 1],
+            'events': events,
+            'leaders': monitor.leaders,
+        }
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    def spawn(self, node_id, api_url, workdir, database, options):
+        env = {
+            **os.environ,
+            'DATABASE_PATH': str(database),
+            'TELEGRAM_BOT_TOKEN': FAILOVER_TOKEN,
+            'TELEGRAM_API_BASE_URL': api_url,
+            'BOT_LEADER_ELECTION': 'True',
+            'BOT_LEASE_TTL': str(options['ttl']),
+            'BOT_LEASE_RETRY_INTERVAL': str(min(1.0, options['ttl'] / 4)),
+            'BOT_NODE_ID': node_id,
+            'BOT_OUTBOX_IN_BOT_PROCESS': 'False',
+            'BOT_BROADCAST_IN_BOT_PROCESS': 'False',
+            'BOT_METRICS_ENABLED': 'False',
+            'LOG_FORMAT': 'text',
+        }
+        log = open(os.path.join(workdir, f'{node_id}.log'), 'w')
+        return subprocess.Popen(
+            [sys.executable, str(settings.BASE_DIR / 'manage.py'), 'run_bot', '--standby'],
+            env=env, stdout=log, stderr=subprocess.STDOUT, cwd=str(settings.BASE_DIR),
+        )
+
+    def stream(self, server, nodes, monitor, options):
+        """Подавать обновления с заданной скоростью; на 1/3 потока убить ведущего, на 2/3 — остановить штатно"""
+        total = options['updates']
+        failures = {total // 3: ('SIGKILL', signal.SIGKILL), 2 * total // 3: ('SIGTERM', signal.SIGTERM)}
+        events = []
+        started = time.monotonic()
+        for i in range(total):
+            if i in failures and len(events) < len(nodes) - 1:
+                name, sig = failures[i]
+                leader = monitor.current_leader()
+                if leader in nodes:
+                    nodes[leader].send_signal(sig)
+                    events.append({'signal': name, 'node': leader, 'at_update': i, 'time': time.time(),
+                                   'epoch': monitor.epoch})
+                    self.stdout.write(f'{name} ведущему {leader} после {i} обновлений')
+            delay = started + i / options['rate'] - time.monotonic()
+            if delay > 0:
+                time.sleep(delay)
+            bot_clients.run_sync(server.push_update(make_update(0, BENCH_ID_BASE + i, 'menu', MENU_TEXT)))
+
+        for event in events:
+            takeover = monitor.takeover_after(event['epoch'], event['time'], timeout=options['ttl'] * 3 + 10)
+            event['new_leader'], event['takeover_s'] = takeover
+            del event['epoch']
+        return events
+
+    def wait_delivered(self, server, options):
+        chats = range(BENCH_ID_BASE, BENCH_ID_BASE + options['updates'])
+        deadline = time.monotonic() + options['ttl'] * 3 + 20
+        while time.monotonic() < deadline and not all(server.delivered[chat_id] for chat_id in chats):
+            time.sleep(0.2)
+        # Дать повторам (если они есть) дойти до сервера
+        time.sleep(1)
+        return Counter(server.delivered)
+
+    def report(self, result):
+        for event in result['events']:
+            takeover = f"{event['takeover_s']:.2f} сек." if event['takeover_s'] is not None else 'не произошло'
+            self.stdout.write(
+                f"{event['signal']} {event['node']} (после {event['at_update']} обновлений): "
+                f"ведущим стал {event['new_leader'] or '—'} через {takeover}"
+            )
+        style = self.style.SUCCESS if not result['lost'] and not result['duplicated'] else self.style.WARNING
+        self.stdout.write(style(
+            f"Обновлений: {result['updates']}, обработано: {result['processed']}, "
+            f"потеряно: {result['lost']}, обработано повторно: {result['duplicated']}"
+        ))
+
+
+class LeaseMonitor(threading.Thread):
+    """Фоновый опрос аренды: кто и с какого момента ведущий"""
+
+    def __init__(self, key, interval=0.05):
+        super().__init__(daemon=True)
+        self.key = key
+        self.interval = interval
+        self.leaders = []
+        self.epoch = 0
+        self._lock = threading.Lock()
+        self._stopped = threading.Event()
+
+    def run(self):
+        while not self._stopped.is_set():
+            lease = BotLease.objects.filter(key=self.key).first()
+            if lease is not None and lease.holder and lease.expires_at > timezone.now():
+                with self._lock:
+                    if lease.epoch != self.epoch:
+                        self.epoch = lease.epoch
+                        self.leaders.append({'node': lease.holder, 'epoch': lease.epoch, 'time': time.time()})
+            self._stopped.wait(self.interval)
+
+    def stop(self):
+        self._stopped.set()
+        self.join()
+
+    def current_leader(self):
+        with self._lock:
+            return self.leaders[-1]['node'] if self.leaders else None
+
+    def wait_leader(self, timeout):
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            leader = self.current_leader()
+            if leader is not None:
+                return leader
+            time.sleep(self.interval)
+        return None
+
+    def takeover_after(self, epoch, since, timeout):
+        """Следующий ведущий после поколения epoch и через сколько секунд после since"""
+        deadline = time.monotonic() + timeout
+        while time.monotonic() < deadline:
+            with self._lock:
+                for leader in self.leaders:
+                    if leader['epoch'] > epoch:
+                        return leader['node'], round(leader['time'] - since, 2)
+            time.sleep(self.interval)
+        return None, None
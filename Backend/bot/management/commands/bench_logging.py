@@ -0,0 +1,133 @@
+import asyncio
+import json
+import logging
+import os
+import tempfile
+
+from django.conf import settings
+from django.core.management.base import CommandError
+from django.test import override_settings
+
+from bot.benchmark import (
+    OfflineBotRequest, isolated_database, latency_summary, replay_updates, result_header, seed_reference_data,
+)
+from bot.cache import snapshot_cache
+from bot.log import JsonFormatter, QueueListenerHandler, SamplingFilter
+from bot.management.commands.bench_updates import Command as BenchUpdatesCommand
+from bot.state import conversation_state
+from bot.users import profile_cache
+
+# off   — логирование отключено (база для сравнения);
+# sync  — прежняя схема logging.basicConfig: запись в файл в потоке обработчика;
+# queue — очередь с фоновым потоком, JSON и ограничение частоты (settings.LOGGING)
+MODES = ('off', 'sync', 'queue')
+TEXT_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+
+class Command(BenchUpdatesCommand):
+    help = 'Измерить накладные расходы логирования на обработку обновления бота'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--updates', type=int, default=5000, help='Число синтетических обновлений')
+        parser.add_argument('--users', type=int, default=500, help='Число различных пользователей')
+        parser.add_argument('--mix', default='', help='Доли видов обновлений, например menu=70,country=12,contact=10,start=8')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора синтетического потока')
+        parser.add_argument('--input', help='Файл JSON Lines с записанными обновлениями (вместо синтетических)')
+        parser.add_argument('--mode', choices=MODES, nargs='*', default=list(MODES), help='Схемы логирования')
+        parser.add_argument('--level', default='INFO', help='Уровень корневого логгера на время прогона')
+        parser.add_argument('--timeout', type=float, default=600, help='Предельное время прогона, сек.')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        raw_updates = self.load_stream(options)
+        if not raw_updates:
+            raise CommandError('Поток обновлений пуст')
+
+        result = {
+            **result_header('bench_logging'),
+            'config': {
+                'updates': len(raw_updates),
+                'level': options['level'],
+                'sample_rate': settings.LOG_SAMPLE_RATE,
+            },
+            'modes': {},
+        }
+        for mode in options['mode']:
+            data = self.run_mode(mode, raw_updates, options)
+            result['modes'][mode] = data
+
+        base = result['modes'].get('off')
+        for mode, data in result['modes'].items():
+            if base and mode != 'off':
+                data['overhead_us_per_update'] = round(
+                    (data['elapsed_s'] - base['elapsed_s']) / len(raw_updates) * 1_000_000, 1
+                )
+            self.report(mode, data)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    def run_mode(self, mode, raw_updates, options):
+        log_fd, log_path = tempfile.mkstemp(suffix='.log', prefix='bench_logging_')
+        os.close(log_fd)
+        root = logging.getLogger()
+        saved = root.handlers[:], root.level
+        handler = self.make_handler(mode, log_path)
+        root.handlers = [handler] if handler else []
+        root.setLevel(options['level'])
+        logging.disable(logging.CRITICAL if mode == 'off' else logging.NOTSET)
+
+        # Каждая схема — в своей отдельной БД: одинаковые стартовые условия, рабочая БД не затрагивается
+        with isolated_database(), override_settings(TELEGRAM_BOT_TOKEN='1:bench'):
+            try:
+                seed_reference_data()
+                snapshot_cache.refresh()
+                profile_cache.clear()
+                elapsed, latencies, _ = asyncio.run(
+                    replay_updates(raw_updates, OfflineBotRequest(), options['timeout'])
+                )
+            finally:
+                if handler:
+                    handler.close()
+                root.handlers, level = saved
+                root.setLevel(level)
+                logging.disable(logging.NOTSET)
+                conversation_state.close()
+                profile_cache.clear()
+
+        with open(log_path, encoding='utf-8') as f:
+            lines = sum(1 for _ in f)
+        os.remove(log_path)
+        all_latencies = [value for values in latencies.values() for value in values]
+        return {
+            'elapsed_s': round(elapsed, 4),
+            'throughput_ups': round(len(all_latencies) / elapsed, 1) if elapsed else 0,
+            'log_lines': lines,
+            'dropped': getattr(handler, 'dropped', 0),
+            'latency': latency_summary(all_latencies),
+        }
+
+    @staticmethod
+    def make_handler(mode, log_path):
+        if mode == 'sync':
+            handler = logging.FileHandler(log_path, encoding='utf-8')
+            handler.setFormatter(logging.Formatter(TEXT_FORMAT))
+            return handler
+        if mode == 'queue':
+            handler = QueueListenerHandler('logging.FileHandler', {'filename': log_path, 'encoding': 'utf-8'})
+            handler.setFormatter(JsonFormatter())
+            sampling = settings.LOGGING['filters']['sampling']
+            handler.addFilter(SamplingFilter(sampling['rate'], sampling['rates']))
+            return handler
+        return None
+
+    def report(self, mode, data):
+        overhead = data.get('overhead_us_per_update')
+        self.stdout.write(
+            f"{mode:>5}: {data['throughput_ups']:8.1f} обн/сек, p50 {data['latency']['p50_ms']:.2f} мс, "
+            f"p99 {data['latency']['p99_ms']:.2f} мс, строк лога {data['log_lines']}"
+            + (f", потеряно {data['dropped']}" if data['dropped'] else '')
+            + (f"; накладные расходы {overhead} мкс/обн" if overhead is not None else '')
+        )
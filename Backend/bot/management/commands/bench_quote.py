@@ -0,0 +1,124 @@
+import json
+import time
+from decimal import Decimal
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+
+from bot.benchmark import (
+    BENCH_ID_BASE, QueryCounter, isolated_database, latency_summary, result_header, seed_reference_data,
+)
+from bot.cache import snapshot_cache
+from bot.management.commands.bench_rates import Command as BenchRatesCommand
+from bot.models import ExchangeRate
+from bot.quotes import issue_quote, quote_rate, verify_quote
+from bot.views import create_exchange_order
+
+class RateQueryCounter(QueryCounter):
+    """QueryCounter, который отдельно считает запросы к таблице курсов"""
+
+    def __init__(self):
+        super().__init__()
+        self.rate_count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if ExchangeRate._meta.db_table in sql:
+            self.rate_count += 1
+        return super().__call__(execute, sql, params, many, context)
+
+
+class Command(BaseCommand):
+    help = (
+        'Измерить котировки: выдачу и проверку токена, /api/quote/ через стек middleware '
+        'и создание заявки по котировке (запросы к БД, в том числе к таблице курсов)'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000, help='Вызовов в сценариях котировок')
+        parser.add_argument('--orders', type=int, default=500, help='Заявок в сценариях создания (откатываются)')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        # Курсы и заявки бенчмарка — в отдельной БД: живой бот и очередь уведомлений их не видят
+        with isolated_database():
+            # Курсы пар Mini App (bot.benchmark.BENCH_RATES)
+            seed_reference_data()
+            iterations = options['iterations']
+            result = {
+                **result_header('bench_quote'),
+                'config': {key: options[key] for key in ('iterations', 'orders')},
+                'scenarios': {},
+            }
+            snapshot_cache.refresh()
+            token = issue_quote('sell')['quote']
+            rate_table = snapshot_cache.get().rate_table
+            scenarios = {
+                # Поиск курса: таблица снимка в памяти и запрос к ExchangeRate
+                'rate_table': (lambda: quote_rate('sell', rate_table), iterations),
+                'rate_db': (lambda: ExchangeRate.objects.filter(
+                    currency_from='USDT', currency_to='Руб', branch__isnull=True, is_active=True
+                ).first(), iterations // 10),
+                'issue_quote': (lambda: issue_quote('sell', Decimal('1000')), iterations),
+                'verify_quote': (lambda: verify_quote(token), iterations),
+            }
+            for name, (func, count) in scenarios.items():
+                result['scenarios'][name] = self.measure(func, count)
+
+            handler = WSGIHandler()
+            with override_settings(ALLOWED_HOSTS=['localhost']):
+                url = '/api/quote/?order_type=sell&amount=1000'
+                status = BenchRatesCommand.request(handler, url)[0]
+                data = self.measure(lambda: BenchRatesCommand.request(handler, url), iterations // 4)
+                data['status'] = status
+                result['scenarios']['quote_endpoint'] = data
+
+            factory = RequestFactory()
+            order = {
+                'telegram_user_id': BENCH_ID_BASE, 'order_type': 'sell', 'amount': '1000',
+                'full_name': 'Bench User', 'wallet_address': 'TBenchWallet',
+            }
+            for name, payload in (('order_quote', {**order, 'quote': token}), ('order_without_quote', order)):
+                body = json.dumps(payload)
+                # Заявки и уведомления в очереди откатываются вместе с транзакцией
+                with transaction.atomic():
+                    result['scenarios'][name] = self.measure(
+                        lambda: create_exchange_order(factory.post('/api/orders/', body, content_type='application/json')),
+                        options['orders'],
+                    )
+                    transaction.set_rollback(True)
+
+        for name, data in result['scenarios'].items():
+            self.report(name, data)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    @staticmethod
+    def measure(func, count):
+        counter = RateQueryCounter()
+        counter.attach()
+        latencies = []
+        try:
+            for _ in range(count):
+                started = time.perf_counter()
+                func()
+                latencies.append(time.perf_counter() - started)
+        finally:
+            counter.detach()
+        return {
+            'calls': count,
+            'queries_per_call': round(counter.count / count, 3) if count else 0,
+            'rate_queries_per_call': round(counter.rate_count / count, 3) if count else 0,
+            'latency': latency_summary(latencies),
+        }
+
+    def report(self, name, data):
+        latency = data['latency']
+        status = f"{data['status']}, " if 'status' in data else ''
+        self.stdout.write(
+            f"{name:>20}: {status}p50 {latency['p50_ms']} мс, p99 {latency['p99_ms']} мс, "
+            f"запросов к БД {data['queries_per_call']}, из них к курсам {data['rate_queries_per_call']}"
+        )
@@ -0,0 +1,146 @@
+import io
+import json
+import time
+
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.http import JsonResponse
+from django.test import override_settings
+from django.urls import path
+from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.http import require_http_methods
+
+from bot.benchmark import isolated_database, latency_summary, result_header
+from bot.cache import snapshot_cache
+from bot.models import ExchangeRate
+from bot.views import get_exchange_rates
+
+RATES_PATH = '/api/exchange-rates/'
+LEGACY_PATH = '/bench/legacy-exchange-rates/'
+
+# legacy       — прежний обработчик: список словарей и JsonResponse на каждый запрос;
+# snapshot     — готовое тело из снимка справочников (200 с ETag);
+# not_modified — повторный запрос Mini App с If-None-Match (304 без тела)
+SCENARIOS = ('legacy', 'snapshot', 'not_modified')
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def legacy_exchange_rates(request):
+    """Прежняя реализация /api/exchange-rates/ для сравнения"""
+    rates_data = []
+    for rate in snapshot_cache.get_rates():
+        rates_data.append({
+            'currency_from': rate.currency_from,
+            'currency_to': rate.currency_to,
+            'rate': str(rate.rate),
+        })
+    return JsonResponse({'success': True, 'rates': rates_data}, status=200)
+
+
+# URLconf прогона: запросы проходят весь стек middleware проекта, как в gunicorn
+urlpatterns = [
+    path(RATES_PATH.lstrip('/'), get_exchange_rates, name='get_exchange_rates'),
+    path(LEGACY_PATH.lstrip('/'), legacy_exchange_rates),
+]
+
+
+class Command(BaseCommand):
+    help = 'Измерить запросы в секунду /api/exchange-rates/: прежний обработчик, готовый снимок и ответ 304'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=20000, help='Число запросов в каждом сценарии')
+        parser.add_argument('--rates', type=int, default=30, help='Добавить столько тестовых курсов на время прогона')
+        parser.add_argument('--scenario', choices=SCENARIOS, nargs='*', default=list(SCENARIOS), help='Сценарии')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        # Курсы бенчмарка — в отдельной БД: рабочий справочник и клиенты Mini App их не видят
+        with isolated_database():
+            bench_rates = ExchangeRate.objects.bulk_create([
+                ExchangeRate(currency_from=f'B{i:03d}', currency_to='RUB', rate=f'{90 + i}.{i:02d}')
+                for i in range(options['rates'])
+            ])
+            handler = WSGIHandler()
+            result = {
+                **result_header('bench_rates'),
+                'config': {'requests': options['requests'], 'rates': ExchangeRate.objects.filter(is_active=True).count()},
+                'scenarios': {},
+            }
+            snapshot_cache.refresh()
+            with override_settings(ROOT_URLCONF=__name__, ALLOWED_HOSTS=['localhost']):
+                etag = self.request(handler, RATES_PATH)[1].get('ETag')
+                for scenario in options['scenario']:
+                    if scenario == 'legacy':
+                        data = self.run_scenario(handler, LEGACY_PATH, options['requests'])
+                    elif scenario == 'snapshot':
+                        data = self.run_scenario(handler, RATES_PATH, options['requests'])
+                    else:
+                        data = self.run_scenario(handler, RATES_PATH, options['requests'], if_none_match=etag)
+                    result['scenarios'][scenario] = data
+
+        base = result['scenarios'].get('legacy')
+        for scenario, data in result['scenarios'].items():
+            if base and scenario != 'legacy':
+                data['speedup'] = round(data['rps'] / base['rps'], 2)
+            self.report(scenario, data)
+
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    @staticmethod
+    def request(handler, url, if_none_match=None):
+        """Один запрос через WSGIHandler: статус, заголовки, тело"""
+        path, _, query_string = url.partition('?')
+        environ = {
+            'REQUEST_METHOD': 'GET',
+            'PATH_INFO': path,
+            'QUERY_STRING': query_string,
+            'SERVER_NAME': 'localhost',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost',
+            'HTTP_ORIGIN': 'https://web.telegram.org',
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(),
+            'wsgi.errors': io.StringIO(),
+        }
+        if if_none_match:
+            environ['HTTP_IF_NONE_MATCH'] = if_none_match
+        started = {}
+
+        def start_response(status, headers, exc_info=None):
+            started['status'], started['headers'] = status, dict(headers)
+
+        response = handler(environ, start_response)
+        try:
+            body = b''.join(response)
+        finally:
+            response.close()
+        return started['status'], started['headers'], body
+
+    def run_scenario(self, handler, url, count, if_none_match=None):
+        status, _, body = self.request(handler, url, if_none_match)
+        latencies = []
+        started = time.perf_counter()
+        for _ in range(count):
+            request_started = time.perf_counter()
+            self.request(handler, url, if_none_match)
+            latencies.append(time.perf_counter() - request_started)
+        elapsed = time.perf_counter() - started
+        return {
+            'status': status,
+            'body_bytes': len(body),
+            'elapsed_s': round(elapsed, 4),
+            'rps': round(count / elapsed, 1) if elapsed else 0,
+            'latency': latency_summary(latencies),
+        }
+
+    def report(self, scenario, data):
+        speedup = f", x{data['speedup']} к legacy" if 'speedup' in data else ''
+        self.stdout.write(
+            f"{scenario:>12}: {data['status']}, {data['body_bytes']} байт, {data['rps']:.0f} запр/сек, "
+            f"p50 {data['latency']['p50_ms']} мс, p99 {data['latency']['p99_ms']} мс{speedup}"
+        )
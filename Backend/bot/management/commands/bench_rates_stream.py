@@ -0,0 +1,185 @@
+import asyncio
+import json
+import time
+import tracemalloc
+from decimal import Decimal
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.benchmark import isolated_database, latency_summary, result_header
+from bot.cache import snapshot_cache
+from bot.host import current_rss, format_bytes
+from bot.models import ExchangeRate
+from bot.stream import POLL_PATH, STREAM_PATH, RatesHub, RatesStreamApp
+
+BENCH_CURRENCY = 'BSTREAM'
+
+
+class StreamClient:
+    """Клиент SSE без сети: запоминает, когда пришло каждое событие rates"""
+
+    def __init__(self):
+        self.closed = asyncio.Event()
+        self.requested = False
+        self.status = None
+        self.events = []
+
+    async def receive(self):
+        if not self.requested:
+            self.requested = True
+            return {'type': 'http.request', 'body': b'', 'more_body': False}
+        await self.closed.wait()
+        return {'type': 'http.disconnect'}
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+        elif b'event: rates' in message.get('body', b''):
+            self.events.append(time.perf_counter())
+
+
+class PollClient(StreamClient):
+    """Клиент long-poll: после каждого ответа сразу запрашивает снова со своей версией"""
+
+    def __init__(self):
+        super().__init__()
+        self.etag = None
+
+    async def run(self, app):
+        while not self.closed.is_set():
+            self.requested = False
+            headers = [(b'if-none-match', self.etag)] if self.etag else []
+            await app(http_scope(POLL_PATH, headers), self.receive, self.send)
+
+    async def send(self, message):
+        if message['type'] == 'http.response.start':
+            self.status = message['status']
+            etag = dict(message['headers'])[b'etag']
+            if self.etag is not None and etag != self.etag:
+                self.events.append(time.perf_counter())
+            self.etag = etag
+
+
+def http_scope(path, headers=()):
+    return {
+        'type': 'http', 'method': 'GET', 'path': path, 'query_string': b'',
+        'headers': [(b'origin', b'https://web.telegram.org'), *headers],
+    }
+
+
+class Command(BaseCommand):
+    help = (
+        'Поток курсов (bot.stream): память на простаивающее SSE-соединение и время доставки '
+        'изменения курса всем подписчикам одного event loop'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--connections', type=int, default=5000, help='Число SSE-соединений')
+        parser.add_argument('--long-poll', type=int, default=500, help='Число клиентов long-poll')
+        parser.add_argument('--changes', type=int, default=5, help='Сколько раз изменить курс')
+        parser.add_argument('--poll-interval', type=float, default=5.0,
+                            help='Интервал опроса /api/exchange-rates/ без потока (для сравнения нагрузки), сек.')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        if options['changes'] < 1:
+            raise CommandError('--changes должно быть не меньше 1')
+        # Курс бенчмарка меняется в отдельной БД: живой поток курсов его не рассылает
+        with isolated_database():
+            rate = ExchangeRate.objects.create(currency_from=BENCH_CURRENCY, currency_to='RUB', rate=Decimal('100'))
+            snapshot_cache.refresh()
+            data = asyncio.run(self.run(rate, options))
+
+        clients = options['connections'] + options['long_poll']
+        result = {
+            **result_header('bench_rates_stream'),
+            'config': {key: options[key] for key in ('connections', 'long_poll', 'changes', 'poll_interval')},
+            **data,
+            # Та же аудитория без потока: каждый клиент опрашивает курсы раз в poll_interval
+            'polling_rps': round(clients / options['poll_interval'], 1),
+            'stream_db_checks_per_s': round(1 / settings.API_RATES_STREAM_CHECK_INTERVAL, 2),
+        }
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    async def run(self, rate, options):
+        hub = RatesHub()
+        app = RatesStreamApp(None, hub)
+        await hub.start()
+
+        rss = current_rss()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        stream_clients = [StreamClient() for _ in range(options['connections'])]
+        poll_clients = [PollClient() for _ in range(options['long_poll'])]
+        tasks = [asyncio.create_task(app(http_scope(STREAM_PATH), client.receive, client.send))
+                 for client in stream_clients]
+        tasks += [asyncio.create_task(client.run(app)) for client in poll_clients]
+        while hub.subscribers < len(tasks):
+            await asyncio.sleep(0.01)
+        heap = tracemalloc.get_traced_memory()[0] - before
+        tracemalloc.stop()
+        after = current_rss()
+
+        fanout = {'stream': [], 'long_poll': []}
+        try:
+            for change in range(options['changes']):
+                saved = await sync_to_async(self.change_rate)(rate, change)
+                deadline = time.monotonic() + 30
+                clients = stream_clients + poll_clients
+                while any(len(client.events) <= change for client in clients) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.005)
+                for key, group in (('stream', stream_clients), ('long_poll', poll_clients)):
+                    fanout[key] += [client.events[change] - saved for client in group if len(client.events) > change]
+                # Дождаться, пока клиенты long-poll снова встанут в ожидание
+                while hub.subscribers < len(tasks) and time.monotonic() < deadline:
+                    await asyncio.sleep(0.005)
+        finally:
+            for client in stream_clients + poll_clients:
+                client.closed.set()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+        connections = len(tasks)
+        return {
+            'statuses': sorted({client.status for client in stream_clients + poll_clients}, key=str),
+            'python_heap_per_connection_bytes': round(heap / connections) if connections else None,
+            'rss_delta_bytes': after - rss if rss is not None and after is not None else None,
+            'delivered': {key: len(values) for key, values in fanout.items()},
+            'expected': {
+                'stream': len(stream_clients) * options['changes'],
+                'long_poll': len(poll_clients) * options['changes'],
+            },
+            'fanout_latency': {key: latency_summary(values) for key, values in fanout.items()},
+        }
+
+    @staticmethod
+    def change_rate(rate, change):
+        """Изменить курс так же, как админка (save() и сигнал post_save); вернуть момент сохранения"""
+        rate.rate = Decimal('100') + change + 1
+        started = time.perf_counter()
+        rate.save(update_fields=['rate', 'updated_at'])
+        return started
+
+    def report(self, result):
+        self.stdout.write(
+            f"Соединений: {result['config']['connections']} SSE + {result['config']['long_poll']} long-poll; "
+            f"Python heap на соединение {format_bytes(result['python_heap_per_connection_bytes'])}, "
+            f"RSS +{format_bytes(result['rss_delta_bytes'])}"
+        )
+        for key, summary in result['fanout_latency'].items():
+            style = self.style.SUCCESS if result['delivered'][key] == result['expected'][key] else self.style.WARNING
+            self.stdout.write(style(
+                f"{key:>9}: доставлено {result['delivered'][key]}/{result['expected'][key]}, "
+                f"от сохранения курса до клиента p50 {summary['p50_ms']} мс, "
+                f"p99 {summary['p99_ms']} мс, max {summary['max_ms']} мс"
+            ))
+        self.stdout.write(
+            f"Без потока те же клиенты дали бы ~{result['polling_rps']} запр/сек к /api/exchange-rates/ "
+            f"(опрос раз в {result['config']['poll_interval']} сек.); поток — {result['stream_db_checks_per_s']} "
+            f"сверки с БД в секунду на процесс"
+        )
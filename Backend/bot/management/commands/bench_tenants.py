@@ -0,0 +1,115 @@
+import asyncio
+import json
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from bot.benchmark import BENCH_BOT_ID, OfflineBotRequest, isolated_database, result_header, seed_reference_data
+from bot.cache import snapshot_cache
+from bot.host import BotHost, format_bytes
+from bot.models import Branch, BotMessage
+from bot.state import conversation_state
+
+
+class Command(BaseCommand):
+    help = 'Измерить накладные расходы на каждого бота филиала в общем процессе (bot.host)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--tenants', type=int, default=10, help='Число ботов филиалов')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        # Филиалы бенчмарка — в отдельной БД: рабочие филиалы и их боты не затрагиваются.
+        # Без фоновых диспетчеров: их нагрузка не относится к накладным расходам на бота
+        with isolated_database(), override_settings(
+            TELEGRAM_BOT_TOKEN=f'{BENCH_BOT_ID}:bench',
+            BOT_OUTBOX_IN_BOT_PROCESS=False,
+            BOT_BROADCAST_IN_BOT_PROCESS=False,
+            BOT_METRICS_ENABLED=False,
+        ):
+            seed_reference_data()
+            branches = Branch.objects.bulk_create([
+                Branch(name=f'Bench {i}', slug=f'bench-{i}', bot_token=f'{BENCH_BOT_ID + 1 + i}:bench')
+                for i in range(options['tenants'])
+            ])
+            # Переопределение сообщения у каждого филиала: снимок справочников держит их все
+            BotMessage.objects.bulk_create([
+                BotMessage(branch=branch, message_type='about', text=f'О филиале {branch.name}') for branch in branches
+            ])
+            try:
+                snapshot_cache.refresh()
+                host, summary, heap = asyncio.run(self.run_host(branches))
+            finally:
+                conversation_state.close()
+                snapshot_cache.refresh()
+
+        for stats, heap_bytes in zip(host.overhead, heap):
+            stats['python_heap_bytes'] = heap_bytes
+        extra_heap = heap[1:]
+        summary['extra_bot_python_heap_bytes'] = round(sum(extra_heap) / len(extra_heap)) if extra_heap else None
+        bots = summary['bots']
+        if summary['single_bot_rss_bytes'] and summary['extra_bot_rss_bytes'] is not None:
+            # Сколько памяти заняли бы bots отдельных процессов против одного общего
+            summary['separate_processes_rss_bytes'] = summary['single_bot_rss_bytes'] * bots
+            summary['shared_process_rss_bytes'] = (
+                summary['single_bot_rss_bytes'] + summary['extra_bot_rss_bytes'] * (bots - 1)
+            )
+
+        result = {
+            **result_header('bench_tenants'),
+            'config': {'tenants': options['tenants']},
+            'summary': summary,
+            'tenants': host.overhead,
+        }
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    async def run_host(self, branches):
+        """
+        Запустить ботов дважды: без трассировки (время запуска и RSS) и с tracemalloc
+        (прирост Python heap на бота; сама трассировка искажает RSS, поэтому отдельно).
+        Обновления не принимаются: измеряются сборка, initialize() и start() каждого бота.
+        """
+        host = BotHost(branches, include_default=True, polling=False, request=OfflineBotRequest())
+        try:
+            for branch in host.tenants:
+                await host.start_tenant(branch)
+            summary = host.summary()
+        finally:
+            await host.stop()
+
+        traced = BotHost(branches, include_default=True, polling=False, request=OfflineBotRequest())
+        heap = []
+        tracemalloc.start()
+        try:
+            for branch in traced.tenants:
+                before = tracemalloc.get_traced_memory()[0]
+                await traced.start_tenant(branch)
+                heap.append(tracemalloc.get_traced_memory()[0] - before)
+        finally:
+            tracemalloc.stop()
+            await traced.stop()
+        return host, summary, heap
+
+    def report(self, result):
+        summary = result['summary']
+        for stats in result['tenants']:
+            self.stdout.write(
+                f"{stats['tenant']:>10}: запуск {stats['startup_s'] * 1000:7.1f} мс, "
+                f"RSS +{format_bytes(stats['rss_delta_bytes'])}, Python heap +{format_bytes(stats['python_heap_bytes'])}"
+            )
+        self.stdout.write(
+            f"Ботов: {summary['bots']}; процесс с одним ботом — {format_bytes(summary['single_bot_rss_bytes'])}, "
+            f"каждый следующий бот — +{format_bytes(summary['extra_bot_rss_bytes'])} RSS "
+            f"(+{format_bytes(summary['extra_bot_python_heap_bytes'])} Python heap), "
+            f"запуск {summary['extra_bot_startup_s']} сек."
+        )
+        if 'separate_processes_rss_bytes' in summary:
+            self.stdout.write(
+                f"Отдельные процессы: ~{format_bytes(summary['separate_processes_rss_bytes'])}, "
+                f"общий процесс: ~{format_bytes(summary['shared_process_rss_bytes'])}"
+            )
@@ -0,0 +1,101 @@
+import asyncio
+import json
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from bot.benchmark import (
+    OfflineBotRequest, isolated_database, latency_summary, parse_mix, replay_updates, result_header,
+    seed_reference_data, synthetic_stream,
+)
+from bot.cache import snapshot_cache
+from bot.state import conversation_state
+from bot.users import profile_cache
+
+
+class Command(BaseCommand):
+    help = 'Прогнать поток обновлений через обработчики бота с заглушкой Bot API и измерить пропускную способность'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--updates', type=int, default=5000, help='Число синтетических обновлений')
+        parser.add_argument('--users', type=int, default=500, help='Число различных пользователей')
+        parser.add_argument('--mix', default='', help='Доли видов обновлений, например menu=70,country=12,contact=10,start=8')
+        parser.add_argument('--seed', type=int, default=0, help='Зерно генератора синтетического потока')
+        parser.add_argument('--input', help='Файл JSON Lines с записанными обновлениями (вместо синтетических)')
+        parser.add_argument('--save-stream', help='Сохранить поток обновлений в файл JSON Lines')
+        parser.add_argument('--concurrency', type=int, help='BOT_CONCURRENT_UPDATES на время прогона')
+        parser.add_argument('--api-latency', type=float, default=0.0, help='Задержка ответа заглушки Bot API, мс')
+        parser.add_argument('--timeout', type=float, default=600, help='Предельное время прогона, сек.')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        raw_updates = self.load_stream(options)
+        if not raw_updates:
+            raise CommandError('Поток обновлений пуст')
+        if options['save_stream']:
+            with open(options['save_stream'], 'w', encoding='utf-8') as f:
+                f.writelines(json.dumps(data, ensure_ascii=False) + '\n' for data in raw_updates)
+
+        concurrency = options['concurrency'] or settings.BOT_CONCURRENT_UPDATES
+        request = OfflineBotRequest(latency=options['api_latency'] / 1000)
+
+        # Тестовый токен и отдельная БД: реальный бот, его пользователи и очередь уведомлений не затрагиваются
+        with isolated_database(), override_settings(
+            TELEGRAM_BOT_TOKEN='1:bench',
+            BOT_CONCURRENT_UPDATES=concurrency,
+        ):
+            try:
+                seed_reference_data()
+                snapshot_cache.refresh()
+                profile_cache.clear()
+                elapsed, latencies, queries = asyncio.run(replay_updates(raw_updates, request, options['timeout']))
+            finally:
+                conversation_state.close()
+                profile_cache.clear()
+
+        all_latencies = [value for values in latencies.values() for value in values]
+        result = {
+            **result_header('bench_updates'),
+            'config': {
+                'updates': len(raw_updates),
+                'users': len({data['message']['from']['id'] for data in raw_updates if 'message' in data}),
+                'source': options['input'] or 'synthetic',
+                'concurrency': concurrency,
+                'api_latency_ms': options['api_latency'],
+                'database': settings.DATABASES['default']['ENGINE'].rsplit('.', 1)[-1],
+            },
+            'elapsed_s': round(elapsed, 3),
+            'throughput_ups': round(len(all_latencies) / elapsed, 1) if elapsed else 0,
+            'db_queries': queries.count,
+            'db_queries_per_update': round(queries.count / len(raw_updates), 3),
+            'api_calls_per_update': round(request.calls / len(raw_updates), 3),
+            'latency': {
+                'all': latency_summary(all_latencies),
+                **{kind: latency_summary(values) for kind, values in sorted(latencies.items())},
+            },
+        }
+        self.report(result)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    def load_stream(self, options):
+        if options['input']:
+            with open(options['input'], encoding='utf-8') as f:
+                return [json.loads(line) for line in f if line.strip()]
+        mix = parse_mix(options['mix']) if options['mix'] else None
+        return synthetic_stream(options['updates'], options['users'], mix, options['seed'])
+
+    def report(self, result):
+        self.stdout.write(
+            f"Обновлений: {result['config']['updates']}, за {result['elapsed_s']} сек. — "
+            f"{result['throughput_ups']} обн/сек; запросов к БД на обновление: {result['db_queries_per_update']}, "
+            f"вызовов Bot API: {result['api_calls_per_update']}"
+        )
+        for kind, summary in result['latency'].items():
+            self.stdout.write(
+                f"{kind:>8}: {summary['count']:6d}  p50 {summary['p50_ms']:8.2f} мс  "
+                f"p95 {summary['p95_ms']:8.2f} мс  p99 {summary['p99_ms']:8.2f} мс"
+            )
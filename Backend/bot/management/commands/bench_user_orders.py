@@ -0,0 +1,191 @@
+import contextlib
+import json
+import random
+import time
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Q
+from django.http import JsonResponse
+from django.test import RequestFactory
+
+from bot.benchmark import BENCH_ID_BASE, QueryCounter, isolated_database, latency_summary, result_header
+from bot.models import ExchangeOrder
+from bot.views import ORDER_FIELDS, decode_order_cursor, get_user_orders
+
+HEAVY_USER_ID = BENCH_ID_BASE
+BATCH_SIZE = 5000
+USER_RECENT_INDEX = 'bot_order_user_recent_idx'
+
+
+def legacy_user_orders(request):
+    """Прежняя реализация /api/orders/user/: все заявки пользователя экземплярами модели"""
+    orders = ExchangeOrder.objects.filter(telegram_user_id=int(request.GET['telegram_user_id'])).order_by('-created_at')
+    orders_data = []
+    for order in orders:
+        orders_data.append({
+            'id': order.id,
+            'order_type': order.order_type,
+            'order_type_display': order.get_order_type_display(),
+            'amount': str(order.amount),
+            'exchange_rate': str(order.exchange_rate),
+            'amount_to_receive': str(order.amount_to_receive),
+            'full_name': order.full_name,
+            'wallet_address': order.wallet_address,
+            'status': order.status,
+            'status_display': order.get_status_display(),
+            'created_at': order.created_at.isoformat(),
+            'updated_at': order.updated_at.isoformat(),
+        })
+    return JsonResponse({'success': True, 'orders': orders_data}, status=200)
+
+
+class Command(BaseCommand):
+    help = (
+        'Измерить /api/orders/user/ для пользователя с большим числом заявок: прежняя выдача целиком '
+        'и страницы по курсору с индексом bot_order_user_recent_idx и без него'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--orders', type=int, default=100_000, help='Заявок у одного пользователя')
+        parser.add_argument('--other-orders', type=int, default=100_000, help='Заявок остальных пользователей')
+        parser.add_argument('--other-users', type=int, default=10_000, help='Число остальных пользователей')
+        parser.add_argument('--pages', type=int, default=200, help='Запросов страниц в каждом сценарии')
+        parser.add_argument('--limit', type=int, default=20, help='Размер страницы')
+        parser.add_argument('--output', help='Сохранить результат в JSON для сравнения между коммитами')
+
+    def handle(self, *args, **options):
+        # Заявки и индекс бенчмарка — в отдельной БД: рабочая таблица заявок не меняется
+        with isolated_database():
+            self.stdout.write(f"Создание {options['orders'] + options['other_orders']} тестовых заявок...")
+            self.create_orders(options)
+            factory = RequestFactory()
+            result = {
+                **result_header('bench_user_orders'),
+                'config': {key: options[key] for key in ('orders', 'other_orders', 'other_users', 'pages', 'limit')},
+                'scenarios': {},
+            }
+            result['scenarios']['legacy_full'] = self.measure(
+                legacy_user_orders, factory, [{'telegram_user_id': HEAVY_USER_ID}] * 3
+            )
+            cursors = self.collect_cursors(factory, options)
+            for indexed in (False, True):
+                suffix = 'indexed' if indexed else 'no_index'
+                with self.user_recent_index(indexed):
+                    plan = self.query_plan(cursors[-1], options)
+                    for scenario, requests in self.page_requests(cursors, options).items():
+                        data = self.measure(get_user_orders, factory, requests)
+                        data['query_plan'] = plan if scenario == 'deep_page' else None
+                        result['scenarios'][f'{scenario}_{suffix}'] = data
+
+        for scenario, data in result['scenarios'].items():
+            self.report(scenario, data)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as f:
+                json.dump(result, f, ensure_ascii=False, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Результат сохранен в {options['output']}"))
+
+    @staticmethod
+    def create_orders(options):
+        rng = random.Random(0)
+        statuses = [status for status, _ in ExchangeOrder.STATUS_CHOICES]
+
+        def order(user_id):
+            return ExchangeOrder(
+                telegram_user_id=user_id,
+                order_type=rng.choice(('buy', 'sell')),
+                amount=Decimal(rng.randint(100, 100_000)),
+                exchange_rate=Decimal('92.5000'),
+                amount_to_receive=Decimal(rng.randint(1, 1000)),
+                full_name='Bench User',
+                wallet_address='TBenchWallet0000000000000000000000',
+                status=rng.choice(statuses),
+            )
+
+        # Заявки остальных пользователей перемешаны с заявками тяжелого пользователя
+        owners = [HEAVY_USER_ID] * options['orders'] + [
+            HEAVY_USER_ID + 1 + rng.randrange(options['other_users']) for _ in range(options['other_orders'])
+        ]
+        rng.shuffle(owners)
+        for start in range(0, len(owners), BATCH_SIZE):
+            ExchangeOrder.objects.bulk_create([order(user_id) for user_id in owners[start:start + BATCH_SIZE]])
+
+    @staticmethod
+    def collect_cursors(factory, options):
+        """Пройти все страницы тяжелого пользователя и запомнить курсоры"""
+        cursors, cursor = [], None
+        while True:
+            params = {'telegram_user_id': HEAVY_USER_ID, 'limit': 100}
+            if cursor:
+                params['cursor'] = cursor
+            data = json.loads(get_user_orders(factory.get('/api/orders/user/', params)).content)
+            cursor = data['next_cursor']
+            if not cursor:
+                return cursors
+            cursors.append(cursor)
+
+    @staticmethod
+    def page_requests(cursors, options):
+        base = {'telegram_user_id': HEAVY_USER_ID, 'limit': options['limit']}
+        pages = options['pages']
+        return {
+            'first_page': [base] * pages,
+            'first_page_status': [{**base, 'status': 'cancelled'}] * pages,
+            # Страницы из второй половины выдачи: прежний OFFSET здесь читал бы десятки тысяч строк
+            'deep_page': [{**base, 'cursor': cursors[len(cursors) // 2 + i % (len(cursors) // 2)]} for i in range(pages)],
+        }
+
+    @contextlib.contextmanager
+    def user_recent_index(self, enabled):
+        """Выполнить блок с индексом bot_order_user_recent_idx (enabled) или временно без него"""
+        index = next(index for index in ExchangeOrder._meta.indexes if index.name == USER_RECENT_INDEX)
+        if enabled:
+            yield
+            return
+        with connection.schema_editor() as editor:
+            editor.remove_index(ExchangeOrder, index)
+        try:
+            yield
+        finally:
+            with connection.schema_editor() as editor:
+                editor.add_index(ExchangeOrder, index)
+
+    @staticmethod
+    def query_plan(cursor, options):
+        created_at, order_id = decode_order_cursor(cursor)
+        queryset = ExchangeOrder.objects.filter(
+            Q(created_at__lt=created_at) | Q(id__lt=order_id),
+            telegram_user_id=HEAVY_USER_ID, created_at__lte=created_at,
+        ).order_by('-created_at', '-id').values(*ORDER_FIELDS)[:options['limit'] + 1]
+        return queryset.explain()
+
+    @staticmethod
+    def measure(view, factory, requests):
+        latencies, sizes = [], []
+        counter = QueryCounter()
+        counter.attach()
+        try:
+            for params in requests:
+                request = factory.get('/api/orders/user/', params)
+                started = time.perf_counter()
+                response = view(request)
+                latencies.append(time.perf_counter() - started)
+                sizes.append(len(response.content))
+        finally:
+            counter.detach()
+        return {
+            'requests': len(requests),
+            'response_bytes': round(sum(sizes) / len(sizes)),
+            'queries_per_request': round(counter.count / len(requests), 2),
+            'latency': latency_summary(latencies),
+        }
+
+    def report(self, scenario, data):
+        latency = data['latency']
+        self.stdout.write(
+            f"{scenario:>26}: p50 {latency['p50_ms']} мс, p99 {latency['p99_ms']} мс, "
+            f"ответ {data['response_bytes']} байт, запросов к БД {data['queries_per_request']}"
+        )
+        if data.get('query_plan'):
+            self.stdout.write(f"{'':>28}план: {' / '.join(data['query_plan'].splitlines())}")
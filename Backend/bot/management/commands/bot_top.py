@@ -0,0 +1,147 @@
+import json
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from bot.metrics import histogram_percentile
+
+CLEAR_SCREEN = '\033[H\033[2J'
+SORT_KEYS = ('calls', 'p95', 'p99', 'errors')
+
+
+class Command(BaseCommand):
+    help = 'Живая сводка метрик процесса бота (по файлу BOT_METRICS_PATH), как top'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', help='Файл метрик (по умолчанию BOT_METRICS_PATH)')
+        parser.add_argument('--interval', type=float, help='Период обновления экрана, сек. (по умолчанию BOT_METRICS_INTERVAL)')
+        parser.add_argument('--sort', choices=SORT_KEYS, default='p95', help='Сортировка обработчиков и методов')
+        parser.add_argument('--cumulative', action='store_true', help='Показывать итог с запуска бота, а не за последний интервал')
+        parser.add_argument('--once', action='store_true', help='Вывести сводку один раз и выйти')
+
+    def handle(self, *args, **options):
+        path = options['path'] or settings.BOT_METRICS_PATH
+        interval = options['interval'] or settings.BOT_METRICS_INTERVAL
+        previous = None
+        try:
+            while True:
+                current = self.load(path)
+                if current is None and options['once']:
+                    raise CommandError(f'Файл метрик {path} не найден или поврежден: бот запущен с BOT_METRICS_ENABLED?')
+                if current is not None:
+                    same_process = previous is not None and previous['started_at'] == current['started_at']
+                    base = None if options['cumulative'] or not same_process else previous
+                    screen = self.render(current, base, options['sort'])
+                    if options['once'] or not self.stdout.isatty():
+                        self.stdout.write(screen)
+                    else:
+                        self.stdout.write(CLEAR_SCREEN + screen)
+                    if options['once']:
+                        return
+                    if base is None or current['exported_at'] != previous['exported_at']:
+                        previous = current
+                else:
+                    self.stdout.write(f'Ожидание файла метрик {path}...')
+                time.sleep(interval)
+        except KeyboardInterrupt:
+            pass
+
+    @staticmethod
+    def load(path):
+        try:
+            with open(path, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    @staticmethod
+    def delta(current, base, key, name=None):
+        """Гистограмма за интервал между снимками (или с запуска, если base нет)"""
+        data = current[key] if name is None else current[key].get(name)
+        if data is None:
+            return None
+        old = base and (base[key] if name is None else base[key].get(name))
+        if not old:
+            return dict(data)
+        return {
+            'count': data['count'] - old['count'],
+            'sum': data['sum'] - old['sum'],
+            'max': data['max'],
+            'buckets': [new - prev for new, prev in zip(data['buckets'], old['buckets'])],
+        }
+
+    @staticmethod
+    def summary(data, bounds, seconds):
+        count = data['count']
+        return {
+            'count': count,
+            'rate': count / seconds if seconds > 0 else 0.0,
+            'avg': data['sum'] / count if count else 0.0,
+            'p50': histogram_percentile(bounds, data['buckets'], 0.50, data['max']),
+            'p95': histogram_percentile(bounds, data['buckets'], 0.95, data['max']),
+            'p99': histogram_percentile(bounds, data['buckets'], 0.99, data['max']),
+            'max': data['max'],
+        }
+
+    def render(self, current, base, sort):
+        bounds = current['bounds_ms']
+        seconds = current['exported_at'] - (base['exported_at'] if base else current['started_at'])
+        uptime = int(current['exported_at'] - current['started_at'])
+        age = time.time() - current['exported_at']
+        lines = [
+            f"Бот pid {current['pid']}, работает {uptime // 3600:02d}:{uptime % 3600 // 60:02d}:{uptime % 60:02d}, "
+            f"снимок {age:.0f} сек. назад, {'за интервал ' + format(seconds, '.0f') + ' сек.' if base else 'с запуска'}",
+        ]
+
+        updates = self.summary(self.delta(current, base, 'updates'), bounds, seconds)
+        queries = self.summary(self.delta(current, base, 'update_queries'), current['query_bounds'], seconds)
+        db = self.summary(self.delta(current, base, 'update_db_ms'), bounds, seconds)
+        api = self.summary(self.delta(current, base, 'update_api_ms'), bounds, seconds)
+        lag = current['loop_lag_ms']
+        lag_window = self.summary(self.delta(current, base, 'loop_lag_ms'), bounds, seconds)
+        lines += [
+            f"Обновления: {updates['rate']:.1f}/сек, p50 {updates['p50']:.1f} мс, p95 {updates['p95']:.1f} мс, "
+            f"p99 {updates['p99']:.1f} мс",
+            f"На обновление: SQL-запросов ср. {queries['avg']:.2f} (p95 {queries['p95']:g}), "
+            f"время БД ср. {db['avg']:.2f} мс, Bot API ср. {api['avg']:.2f} мс",
+            f"Event loop: задержка {lag['last']:.1f} мс, p99 {lag_window['p99']:.1f} мс, макс. {lag['max']:.1f} мс",
+            '',
+        ]
+
+        errors = self.error_counts(current, base, 'handler_errors')
+        lines += self.table('ОБРАБОТЧИК', current, base, 'handlers', errors, bounds, seconds, sort)
+        lines.append('')
+        api_errors = self.error_counts(current, base, 'api_errors')
+        method_errors = {}
+        for key, count in api_errors.items():
+            method = key.split(':', 1)[0]
+            method_errors[method] = method_errors.get(method, 0) + count
+        lines += self.table('МЕТОД BOT API', current, base, 'api', method_errors, bounds, seconds, sort)
+        if api_errors:
+            lines.append('Ошибки Bot API: ' + ', '.join(f'{key} — {count}' for key, count in sorted(api_errors.items())))
+        return '\n'.join(lines)
+
+    @staticmethod
+    def error_counts(current, base, key):
+        old = base[key] if base else {}
+        return {name: count - old.get(name, 0) for name, count in current[key].items() if count - old.get(name, 0)}
+
+    def table(self, title, current, base, key, errors, bounds, seconds, sort):
+        rows = []
+        for name in current[key]:
+            row = self.summary(self.delta(current, base, key, name), bounds, seconds)
+            row['name'] = name
+            row['errors'] = errors.get(name, 0)
+            rows.append(row)
+        rows.sort(key=lambda row: row['count' if sort == 'calls' else sort], reverse=True)
+        lines = [
+            f"{title:<32} {'В СЕК.':>8} {'ВЫЗОВОВ':>9} {'P50 МС':>8} {'P95 МС':>8} {'P99 МС':>8} "
+            f"{'МАКС. МС':>9} {'ОШИБОК':>7}"
+        ]
+        for row in rows:
+            lines.append(
+                f"{row['name'][:32]:<32} {row['rate']:>8.1f} {row['count']:>9d} {row['p50']:>8.1f} "
+                f"{row['p95']:>8.1f} {row['p99']:>8.1f} {row['max']:>9.1f} {row['errors']:>7d}"
+            )
+        return lines
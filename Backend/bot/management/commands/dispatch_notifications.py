@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+from bot.clients import bot_clients
+from bot.outbox import OutboxDispatcher, dispatch_batch
+
+
+class Command(BaseCommand):
+    help = 'Отправить уведомления администраторам из очереди'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--once', action='store_true', help='Разобрать очередь один раз и завершиться')
+        parser.add_argument('--batch-size', type=int, help='Размер пачки (по умолчанию BOT_OUTBOX_BATCH_SIZE)')
+
+    def handle(self, *args, **options):
+        batch_size = options.get('batch_size')
+        if options['once']:
+            total = 0
+            while True:
+                processed = bot_clients.run_sync(dispatch_batch(batch_size))
+                if not processed:
+                    break
+                total += processed
+            self.stdout.write(self.style.SUCCESS(f'Обработано уведомлений: {total}'))
+            return
+
+        self.stdout.write(self.style.SUCCESS('Диспетчер очереди уведомлений запущен'))
+        dispatcher = OutboxDispatcher(batch_size=batch_size)
+        try:
+            bot_clients.run_sync(dispatcher.run())
+        except KeyboardInterrupt:
+            dispatcher.stop()
+            self.stdout.write(self.style.WARNING('Диспетчер остановлен пользователем'))
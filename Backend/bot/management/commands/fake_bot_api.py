@@ -0,0 +1,58 @@
+import asyncio
+
+from django.core.management.base import BaseCommand
+
+from bot.fakeapi import FakeBotAPI
+
+
+def add_fake_api_arguments(parser):
+    """Параметры локального Bot API, общие для fake_bot_api и bench_delivery"""
+    parser.add_argument('--latency', type=float, default=0.0, help='Задержка ответа, мс')
+    parser.add_argument('--jitter', type=float, default=0.0, help='Случайная добавка к задержке, мс')
+    parser.add_argument('--global-rate', type=float, default=30.0, help='Сообщений в секунду на токен (0 — без лимита)')
+    parser.add_argument('--per-chat-interval', type=float, default=1.0, help='Интервал между сообщениями в один чат, сек. (0 — без лимита)')
+    parser.add_argument('--retry-after', type=int, default=1, help='retry_after в ответах 429, сек.')
+    parser.add_argument('--inject-429', type=float, default=0.0, help='Доля sendMessage со случайным ответом 429')
+    parser.add_argument('--blocked-ratio', type=float, default=0.0, help='Доля чатов, заблокировавших бота')
+    parser.add_argument('--blocked', type=int, nargs='*', default=[], help='chat_id, заблокировавшие бота')
+    parser.add_argument('--seed', type=int, default=0, help='Зерно генератора случайных ошибок')
+
+
+def fake_api_from_options(options, host='127.0.0.1', port=0):
+    return FakeBotAPI(
+        host=host,
+        port=port,
+        latency=options['latency'] / 1000,
+        jitter=options['jitter'] / 1000,
+        global_rate=options['global_rate'],
+        per_chat_interval=options['per_chat_interval'],
+        retry_after=options['retry_after'],
+        inject_429=options['inject_429'],
+        blocked_chat_ids=options['blocked'],
+        blocked_ratio=options['blocked_ratio'],
+        seed=options['seed'],
+    )
+
+
+class Command(BaseCommand):
+    help = 'Запустить локальный сервер Bot API для нагрузочных тестов доставки'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1', help='Адрес для прослушивания')
+        parser.add_argument('--port', type=int, default=8081, help='Порт')
+        add_fake_api_arguments(parser)
+
+    def handle(self, *args, **options):
+        server = fake_api_from_options(options, options['host'], options['port'])
+
+        async def _serve():
+            await server.start()
+            self.stdout.write(self.style.SUCCESS(f'Локальный Bot API запущен: {server.url}'))
+            self.stdout.write(f'Для бота и уведомлений: TELEGRAM_API_BASE_URL={server.url}')
+            self.stdout.write(f'Статистика: {server.url}/stats')
+            await asyncio.Event().wait()
+
+        try:
+            asyncio.run(_serve())
+        except KeyboardInterrupt:
+            self.stdout.write(self.style.WARNING(f'Сервер остановлен: {server.snapshot()}'))
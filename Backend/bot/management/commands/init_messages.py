@@ -55,6 +55,7 @@ class Command(BaseCommand):
         for msg_data in messages_data:
             message, created = BotMessage.objects.get_or_create(
                 message_type=msg_data['message_type'],
+                branch=None,
                 defaults={'text': msg_data['text']}
             )
             if not created:
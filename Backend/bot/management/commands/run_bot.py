@@ -1,14 +1,37 @@
+from django.conf import settings
 from django.core.management.base import BaseCommand
 from bot.bot import run_polling
+from bot.host import run_host
+from bot.leader import run_leader_elected
 
 
 class Command(BaseCommand):
     help = 'Запустить Telegram бота'
 
+    def add_arguments(self, parser):
+        parser.add_argument('--multi', action='store_true', help='Основной бот и боты филиалов в одном процессе (BOT_MULTI_TENANT)')
+        parser.add_argument('--branch', action='append', dest='branches', help='Запустить только ботов этих филиалов (код филиала)')
+        parser.add_argument('--standby', action='store_true', help='Горячий резерв: polling ведет узел с арендой в БД (BOT_LEADER_ELECTION)')
+
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('Запуск Telegram бота...'))
+        if settings.TELEGRAM_BOT_MODE == 'webhook':
+            self.stdout.write(self.style.WARNING(
+                'TELEGRAM_BOT_MODE=webhook: бот обслуживается ASGI-сервером (config.asgi), polling не запускается'
+            ))
+            return
+        multi = options['multi'] or options['branches'] or settings.BOT_MULTI_TENANT
+        standby = options['standby'] or settings.BOT_LEADER_ELECTION
+        if multi and standby:
+            self.stdout.write(self.style.ERROR('Горячий резерв пока поддерживается только для основного бота, без --multi'))
+            return
+        self.stdout.write(self.style.SUCCESS('Запуск ботов филиалов...' if multi else 'Запуск Telegram бота...'))
         try:
-            run_polling()
+            if multi:
+                run_host(options['branches'])
+            elif standby:
+                run_leader_elected()
+            else:
+                run_polling()
         except KeyboardInterrupt:
             self.stdout.write(self.style.WARNING('Бот остановлен пользователем'))
         except Exception as e:
@@ -0,0 +1,16 @@
+from django.core.management.base import BaseCommand
+from bot.broadcast import BroadcastRunner
+from bot.clients import bot_clients
+
+
+class Command(BaseCommand):
+    help = 'Выполнять задания на рассылку из очереди'
+
+    def handle(self, *args, **options):
+        self.stdout.write(self.style.SUCCESS('Исполнитель рассылок запущен'))
+        runner = BroadcastRunner()
+        try:
+            bot_clients.run_sync(runner.run())
+        except KeyboardInterrupt:
+            runner.stop()
+            self.stdout.write(self.style.WARNING('Исполнитель остановлен пользователем'))
@@ -1,6 +1,6 @@
 from django.core.management.base import BaseCommand
-from bot.models import TelegramUser
-from bot.bot import send_broadcast_message
+from bot.broadcast import create_job, claim_job, run_job
+from bot.clients import bot_clients
 
 
 class Command(BaseCommand):
@@ -11,25 +11,27 @@ class Command(BaseCommand):
 
     def handle(self, *args, **options):
         message = options['message']
-        users = TelegramUser.objects.all()
-        count = users.count()
+        job = create_job(message)
         
-        self.stdout.write(f'Отправка сообщения {count} пользователям...')
+        self.stdout.write(f'Рассылка #{job.pk}: отправка сообщения {job.total_count} пользователям...')
         
-        success_count = 0
-        error_count = 0
+        job = claim_job(job.pk)
+        if job is None:
+            self.stdout.write(self.style.WARNING('Рассылка уже выполняется другим процессом'))
+            return
         
-        for user in users:
-            try:
-                send_broadcast_message(user.telegram_id, message)
-                success_count += 1
-            except Exception as e:
-                error_count += 1
-                self.stdout.write(self.style.ERROR(f'Ошибка отправки пользователю {user.telegram_id}: {e}'))
+        def on_progress(job):
+            eta = job.get_eta_seconds()
+            self.stdout.write(
+                f'  {job.get_progress()}% — отправлено {job.sent_count}, ошибок {job.failed_count}, '
+                f'заблокировали бота {job.blocked_count}' + (f', осталось ~{eta} сек.' if eta is not None else '')
+            )
+        
+        job = bot_clients.run_sync(run_job(job, on_progress=on_progress))
         
         self.stdout.write(
             self.style.SUCCESS(
-                f'Отправлено успешно: {success_count}, Ошибок: {error_count}'
+                f'Отправлено успешно: {job.sent_count}, Ошибок: {job.failed_count}, '
+                f'Заблокировали бота: {job.blocked_count}'
             )
         )
-
@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from bot.models import Cityex24Transfer
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+class Command(BaseCommand):
+    help = 'Удаляет брошенные черновики заявок Cityex24 (страна выбрана, контакт не получен)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--older-than', type=int, default=24, help='Возраст черновика в часах (по умолчанию 24)')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Сколько строк удалять за один запрос')
+        parser.add_argument('--dry-run', action='store_true', help='Только посчитать черновики')
+
+    def handle(self, *args, **options):
+        # Раньше бот создавал заявку при выборе страны; без контакта она так и оставалась пустой
+        cutoff = timezone.now() - timedelta(hours=options['older_than'])
+        drafts = Cityex24Transfer.objects.filter(
+            Q(contact_phone__isnull=True) | Q(contact_phone=''),
+            status='new',
+            created_at__lt=cutoff,
+        )
+
+        if options['dry_run']:
+            self.stdout.write(f'Брошенных черновиков: {drafts.count()}')
+            return
+
+        deleted = 0
+        while True:
+            # Удаляем пачками, чтобы не держать долгую блокировку таблицы
+            ids = list(drafts.values_list('pk', flat=True)[:options['batch_size']])
+            if not ids:
+                break
+            deleted += Cityex24Transfer.objects.filter(pk__in=ids).delete()[0]
+
+        if deleted:
+            self.stdout.write(self.style.SUCCESS(f'Удалено брошенных черновиков заявок Cityex24: {deleted}'))
+            logger.info('Удалено брошенных черновиков заявок Cityex24: %s', deleted)
+        else:
+            self.stdout.write(self.style.SUCCESS('Нет брошенных черновиков'))
@@ -1,7 +1,7 @@
 from django.core.management.base import BaseCommand
 from bot.models import AdminChat, Cityex24Transfer
 from bot.bot import send_notification_to_admin
-import asyncio
+from bot.clients import bot_clients
 
 
 class Command(BaseCommand):
@@ -49,7 +49,7 @@ class Command(BaseCommand):
         
         # Отправляем уведомление
         try:
-            asyncio.run(send_notification_to_admin(transfer))
+            bot_clients.run_sync(send_notification_to_admin(transfer))
             self.stdout.write(self.style.SUCCESS('Уведомление отправлено! Проверьте логи для деталей.'))
         except Exception as e:
             self.stdout.write(self.style.ERROR(f'Ошибка при отправке: {e}'))
@@ -0,0 +1,42 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from telegram import Update
+from bot.clients import bot_clients, get_main_bot
+
+
+class Command(BaseCommand):
+    help = 'Управление webhook Telegram бота (set / delete / info)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('action', choices=['set', 'delete', 'info'], help='Действие с webhook')
+        parser.add_argument('--url', type=str, help='Публичный адрес сервера (по умолчанию TELEGRAM_WEBHOOK_URL)')
+        parser.add_argument('--drop-pending', action='store_true', help='Удалить накопившиеся обновления')
+
+    def handle(self, *args, **options):
+        if not settings.TELEGRAM_BOT_TOKEN:
+            raise CommandError('TELEGRAM_BOT_TOKEN не установлен в настройках')
+
+        action = options['action']
+        if action == 'set':
+            base_url = (options.get('url') or settings.TELEGRAM_WEBHOOK_URL).rstrip('/')
+            if not base_url:
+                raise CommandError('Укажите --url или TELEGRAM_WEBHOOK_URL')
+            if not settings.TELEGRAM_WEBHOOK_SECRET:
+                raise CommandError('TELEGRAM_WEBHOOK_SECRET не установлен в настройках')
+            url = f'{base_url}{settings.TELEGRAM_WEBHOOK_PATH}'
+            bot_clients.run_sync(self._call('set_webhook', url=url, secret_token=settings.TELEGRAM_WEBHOOK_SECRET,
+                                   allowed_updates=Update.ALL_TYPES, drop_pending_updates=options['drop_pending']))
+            self.stdout.write(self.style.SUCCESS(f'Webhook установлен: {url}'))
+        elif action == 'delete':
+            bot_clients.run_sync(self._call('delete_webhook', drop_pending_updates=options['drop_pending']))
+            self.stdout.write(self.style.SUCCESS('Webhook удален, бот можно запускать в режиме polling'))
+        else:
+            info = bot_clients.run_sync(self._call('get_webhook_info'))
+            self.stdout.write(f'URL: {info.url or "не установлен"}')
+            self.stdout.write(f'Ожидает обработки: {info.pending_update_count}')
+            if info.last_error_message:
+                self.stdout.write(self.style.WARNING(f'Последняя ошибка: {info.last_error_message}'))
+
+    async def _call(self, method, **kwargs):
+        bot = await get_main_bot()
+        return await getattr(bot, method)(**kwargs)
@@ -0,0 +1,139 @@
+import logging
+
+from telegram import ReplyKeyboardMarkup, KeyboardButton
+
+from bot.cache import snapshot_cache, NOT_CONFIGURED
+from bot.metrics import instrumented
+from bot.models import Cityex24Transfer
+
+logger = logging.getLogger(__name__)
+
+# Клавиатуры неизменяемы, поэтому собираются один раз при импорте
+MAIN_KEYBOARD = ReplyKeyboardMarkup([
+    [
+        KeyboardButton("О нас"),
+        KeyboardButton("Курсы"),
+    ],
+    [
+        KeyboardButton("AML Проверка"),
+        KeyboardButton("Связаться с нами"),
+    ],
+    [
+        KeyboardButton("Как нас найти"),
+    ],
+    [
+        KeyboardButton("Международные переводы Cityex24"),
+    ],
+], resize_keyboard=True)
+
+COUNTRIES_KEYBOARD = ReplyKeyboardMarkup([
+    [
+        KeyboardButton("🇰🇬 Кыргызстан"),
+        KeyboardButton("🇺🇿 Узбекистан"),
+    ],
+    [
+        KeyboardButton("🇦🇪 ОАЭ"),
+        KeyboardButton("🇹🇷 Турция"),
+    ],
+    [
+        KeyboardButton("🇸🇦 Саудовская Аравия"),
+    ],
+], resize_keyboard=True)
+
+CONTACT_KEYBOARD = ReplyKeyboardMarkup([
+    [
+        KeyboardButton("Поделиться контактом", request_contact=True),
+    ],
+], resize_keyboard=True, one_time_keyboard=True)
+
+# Подпись кнопки страны -> код страны в Cityex24Transfer
+COUNTRY_CODES = {label: code for code, label in Cityex24Transfer.COUNTRY_CHOICES}
+
+# Кнопка -> (тип сообщения BotMessage, текст по умолчанию, клавиатура ответа)
+STATIC_SECTIONS = {
+    "О нас": ('about', "Информация о нас скоро будет добавлена.", MAIN_KEYBOARD),
+    "AML Проверка": ('aml', "Информация об AML проверке скоро будет добавлена.", MAIN_KEYBOARD),
+    "Связаться с нами": ('contact', "Контактная информация скоро будет добавлена.", MAIN_KEYBOARD),
+    "Как нас найти": ('location', "Информация о местоположении скоро будет добавлена.", MAIN_KEYBOARD),
+    "Международные переводы Cityex24": (
+        'cityex24_question',
+        "В какую страну нужно перевести деньги? По международным переводам работаем с 08:00 до 20:00 по МСК",
+        COUNTRIES_KEYBOARD,
+    ),
+}
+
+COURSES_BUTTON = "Курсы"
+
+
+def render_courses(snapshot):
+    """Текст раздела «Курсы» из сообщения courses и активных курсов"""
+    courses_text = snapshot.messages.get('courses', NOT_CONFIGURED)
+    if not snapshot.rates:
+        return courses_text if courses_text != NOT_CONFIGURED else "Курсы обмена скоро будут добавлены."
+    lines = []
+    if courses_text and courses_text != NOT_CONFIGURED:
+        lines.append(f"{courses_text}\n")
+    lines.append("📊 Актуальные курсы обмена:\n")
+    lines.extend(f"💱 {rate.currency_from} → {rate.currency_to}: {rate.rate}" for rate in snapshot.rates)
+    return "\n".join(lines) + "\n"
+
+
+def render_replies(snapshot):
+    """Заранее подготовленные ответы статических разделов: кнопка -> (текст, клавиатура)"""
+    replies = {}
+    for button, (message_type, fallback, keyboard) in STATIC_SECTIONS.items():
+        text = snapshot.messages.get(message_type, NOT_CONFIGURED)
+        replies[button] = (fallback if text == NOT_CONFIGURED else text, keyboard)
+    replies[COURSES_BUTTON] = (render_courses(snapshot), MAIN_KEYBOARD)
+    return replies
+
+
+class MenuRouter:
+    """
+    Таблица маршрутов меню: текст кнопки -> обработчик, поиск за O(1).
+
+    Каждый маршрут замеряется отдельно (handle_text:<name> в bot.metrics).
+
+    Ответы статических разделов рендерятся один раз на версию снимка
+    справочников (отдельно для каждого филиала) и пересобираются только
+    после изменения BotMessage/ExchangeRate.
+    """
+
+    def __init__(self):
+        self._routes = {}
+        # ID филиала -> (версия снимка, ответы)
+        self._rendered = {}
+
+    def add(self, text, handler, name):
+        self._routes[text] = instrumented(f"handle_text:{name}")(handler)
+
+    def add_countries(self, handler):
+        """handler(update, context, country_text) для каждой кнопки страны"""
+        for label in COUNTRY_CODES:
+            self.add(label, lambda update, context, label=label: handler(update, context, label), 'country')
+
+    async def replies(self):
+        snapshot = await snapshot_cache.aget()
+        rendered = self._rendered.get(snapshot.branch_id)
+        if rendered is None or rendered[0] != snapshot.version:
+            rendered = self._rendered[snapshot.branch_id] = (snapshot.version, render_replies(snapshot))
+            logger.debug("Ответы меню пересобраны для версии справочников %s", snapshot.version)
+        return rendered[1]
+
+    async def reply_static(self, update, context):
+        text, keyboard = (await self.replies())[update.message.text]
+        await update.message.reply_text(text, reply_markup=keyboard)
+
+    async def dispatch(self, update, context):
+        """Вызвать обработчик кнопки; вернуть False, если текст не является кнопкой меню"""
+        handler = self._routes.get(update.message.text)
+        if handler is None:
+            return False
+        await handler(update, context)
+        return True
+
+
+menu_router = MenuRouter()
+for _button, (_message_type, _, _) in STATIC_SECTIONS.items():
+    menu_router.add(_button, menu_router.reply_static, _message_type)
+menu_router.add(COURSES_BUTTON, menu_router.reply_static, 'courses')
@@ -0,0 +1,310 @@
+import asyncio
+import contextvars
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import Counter
+
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from telegram import Update
+from telegram.ext import TypeHandler
+from telegram.request import BaseRequest
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограмм задержки, мс (последняя корзина — все, что больше)
+LATENCY_BOUNDS_MS = (
+    0.5, 1, 2, 3, 5, 7.5, 10, 15, 25, 35, 50, 75, 100, 150, 250, 500, 1000, 2500, 5000, 10000,
+)
+# Границы корзин числа SQL-запросов на обновление
+QUERY_BOUNDS = (0, 1, 2, 3, 5, 10, 20, 50)
+# Группы обработчиков до и после обработчиков бота (группа 0) для замера обновления целиком
+METRICS_BEGIN_GROUP = -10
+METRICS_END_GROUP = 110
+
+# Замер текущего обновления; sync_to_async копирует контекст в поток БД
+current_update = contextvars.ContextVar('bot_metrics_update', default=None)
+
+
+class Histogram:
+    """Гистограмма с фиксированными корзинами: запись — поиск корзины и три сложения"""
+
+    __slots__ = ('bounds', 'buckets', 'count', 'total', 'max')
+
+    def __init__(self, bounds=LATENCY_BOUNDS_MS):
+        self.bounds = bounds
+        self.buckets = [0] * (len(bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def record(self, value):
+        self.buckets[bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'sum': round(self.total, 3),
+            'max': round(self.max, 3),
+            'buckets': list(self.buckets),
+        }
+
+
+def histogram_percentile(bounds, buckets, fraction, maximum=None):
+    """Оценка перцентиля по корзинам: верхняя граница корзины, в которую он попал"""
+    count = sum(buckets)
+    if not count:
+        return 0.0
+    rank = fraction * count
+    seen = 0
+    for index, bucket in enumerate(buckets):
+        seen += bucket
+        if seen >= rank and bucket:
+            if index < len(bounds):
+                return bounds[index] if maximum is None else min(bounds[index], maximum)
+            return maximum if maximum is not None else bounds[-1]
+    return maximum or 0.0
+
+
+class UpdateScope:
+    """Счетчики одного обновления: SQL-запросы и вызовы Bot API"""
+
+    __slots__ = ('started', 'queries', 'db_time', 'api_calls', 'api_time')
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.queries = 0
+        self.db_time = 0.0
+        self.api_calls = 0
+        self.api_time = 0.0
+
+
+class BotMetrics:
+    """
+    Метрики процесса бота в памяти.
+
+    Обработчики, вызовы Bot API и SQL-запросы пишут в гистограммы под одной
+    блокировкой (запись из потоков sync_to_async и фонового event loop клиентов).
+    Снимок периодически сохраняется в файл BOT_METRICS_PATH, откуда его читает
+    manage.py bot_top.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.started_at = time.time()
+            self.handlers = {}
+            self.handler_errors = Counter()
+            self.api = {}
+            self.api_errors = Counter()
+            self.updates = Histogram()
+            self.update_queries = Histogram(QUERY_BOUNDS)
+            self.update_db_time = Histogram()
+            self.update_api_time = Histogram()
+            self.loop_lag = Histogram()
+            self.loop_lag_last = 0.0
+
+    def _histogram(self, registry, name):
+        histogram = registry.get(name)
+        if histogram is None:
+            histogram = registry[name] = Histogram()
+        return histogram
+
+    def record_handler(self, name, elapsed, failed=False):
+        with self._lock:
+            self._histogram(self.handlers, name).record(elapsed * 1000)
+            if failed:
+                self.handler_errors[name] += 1
+
+    def error(self, name):
+        """Ошибка, перехваченная внутри обработчика (он ответил пользователю запасным текстом)"""
+        with self._lock:
+            self.handler_errors[name] += 1
+
+    def record_api(self, method, elapsed, status=200):
+        with self._lock:
+            self._histogram(self.api, method).record(elapsed * 1000)
+            if status >= 400:
+                self.api_errors[f"{method}:{status}"] += 1
+        scope = current_update.get()
+        if scope is not None:
+            scope.api_calls += 1
+            scope.api_time += elapsed
+
+    def record_update(self, scope):
+        elapsed = time.perf_counter() - scope.started
+        with self._lock:
+            self.updates.record(elapsed * 1000)
+            self.update_queries.record(scope.queries)
+            self.update_db_time.record(scope.db_time * 1000)
+            self.update_api_time.record(scope.api_time * 1000)
+
+    def record_loop_lag(self, lag):
+        with self._lock:
+            self.loop_lag.record(lag * 1000)
+            self.loop_lag_last = lag * 1000
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'pid': os.getpid(),
+                'started_at': self.started_at,
+                'exported_at': time.time(),
+                'bounds_ms': list(LATENCY_BOUNDS_MS),
+                'query_bounds': list(QUERY_BOUNDS),
+                'updates': self.updates.snapshot(),
+                'update_queries': self.update_queries.snapshot(),
+                'update_db_ms': self.update_db_time.snapshot(),
+                'update_api_ms': self.update_api_time.snapshot(),
+                'handlers': {name: histogram.snapshot() for name, histogram in self.handlers.items()},
+                'handler_errors': dict(self.handler_errors),
+                'api': {method: histogram.snapshot() for method, histogram in self.api.items()},
+                'api_errors': dict(self.api_errors),
+                'loop_lag_ms': {**self.loop_lag.snapshot(), 'last': round(self.loop_lag_last, 3)},
+            }
+
+    # SQL-запросы обновления
+
+    def __call__(self, execute, sql, params, many, context):
+        scope = current_update.get()
+        if scope is None:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            scope.queries += 1
+            scope.db_time += time.perf_counter() - started
+
+    def _attach(self, connection):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def _on_connection_created(self, sender, connection, **kwargs):
+        self._attach(connection)
+
+    def install_db_wrapper(self):
+        """Считать SQL-запросы во всех соединениях процесса, в том числе открытых позже"""
+        connection_created.connect(self._on_connection_created, dispatch_uid='bot_metrics')
+        for connection in connections.all(initialized_only=True):
+            self._attach(connection)
+
+    # Обновления целиком
+
+    async def begin_update(self, update, context):
+        current_update.set(UpdateScope())
+
+    async def end_update(self, update, context):
+        scope = current_update.get()
+        if scope is not None:
+            self.record_update(scope)
+            current_update.set(None)
+
+    def install(self, application):
+        """Замер обновлений Application: обработчики до и после всех групп"""
+        application.add_handler(TypeHandler(Update, self.begin_update), group=METRICS_BEGIN_GROUP)
+        application.add_handler(TypeHandler(Update, self.end_update), group=METRICS_END_GROUP)
+        self.install_db_wrapper()
+
+    # Фоновые задачи
+
+    async def run_loop_lag_probe(self, interval=0.5):
+        """Задержка event loop: насколько позже запланированного просыпается sleep(interval)"""
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(interval)
+            self.record_loop_lag(max(loop.time() - started - interval, 0.0))
+
+    def export(self, path=None):
+        """Записать снимок в файл атомарно (читатель не увидит недописанный JSON)"""
+        path = path or settings.BOT_METRICS_PATH
+        data = json.dumps(self.snapshot(), ensure_ascii=False)
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+    async def run_exporter(self, interval=None, path=None):
+        interval = interval or settings.BOT_METRICS_INTERVAL
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.export, path)
+            except OSError as e:
+                logger.error("Не удалось сохранить метрики бота: %s", e)
+
+
+bot_metrics = BotMetrics()
+
+
+def instrumented(name):
+    """Декоратор обработчика: время выполнения и необработанные исключения"""
+    def decorator(handler):
+        @functools.wraps(handler)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            failed = False
+            try:
+                return await handler(*args, **kwargs)
+            except Exception:
+                failed = True
+                raise
+            finally:
+                bot_metrics.record_handler(name, time.perf_counter() - started, failed)
+        return wrapper
+    return decorator
+
+
+class MeasuredRequest(BaseRequest):
+    """Обертка над BaseRequest: задержка и коды ответов Bot API по методам"""
+
+    def __init__(self, request, metrics=bot_metrics):
+        self.request = request
+        self.metrics = metrics
+
+    @property
+    def read_timeout(self):
+        return self.request.read_timeout
+
+    async def initialize(self):
+        await self.request.initialize()
+
+    async def shutdown(self):
+        await self.request.shutdown()
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None,
+                         write_timeout=None, connect_timeout=None, pool_timeout=None):
+        api_method = url.rsplit('/', 1)[-1]
+        started = time.perf_counter()
+        status = 599
+        try:
+            status, payload = await self.request.do_request(
+                url, method, request_data=request_data, read_timeout=read_timeout,
+                write_timeout=write_timeout, connect_timeout=connect_timeout, pool_timeout=pool_timeout,
+            )
+            return status, payload
+        finally:
+            # 599 — сетевая ошибка или таймаут без ответа сервера
+            self.metrics.record_api(api_method, time.perf_counter() - started, status)
+
+
+def measured_request(request):
+    """Обернуть запрос в MeasuredRequest, если метрики включены"""
+    if not settings.BOT_METRICS_ENABLED:
+        return request
+    return MeasuredRequest(request)
+
@@ -0,0 +1,38 @@
+from django.urls import NoReverseMatch, resolve, reverse
+
+# Публичные GET-эндпоинты Mini App без сессии, cookies и форм
+FAST_PATH_VIEWS = ('get_exchange_rates', 'get_bootstrap', 'get_quote')
+
+
+class FastPathMiddleware:
+    """
+    Короткий путь для публичных GET-эндпоинтов из FAST_PATH_VIEWS.
+
+    Стоит сразу после CorsMiddleware: запрос сразу уходит в представление, минуя
+    сессии, CSRF, аутентификацию и сообщения, которые этим эндпоинтам не нужны,
+    а заголовки CORS и SecurityMiddleware добавляются к ответу как обычно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self._routes = None
+
+    def routes(self):
+        """Путь -> представление; URLconf читается при первом запросе"""
+        if self._routes is None:
+            routes = {}
+            for name in FAST_PATH_VIEWS:
+                try:
+                    url = reverse(name)
+                except NoReverseMatch:
+                    continue
+                routes[url] = resolve(url).func
+            self._routes = routes
+        return self._routes
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD'):
+            view = self.routes().get(request.path_info)
+            if view is not None:
+                return view(request)
+        return self.get_response(request)
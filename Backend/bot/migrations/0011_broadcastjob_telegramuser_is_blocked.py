@@ -0,0 +1,43 @@
+# Generated by Django 4.2.26 on 2026-10-17 16:25
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0010_notificationoutbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BroadcastJob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text', models.TextField(verbose_name='Текст сообщения')),
+                ('audience', models.CharField(choices=[('all', 'Все пользователи'), ('selected', 'Выбранные пользователи')], default='all', max_length=20, verbose_name='Получатели')),
+                ('recipient_ids', models.JSONField(blank=True, default=list, verbose_name='Telegram ID получателей')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Отправляется'), ('completed', 'Завершена'), ('cancelled', 'Отменена'), ('failed', 'Ошибка')], default='pending', max_length=20, verbose_name='Статус')),
+                ('total_count', models.PositiveIntegerField(default=0, verbose_name='Всего получателей')),
+                ('sent_count', models.PositiveIntegerField(default=0, verbose_name='Отправлено')),
+                ('failed_count', models.PositiveIntegerField(default=0, verbose_name='Ошибок')),
+                ('blocked_count', models.PositiveIntegerField(default=0, verbose_name='Заблокировали бота')),
+                ('last_user_pk', models.BigIntegerField(default=0, verbose_name='Контрольная точка')),
+                ('heartbeat_at', models.DateTimeField(blank=True, null=True, verbose_name='Последняя активность')),
+                ('last_error', models.TextField(blank=True, default='', verbose_name='Последняя ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начало')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Окончание')),
+            ],
+            options={
+                'verbose_name': 'Рассылка',
+                'verbose_name_plural': 'Рассылки',
+                'ordering': ['-created_at'],
+            },
+        ),
+        migrations.AddField(
+            model_name='telegramuser',
+            name='is_blocked',
+            field=models.BooleanField(default=False, verbose_name='Заблокировал бота'),
+        ),
+    ]
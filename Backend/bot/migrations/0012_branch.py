@@ -0,0 +1,77 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:40
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0011_broadcastjob_telegramuser_is_blocked'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Branch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=255, verbose_name='Название')),
+                ('slug', models.SlugField(unique=True, verbose_name='Код')),
+                ('bot_token', models.CharField(max_length=100, unique=True, verbose_name='Токен бота')),
+                ('notification_bot_token', models.CharField(blank=True, default='', help_text='Пусто — уведомления отправляет общий бот (TELEGRAM_NOTIFICATION_BOT_TOKEN)', max_length=100, verbose_name='Токен бота уведомлений')),
+                ('is_active', models.BooleanField(default=True, verbose_name='Активен')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создано')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Обновлено')),
+            ],
+            options={
+                'verbose_name': 'Филиал',
+                'verbose_name_plural': 'Филиалы',
+                'ordering': ['name'],
+            },
+        ),
+        migrations.AlterUniqueTogether(
+            name='exchangerate',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='botmessage',
+            name='message_type',
+            field=models.CharField(choices=[('start', 'Стартовое сообщение'), ('about', 'О нас'), ('support', 'Поддержка'), ('courses', 'Курсы'), ('contact', 'Связаться с нами'), ('location', 'Как нас найти'), ('aml', 'AML Проверка'), ('cityex24_question', 'Cityex24 - Вопрос о стране'), ('cityex24_contact_request', 'Cityex24 - Запрос контакта'), ('cityex24_confirmation', 'Cityex24 - Подтверждение заявки')], max_length=30, verbose_name='Тип сообщения'),
+        ),
+        migrations.AddField(
+            model_name='adminchat',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Пусто — получает уведомления всех филиалов', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='admin_chats', to='bot.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='botmessage',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Пусто — общее сообщение для всех ботов', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='messages', to='bot.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='cityex24transfer',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='cityex24_transfers', to='bot.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddField(
+            model_name='exchangerate',
+            name='branch',
+            field=models.ForeignKey(blank=True, help_text='Пусто — общий курс; курсы филиала заменяют общие целиком', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='rates', to='bot.branch', verbose_name='Филиал'),
+        ),
+        migrations.AddConstraint(
+            model_name='botmessage',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('message_type',), name='bot_message_type_global_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='botmessage',
+            constraint=models.UniqueConstraint(fields=('branch', 'message_type'), name='bot_message_type_branch_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('currency_from', 'currency_to'), name='exchange_rate_pair_global_uniq'),
+        ),
+        migrations.AddConstraint(
+            model_name='exchangerate',
+            constraint=models.UniqueConstraint(fields=('branch', 'currency_from', 'currency_to'), name='exchange_rate_pair_branch_uniq'),
+        ),
+    ]
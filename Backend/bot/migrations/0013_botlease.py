@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 11:46
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0012_branch'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BotLease',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Бот')),
+                ('holder', models.CharField(blank=True, default='', max_length=255, verbose_name='Узел-держатель')),
+                ('epoch', models.PositiveBigIntegerField(default=0, verbose_name='Поколение')),
+                ('expires_at', models.DateTimeField(verbose_name='Действует до')),
+                ('update_offset', models.BigIntegerField(default=0, verbose_name='Offset getUpdates')),
+                ('acquired_at', models.DateTimeField(blank=True, null=True, verbose_name='Захвачена')),
+                ('renewed_at', models.DateTimeField(blank=True, null=True, verbose_name='Продлена')),
+            ],
+            options={
+                'verbose_name': 'Аренда polling',
+                'verbose_name_plural': 'Аренды polling',
+            },
+        ),
+    ]
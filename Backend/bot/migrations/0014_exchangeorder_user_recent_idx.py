@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0013_botlease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='exchangeorder',
+            index=models.Index(fields=['telegram_user_id', '-created_at', '-id'], name='bot_order_user_recent_idx'),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:42
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0014_exchangeorder_user_recent_idx'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='telegramuser',
+            index=models.Index(condition=models.Q(('is_blocked', True)), fields=['updated_at'], name='bot_user_blocked_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 12:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0015_telegramuser_blocked_idx'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConversationState',
+            fields=[
+                ('user_id', models.BigIntegerField(primary_key=True, serialize=False, verbose_name='Telegram ID')),
+                ('state', models.TextField(verbose_name='Состояние (JSON)')),
+                ('updated_at', models.FloatField(db_index=True, verbose_name='Изменено (unix time)')),
+            ],
+            options={
+                'verbose_name': 'Состояние диалога',
+                'verbose_name_plural': 'Состояния диалогов',
+            },
+        ),
+        migrations.AddField(
+            model_name='cityex24transfer',
+            name='telegram_update',
+            field=models.CharField(blank=True, editable=False, max_length=64, null=True, unique=True, verbose_name='Обновление Telegram'),
+        ),
+    ]
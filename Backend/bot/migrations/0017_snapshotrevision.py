@@ -0,0 +1,68 @@
+# Generated by Django 4.2.30 on 2026-10-17 13:03
+
+from django.db import migrations, models
+
+# Справочные таблицы кеша bot.cache: любое изменение увеличивает SnapshotRevision.revision
+SNAPSHOT_MODELS = ('BotMessage', 'ExchangeRate', 'AdminChat', 'Branch')
+OPERATIONS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+def create_triggers(apps, schema_editor):
+    SnapshotRevision = apps.get_model('bot', 'SnapshotRevision')
+    SnapshotRevision.objects.create(pk=1)
+    revision_table = SnapshotRevision._meta.db_table
+    bump = f"UPDATE {revision_table} SET revision = revision + 1 WHERE id = 1;"
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            "CREATE OR REPLACE FUNCTION bot_snapshot_revision_bump() RETURNS trigger AS $$ "
+            f"BEGIN {bump} RETURN NULL; END $$ LANGUAGE plpgsql"
+        )
+    for name in SNAPSHOT_MODELS:
+        table = apps.get_model('bot', name)._meta.db_table
+        if vendor == 'sqlite':
+            for operation in OPERATIONS:
+                schema_editor.execute(
+                    f"CREATE TRIGGER bot_snapshot_revision_{table}_{operation.lower()} "
+                    f"AFTER {operation} ON {table} BEGIN {bump} END"
+                )
+        elif vendor == 'postgresql':
+            schema_editor.execute(
+                f"CREATE TRIGGER bot_snapshot_revision_{table} AFTER {' OR '.join(OPERATIONS)} ON {table} "
+                "FOR EACH STATEMENT EXECUTE FUNCTION bot_snapshot_revision_bump()"
+            )
+
+
+def drop_triggers(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    for name in SNAPSHOT_MODELS:
+        table = apps.get_model('bot', name)._meta.db_table
+        if vendor == 'sqlite':
+            for operation in OPERATIONS:
+                schema_editor.execute(f"DROP TRIGGER IF EXISTS bot_snapshot_revision_{table}_{operation.lower()}")
+        elif vendor == 'postgresql':
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS bot_snapshot_revision_{table} ON {table}")
+    if vendor == 'postgresql':
+        schema_editor.execute("DROP FUNCTION IF EXISTS bot_snapshot_revision_bump()")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bot', '0016_conversationstate_transfer_update'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SnapshotRevision',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('revision', models.PositiveBigIntegerField(default=0, verbose_name='Ревизия')),
+            ],
+            options={
+                'verbose_name': 'Ревизия справочников',
+                'verbose_name_plural': 'Ревизии справочников',
+            },
+        ),
+        migrations.RunPython(create_triggers, drop_triggers),
+    ]
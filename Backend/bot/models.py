@@ -1,5 +1,6 @@
 from django.db import models
 from django.core.exceptions import ValidationError
+from django.utils import timezone
 
 
 class TelegramUser(models.Model):
@@ -8,6 +9,7 @@ class TelegramUser(models.Model):
     username = models.CharField(max_length=255, null=True, blank=True, verbose_name="Username")
     first_name = models.CharField(max_length=255, null=True, blank=True, verbose_name="Имя")
     last_name = models.CharField(max_length=255, null=True, blank=True, verbose_name="Фамилия")
+    is_blocked = models.BooleanField(default=False, verbose_name="Заблокировал бота")
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Дата регистрации")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -15,11 +17,37 @@ class TelegramUser(models.Model):
         verbose_name = "Пользователь Telegram"
         verbose_name_plural = "Пользователи Telegram"
         ordering = ['-created_at']
+        indexes = [
+            # Недавно заблокировавшие бота пользователи для синхронизации кеша профилей (bot.users)
+            models.Index(fields=['updated_at'], condition=models.Q(is_blocked=True), name='bot_user_blocked_idx'),
+        ]
 
     def __str__(self):
         return f"{self.first_name or 'Unknown'} (@{self.username or 'no_username'}) - {self.telegram_id}"
 
 
+class Branch(models.Model):
+    """Филиал обменника со своим ботом (режим нескольких ботов в одном процессе)"""
+    name = models.CharField(max_length=255, verbose_name="Название")
+    slug = models.SlugField(max_length=50, unique=True, verbose_name="Код")
+    bot_token = models.CharField(max_length=100, unique=True, verbose_name="Токен бота")
+    notification_bot_token = models.CharField(
+        max_length=100, blank=True, default='', verbose_name="Токен бота уведомлений",
+        help_text="Пусто — уведомления отправляет общий бот (TELEGRAM_NOTIFICATION_BOT_TOKEN)"
+    )
+    is_active = models.BooleanField(default=True, verbose_name="Активен")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+
+    class Meta:
+        verbose_name = "Филиал"
+        verbose_name_plural = "Филиалы"
+        ordering = ['name']
+
+    def __str__(self):
+        return self.name
+
+
 class BotMessage(models.Model):
     """Модель для хранения текстов сообщений бота"""
     MESSAGE_TYPES = [
@@ -38,9 +66,12 @@ class BotMessage(models.Model):
     message_type = models.CharField(
         max_length=30,
         choices=MESSAGE_TYPES,
-        unique=True,
         verbose_name="Тип сообщения"
     )
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, null=True, blank=True, related_name='messages',
+        verbose_name="Филиал", help_text="Пусто — общее сообщение для всех ботов"
+    )
     text = models.TextField(verbose_name="Текст сообщения")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -48,6 +79,13 @@ class BotMessage(models.Model):
         verbose_name = "Сообщение бота"
         verbose_name_plural = "Сообщения бота"
         ordering = ['message_type']
+        constraints = [
+            # Одно общее сообщение каждого типа и не больше одного переопределения на филиал
+            models.UniqueConstraint(
+                fields=['message_type'], condition=models.Q(branch__isnull=True), name='bot_message_type_global_uniq'
+            ),
+            models.UniqueConstraint(fields=['branch', 'message_type'], name='bot_message_type_branch_uniq'),
+        ]
 
     def __str__(self):
         return dict(self.MESSAGE_TYPES).get(self.message_type, self.message_type)
@@ -56,7 +94,7 @@ class BotMessage(models.Model):
     def get_message(cls, message_type):
         """Получить текст сообщения по типу"""
         try:
-            return cls.objects.get(message_type=message_type).text
+            return cls.objects.get(message_type=message_type, branch__isnull=True).text
         except cls.DoesNotExist:
             return "Сообщение не настроено"
 
@@ -67,6 +105,10 @@ class ExchangeRate(models.Model):
     currency_to = models.CharField(max_length=10, verbose_name="Валюта к")
     rate = models.DecimalField(max_digits=10, decimal_places=4, verbose_name="Курс")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, null=True, blank=True, related_name='rates',
+        verbose_name="Филиал", help_text="Пусто — общий курс; курсы филиала заменяют общие целиком"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -74,7 +116,13 @@ class ExchangeRate(models.Model):
         verbose_name = "Курс обмена"
         verbose_name_plural = "Курсы обмена"
         ordering = ['currency_from', 'currency_to']
-        unique_together = [['currency_from', 'currency_to']]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['currency_from', 'currency_to'], condition=models.Q(branch__isnull=True),
+                name='exchange_rate_pair_global_uniq'
+            ),
+            models.UniqueConstraint(fields=['branch', 'currency_from', 'currency_to'], name='exchange_rate_pair_branch_uniq'),
+        ]
 
     def __str__(self):
         return f"{self.currency_from} → {self.currency_to}: {self.rate}"
@@ -110,6 +158,14 @@ class Cityex24Transfer(models.Model):
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
     notes = models.TextField(blank=True, null=True, verbose_name="Заметки")
+    branch = models.ForeignKey(
+        Branch, on_delete=models.SET_NULL, null=True, blank=True, related_name='cityex24_transfers',
+        verbose_name="Филиал"
+    )
+    # "<ID бота>:<update_id>" обновления с контактом: повтор обновления после смены ведущего не создает вторую заявку
+    telegram_update = models.CharField(
+        max_length=64, unique=True, null=True, blank=True, editable=False, verbose_name="Обновление Telegram"
+    )
 
     class Meta:
         verbose_name = "Заявка Cityex24"
@@ -130,6 +186,10 @@ class AdminChat(models.Model):
     chat_id = models.BigIntegerField(unique=True, verbose_name="Chat ID")
     name = models.CharField(max_length=255, blank=True, null=True, verbose_name="Имя/Описание")
     is_active = models.BooleanField(default=True, verbose_name="Активен")
+    branch = models.ForeignKey(
+        Branch, on_delete=models.CASCADE, null=True, blank=True, related_name='admin_chats',
+        verbose_name="Филиал", help_text="Пусто — получает уведомления всех филиалов"
+    )
     created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
     updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
 
@@ -178,8 +238,162 @@ class ExchangeOrder(models.Model):
         verbose_name = "Заявка на обмен"
         verbose_name_plural = "Заявки на обмен"
         ordering = ['-created_at']
+        indexes = [
+            # Страницы заявок пользователя (/api/orders/user/) по курсору (created_at, id)
+            models.Index(fields=['telegram_user_id', '-created_at', '-id'], name='bot_order_user_recent_idx'),
+        ]
 
     def __str__(self):
         order_type_display = dict(self.ORDER_TYPE_CHOICES).get(self.order_type, self.order_type)
         return f"#{self.id} - {order_type_display} - {self.full_name} ({self.get_status_display()})"
 
+
+
+class NotificationOutbox(models.Model):
+    """Очередь уведомлений администраторам (transactional outbox)"""
+    KIND_CHOICES = [
+        ('exchange_order', 'Заявка на обмен'),
+        ('cityex24_transfer', 'Заявка Cityex24'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'Ожидает отправки'),
+        ('processing', 'Отправляется'),
+        ('sent', 'Отправлено'),
+        ('dead', 'Не доставлено'),
+    ]
+
+    kind = models.CharField(max_length=30, choices=KIND_CHOICES, verbose_name="Тип уведомления")
+    object_id = models.BigIntegerField(verbose_name="ID заявки")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    next_attempt_at = models.DateTimeField(default=timezone.now, verbose_name="Следующая попытка")
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    updated_at = models.DateTimeField(auto_now=True, verbose_name="Обновлено")
+    sent_at = models.DateTimeField(null=True, blank=True, verbose_name="Отправлено")
+
+    class Meta:
+        verbose_name = "Уведомление в очереди"
+        verbose_name_plural = "Очередь уведомлений"
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', 'next_attempt_at'], name='bot_outbox_due_idx'),
+        ]
+
+    def __str__(self):
+        kind_display = dict(self.KIND_CHOICES).get(self.kind, self.kind)
+        return f"{kind_display} #{self.object_id} ({self.get_status_display()})"
+
+
+class BroadcastJob(models.Model):
+    """Задание на рассылку сообщения пользователям бота"""
+    AUDIENCE_CHOICES = [
+        ('all', 'Все пользователи'),
+        ('selected', 'Выбранные пользователи'),
+    ]
+
+    STATUS_CHOICES = [
+        ('pending', 'В очереди'),
+        ('running', 'Отправляется'),
+        ('completed', 'Завершена'),
+        ('cancelled', 'Отменена'),
+        ('failed', 'Ошибка'),
+    ]
+
+    text = models.TextField(verbose_name="Текст сообщения")
+    audience = models.CharField(max_length=20, choices=AUDIENCE_CHOICES, default='all', verbose_name="Получатели")
+    recipient_ids = models.JSONField(default=list, blank=True, verbose_name="Telegram ID получателей")
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending', verbose_name="Статус")
+    total_count = models.PositiveIntegerField(default=0, verbose_name="Всего получателей")
+    sent_count = models.PositiveIntegerField(default=0, verbose_name="Отправлено")
+    failed_count = models.PositiveIntegerField(default=0, verbose_name="Ошибок")
+    blocked_count = models.PositiveIntegerField(default=0, verbose_name="Заблокировали бота")
+    last_user_pk = models.BigIntegerField(default=0, verbose_name="Контрольная точка")
+    heartbeat_at = models.DateTimeField(null=True, blank=True, verbose_name="Последняя активность")
+    last_error = models.TextField(blank=True, default='', verbose_name="Последняя ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создано")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начало")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Окончание")
+
+    class Meta:
+        verbose_name = "Рассылка"
+        verbose_name_plural = "Рассылки"
+        ordering = ['-created_at']
+
+    def __str__(self):
+        preview = self.text[:40] + '...' if len(self.text) > 40 else self.text
+        return f"#{self.id} {preview} ({self.get_status_display()})"
+
+    @property
+    def processed_count(self):
+        return self.sent_count + self.failed_count + self.blocked_count
+
+    def get_progress(self):
+        """Процент выполнения рассылки"""
+        if not self.total_count:
+            return 100 if self.status == 'completed' else 0
+        return min(100, round(self.processed_count * 100 / self.total_count))
+
+    def get_eta_seconds(self):
+        """Оценка оставшегося времени по средней скорости с момента начала"""
+        if self.status != 'running' or not self.started_at or not self.processed_count:
+            return None
+        elapsed = (timezone.now() - self.started_at).total_seconds()
+        remaining = max(0, self.total_count - self.processed_count)
+        return round(remaining * elapsed / self.processed_count)
+
+
+class BotLease(models.Model):
+    """
+    Аренда polling бота (bot.leader): getUpdates по токену ведет только узел-держатель.
+
+    epoch увеличивается при каждой смене держателя и служит фенсинг-токеном:
+    продление и запись offset проходят, только пока epoch не изменился.
+    """
+    key = models.CharField(max_length=64, unique=True, verbose_name="Бот")
+    holder = models.CharField(max_length=255, blank=True, default='', verbose_name="Узел-держатель")
+    epoch = models.PositiveBigIntegerField(default=0, verbose_name="Поколение")
+    expires_at = models.DateTimeField(verbose_name="Действует до")
+    update_offset = models.BigIntegerField(default=0, verbose_name="Offset getUpdates")
+    acquired_at = models.DateTimeField(null=True, blank=True, verbose_name="Захвачена")
+    renewed_at = models.DateTimeField(null=True, blank=True, verbose_name="Продлена")
+
+    class Meta:
+        verbose_name = "Аренда polling"
+        verbose_name_plural = "Аренды polling"
+
+    def __str__(self):
+        return f"{self.key}: {self.holder or '—'} (поколение {self.epoch})"
+
+
+class ConversationState(models.Model):
+    """Состояние диалога пользователя с ботом (bot.state); общее для узлов горячего резерва"""
+    user_id = models.BigIntegerField(primary_key=True, verbose_name="Telegram ID")
+    state = models.TextField(verbose_name="Состояние (JSON)")
+    updated_at = models.FloatField(db_index=True, verbose_name="Изменено (unix time)")
+
+    class Meta:
+        verbose_name = "Состояние диалога"
+        verbose_name_plural = "Состояния диалогов"
+
+    def __str__(self):
+        return f"{self.user_id}: {self.state}"
+
+
+class SnapshotRevision(models.Model):
+    """
+    Счетчик изменений справочных таблиц для кеша bot.cache (одна строка).
+
+    Увеличивается триггерами БД на INSERT/UPDATE/DELETE в BotMessage, ExchangeRate,
+    AdminChat и Branch (миграция 0017), поэтому процессы видят и изменения через
+    QuerySet.update() или правку из shell, не меняющие updated_at.
+    """
+    revision = models.PositiveBigIntegerField(default=0, verbose_name="Ревизия")
+
+    class Meta:
+        verbose_name = "Ревизия справочников"
+        verbose_name_plural = "Ревизии справочников"
+
+    def __str__(self):
+        return str(self.revision)
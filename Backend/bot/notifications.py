@@ -0,0 +1,156 @@
+import asyncio
+import logging
+import time
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from telegram.error import BadRequest, ChatMigrated, Forbidden, InvalidToken, NetworkError, RetryAfter
+
+from bot.cache import snapshot_cache
+from bot.clients import get_notification_bot
+from bot.ratelimit import TokenBucket, PerChatLimiter, retry_after_seconds
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass
+class DeliveryResult:
+    """Результат доставки в один чат"""
+    chat_id: int
+    ok: bool = False
+    attempts: int = 0
+    error: str = ''
+    error_type: str = ''
+    retry_after: float = 0.0
+    elapsed: float = 0.0
+
+
+@dataclass
+class DeliveryReport:
+    """Отчет о рассылке уведомления по всем чатам"""
+    results: list = field(default_factory=list)
+    elapsed: float = 0.0
+
+    @property
+    def success_count(self):
+        return sum(1 for result in self.results if result.ok)
+
+    @property
+    def error_count(self):
+        return sum(1 for result in self.results if not result.ok)
+
+    @property
+    def failed(self):
+        return [result for result in self.results if not result.ok]
+
+    def as_dict(self):
+        return {
+            'success': self.success_count,
+            'errors': self.error_count,
+            'elapsed': round(self.elapsed, 3),
+            'chats': [result.__dict__ for result in self.results],
+        }
+
+
+# Лимиты привязаны к event loop: asyncio-примитивы нельзя делить между циклами
+_limiters = {}
+
+
+def get_limiters():
+    loop = asyncio.get_running_loop()
+    limiters = _limiters.get(loop)
+    if limiters is None:
+        limiters = _limiters[loop] = (
+            TokenBucket(settings.BOT_NOTIFICATION_RATE),
+            PerChatLimiter(),
+        )
+    return limiters
+
+
+async def deliver(bot, chat_id, text, max_attempts=None, limiters=None, **kwargs):
+    """
+    Отправить сообщение в один чат с учетом лимитов и повторами при RetryAfter/сетевых ошибках.
+
+    limiters — пара (TokenBucket, PerChatLimiter); по умолчанию лимиты уведомлений администраторам.
+    """
+    bucket, per_chat = limiters or get_limiters()
+    max_attempts = max_attempts or settings.BOT_NOTIFICATION_MAX_ATTEMPTS
+    result = DeliveryResult(chat_id=chat_id)
+    started = time.monotonic()
+
+    while result.attempts < max_attempts:
+        result.attempts += 1
+        await per_chat.wait(chat_id)
+        await bucket.acquire()
+        try:
+            await bot.send_message(chat_id=int(chat_id), text=text, **kwargs)
+            result.ok = True
+            result.error = result.error_type = ''
+            break
+        except RetryAfter as e:
+            # Telegram сам говорит, когда можно повторить: откладываем этот чат и общий поток
+            delay = retry_after_seconds(e)
+            result.retry_after = delay
+            result.error, result.error_type = str(e), type(e).__name__
+            per_chat.defer(chat_id, delay)
+            bucket.pause(delay)
+            logger.warning("RetryAfter для chat_id %s: повтор через %s сек.", chat_id, delay)
+        except (Forbidden, BadRequest, ChatMigrated, InvalidToken) as e:
+            # Повтор не поможет: чат не найден, бот заблокирован, неверный токен
+            result.error, result.error_type = str(e), type(e).__name__
+            break
+        except NetworkError as e:
+            result.error, result.error_type = str(e), type(e).__name__
+            # После последней попытки ждать нечего: пауза только держала бы слот рассылки и захват очереди
+            if result.attempts < max_attempts:
+                await asyncio.sleep(min(2 ** result.attempts, 30))
+
+    result.elapsed = time.monotonic() - started
+    return result
+
+
+async def fan_out(bot, chat_ids, text, **kwargs):
+    """Параллельно отправить сообщение во все чаты и вернуть отчет о доставке"""
+    started = time.monotonic()
+    results = await asyncio.gather(*(deliver(bot, chat_id, text, **kwargs) for chat_id in chat_ids))
+    return DeliveryReport(results=list(results), elapsed=time.monotonic() - started)
+
+
+def log_report(report):
+    for result in report.failed:
+        logger.error(
+            "✗ Ошибка при отправке уведомления администратору (chat_id: %s): %s [%s, попыток: %s]",
+            result.chat_id, result.error, result.error_type, result.attempts,
+        )
+        error_msg = result.error.lower()
+        if "chat not found" in error_msg or "chat_id is empty" in error_msg:
+            logger.error("  ВНИМАНИЕ: Пользователь с chat_id %s не начал диалог с ботом-уведомлений!", result.chat_id)
+        elif "unauthorized" in error_msg or result.error_type == 'InvalidToken':
+            logger.error("  ВНИМАНИЕ: Неверный токен бота или бот заблокирован!")
+    logger.info(
+        "Итог отправки уведомлений: успешно %d, ошибок %d, за %.2f сек.",
+        report.success_count, report.error_count, report.elapsed,
+        extra={'delivered': report.success_count, 'failed': report.error_count},
+    )
+
+
+async def notify_admins(text):
+    """Отправить уведомление во все активные чаты администраторов; вернуть DeliveryReport или None"""
+    # Свежий снимок справочников отдается без перехода в поток; для заявки филиала —
+    # chat_id и бот уведомлений этого филиала
+    snapshot = await snapshot_cache.aget()
+    if not (snapshot.notification_bot_token or settings.TELEGRAM_NOTIFICATION_BOT_TOKEN):
+        logger.error("TELEGRAM_NOTIFICATION_BOT_TOKEN не установлен в настройках")
+        return None
+
+    admin_chat_ids = list(snapshot.admin_chat_ids)
+    logger.debug("Найдено активных chat_id: %d", len(admin_chat_ids))
+    if not admin_chat_ids:
+        logger.warning("Нет активных chat_id администраторов для отправки уведомлений. Добавьте chat_id в админке!")
+        return DeliveryReport()
+
+    # Долгоживущий клиент бота уведомлений (инициализируется один раз на процесс)
+    notification_bot = await get_notification_bot(snapshot.notification_bot_token)
+    report = await fan_out(notification_bot, admin_chat_ids, text)
+    log_report(report)
+    return report
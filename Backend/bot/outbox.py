@@ -0,0 +1,265 @@
+import asyncio
+import logging
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db.models import F, Q
+from django.utils import timezone
+
+from bot.digest import build_digest, notification_coalescer
+from bot.models import NotificationOutbox, ExchangeOrder, Cityex24Transfer
+from bot.tenants import branch_scope
+
+logger = logging.getLogger(__name__)
+
+SOURCE_MODELS = {
+    'exchange_order': ExchangeOrder,
+    'cityex24_transfer': Cityex24Transfer,
+}
+
+
+def enqueue(kind, object_id):
+    """
+    Поставить уведомление в очередь.
+
+    Вызывается внутри той же транзакции, что и создание заявки: уведомление
+    появится в очереди только если заявка сохранена, и не потеряется, если
+    Telegram недоступен.
+    """
+    return NotificationOutbox.objects.create(kind=kind, object_id=object_id)
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед следующей попыткой"""
+    return timedelta(seconds=min(settings.BOT_OUTBOX_RETRY_BASE * 2 ** (attempts - 1), 3600))
+
+
+def claim_batch(batch_size=None):
+    """
+    Забрать пачку готовых к отправке уведомлений.
+
+    Каждая строка захватывается условным UPDATE, поэтому несколько диспетчеров
+    (процесс бота и management-команда) не отправят одно уведомление дважды.
+    Захват действует BOT_OUTBOX_LEASE секунд: если диспетчер упал, строка
+    снова станет доступна.
+    """
+    now = timezone.now()
+    batch_size = batch_size or settings.BOT_OUTBOX_BATCH_SIZE
+    lease_until = now + timedelta(seconds=settings.BOT_OUTBOX_LEASE)
+    candidates = list(
+        NotificationOutbox.objects
+        .filter(Q(status='pending') | Q(status='processing'), next_attempt_at__lte=now)
+        .order_by('next_attempt_at')
+        .values_list('pk', 'status', 'next_attempt_at')[:batch_size]
+    )
+
+    claimed = []
+    for pk, status, next_attempt_at in candidates:
+        updated = NotificationOutbox.objects.filter(
+            pk=pk, status=status, next_attempt_at=next_attempt_at
+        ).update(status='processing', next_attempt_at=lease_until, attempts=F('attempts') + 1)
+        if updated:
+            claimed.append(pk)
+    return list(NotificationOutbox.objects.filter(pk__in=claimed))
+
+
+def load_source(entry):
+    model = SOURCE_MODELS[entry.kind]
+    queryset = model.objects.select_related('user') if model is Cityex24Transfer else model.objects
+    try:
+        return queryset.get(pk=entry.object_id)
+    except model.DoesNotExist:
+        return None
+
+
+def load_sources(entries):
+    """Загрузить заявки для пачки уведомлений одним запросом на каждый тип"""
+    by_kind = {}
+    for entry in entries:
+        by_kind.setdefault(entry.kind, []).append(entry.object_id)
+    loaded = {
+        kind: SOURCE_MODELS[kind].objects.in_bulk(object_ids)
+        for kind, object_ids in by_kind.items()
+    }
+    return [loaded[entry.kind].get(entry.object_id) for entry in entries]
+
+
+def mark_sent(entry):
+    """Отметить уведомление отправленным; False, если захват уже истек"""
+    return finish(entry, status='sent', sent_at=timezone.now(), last_error='')
+
+
+def mark_failed(entry, error):
+    """Запланировать повтор или перевести уведомление в dead-letter; False, если захват уже истек"""
+    now = timezone.now()
+    if entry.attempts >= settings.BOT_OUTBOX_MAX_ATTEMPTS:
+        status, next_attempt_at = 'dead', now
+    else:
+        status, next_attempt_at = 'pending', now + retry_delay(entry.attempts)
+    if not finish(entry, status=status, next_attempt_at=next_attempt_at, last_error=str(error)[:2000]):
+        return False
+    if status == 'dead':
+        logger.error("Уведомление %s не доставлено после %s попыток: %s", entry, entry.attempts, error)
+    else:
+        logger.warning(
+            "Уведомление %s не доставлено (попытка %s), повтор в %s: %s", entry, entry.attempts, next_attempt_at, error
+        )
+    return True
+
+
+def finish(entry, **fields):
+    """
+    Записать результат отправки, только если строка все еще захвачена этим диспетчером.
+
+    Захват определяется парой status='processing' и next_attempt_at (срок аренды из
+    claim_batch): если аренда истекла и уведомление забрал другой диспетчер, поздний
+    результат первого не перезапишет результат второго.
+    """
+    updated = NotificationOutbox.objects.filter(
+        pk=entry.pk, status='processing', next_attempt_at=entry.next_attempt_at
+    ).update(updated_at=timezone.now(), **fields)
+    if not updated:
+        logger.warning("Захват уведомления %s истек до записи результата, результат отброшен", entry)
+    return bool(updated)
+
+
+async def within_lease(coroutine):
+    """
+    Ограничить отправку BOT_OUTBOX_SEND_TIMEOUT секундами (меньше BOT_OUTBOX_LEASE).
+
+    Повторы при RetryAfter и сетевых ошибках могут длиться дольше аренды; тогда
+    уведомление заберет другой диспетчер и отправит его второй раз.
+    """
+    try:
+        return await asyncio.wait_for(coroutine, timeout=settings.BOT_OUTBOX_SEND_TIMEOUT)
+    except asyncio.TimeoutError:
+        return f'Отправка не завершилась за {settings.BOT_OUTBOX_SEND_TIMEOUT} сек.'
+
+
+async def send_entry(entry):
+    """Отправить одно уведомление; вернуть текст ошибки или пустую строку при успехе"""
+    from bot.bot import send_exchange_order_notification, send_notification_to_admin
+
+    source = await sync_to_async(load_source)(entry)
+    if source is None:
+        return 'Заявка не найдена'
+
+    # Заявка филиала уходит администраторам филиала (и общим chat_id)
+    with branch_scope(getattr(source, 'branch_id', None)):
+        if entry.kind == 'exchange_order':
+            report = await send_exchange_order_notification(source)
+        else:
+            report = await send_notification_to_admin(source)
+    return report_error(report)
+
+
+def report_error(report):
+    """Текст ошибки доставки по DeliveryReport или пустая строка при успехе"""
+    if report is None:
+        return 'Уведомление не отправлено (см. лог)'
+    if not report.results:
+        return 'Нет активных chat_id администраторов'
+    if not report.success_count:
+        return '; '.join(f"{result.chat_id}: {result.error}" for result in report.failed)
+    return ''
+
+
+async def send_digest(entries):
+    """Отправить сводку по заявкам пачки (одну на филиал); вернуть ошибку для каждого уведомления"""
+    from bot.notifications import notify_admins
+
+    sources = await sync_to_async(load_sources)(entries)
+    # Отдельная сводка для каждого филиала
+    by_branch = {}
+    for source in sources:
+        if source is not None:
+            by_branch.setdefault(getattr(source, 'branch_id', None), []).append(source)
+    errors = {}
+    for branch_id, found in by_branch.items():
+        with branch_scope(branch_id):
+            errors[branch_id] = report_error(await notify_admins(build_digest(found)))
+    return [
+        errors[getattr(source, 'branch_id', None)] if source is not None else 'Заявка не найдена'
+        for source in sources
+    ]
+
+
+async def dispatch_batch(batch_size=None, coalescer=notification_coalescer):
+    """
+    Отправить одну пачку уведомлений; вернуть число обработанных.
+
+    В спокойном режиме каждая заявка уведомляется отдельно (параллельно), при
+    всплеске вся пачка уходит одной сводкой (см. bot.digest).
+    """
+    entries = await sync_to_async(claim_batch)(batch_size)
+    if not entries:
+        return 0
+
+    if coalescer.should_coalesce(len(entries)):
+        logger.info("Всплеск заявок: %s уведомлений объединены в сводку", len(entries))
+        try:
+            errors = await within_lease(send_digest(entries))
+        except Exception as e:
+            errors = e
+        if not isinstance(errors, list):
+            errors = [errors] * len(entries)
+        coalescer.record(1, digested=len(entries))
+    else:
+        errors = await asyncio.gather(
+            *(within_lease(send_entry(entry)) for entry in entries), return_exceptions=True
+        )
+        coalescer.record(len(entries))
+    for entry, error in zip(entries, errors):
+        if error:
+            await sync_to_async(mark_failed)(entry, error)
+        else:
+            await sync_to_async(mark_sent)(entry)
+    return len(entries)
+
+
+class OutboxDispatcher:
+    """Фоновый цикл, разбирающий очередь уведомлений пачками"""
+
+    def __init__(self, poll_interval=None, batch_size=None, coalescer=notification_coalescer):
+        self.poll_interval = poll_interval or settings.BOT_OUTBOX_POLL_INTERVAL
+        self.batch_size = batch_size
+        self.coalescer = coalescer
+        self._wakeup = None
+        self._stopped = False
+
+    def wake(self):
+        """Разбудить диспетчер сразу после постановки уведомления в очередь"""
+        if self._wakeup is not None:
+            self._wakeup.set()
+
+    def stop(self):
+        self._stopped = True
+        self.wake()
+
+    async def run(self):
+        self._wakeup = asyncio.Event()
+        self._stopped = False
+        logger.info("Диспетчер очереди уведомлений запущен")
+        while not self._stopped:
+            hold = self.coalescer.hold_for()
+            if hold:
+                # Лимит сообщений в окне исчерпан: копим заявки для следующей сводки
+                await asyncio.sleep(min(hold, self.poll_interval))
+                continue
+            try:
+                processed = await dispatch_batch(self.batch_size, self.coalescer)
+            except Exception as e:
+                logger.error("Ошибка диспетчера очереди уведомлений: %s", e, exc_info=True)
+                processed = 0
+            if processed:
+                continue
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.poll_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+        logger.info("Диспетчер очереди уведомлений остановлен")
+
+
+outbox_dispatcher = OutboxDispatcher()
@@ -0,0 +1,99 @@
+"""
+Котировки обмена для Mini App.
+
+Курс заявки определяет сервер: /api/quote/ берет курс пары валют из таблицы
+снимка справочников (rate_table, пересобирается при изменении ExchangeRate)
+и выдает токен котировки, подписанный SECRET_KEY, со сроком действия
+API_QUOTE_TTL секунд. create_exchange_order проверяет подпись и срок без
+обращения к БД и создает заявку по курсу из токена, даже если курс за это
+время успел измениться.
+"""
+
+from collections import namedtuple
+from datetime import timedelta
+from decimal import Decimal, InvalidOperation
+
+from django.conf import settings
+from django.core import signing
+from django.utils import timezone
+
+from bot.cache import snapshot_cache
+
+# Пара валют курса для типа заявки (как в Mini App): покупка — Руб -> USDT, продажа — USDT -> Руб
+QUOTE_PAIRS = {
+    'buy': ('Руб', 'USDT'),
+    'sell': ('USDT', 'Руб'),
+}
+# Точность курса и сумм — как у полей ExchangeOrder
+RATE_PLACES = Decimal('0.0001')
+AMOUNT_PLACES = Decimal('0.01')
+
+Quote = namedtuple('Quote', 'order_type rate')
+
+
+def quote_signer():
+    return signing.TimestampSigner(salt='bot.quotes')
+
+
+def quote_rate(order_type, rate_table):
+    """Курс для типа заявки; если прямой пары нет — обратный к курсу обратной пары"""
+    currency_from, currency_to = QUOTE_PAIRS[order_type]
+    rate = rate_table.get((currency_from, currency_to))
+    if rate is None:
+        reverse = rate_table.get((currency_to, currency_from))
+        if reverse:
+            rate = (1 / reverse).quantize(RATE_PLACES)
+    if rate is None or rate <= 0:
+        return None
+    return rate
+
+
+def calculate_amount_to_receive(order_type, amount, rate):
+    """Сумма к получению с точностью поля ExchangeOrder.amount_to_receive"""
+    if order_type == 'sell':
+        # Продажа USDT за рубли: amount * rate
+        value = amount * rate
+    else:
+        # Покупка USDT за рубли: amount / rate
+        value = amount / rate
+    return value.quantize(AMOUNT_PLACES)
+
+
+def issue_quote(order_type, amount=None):
+    """Котировка для /api/quote/; None, если курс для типа заявки не настроен"""
+    rate = quote_rate(order_type, snapshot_cache.get().rate_table)
+    if rate is None:
+        return None
+    ttl = settings.API_QUOTE_TTL
+    currency_from, currency_to = QUOTE_PAIRS[order_type]
+    quote = {
+        'order_type': order_type,
+        'currency_from': currency_from,
+        'currency_to': currency_to,
+        'rate': str(rate),
+        'quote': quote_signer().sign_object({'order_type': order_type, 'rate': str(rate)}),
+        'expires_in': ttl,
+        'expires_at': (timezone.now() + timedelta(seconds=ttl)).isoformat(),
+    }
+    if amount is not None:
+        quote['amount'] = str(amount)
+        quote['amount_to_receive'] = str(calculate_amount_to_receive(order_type, amount, rate))
+    return quote
+
+
+def verify_quote(token):
+    """
+    Проверить токен котировки (без обращения к БД) и вернуть Quote.
+
+    signing.SignatureExpired — срок котировки истек, signing.BadSignature — токен поврежден или подделан.
+    """
+    if not isinstance(token, str):
+        raise signing.BadSignature('Котировка должна быть строкой')
+    data = quote_signer().unsign_object(token, max_age=settings.API_QUOTE_TTL)
+    try:
+        quote = Quote(data['order_type'], Decimal(data['rate']))
+    except (KeyError, TypeError, InvalidOperation):
+        raise signing.BadSignature('Неверное содержимое котировки')
+    if quote.order_type not in QUOTE_PAIRS or quote.rate <= 0:
+        raise signing.BadSignature('Неверное содержимое котировки')
+    return quote
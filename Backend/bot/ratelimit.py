@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+
+class TokenBucket:
+    """
+    Асинхронный token bucket: не более rate отправок в секунду со всплеском до capacity.
+
+    pause() останавливает выдачу токенов всем ожидающим (используется при
+    глобальном RetryAfter от Telegram).
+    """
+
+    def __init__(self, rate, capacity=None):
+        self.rate = float(rate)
+        self.capacity = float(capacity or rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._paused_until = 0.0
+        self._lock = asyncio.Lock()
+
+    def _refill(self, now):
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self._paused_until:
+                    await asyncio.sleep(self._paused_until - now)
+                    continue
+                self._refill(now)
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    def pause(self, seconds):
+        self._paused_until = max(self._paused_until, time.monotonic() + seconds)
+        self._tokens = 0
+
+
+class PerChatLimiter:
+    """Минимальный интервал между сообщениями в один чат (лимиты Bot API для чатов)"""
+
+    # Личные чаты: ~1 сообщение в секунду; группы: ~20 сообщений в минуту
+    PRIVATE_INTERVAL = 1.0
+    GROUP_INTERVAL = 3.0
+
+    MAX_TRACKED_CHATS = 10000
+
+    def __init__(self):
+        self._next_at = {}
+
+    def interval(self, chat_id):
+        return self.PRIVATE_INTERVAL if int(chat_id) > 0 else self.GROUP_INTERVAL
+
+    async def wait(self, chat_id):
+        now = time.monotonic()
+        if len(self._next_at) > self.MAX_TRACKED_CHATS:
+            self._next_at = {key: at for key, at in self._next_at.items() if at > now}
+        next_at = self._next_at.get(chat_id, 0.0)
+        # Бронируем слот до ожидания, чтобы параллельные отправки в чат выстроились по очереди
+        self._next_at[chat_id] = max(now, next_at) + self.interval(chat_id)
+        if next_at > now:
+            await asyncio.sleep(next_at - now)
+
+    def defer(self, chat_id, seconds):
+        """Отложить следующую отправку в чат (RetryAfter для конкретного чата)"""
+        self._next_at[chat_id] = max(self._next_at.get(chat_id, 0.0), time.monotonic() + seconds)
+
+
+def retry_after_seconds(error):
+    """Значение retry_after из RetryAfter в секундах (int или timedelta в зависимости от версии PTB)"""
+    value = error.retry_after
+    if hasattr(value, 'total_seconds'):
+        return value.total_seconds()
+    return float(value)
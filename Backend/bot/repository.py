@@ -0,0 +1,136 @@
+"""
+Асинхронный доступ к данным для обработчиков бота.
+
+Запросы, которые можно обслужить из кешей (снимок справочников, LRU профилей),
+выполняются прямо в event loop без перехода в поток. Остальные используют
+асинхронный API QuerySet (aget). В Django 4.2 он сам уходит в
+общий thread-sensitive поток asgiref, поэтому каждый промах кеша — ровно один
+переход на операцию. sync_to_async напрямую остается только там, где нужен
+transaction.atomic или raw-запрос, не имеющие асинхронного API.
+"""
+
+import logging
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+
+from bot.cache import snapshot_cache, NOT_CONFIGURED
+from bot.models import Cityex24Transfer
+from bot.outbox import enqueue as enqueue_notification
+from bot.tenants import current_branch
+from bot.users import cached_telegram_user, upsert_telegram_user
+
+logger = logging.getLogger(__name__)
+
+
+def _profile_fields(user_data):
+    return {
+        'username': user_data.username,
+        'first_name': user_data.first_name,
+        'last_name': user_data.last_name,
+        # Пользователь пишет боту — значит, не блокирует его
+        'is_blocked': False,
+    }
+
+
+async def get_or_create_user(user_data):
+    """Получить или создать пользователя по effective_user; при попадании в LRU без обращения к БД"""
+    fields = _profile_fields(user_data)
+    user = cached_telegram_user(user_data.id, **fields)
+    if user is not None:
+        return user
+    # Upsert — raw-запрос INSERT ... ON CONFLICT, асинхронного API для него нет
+    return await sync_to_async(upsert_telegram_user)(user_data.id, **fields)
+
+
+async def get_message(message_type, default=None):
+    """Текст сообщения бота из снимка справочников; default, если сообщение не настроено"""
+    snapshot = await snapshot_cache.aget()
+    text = snapshot.messages.get(message_type, NOT_CONFIGURED)
+    if default is not None and (not text or text == NOT_CONFIGURED):
+        return default
+    return text
+
+
+async def get_exchange_rates():
+    """Активные курсы обмена из снимка справочников"""
+    return list((await snapshot_cache.aget()).rates)
+
+
+async def get_active_admin_chats():
+    """chat_id активных администраторов из снимка справочников"""
+    return list((await snapshot_cache.aget()).admin_chat_ids)
+
+
+def _create_transfer(user, country_code, phone_number, first_name, last_name, branch_id=None, telegram_update=None):
+    with transaction.atomic():
+        transfer = Cityex24Transfer.objects.create(
+            user=user,
+            branch_id=branch_id,
+            country=country_code,
+            contact_phone=phone_number,
+            contact_first_name=first_name,
+            contact_last_name=last_name,
+            status='new',
+            telegram_update=telegram_update,
+        )
+        # Уведомление администраторам ставится в очередь в той же транзакции
+        enqueue_notification('cityex24_transfer', transfer.id)
+    return transfer
+
+
+async def create_transfer(user, country_code, phone_number, first_name=None, last_name=None, telegram_update=None):
+    """
+    Создать заполненную заявку Cityex24 одним INSERT.
+
+    Черновик (выбранная страна) до получения контакта хранится в состоянии
+    диалога, поэтому брошенные диалоги не оставляют строк в БД. telegram_update —
+    ключ обновления с контактом (get_transfer_for_update).
+    """
+    return await sync_to_async(_create_transfer)(
+        user, country_code, phone_number, first_name, last_name, current_branch.get(), telegram_update
+    )
+
+
+async def get_transfer_for_update(telegram_update):
+    """
+    Заявка, уже созданная по этому обновлению, или None.
+
+    Ведущий узел (bot.leader) может упасть, обработав обновление, но не записав
+    offset: новый ведущий получит обновление повторно и не должен создать вторую
+    заявку и второе уведомление.
+    """
+    return await Cityex24Transfer.objects.filter(telegram_update=telegram_update).afirst()
+
+
+def _save_contact(transfer_id, phone_number, first_name, last_name):
+    try:
+        with transaction.atomic():
+            transfer = Cityex24Transfer.objects.get(pk=transfer_id)
+            transfer.contact_phone = phone_number
+            transfer.contact_first_name = first_name
+            transfer.contact_last_name = last_name
+            transfer.save()
+            # Заявка заполнена — ставим уведомление администраторам в очередь в той же транзакции
+            enqueue_notification('cityex24_transfer', transfer.id)
+        return transfer
+    except Cityex24Transfer.DoesNotExist:
+        return None
+
+
+async def save_contact(transfer_id, phone_number, first_name=None, last_name=None):
+    """
+    Сохранить контакт в заявку, созданную при выборе страны, и поставить уведомление в очередь.
+
+    Нужно только для диалогов, начатых до перехода на черновики в состоянии диалога.
+    Возвращает None, если заявки нет.
+    """
+    # transaction.atomic не работает в асинхронном контексте, поэтому один переход на всю транзакцию
+    return await sync_to_async(_save_contact)(transfer_id, phone_number, first_name, last_name)
+
+
+async def get_transfer(transfer):
+    """Заявка Cityex24 вместе с пользователем; без запроса, если пользователь уже загружен"""
+    if transfer.user_id is None or Cityex24Transfer.user.is_cached(transfer):
+        return transfer
+    return await Cityex24Transfer.objects.select_related('user').aget(pk=transfer.pk)
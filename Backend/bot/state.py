@@ -0,0 +1,199 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+
+from bot.models import ConversationState
+from bot.tenants import scoped_key
+
+logger = logging.getLogger(__name__)
+
+_DELETED = object()
+
+
+class ConversationStateStore:
+    """
+    Хранилище состояния диалогов бота (например, ID незавершенной заявки Cityex24).
+
+    В памяти держится ограниченный LRU с TTL; изменения записываются в таблицу
+    ConversationState общей БД отложенно (write-behind) пачками, поэтому состояние
+    переживает перезапуск бота и передачу роли ведущего другому узлу (bot.leader).
+    При первом обращении к пользователю, которого нет в памяти, его состояние
+    лениво подгружается из БД.
+    """
+
+    def __init__(self, maxsize=None, ttl=None):
+        self._maxsize = maxsize
+        self._ttl = ttl
+        # user_id -> (state dict, время последнего изменения)
+        self._data = OrderedDict()
+        # user_id -> (json, время изменения) или _DELETED; ждут записи в БД
+        self._dirty = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.flushes = 0
+        self.flushed_rows = 0
+        self.last_flush_ms = 0.0
+        self.max_flush_ms = 0.0
+
+    @property
+    def maxsize(self):
+        return self._maxsize or settings.BOT_STATE_MAX_USERS
+
+    @property
+    def ttl(self):
+        return self._ttl or settings.BOT_STATE_TTL
+
+    @property
+    def dirty(self):
+        return bool(self._dirty)
+
+    def _load(self, user_id):
+        """Прочитать состояние из БД (с учетом еще не записанных изменений)"""
+        now = time.time()
+        with self._lock:
+            pending = self._dirty.get(user_id)
+        if pending is _DELETED:
+            return {}, now
+        if pending is not None:
+            return json.loads(pending[0]), pending[1]
+        row = ConversationState.objects.filter(user_id=user_id).values_list('state', 'updated_at').first()
+        if row is None or now - row[1] > self.ttl:
+            return {}, now
+        return json.loads(row[0]), row[1]
+
+    async def _entry(self, user_id):
+        with self._lock:
+            entry = self._data.get(user_id)
+            if entry is not None:
+                self._data.move_to_end(user_id)
+                self.hits += 1
+        if entry is None:
+            self.misses += 1
+            entry = await asyncio.to_thread(self._load, user_id)
+            self._remember(user_id, entry)
+        state, updated_at = entry
+        if time.time() - updated_at > self.ttl:
+            # Диалог брошен слишком давно — начинаем заново
+            state.clear()
+        return state
+
+    def _remember(self, user_id, entry):
+        with self._lock:
+            self._data[user_id] = entry
+            self._data.move_to_end(user_id)
+            while len(self._data) > self.maxsize:
+                # Несохраненные изменения вытесненного пользователя остаются в _dirty
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def _mark_dirty(self, user_id, state):
+        now = time.time()
+        self._remember(user_id, (state, now))
+        with self._lock:
+            self._dirty[user_id] = (json.dumps(state), now) if state else _DELETED
+
+    # Ключи состояния разделены по филиалам: один пользователь может вести диалоги с разными ботами
+
+    async def get(self, user_id, key, default=None):
+        state = await self._entry(user_id)
+        return state.get(scoped_key(key), default)
+
+    async def set(self, user_id, key, value):
+        state = dict(await self._entry(user_id))
+        state[scoped_key(key)] = value
+        self._mark_dirty(user_id, state)
+
+    async def pop(self, user_id, key, default=None):
+        state = dict(await self._entry(user_id))
+        value = state.pop(scoped_key(key), default)
+        self._mark_dirty(user_id, state)
+        return value
+
+    def flush(self):
+        """Записать накопленные изменения в БД одной транзакцией"""
+        with self._lock:
+            dirty, self._dirty = self._dirty, {}
+        if not dirty:
+            return 0
+
+        started = time.perf_counter()
+        upserts = [
+            ConversationState(user_id=user_id, state=data[0], updated_at=data[1])
+            for user_id, data in dirty.items() if data is not _DELETED
+        ]
+        deletes = [user_id for user_id, data in dirty.items() if data is _DELETED]
+        try:
+            with self._flush_lock, transaction.atomic():
+                ConversationState.objects.bulk_create(
+                    upserts, update_conflicts=True, unique_fields=['user_id'], update_fields=['state', 'updated_at']
+                )
+                ConversationState.objects.filter(
+                    Q(user_id__in=deletes) | Q(updated_at__lt=time.time() - self.ttl)
+                ).delete()
+        except Exception as e:
+            # Возвращаем изменения в очередь, не затирая более свежие
+            with self._lock:
+                for user_id, data in dirty.items():
+                    self._dirty.setdefault(user_id, data)
+            logger.error("Ошибка записи состояния диалогов: %s", e, exc_info=True)
+            return 0
+
+        elapsed = (time.perf_counter() - started) * 1000
+        self.flushes += 1
+        self.flushed_rows += len(dirty)
+        self.last_flush_ms = elapsed
+        self.max_flush_ms = max(self.max_flush_ms, elapsed)
+        return len(dirty)
+
+    async def run_flusher(self):
+        """Фоновая запись: раз в BOT_STATE_FLUSH_INTERVAL или при накоплении BOT_STATE_FLUSH_BATCH изменений"""
+        interval = settings.BOT_STATE_FLUSH_INTERVAL
+        batch = settings.BOT_STATE_FLUSH_BATCH
+        waited = 0.0
+        step = min(interval, 0.2)
+        while True:
+            await asyncio.sleep(step)
+            waited += step
+            if self._dirty and (waited >= interval or len(self._dirty) >= batch):
+                await asyncio.to_thread(self.flush)
+                waited = 0.0
+
+    def memory_usage(self):
+        """Приблизительный объем состояния в памяти, байт"""
+        with self._lock:
+            entries = list(self._data.values())
+        return sum(len(json.dumps(state)) + 64 for state, _ in entries)
+
+    def stats(self):
+        return {
+            'users_in_memory': len(self._data),
+            'memory_bytes': self.memory_usage(),
+            'dirty': len(self._dirty),
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'flushes': self.flushes,
+            'flushed_rows': self.flushed_rows,
+            'last_flush_ms': round(self.last_flush_ms, 2),
+            'max_flush_ms': round(self.max_flush_ms, 2),
+        }
+
+    def close(self):
+        """Дописать изменения в БД; память очищается и потом читается из БД заново"""
+        self.flush()
+        with self._lock:
+            # Пока узел был в резерве, состояние могли изменить на ведущем узле (bot.leader)
+            self._data.clear()
+
+
+conversation_state = ConversationStateStore()
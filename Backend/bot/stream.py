@@ -0,0 +1,291 @@
+"""
+Поток изменений курсов для Mini App (ASGI): Server-Sent Events и long-poll.
+
+Один RatesHub на процесс следит за снимком справочников и рассылает изменения
+всем подключенным клиентам. Правка курса в этом процессе (в том числе
+list_editable в админке) будит хаб сразу через подписку на кеш справочников;
+правки в других процессах замечаются сверкой с БД раз в
+API_RATES_STREAM_CHECK_INTERVAL секунд, пока есть подписчики.
+
+Идентификатор события — версия курсов (ETag /api/exchange-rates/ без кавычек),
+поэтому Last-Event-ID понятен любому процессу: клиент получает пропущенные
+изменения из истории хаба или полный список курсов, если его версия слишком старая.
+
+События SSE:
+    snapshot — полный список курсов (то же тело, что у /api/exchange-rates/);
+    rates    — изменения: {"changed": [{currency_from, currency_to, rate}], "removed": [{currency_from, currency_to}]}.
+"""
+
+import asyncio
+import json
+import logging
+from collections import deque
+from urllib.parse import parse_qs
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+
+from bot.cache import snapshot_cache
+
+logger = logging.getLogger(__name__)
+
+STREAM_PATH = '/api/exchange-rates/stream/'
+POLL_PATH = '/api/exchange-rates/poll/'
+# Сколько последних изменений хранить для возобновления по Last-Event-ID
+HISTORY_SIZE = 100
+# Пауза переподключения EventSource, мс
+RETRY_MS = 3000
+PING = b': ping\n\n'
+
+
+def encode_event(event, event_id, data):
+    if not isinstance(data, bytes):
+        data = json.dumps(data, cls=DjangoJSONEncoder).encode()
+    return b'event: ' + event.encode() + b'\nid: ' + event_id.encode() + b'\ndata: ' + data + b'\n\n'
+
+
+class RatesHub:
+    """
+    Рассылка изменений курсов подписчикам одного event loop.
+
+    Подписчик не держит собственной очереди: все ждут общий future текущей
+    версии, который завершается при следующем изменении, а события кодируются
+    один раз и отправляются всем одними и теми же байтами. Простаивающее
+    соединение стоит одну задачу ASGI-сервера и одну задачу ожидания отключения.
+    """
+
+    def __init__(self, history_size=HISTORY_SIZE):
+        self.version = None
+        self.rates = {}
+        self.payload = b''
+        self.etag = ''
+        self.snapshot_event = b''
+        self.history = deque(maxlen=history_size)
+        self.subscribers = 0
+        self.published = 0
+        self.changed = None
+        self._loop = None
+        self._pending = None
+        self._wake = None
+        self._ready = None
+        self._watcher = None
+
+    async def start(self):
+        """Запустить хаб в текущем event loop (при первом запросе)"""
+        if self._ready is None:
+            self._ready = asyncio.ensure_future(self._start())
+        await asyncio.shield(self._ready)
+
+    async def _start(self):
+        try:
+            self._loop = asyncio.get_running_loop()
+            self._wake = asyncio.Event()
+            self.changed = self._loop.create_future()
+            self.apply(await sync_to_async(snapshot_cache.check)())
+            snapshot_cache.add_listener(self.on_rebuild)
+            self._watcher = asyncio.create_task(self.watch(), name='rates_hub_watcher')
+        except Exception:
+            self._ready = None
+            raise
+
+    def on_rebuild(self, snapshot):
+        """Подписчик кеша справочников: вызывается в потоке, пересобравшем снимок"""
+        self._pending = snapshot
+        try:
+            self._loop.call_soon_threadsafe(self._wake.set)
+        except RuntimeError:
+            # Event loop уже закрыт (остановка процесса)
+            pass
+
+    async def watch(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wake.wait(), settings.API_RATES_STREAM_CHECK_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            self._wake.clear()
+            snapshot, self._pending = self._pending, None
+            try:
+                if snapshot is None and self.subscribers:
+                    # Правки из других процессов видны только по отпечатку таблиц
+                    snapshot = await sync_to_async(snapshot_cache.check)()
+                if snapshot is not None:
+                    self.apply(snapshot)
+            except Exception as e:
+                logger.error("Ошибка при проверке курсов для потока: %s", e, exc_info=True)
+
+    def apply(self, snapshot):
+        """Принять снимок; если курсы изменились — разослать изменения подписчикам"""
+        version = snapshot.rates_version
+        if version == self.version:
+            return False
+        rates = {(rate.currency_from, rate.currency_to): str(rate.rate) for rate in snapshot.rates}
+        if self.version is not None:
+            diff = {
+                'changed': [
+                    {'currency_from': key[0], 'currency_to': key[1], 'rate': rate}
+                    for key, rate in rates.items() if self.rates.get(key) != rate
+                ],
+                'removed': [
+                    {'currency_from': key[0], 'currency_to': key[1]} for key in self.rates if key not in rates
+                ],
+            }
+            self.history.append((self.version, encode_event('rates', version, diff)))
+        self.version, self.rates = version, rates
+        self.payload, self.etag = snapshot.rates_payload, snapshot.rates_etag
+        self.snapshot_event = encode_event('snapshot', version, snapshot.rates_payload)
+
+        changed, self.changed = self.changed, self._loop.create_future()
+        changed.set_result(version)
+        self.published += 1
+        logger.info("Курсы изменились (%s), подписчиков потока: %s", version, self.subscribers)
+        return True
+
+    def events_since(self, version):
+        """События, которые переводят клиента с версии version на текущую"""
+        if version == self.version:
+            return []
+        for index in range(len(self.history) - 1, -1, -1):
+            if self.history[index][0] == version:
+                return [event for _, event in list(self.history)[index:]]
+        return [self.snapshot_event]
+
+
+rates_hub = RatesHub()
+
+
+class RatesStreamApp:
+    """
+    ASGI-приложение потока курсов: SSE на STREAM_PATH и long-poll на POLL_PATH.
+    Остальные запросы (и предварительные CORS-запросы OPTIONS) уходят в Django.
+    """
+
+    def __init__(self, django_app, hub=None):
+        self.django_app = django_app
+        self.hub = hub or rates_hub
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'http' and scope['method'] == 'GET' and scope['path'] in (STREAM_PATH, POLL_PATH):
+            try:
+                await self.hub.start()
+            except Exception as e:
+                logger.error("Не удалось запустить поток курсов: %s", e, exc_info=True)
+                body = json.dumps({'success': False, 'error': 'Внутренняя ошибка сервера'}).encode()
+                await self.respond(send, 500, [(b'content-type', b'application/json')] + cors_headers(scope), body)
+                return
+            try:
+                if scope['path'] == STREAM_PATH:
+                    await self.stream(scope, receive, send)
+                else:
+                    await self.long_poll(scope, receive, send)
+            except OSError:
+                # Клиент отключился во время отправки
+                pass
+        else:
+            await self.django_app(scope, receive, send)
+
+    async def stream(self, scope, receive, send):
+        hub = self.hub
+        headers = dict(scope['headers'])
+        query = parse_qs(scope.get('query_string', b'').decode())
+        # Полифиллы EventSource передают последний id в параметре запроса
+        version = headers.get(b'last-event-id', b'').decode() or query.get('lastEventId', [''])[0] or None
+
+        await send({
+            'type': 'http.response.start',
+            'status': 200,
+            'headers': [
+                (b'content-type', b'text/event-stream'),
+                (b'cache-control', b'no-cache'),
+                # Не буферизовать поток в nginx
+                (b'x-accel-buffering', b'no'),
+            ] + cors_headers(scope),
+        })
+        disconnect = asyncio.ensure_future(wait_disconnect(receive))
+        hub.subscribers += 1
+        try:
+            chunks = [f'retry: {RETRY_MS}\n\n'.encode(), *hub.events_since(version)]
+            version = hub.version
+            await send({'type': 'http.response.body', 'body': b''.join(chunks), 'more_body': True})
+            heartbeat = settings.API_RATES_STREAM_HEARTBEAT
+            while True:
+                if hub.version == version:
+                    done, _ = await asyncio.wait(
+                        (hub.changed, disconnect), timeout=heartbeat, return_when=asyncio.FIRST_COMPLETED
+                    )
+                    if disconnect in done:
+                        return
+                if hub.version != version:
+                    body = b''.join(hub.events_since(version))
+                    version = hub.version
+                else:
+                    body = PING
+                await send({'type': 'http.response.body', 'body': body, 'more_body': True})
+        finally:
+            hub.subscribers -= 1
+            disconnect.cancel()
+
+    async def long_poll(self, scope, receive, send):
+        """
+        Запасной вариант без EventSource: клиент передает текущую версию в If-None-Match
+        (или ?version=) и получает новые курсы, как только они изменятся, либо 304
+        через API_RATES_LONG_POLL_TIMEOUT секунд.
+        """
+        hub = self.hub
+        headers = dict(scope['headers'])
+        query = parse_qs(scope.get('query_string', b'').decode())
+        etag = headers.get(b'if-none-match', b'').decode()
+        version = etag.removeprefix('W/').strip('"') or query.get('version', [''])[0]
+
+        if version == hub.version:
+            disconnect = asyncio.ensure_future(wait_disconnect(receive))
+            hub.subscribers += 1
+            try:
+                done, _ = await asyncio.wait(
+                    (hub.changed, disconnect), timeout=settings.API_RATES_LONG_POLL_TIMEOUT,
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+                if disconnect in done:
+                    return
+            finally:
+                hub.subscribers -= 1
+                disconnect.cancel()
+
+        response_headers = [
+            (b'etag', hub.etag.encode()),
+            # Ответ зависит от момента запроса: не кешировать в CDN и nginx
+            (b'cache-control', b'no-store'),
+        ] + cors_headers(scope)
+        if version == hub.version:
+            await self.respond(send, 304, response_headers, b'')
+        else:
+            await self.respond(send, 200, [(b'content-type', b'application/json')] + response_headers, hub.payload)
+
+    @staticmethod
+    async def respond(send, status, headers, body):
+        await send({'type': 'http.response.start', 'status': status, 'headers': headers})
+        await send({'type': 'http.response.body', 'body': body})
+
+
+async def wait_disconnect(receive):
+    while True:
+        message = await receive()
+        if message['type'] == 'http.disconnect':
+            return
+
+
+def cors_headers(scope):
+    """Заголовки CORS по настройкам django-cors-headers (запросы потока не проходят CorsMiddleware)"""
+    origin = dict(scope['headers']).get(b'origin')
+    if not origin:
+        return []
+    allowed = getattr(settings, 'CORS_ALLOW_ALL_ORIGINS', False) or (
+        origin.decode() in getattr(settings, 'CORS_ALLOWED_ORIGINS', ())
+    )
+    if not allowed:
+        return []
+    headers = [(b'access-control-allow-origin', origin), (b'vary', b'origin')]
+    if getattr(settings, 'CORS_ALLOW_CREDENTIALS', False):
+        headers.append((b'access-control-allow-credentials', b'true'))
+    return headers
@@ -0,0 +1,51 @@
+"""
+Филиалы (тенанты) в режиме нескольких ботов в одном процессе.
+
+Обработчики бота общие для всех филиалов. Текущий филиал хранится в
+contextvar: его выставляет первый обработчик каждого Application
+(BranchScope), а кеш справочников, состояние диалогов и создание заявок
+читают его сами. Фоновые задачи, запущенные из обработчика, и переходы
+в sync_to_async наследуют филиал вместе с контекстом.
+"""
+
+import contextlib
+import contextvars
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+# Группа, выполняемая раньше всех остальных обработчиков Application
+BRANCH_GROUP = -100
+
+# ID филиала текущего обновления; None — основной бот (TELEGRAM_BOT_TOKEN)
+current_branch = contextvars.ContextVar('bot_branch', default=None)
+
+
+def scoped_key(key):
+    """Ключ состояния диалога в пространстве текущего филиала"""
+    branch_id = current_branch.get()
+    return key if branch_id is None else f"{branch_id}:{key}"
+
+
+@contextlib.contextmanager
+def branch_scope(branch_id):
+    """Выполнить блок от имени филиала (например, уведомление о заявке филиала)"""
+    token = current_branch.set(branch_id)
+    try:
+        yield
+    finally:
+        current_branch.reset(token)
+
+
+class BranchScope:
+    """Обработчик группы BRANCH_GROUP: выставляет филиал для всех обработчиков обновления"""
+
+    def __init__(self, branch_id):
+        self.branch_id = branch_id
+
+    async def __call__(self, update, context):
+        current_branch.set(self.branch_id)
+
+
+def install(application, branch_id):
+    application.add_handler(TypeHandler(Update, BranchScope(branch_id)), group=BRANCH_GROUP)
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from bot.cache import snapshot_cache
+from bot.models import BotMessage, ExchangeOrder, ExchangeRate
+
+
+class BootstrapTests(TestCase):
+    """/api/bootstrap/: разделы с известными клиенту версиями не отправляются"""
+
+    url = '/api/bootstrap/'
+
+    def setUp(self):
+        self.rate = ExchangeRate.objects.create(currency_from='USDT', currency_to='Руб', rate=Decimal('95.5000'))
+        BotMessage.objects.create(message_type='about', text='О нас')
+        self.order = ExchangeOrder.objects.create(
+            telegram_user_id=700, order_type='buy', amount=Decimal('100'), exchange_rate=Decimal('90'),
+            amount_to_receive=Decimal('1.11'), full_name='A', wallet_address='T' * 34,
+        )
+        # В TestCase on_commit не срабатывает: снимок пересобираем вручную
+        snapshot_cache.refresh()
+        self.addCleanup(snapshot_cache.invalidate)
+
+    def fetch(self, known=()):
+        response = self.client.get(self.url, {'telegram_user_id': 700, 'known': ','.join(known)})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'private, no-store')
+        return response.json()
+
+    def test_first_launch_returns_all_sections(self):
+        data = self.fetch()
+
+        self.assertEqual(set(data['versions']), {'rates', 'messages', 'orders'})
+        self.assertEqual(data['rates'], [{'currency_from': 'USDT', 'currency_to': 'Руб', 'rate': '95.5000'}])
+        self.assertEqual(data['messages']['about'], 'О нас')
+        self.assertEqual([order['id'] for order in data['orders']['items']], [self.order.pk])
+        self.assertIsNone(data['orders']['next_cursor'])
+
+    def test_known_versions_are_skipped(self):
+        versions = self.fetch()['versions']
+
+        data = self.fetch(versions.values())
+        self.assertEqual(data['versions'], versions)
+        self.assertFalse({'rates', 'messages', 'orders'} & set(data))
+
+        data = self.fetch([versions['rates']])
+        self.assertNotIn('rates', data)
+        self.assertIn('messages', data)
+        self.assertIn('orders', data)
+
+    def test_changed_section_is_sent_again(self):
+        versions = self.fetch()['versions']
+
+        self.rate.rate = Decimal('96.0000')
+        self.rate.save()
+        snapshot_cache.refresh()
+        ExchangeOrder.objects.filter(pk=self.order.pk).update(status='processed')
+
+        data = self.fetch(versions.values())
+        self.assertNotEqual(data['versions']['rates'], versions['rates'])
+        self.assertEqual(data['rates'][0]['rate'], '96.0000')
+        self.assertEqual(data['orders']['items'][0]['status'], 'processed')
+        self.assertNotIn('messages', data)
+
+    def test_without_user_orders_are_not_included(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(set(response.json()['versions']), {'rates', 'messages'})
+        self.assertNotIn('orders', response.json())
+
+    def test_invalid_user_id(self):
+        response = self.client.get(self.url, {'telegram_user_id': 'abc'})
+
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(response.json()['success'])
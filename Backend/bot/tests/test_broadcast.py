@@ -0,0 +1,117 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import TransactionTestCase, override_settings
+from django.utils import timezone
+
+from bot.broadcast import claim_job, run_job, save_checkpoint, send_chunk
+from bot.models import BroadcastJob, TelegramUser
+
+
+@override_settings(BOT_BROADCAST_STALE_AFTER=120)
+class BroadcastClaimFencingTests(TransactionTestCase):
+    """Прогресс рассылки пишет только исполнитель, который держит захват задания"""
+
+    def test_checkpoint_of_replaced_runner_is_rejected(self):
+        users = [TelegramUser.objects.create(telegram_id=900 + i) for i in range(3)]
+        BroadcastJob.objects.create(text='t')
+        first = claim_job()
+        # Первый исполнитель завис дольше BOT_BROADCAST_STALE_AFTER: задание забирает второй
+        BroadcastJob.objects.filter(pk=first.pk).update(heartbeat_at=timezone.now() - timedelta(minutes=5))
+        second = claim_job()
+
+        self.assertTrue(save_checkpoint(second, users[1].pk, 2, 0, []))
+        self.assertFalse(save_checkpoint(first, users[2].pk, 3, 0, [users[2].telegram_id]))
+
+        job = BroadcastJob.objects.get()
+        self.assertEqual((job.last_user_pk, job.sent_count, job.blocked_count), (users[1].pk, 2, 0))
+        self.assertFalse(TelegramUser.objects.get(pk=users[2].pk).is_blocked)
+
+    @override_settings(BOT_BROADCAST_STALE_AFTER=0.3)
+    def test_heartbeat_is_kept_during_a_long_chunk(self):
+        BroadcastJob.objects.create(text='t')
+        job = claim_job()
+        started = job.heartbeat_at
+
+        async def send(delay):
+            await asyncio.sleep(delay)
+            return delay
+
+        results = async_to_sync(send_chunk)(job, [send(0.35), send(0.01)])
+
+        self.assertEqual(results, [0.35, 0.01])
+        self.assertGreater(BroadcastJob.objects.get().heartbeat_at, started)
+        # Пока пачка отправляется, задание не считается зависшим
+        self.assertIsNone(claim_job())
+
+    @override_settings(BOT_BROADCAST_STALE_AFTER=0.15)
+    def test_chunk_stops_when_job_is_cancelled(self):
+        BroadcastJob.objects.create(text='t')
+        job = claim_job()
+        BroadcastJob.objects.filter(pk=job.pk).update(status='cancelled')
+
+        results = async_to_sync(send_chunk)(job, [asyncio.sleep(5)])
+
+        self.assertIsNone(results)
+
+
+@override_settings(BOT_BROADCAST_STALE_AFTER=120, BOT_BROADCAST_CHUNK_SIZE=2, BOT_BROADCAST_RATE=1000)
+class RunJobTests(TransactionTestCase):
+    """Выполнение рассылки пачками (bot.broadcast.run_job)"""
+
+    def setUp(self):
+        self.users = [TelegramUser.objects.create(telegram_id=800 + i) for i in range(5)]
+        self.sent = []
+        # Администратор отменяет рассылку во время отправки сообщения с этим номером
+        self.cancel_on = None
+
+    def run(self, result=None):
+        async def send_message(chat_id, **kwargs):
+            self.sent.append(chat_id)
+            if len(self.sent) == self.cancel_on:
+                await sync_to_async(BroadcastJob.objects.update)(status='cancelled')
+
+        # Сообщения «отправляются» в список вместо Bot API
+        bot = SimpleNamespace(send_message=send_message)
+        with patch('bot.broadcast.get_main_bot', AsyncMock(return_value=bot)):
+            return super().run(result)
+
+    def test_stale_job_resumes_from_checkpoint(self):
+        """Исполнитель упал после второй пачки: другой продолжает с last_user_pk"""
+        BroadcastJob.objects.create(
+            text='t', status='running', total_count=5, sent_count=2, last_user_pk=self.users[1].pk,
+            heartbeat_at=timezone.now() - timedelta(minutes=5),
+        )
+
+        job = async_to_sync(run_job)(claim_job())
+
+        self.assertEqual(self.sent, [800 + i for i in range(2, 5)])
+        self.assertEqual((job.status, job.sent_count, job.last_user_pk), ('completed', 5, self.users[4].pk))
+
+    def test_running_job_with_fresh_heartbeat_is_not_taken(self):
+        BroadcastJob.objects.create(text='t', status='running', heartbeat_at=timezone.now())
+        self.assertIsNone(claim_job())
+
+    def test_cancel_stops_job(self):
+        """Отмена во второй пачке: первая сохранена, прогресс второй не пишется, третьей нет"""
+        self.cancel_on = 3
+        BroadcastJob.objects.create(text='t', total_count=5)
+
+        async_to_sync(run_job)(claim_job())
+
+        self.assertEqual(self.sent, [800, 801, 802, 803])
+        job = BroadcastJob.objects.get()
+        self.assertEqual((job.status, job.sent_count, job.last_user_pk), ('cancelled', 2, self.users[1].pk))
+
+    def test_cancel_in_first_chunk(self):
+        self.cancel_on = 1
+        BroadcastJob.objects.create(text='t', total_count=5)
+
+        async_to_sync(run_job)(claim_job())
+
+        self.assertEqual(self.sent, [800, 801])
+        job = BroadcastJob.objects.get()
+        self.assertEqual((job.status, job.sent_count, job.last_user_pk), ('cancelled', 0, 0))
@@ -0,0 +1,57 @@
+import time
+from decimal import Decimal
+
+from django.test import TestCase
+
+from bot.cache import SnapshotCache
+from bot.models import AdminChat, BotMessage, ExchangeRate, SnapshotRevision
+
+
+class SnapshotCacheTests(TestCase):
+    """
+    Кеш справочников (bot.cache) в процессе, где изменения не происходили.
+
+    В TestCase on_commit не срабатывает, поэтому отдельный SnapshotCache видит
+    изменения только через сверку счетчика SnapshotRevision — как другой процесс.
+    """
+
+    ttl = 0.05
+
+    def setUp(self):
+        self.rate = ExchangeRate.objects.create(currency_from='USDT', currency_to='Руб', rate=Decimal('95.5000'))
+        self.cache = SnapshotCache(ttl=self.ttl)
+
+    def rate_after_ttl(self):
+        time.sleep(self.ttl)
+        return self.cache.get().rate_table[('USDT', 'Руб')]
+
+    def test_queryset_update_is_picked_up_after_ttl(self):
+        """update() не вызывает post_save и не меняет updated_at, но увеличивает ревизию"""
+        self.assertEqual(self.cache.get().rate_table[('USDT', 'Руб')], Decimal('95.5000'))
+
+        ExchangeRate.objects.filter(pk=self.rate.pk).update(rate=Decimal('96.0000'))
+
+        # До истечения TTL отдается прежний снимок без запросов к БД
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get().rate_table[('USDT', 'Руб')], Decimal('95.5000'))
+        self.assertEqual(self.rate_after_ttl(), Decimal('96.0000'))
+
+    def test_unchanged_tables_cost_one_query_per_ttl(self):
+        snapshot = self.cache.get()
+        time.sleep(self.ttl)
+        with self.assertNumQueries(1):
+            self.assertIs(self.cache.get(), snapshot)
+
+    def test_every_snapshot_table_bumps_revision(self):
+        revision = SnapshotRevision.objects.get(pk=1).revision
+        BotMessage.objects.create(message_type='start', text='Привет')
+        AdminChat.objects.create(chat_id=1)
+        ExchangeRate.objects.filter(pk=self.rate.pk).update(is_active=False)
+        ExchangeRate.objects.filter(pk=self.rate.pk).delete()
+        self.assertEqual(SnapshotRevision.objects.get(pk=1).revision, revision + 4)
+
+    def test_deactivated_rate_disappears(self):
+        self.cache.get()
+        ExchangeRate.objects.filter(pk=self.rate.pk).update(is_active=False)
+        time.sleep(self.ttl)
+        self.assertEqual(self.cache.get().rate_table, {})
@@ -0,0 +1,71 @@
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram import Update
+from telegram.ext import SimpleUpdateProcessor
+
+from bot.benchmark import make_update
+from bot.catchup import GET_UPDATES_LIMIT, catch_up
+
+
+class BacklogBot:
+    """Bot API getUpdates: offset подтверждает все обновления с меньшим update_id"""
+
+    def __init__(self, count, fail_at_offset=None):
+        self.pending = [Update.de_json(make_update(i, 1000 + i, 'text', f'text {i}'), None) for i in range(1, count + 1)]
+        self.acknowledged = 0
+        self.fail_at_offset = fail_at_offset
+
+    async def get_updates(self, offset=0, limit=100, timeout=0, allowed_updates=None):
+        if offset == self.fail_at_offset:
+            # Процесс упал до того, как запрос дошел до Telegram
+            raise ConnectionError('killed')
+        self.acknowledged = max(self.acknowledged, offset - 1)
+        return [update for update in self.pending if update.update_id >= offset][:limit]
+
+
+class CatchUpTests(SimpleTestCase):
+    """Бэклог подтверждается в Telegram только после обработки"""
+
+    @staticmethod
+    def make_application(bot):
+        # update_id -> сколько было подтверждено в Telegram к началу его обработки
+        processed = {}
+
+        async def process_update(update):
+            processed[update.update_id] = bot.acknowledged
+
+        application = SimpleNamespace(
+            bot=bot, update_processor=SimpleUpdateProcessor(8), process_update=process_update,
+        )
+        return application, processed
+
+    def test_batches_are_acknowledged_after_processing(self):
+        bot = BacklogBot(GET_UPDATES_LIMIT * 2 + 50)
+        application, processed = self.make_application(bot)
+
+        summary = async_to_sync(catch_up)(application)
+
+        self.assertEqual(sorted(processed), list(range(1, 251)))
+        # Ни одно обновление не подтверждено раньше, чем обработано
+        self.assertTrue(all(acknowledged < update_id for update_id, acknowledged in processed.items()))
+        self.assertEqual(bot.acknowledged, 250)
+        self.assertEqual(summary['batches'], 3)
+        self.assertEqual(summary['received'], 250)
+
+    def test_crash_leaves_unacknowledged_batch_in_telegram(self):
+        bot = BacklogBot(GET_UPDATES_LIMIT * 3, fail_at_offset=GET_UPDATES_LIMIT * 2 + 1)
+        application, processed = self.make_application(bot)
+
+        with self.assertRaises(ConnectionError):
+            async_to_sync(catch_up)(application)
+
+        # Вторая пачка обработана, но не подтверждена: Telegram отдаст ее снова после перезапуска
+        self.assertEqual(len(processed), GET_UPDATES_LIMIT * 2)
+        self.assertEqual(bot.acknowledged, GET_UPDATES_LIMIT)
+
+    def test_empty_backlog(self):
+        bot = BacklogBot(0)
+        application, _ = self.make_application(bot)
+        self.assertIsNone(async_to_sync(catch_up)(application))
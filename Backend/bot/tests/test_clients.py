@@ -0,0 +1,87 @@
+import asyncio
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+from telegram import Bot, User
+
+from bot.clients import BotClientRegistry
+
+TOKEN = '1:MAIN'
+OTHER_TOKEN = '2:NOTIFY'
+
+
+class BotClientRegistryTests(SimpleTestCase):
+    """Клиент Bot API создается и инициализируется один раз на пару (токен, event loop)"""
+
+    def setUp(self):
+        self.registry = BotClientRegistry()
+        self.initialized = []
+
+        # initialize() без запроса getMe к Bot API
+        async def initialize(bot):
+            bot._bot_user = User(1, 'bot', True, username='test_bot')
+            bot._initialized = True
+            self.initialized.append(bot.token)
+
+        patcher = patch.object(Bot, 'initialize', initialize)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def run_in_new_loop(self, coroutine):
+        loop = asyncio.new_event_loop()
+        try:
+            return loop.run_until_complete(coroutine)
+        finally:
+            loop.close()
+
+    def test_client_is_reused_in_one_loop(self):
+        async def _run():
+            # Одновременные первые обращения не создают второй клиент
+            clients = await asyncio.gather(*(self.registry.get(TOKEN) for _ in range(5)))
+            again = await self.registry.get(TOKEN)
+            other = await self.registry.get(OTHER_TOKEN)
+            await self.registry.shutdown_loop()
+            return clients, again, other
+
+        clients, again, other = self.run_in_new_loop(_run())
+
+        self.assertEqual(len({id(client) for client in clients}), 1)
+        self.assertIs(again, clients[0])
+        self.assertIsNot(other, again)
+        self.assertEqual(other.token, OTHER_TOKEN)
+        self.assertEqual(self.initialized, [TOKEN, OTHER_TOKEN])
+
+    def test_each_loop_gets_its_own_client(self):
+        async def _get():
+            bot = await self.registry.get(TOKEN)
+            await self.registry.shutdown_loop()
+            return bot
+
+        first = self.run_in_new_loop(_get())
+        second = self.run_in_new_loop(_get())
+
+        self.assertIsNot(first, second)
+        self.assertEqual(self.registry._clients, {})
+
+    def test_shutdown_closes_only_current_loop(self):
+        other_loop = asyncio.new_event_loop()
+        self.addCleanup(other_loop.close)
+        kept = other_loop.run_until_complete(self.registry.get(TOKEN))
+
+        async def _run():
+            await self.registry.get(TOKEN)
+            await self.registry.shutdown_loop()
+
+        self.run_in_new_loop(_run())
+
+        self.assertEqual(list(self.registry._clients.values()), [kept])
+        other_loop.run_until_complete(self.registry.shutdown_loop())
+
+    def test_run_sync_reuses_background_loop_client(self):
+        self.addCleanup(self.registry.close)
+
+        first = self.registry.run_sync(self.registry.get(TOKEN), timeout=5)
+        second = self.registry.run_sync(self.registry.get(TOKEN), timeout=5)
+
+        self.assertIs(first, second)
+        self.assertEqual(self.initialized, [TOKEN])
@@ -0,0 +1,92 @@
+from datetime import datetime
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.test import SimpleTestCase
+
+from bot.digest import MAX_LISTED_IDS, NotificationCoalescer, build_digest
+from bot.models import Cityex24Transfer, ExchangeOrder
+
+
+class NotificationCoalescerTests(SimpleTestCase):
+    """Лимит сообщений администраторам в скользящем окне (bot.digest)"""
+
+    def setUp(self):
+        self.now = 1000.0
+        patcher = patch('bot.digest.time.monotonic', lambda: self.now)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.coalescer = NotificationCoalescer(window=60, max_messages=3)
+
+    def test_quiet_traffic_is_sent_one_by_one(self):
+        self.assertFalse(self.coalescer.should_coalesce(3))
+        self.assertFalse(self.coalescer.should_coalesce(1))
+        self.assertEqual(self.coalescer.hold_for(), 0.0)
+
+    def test_burst_is_coalesced(self):
+        self.coalescer.record(2)
+        self.assertTrue(self.coalescer.should_coalesce(2))
+        # Сводка из одной заявки не нужна
+        self.assertFalse(self.coalescer.should_coalesce(1))
+
+    def test_hold_for_waits_until_oldest_message_leaves_window(self):
+        self.coalescer.record(1)
+        self.now += 20
+        self.coalescer.record(2)
+        self.assertEqual(self.coalescer.hold_for(), 40.0)
+
+        self.now += 40
+        self.assertEqual(self.coalescer.hold_for(), 0.0)
+        self.assertEqual(self.coalescer.stats()['recent_messages'], 2)
+
+    def test_disabled_window(self):
+        coalescer = NotificationCoalescer(window=0, max_messages=1)
+        coalescer.record(5)
+        self.assertFalse(coalescer.should_coalesce(10))
+        self.assertEqual(coalescer.hold_for(), 0.0)
+
+    def test_stats(self):
+        self.coalescer.record(2)
+        self.coalescer.record(1, digested=7)
+        self.assertEqual(self.coalescer.stats(), {
+            'recent_messages': 3, 'single_messages': 2, 'digests': 1, 'digested_entries': 7,
+        })
+
+
+class BuildDigestTests(SimpleTestCase):
+    """Текст сводки по накопившимся заявкам"""
+
+    @staticmethod
+    def order(pk, order_type, amount, to_receive, minute):
+        return ExchangeOrder(
+            id=pk, order_type=order_type, amount=Decimal(amount), amount_to_receive=Decimal(to_receive),
+            created_at=datetime(2026, 10, 17, 12, minute),
+        )
+
+    def test_orders_and_transfers(self):
+        sources = [
+            self.order(3, 'buy', '1000', '10.50', 5),
+            self.order(1, 'buy', '2000', '21', 1),
+            self.order(2, 'sell', '15', '1425.5', 9),
+            Cityex24Transfer(id=7, country='turkey', created_at=datetime(2026, 10, 17, 12, 3)),
+            Cityex24Transfer(id=8, country='turkey', created_at=datetime(2026, 10, 17, 12, 4)),
+        ]
+
+        text = build_digest(sources)
+
+        self.assertIn('Сводка новых заявок: 5', text)
+        self.assertIn('🕒 17.10.2026 12:01 — 12:09', text)
+        self.assertIn('📋 Покупка: 2 — 3000,00 RUB → 31,50 USDT', text)
+        self.assertIn('📋 Продажа: 1 — 15,00 USDT → 1425,50 RUB', text)
+        self.assertIn('🆔 #1, #2, #3', text)
+        self.assertIn('🇹🇷 Турция: 2', text)
+        self.assertIn('🆔 #7, #8', text)
+
+    def test_long_id_list_is_shortened(self):
+        sources = [self.order(pk, 'buy', '1', '1', 0) for pk in range(1, MAX_LISTED_IDS + 6)]
+
+        text = build_digest(sources)
+
+        self.assertIn(f'#{MAX_LISTED_IDS} и еще 5', text)
+        self.assertNotIn(f'#{MAX_LISTED_IDS + 1}', text)
+        self.assertNotIn('Cityex24', text)
@@ -0,0 +1,71 @@
+import asyncio
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram import Update
+
+from bot.benchmark import make_update
+from bot.dispatch import ChatOrderedUpdateProcessor
+
+
+def chat_update(update_id, chat_id):
+    return Update.de_json(make_update(update_id, chat_id, 'text', 'x'), None)
+
+
+class ChatOrderedUpdateProcessorTests(SimpleTestCase):
+    """Параллельная обработка разных чатов и строгий порядок внутри чата (bot.dispatch)"""
+
+    def run_updates(self, processor, updates, delays):
+        log = []
+        running = {'now': 0, 'max': 0}
+
+        async def handle(update):
+            running['now'] += 1
+            running['max'] = max(running['max'], running['now'])
+            log.append(('start', update.update_id))
+            await asyncio.sleep(delays.get(update.update_id, 0.01))
+            log.append(('end', update.update_id))
+            running['now'] -= 1
+
+        async def _run():
+            # Как Application: задача на каждое обновление в порядке поступления
+            await asyncio.gather(*(processor.process_update(update, handle(update)) for update in updates))
+
+        async_to_sync(_run)()
+        return log, running['max']
+
+    def test_same_chat_is_processed_in_order(self):
+        updates = [chat_update(1, 10), chat_update(2, 10), chat_update(3, 10)]
+        # Первое обновление самое медленное: второе все равно ждет его завершения
+        log, _ = self.run_updates(ChatOrderedUpdateProcessor(4), updates, {1: 0.05})
+
+        self.assertEqual(log, [('start', 1), ('end', 1), ('start', 2), ('end', 2), ('start', 3), ('end', 3)])
+
+    def test_other_chats_run_in_parallel(self):
+        updates = [chat_update(1, 10), chat_update(2, 20), chat_update(3, 10)]
+        log, peak = self.run_updates(ChatOrderedUpdateProcessor(4), updates, {1: 0.05})
+
+        self.assertEqual(peak, 2)
+        # Чат 20 не ждет медленное обновление чата 10
+        self.assertLess(log.index(('end', 2)), log.index(('end', 1)))
+        self.assertLess(log.index(('end', 1)), log.index(('start', 3)))
+
+    def test_global_limit(self):
+        processor = ChatOrderedUpdateProcessor(2)
+        log, peak = self.run_updates(processor, [chat_update(i, 100 + i) for i in range(1, 7)], {})
+
+        self.assertEqual(peak, 2)
+        self.assertEqual(len(log), 12)
+        stats = processor.stats()
+        self.assertEqual((stats['processed'], stats['in_flight'], stats['pending'], stats['active_chats']), (6, 0, 0, 0))
+
+    def test_max_pending_bounds_accepted_updates(self):
+        processor = ChatOrderedUpdateProcessor(1, max_pending=2)
+        self.assertEqual(processor.max_concurrent_updates, 2)
+        _, peak = self.run_updates(processor, [chat_update(i, 100 + i) for i in range(1, 5)], {})
+        self.assertEqual(peak, 1)
+
+    def test_updates_without_chat_are_not_ordered(self):
+        self.assertEqual(ChatOrderedUpdateProcessor.chat_key(chat_update(1, 10)), 10)
+        self.assertIsNone(ChatOrderedUpdateProcessor.chat_key(SimpleNamespace(update_id=1)))
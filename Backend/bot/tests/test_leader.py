@@ -0,0 +1,67 @@
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram import Bot, Update, User
+from telegram.ext import ApplicationBuilder, ApplicationHandlerStop, TypeHandler
+
+from bot.benchmark import make_update
+from bot.dispatch import ChatOrderedUpdateProcessor
+from bot.leader import LeaderElectedBot, OffsetTracker
+
+
+class LeaderOffsetTests(SimpleTestCase):
+    """Offset ведущего сдвигается за каждое обработанное обновление (bot.leader)"""
+
+    def setUp(self):
+        self.application = (
+            ApplicationBuilder().token('1:TEST').updater(None)
+            .concurrent_updates(ChatOrderedUpdateProcessor(4)).build()
+        )
+        self.node = LeaderElectedBot(self.application, node_id='test', ttl=30, retry_interval=1)
+        self.handled = []
+
+    def run_updates(self, count):
+        tracker = OffsetTracker(1)
+        updates = tracker.accept([Update.de_json(make_update(i, 100 + i, 'text', 'x'), None) for i in range(1, count + 1)])
+
+        async def _run():
+            with patch.object(Bot, 'get_me', AsyncMock(return_value=User(1, 'bot', True, username='test_bot'))):
+                await self.application.initialize()
+            try:
+                for update in updates:
+                    await self.node.process(tracker, update)
+            finally:
+                await self.application.shutdown()
+
+        async_to_sync(_run)()
+        return tracker
+
+    def test_handler_stop_does_not_stall_offset(self):
+        """Обработчик прервал цепочку (ApplicationHandlerStop): обновление все равно отмечено обработанным"""
+        async def stop_chain(update, context):
+            self.handled.append(update.update_id)
+            raise ApplicationHandlerStop
+
+        async def later_group(update, context):
+            self.handled.append(-update.update_id)
+
+        self.application.add_handler(TypeHandler(Update, stop_chain), group=-1)
+        self.application.add_handler(TypeHandler(Update, later_group), group=10)
+
+        tracker = self.run_updates(3)
+
+        self.assertEqual(self.handled, [1, 2, 3])
+        self.assertEqual(tracker.pending, set())
+        self.assertEqual(tracker.offset, 4)
+
+    def test_failing_handler_does_not_stall_offset(self):
+        async def fail(update, context):
+            raise RuntimeError('boom')
+
+        self.application.add_handler(TypeHandler(Update, fail))
+
+        with self.assertLogs('telegram.ext.Application', 'ERROR'):
+            tracker = self.run_updates(2)
+
+        self.assertEqual((tracker.pending, tracker.offset), (set(), 3))
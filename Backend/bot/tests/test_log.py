@@ -0,0 +1,42 @@
+import io
+import logging
+
+from django.test import SimpleTestCase
+
+from bot.log import QueueListenerHandler
+
+
+class QueueListenerHandlerTests(SimpleTestCase):
+    """Очередь логов: аргументы подставляются в потоке вызывающего кода, поток — при первой записи"""
+
+    def setUp(self):
+        self.handler = QueueListenerHandler('logging.StreamHandler', {'stream': io.StringIO()})
+        self.handler.setFormatter(logging.Formatter('%(levelname)s %(message)s'))
+        self.logger = logging.Logger('bot.tests.log')
+        self.logger.addHandler(self.handler)
+
+    def tearDown(self):
+        self.handler.close()
+
+    def output(self):
+        self.handler.stop()
+        return self.handler.targets[0].stream.getvalue()
+
+    def test_listener_starts_on_first_record(self):
+        self.assertIsNone(self.handler.listener)
+        self.logger.warning('first')
+        self.assertIsNotNone(self.handler.listener)
+        self.assertEqual(self.output(), 'WARNING first\n')
+
+    def test_args_are_formatted_in_caller_thread(self):
+        chats = [1]
+        self.logger.warning('chats %s', chats)
+        # Список меняется, пока запись ждет в очереди
+        chats.append(2)
+        self.assertEqual(self.output(), 'WARNING chats [1]\n')
+
+    def test_records_after_stop_are_written_synchronously(self):
+        self.logger.warning('before')
+        self.handler.stop()
+        self.logger.warning('after %d', 1)
+        self.assertEqual(self.handler.targets[0].stream.getvalue(), 'WARNING before\nWARNING after 1\n')
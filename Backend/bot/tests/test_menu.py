@@ -0,0 +1,61 @@
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import TestCase
+
+from bot import menu
+from bot.cache import snapshot_cache
+from bot.menu import COURSES_BUTTON, MAIN_KEYBOARD, STATIC_SECTIONS, MenuRouter
+from bot.models import BotMessage, ExchangeRate
+
+
+class MenuRouterTests(TestCase):
+    """Ответы меню рендерятся один раз на версию снимка справочников (bot.menu)"""
+
+    def setUp(self):
+        self.message = BotMessage.objects.create(message_type='about', text='О нас v1')
+        ExchangeRate.objects.create(currency_from='USDT', currency_to='Руб', rate=Decimal('95.5000'))
+        # В TestCase on_commit не срабатывает: снимок пересобираем вручную
+        snapshot_cache.refresh()
+        self.addCleanup(snapshot_cache.invalidate)
+        self.router = MenuRouter()
+        for button in (*STATIC_SECTIONS, COURSES_BUTTON):
+            self.router.add(button, self.router.reply_static, 'test')
+
+    def press(self, text):
+        message = SimpleNamespace(text=text, reply_text=AsyncMock())
+        handled = async_to_sync(self.router.dispatch)(SimpleNamespace(message=message), None)
+        return handled, message.reply_text
+
+    def test_reply_is_rendered_once_per_version(self):
+        with patch('bot.menu.render_replies', wraps=menu.render_replies) as render:
+            for _ in range(3):
+                handled, reply = self.press('О нас')
+                self.assertTrue(handled)
+                reply.assert_awaited_once_with('О нас v1', reply_markup=MAIN_KEYBOARD)
+            self.press(COURSES_BUTTON)
+        self.assertEqual(render.call_count, 1)
+
+    def test_snapshot_version_change_invalidates_replies(self):
+        self.press('О нас')
+
+        self.message.text = 'О нас v2'
+        self.message.save()
+        ExchangeRate.objects.update(rate=Decimal('96.0000'))
+        snapshot_cache.refresh()
+
+        _, reply = self.press('О нас')
+        reply.assert_awaited_once_with('О нас v2', reply_markup=MAIN_KEYBOARD)
+        _, reply = self.press(COURSES_BUTTON)
+        self.assertIn('USDT → Руб: 96.0000', reply.await_args.args[0])
+
+    def test_fallback_text_for_missing_message(self):
+        _, reply = self.press('AML Проверка')
+        reply.assert_awaited_once_with(STATIC_SECTIONS['AML Проверка'][1], reply_markup=MAIN_KEYBOARD)
+
+    def test_unknown_text_is_not_routed(self):
+        handled, reply = self.press('привет')
+        self.assertFalse(handled)
+        reply.assert_not_awaited()
@@ -0,0 +1,37 @@
+from types import SimpleNamespace
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase
+from telegram.error import NetworkError
+
+from bot.notifications import deliver
+
+# Лимиты без ожиданий: в тестах проверяются только паузы самого deliver()
+NO_LIMITS = (SimpleNamespace(acquire=AsyncMock()), SimpleNamespace(wait=AsyncMock(), defer=lambda *args: None))
+
+
+class DeliverTests(SimpleTestCase):
+    """Повторы отправки в bot.notifications.deliver"""
+
+    def deliver(self, max_attempts, errors):
+        bot = SimpleNamespace(send_message=AsyncMock(side_effect=errors))
+        with patch('bot.notifications.asyncio.sleep', new=AsyncMock()) as sleep:
+            result = async_to_sync(deliver)(bot, 1, 'text', max_attempts=max_attempts, limiters=NO_LIMITS)
+        return result, [call.args[0] for call in sleep.await_args_list]
+
+    def test_no_pause_after_last_network_error(self):
+        result, pauses = self.deliver(3, NetworkError('Bad Gateway'))
+
+        self.assertFalse(result.ok)
+        self.assertEqual((result.attempts, result.error_type), (3, 'NetworkError'))
+        self.assertEqual(pauses, [2, 4])
+
+    def test_single_attempt_does_not_wait(self):
+        result, pauses = self.deliver(1, NetworkError('Bad Gateway'))
+        self.assertEqual((result.ok, pauses), (False, []))
+
+    def test_retry_after_network_error_succeeds(self):
+        result, pauses = self.deliver(3, [NetworkError('Bad Gateway'), None])
+        self.assertEqual((result.ok, result.attempts, result.error), (True, 2, ''))
+        self.assertEqual(pauses, [2])
@@ -0,0 +1,85 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.test import TestCase
+from django.utils import timezone
+
+from bot.models import ExchangeOrder
+from bot.views import decode_order_cursor, encode_order_cursor
+
+
+class UserOrdersCursorTests(TestCase):
+    """Страницы /api/orders/user/ по курсору (created_at, id), без OFFSET"""
+
+    url = '/api/orders/user/'
+
+    def create_orders(self, created_at, count, user_id=700, status='pending'):
+        orders = []
+        for _ in range(count):
+            order = ExchangeOrder.objects.create(
+                telegram_user_id=user_id, order_type='buy', amount=Decimal('100'), exchange_rate=Decimal('90'),
+                amount_to_receive=Decimal('1.11'), full_name='A', wallet_address='T' * 34, status=status,
+            )
+            ExchangeOrder.objects.filter(pk=order.pk).update(created_at=created_at)
+            orders.append(order.pk)
+        return orders
+
+    def fetch_all(self, **params):
+        ids, cursor, pages = [], None, 0
+        while True:
+            query = {'telegram_user_id': 700, **params}
+            if cursor:
+                query['cursor'] = cursor
+            data = self.client.get(self.url, query).json()
+            self.assertTrue(data['success'])
+            ids += [order['id'] for order in data['orders']]
+            pages += 1
+            cursor = data['next_cursor']
+            if cursor is None:
+                return ids, pages
+
+    def test_pages_cover_all_orders_once(self):
+        now = timezone.now()
+        older = self.create_orders(now - timedelta(hours=1), 3)
+        newer = self.create_orders(now, 4)
+
+        ids, pages = self.fetch_all(limit=3)
+
+        self.assertEqual(ids, sorted(newer, reverse=True) + sorted(older, reverse=True))
+        self.assertEqual(pages, 3)
+
+    def test_ties_on_created_at_split_across_pages(self):
+        """Заявки с одинаковым created_at на границе страницы не теряются и не повторяются"""
+        same = self.create_orders(timezone.now(), 5)
+
+        ids, pages = self.fetch_all(limit=2)
+
+        self.assertEqual(ids, sorted(same, reverse=True))
+        self.assertEqual(pages, 3)
+
+    def test_status_filter_and_other_users(self):
+        now = timezone.now()
+        processed = self.create_orders(now, 2, status='processed')
+        self.create_orders(now, 2, status='pending')
+        self.create_orders(now, 2, user_id=701, status='processed')
+
+        ids, _ = self.fetch_all(limit=1, status='processed')
+
+        self.assertEqual(ids, sorted(processed, reverse=True))
+
+    def test_last_page_has_no_cursor(self):
+        self.create_orders(timezone.now(), 2)
+        data = self.client.get(self.url, {'telegram_user_id': 700, 'limit': 2}).json()
+        self.assertEqual(len(data['orders']), 2)
+        self.assertIsNone(data['next_cursor'])
+
+    def test_cursor_roundtrip(self):
+        created_at = timezone.now()
+        self.assertEqual(decode_order_cursor(encode_order_cursor({'created_at': created_at, 'id': 42})), (created_at, 42))
+
+    def test_invalid_params(self):
+        for params in ({'cursor': 'not-a-cursor'}, {'limit': '0'}, {'limit': 'x'}, {'status': 'unknown'}):
+            with self.subTest(params=params):
+                response = self.client.get(self.url, {'telegram_user_id': 700, **params})
+                self.assertEqual(response.status_code, 400)
+                self.assertFalse(response.json()['success'])
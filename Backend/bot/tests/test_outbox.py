@@ -0,0 +1,179 @@
+import asyncio
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.contrib.admin import site
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+
+from bot.admin import NotificationOutboxAdmin
+from bot.models import NotificationOutbox
+from bot.outbox import claim_batch, dispatch_batch, enqueue, mark_failed, mark_sent, retry_delay
+
+# Диспетчер без сводок: каждое уведомление отправляется отдельно
+NO_DIGEST = SimpleNamespace(should_coalesce=lambda count: False, record=lambda *args, **kwargs: None)
+
+
+@override_settings(BOT_OUTBOX_BATCH_SIZE=20, BOT_OUTBOX_LEASE=120, BOT_OUTBOX_MAX_ATTEMPTS=3, BOT_OUTBOX_RETRY_BASE=10)
+class OutboxClaimTests(TestCase):
+    """Захват пачки уведомлений (bot.outbox.claim_batch)"""
+
+    def test_claims_due_entries_once(self):
+        due = enqueue('exchange_order', 1)
+        NotificationOutbox.objects.create(
+            kind='exchange_order', object_id=2, next_attempt_at=timezone.now() + timedelta(minutes=5)
+        )
+
+        claimed = claim_batch()
+
+        self.assertEqual([entry.pk for entry in claimed], [due.pk])
+        entry = claimed[0]
+        self.assertEqual(entry.status, 'processing')
+        self.assertEqual(entry.attempts, 1)
+        self.assertGreater(entry.next_attempt_at, timezone.now() + timedelta(seconds=100))
+        # Второй диспетчер не получит уже захваченное уведомление
+        self.assertEqual(claim_batch(), [])
+
+    def test_expired_lease_is_reclaimed(self):
+        """Диспетчер упал после захвата: по истечении аренды уведомление забирает другой"""
+        entry = enqueue('cityex24_transfer', 1)
+        claim_batch()
+        NotificationOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+
+        claimed = claim_batch()
+
+        self.assertEqual([item.pk for item in claimed], [entry.pk])
+        self.assertEqual(claimed[0].attempts, 2)
+
+    def test_batch_size_and_order(self):
+        now = timezone.now()
+        entries = [
+            NotificationOutbox.objects.create(kind='exchange_order', object_id=i, next_attempt_at=now - timedelta(seconds=i))
+            for i in range(5)
+        ]
+        claimed = claim_batch(batch_size=2)
+        self.assertEqual({entry.pk for entry in claimed}, {entries[4].pk, entries[3].pk})
+
+
+@override_settings(BOT_OUTBOX_MAX_ATTEMPTS=3, BOT_OUTBOX_RETRY_BASE=10)
+class OutboxRetryTests(TestCase):
+    """Повторы с экспоненциальной задержкой и dead-letter"""
+
+    def test_retry_delay_doubles_up_to_an_hour(self):
+        self.assertEqual(retry_delay(1), timedelta(seconds=10))
+        self.assertEqual(retry_delay(2), timedelta(seconds=20))
+        self.assertEqual(retry_delay(4), timedelta(seconds=80))
+        self.assertEqual(retry_delay(20), timedelta(hours=1))
+
+    def test_failed_entry_is_rescheduled(self):
+        enqueue('exchange_order', 1)
+        entry = claim_batch()[0]
+
+        before = timezone.now()
+        mark_failed(entry, 'Bad Gateway')
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'pending')
+        self.assertEqual(entry.last_error, 'Bad Gateway')
+        self.assertGreaterEqual(entry.next_attempt_at, before + timedelta(seconds=10))
+        # До срока повтора уведомление не забирается
+        self.assertEqual(claim_batch(), [])
+
+    def test_last_attempt_goes_to_dead_letter(self):
+        entry = enqueue('exchange_order', 1)
+        NotificationOutbox.objects.filter(pk=entry.pk).update(attempts=2)
+        entry = claim_batch()[0]
+        self.assertEqual(entry.attempts, 3)
+
+        mark_failed(entry, 'Forbidden')
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'dead')
+        NotificationOutbox.objects.filter(pk=entry.pk).update(next_attempt_at=timezone.now() - timedelta(days=1))
+        self.assertEqual(claim_batch(), [])
+
+    def test_late_result_does_not_overwrite_reclaimed_entry(self):
+        """Первый диспетчер не уложился в аренду: уведомление забрал второй, поздний результат отброшен"""
+        enqueue('exchange_order', 1)
+        first = claim_batch()[0]
+        NotificationOutbox.objects.filter(pk=first.pk).update(next_attempt_at=timezone.now() - timedelta(seconds=1))
+        second = claim_batch()[0]
+
+        self.assertTrue(mark_sent(second))
+        self.assertFalse(mark_failed(first, 'Timed out'))
+
+        entry = NotificationOutbox.objects.get(pk=first.pk)
+        self.assertEqual((entry.status, entry.last_error), ('sent', ''))
+
+    def test_mark_sent(self):
+        enqueue('exchange_order', 1)
+        entry = claim_batch()[0]
+        mark_sent(entry)
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'sent')
+        self.assertIsNotNone(entry.sent_at)
+
+
+@override_settings(BOT_OUTBOX_MAX_ATTEMPTS=3, BOT_OUTBOX_RETRY_BASE=10)
+class DispatchBatchTests(TransactionTestCase):
+    """Пачка диспетчера: успешные отмечаются отправленными, ошибки — на повтор"""
+
+    def test_results_are_recorded_per_entry(self):
+        ok = enqueue('exchange_order', 1)
+        failed = enqueue('exchange_order', 2)
+        crashed = enqueue('exchange_order', 3)
+
+        async def send_entry(entry):
+            if entry.object_id == 3:
+                raise RuntimeError('boom')
+            return '' if entry.object_id == 1 else 'Нет активных chat_id администраторов'
+
+        with patch('bot.outbox.send_entry', send_entry):
+            processed = async_to_sync(dispatch_batch)(coalescer=NO_DIGEST)
+
+        self.assertEqual(processed, 3)
+        statuses = dict(NotificationOutbox.objects.values_list('pk', 'status'))
+        self.assertEqual(statuses, {ok.pk: 'sent', failed.pk: 'pending', crashed.pk: 'pending'})
+        self.assertEqual(NotificationOutbox.objects.get(pk=crashed.pk).last_error, 'boom')
+
+
+    @override_settings(BOT_OUTBOX_SEND_TIMEOUT=0.05)
+    def test_slow_send_is_cut_before_lease_expires(self):
+        entry = enqueue('exchange_order', 1)
+
+        async def send_entry(entry):
+            await asyncio.sleep(5)
+            return ''
+
+        with patch('bot.outbox.send_entry', send_entry):
+            async_to_sync(dispatch_batch)(coalescer=NO_DIGEST)
+
+        entry.refresh_from_db()
+        self.assertEqual(entry.status, 'pending')
+        self.assertIn('не завершилась', entry.last_error)
+
+class RetryNotificationsActionTests(TestCase):
+    """Действие админки «Повторить отправку»"""
+
+    def test_processing_and_sent_entries_are_not_requeued(self):
+        entries = {
+            status: NotificationOutbox.objects.create(kind='exchange_order', object_id=i, status=status, attempts=3)
+            for i, status in enumerate(('dead', 'pending', 'processing', 'sent'))
+        }
+        model_admin = NotificationOutboxAdmin(NotificationOutbox, site)
+
+        with patch.object(model_admin, 'message_user'):
+            model_admin.retry_notifications(None, NotificationOutbox.objects.all())
+
+        states = {
+            status: NotificationOutbox.objects.values_list('status', 'attempts').get(pk=entry.pk)
+            for status, entry in entries.items()
+        }
+        self.assertEqual(states, {
+            'dead': ('pending', 0),
+            'pending': ('pending', 0),
+            'processing': ('processing', 3),
+            'sent': ('sent', 3),
+        })
@@ -0,0 +1,102 @@
+import json
+import time
+from decimal import Decimal
+from unittest.mock import patch
+
+from django.core import signing
+from django.test import TestCase, override_settings
+
+from bot.cache import snapshot_cache
+from bot.models import ExchangeOrder, ExchangeRate
+from bot.quotes import issue_quote, quote_signer, verify_quote
+
+
+@override_settings(API_QUOTE_TTL=60)
+class QuoteTests(TestCase):
+    """Подписанные котировки (bot.quotes) и заявки по ним"""
+
+    def setUp(self):
+        ExchangeRate.objects.create(currency_from='USDT', currency_to='Руб', rate=Decimal('95.5000'))
+        ExchangeRate.objects.create(currency_from='Руб', currency_to='USDT', rate=Decimal('0.0100'))
+        # В TestCase on_commit не срабатывает: снимок пересобираем вручную
+        snapshot_cache.refresh()
+        self.addCleanup(snapshot_cache.invalidate)
+
+    def issue_expired_quote(self, order_type):
+        # Котировка выдана две минуты назад при сроке действия в минуту
+        with patch('time.time', return_value=time.time() - 120):
+            return issue_quote(order_type)['quote']
+
+    def create_order(self, **data):
+        payload = {'order_type': 'sell', 'amount': '100', 'full_name': 'A', 'wallet_address': 'T' * 34, **data}
+        return self.client.post('/api/orders/', json.dumps(payload), content_type='application/json')
+
+    def test_sign_and_verify(self):
+        quote = issue_quote('sell', Decimal('1000'))
+
+        self.assertEqual(quote['rate'], '95.5000')
+        self.assertEqual(quote['amount_to_receive'], '95500.00')
+        self.assertEqual(verify_quote(quote['quote']), ('sell', Decimal('95.5000')))
+
+    def test_tampered_quote_is_rejected(self):
+        token = issue_quote('sell')['quote']
+        payload, signature = token.split(':', 1)
+        # Клиент подменил курс, оставив подпись исходной котировки
+        forged = signing.b64_encode(b'{"order_type":"sell","rate":"99.0000"}').decode() + ':' + signature
+        other_salt = signing.TimestampSigner(salt='other').sign_object({'order_type': 'sell', 'rate': '99'})
+        unsigned = quote_signer().sign_object({'order_type': 'sell'})
+
+        for token in (forged, payload, other_salt, unsigned, 42):
+            with self.subTest(token=token), self.assertRaises(signing.BadSignature):
+                verify_quote(token)
+
+    def test_expired_quote(self):
+        with self.assertRaises(signing.SignatureExpired):
+            verify_quote(self.issue_expired_quote('sell'))
+
+    def test_quote_endpoint(self):
+        response = self.client.get('/api/quote/', {'order_type': 'buy', 'amount': '1000'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+        data = response.json()
+        self.assertEqual((data['rate'], data['amount_to_receive']), ('0.0100', '100000.00'))
+        self.assertEqual(verify_quote(data['quote']).order_type, 'buy')
+        self.assertEqual(self.client.get('/api/quote/', {'order_type': 'swap'}).status_code, 400)
+
+    def test_order_uses_quoted_rate(self):
+        """Курс изменился после выдачи котировки: заявка создается по курсу из котировки"""
+        token = issue_quote('sell')['quote']
+        ExchangeRate.objects.filter(currency_from='USDT').update(rate=Decimal('90.0000'))
+        snapshot_cache.refresh()
+
+        response = self.create_order(quote=token, exchange_rate='1000')
+
+        self.assertEqual(response.status_code, 201)
+        order = ExchangeOrder.objects.get()
+        self.assertEqual(order.exchange_rate, Decimal('95.5000'))
+        self.assertEqual(order.amount_to_receive, Decimal('9550.00'))
+
+    def test_expired_quote_returns_409_with_new_quote(self):
+        response = self.create_order(quote=self.issue_expired_quote('sell'))
+
+        self.assertEqual(response.status_code, 409)
+        new_quote = response.json()['quote']
+        self.assertEqual(verify_quote(new_quote['quote']).rate, Decimal('95.5000'))
+        self.assertFalse(ExchangeOrder.objects.exists())
+
+    def test_invalid_quotes_are_rejected(self):
+        cases = (
+            ({'quote': 'garbage'}, 400),
+            ({'quote': issue_quote('buy')['quote']}, 400),
+        )
+        for data, status in cases:
+            with self.subTest(data=data):
+                self.assertEqual(self.create_order(**data).status_code, status)
+        self.assertFalse(ExchangeOrder.objects.exists())
+
+    def test_order_without_quote_uses_current_rate(self):
+        response = self.create_order(exchange_rate='1000')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(ExchangeOrder.objects.get().exchange_rate, Decimal('95.5000'))
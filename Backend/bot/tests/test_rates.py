@@ -0,0 +1,70 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from bot.cache import snapshot_cache
+from bot.models import ExchangeRate
+from bot.views import RATES_CACHE_CONTROL
+
+
+class ExchangeRatesConditionalTests(TestCase):
+    """ETag и 304 на /api/exchange-rates/"""
+
+    url = '/api/exchange-rates/'
+
+    def setUp(self):
+        self.rate = ExchangeRate.objects.create(currency_from='USDT', currency_to='Руб', rate=Decimal('95.5000'))
+        # В TestCase on_commit не срабатывает: снимок пересобираем вручную
+        snapshot_cache.refresh()
+        self.addCleanup(snapshot_cache.invalidate)
+
+    def test_response_has_etag_and_cache_control(self):
+        response = self.client.get(self.url)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['rates'], [{'currency_from': 'USDT', 'currency_to': 'Руб', 'rate': '95.5000'}])
+        self.assertTrue(response['ETag'].startswith('"'))
+        self.assertEqual(response['Cache-Control'], RATES_CACHE_CONTROL)
+
+    def test_if_none_match_returns_304(self):
+        etag = self.client.get(self.url)['ETag']
+
+        for header in (etag, f'W/{etag}', f'"other", {etag}', '*'):
+            with self.subTest(header=header):
+                response = self.client.get(self.url, HTTP_IF_NONE_MATCH=header)
+                self.assertEqual(response.status_code, 304)
+                self.assertEqual(response.content, b'')
+                self.assertEqual(response['ETag'], etag)
+                self.assertEqual(response['Cache-Control'], RATES_CACHE_CONTROL)
+
+    def test_head_request(self):
+        etag = self.client.get(self.url)['ETag']
+        self.assertEqual(self.client.head(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_rate_change_gives_new_etag(self):
+        etag = self.client.get(self.url)['ETag']
+
+        self.rate.rate = Decimal('96.0000')
+        self.rate.save()
+        snapshot_cache.refresh()
+
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertEqual(response.json()['rates'][0]['rate'], '96.0000')
+
+    def test_etag_depends_only_on_content(self):
+        """Сохранение без изменения курса пересобирает снимок, но не меняет ETag"""
+        etag = self.client.get(self.url)['ETag']
+        self.rate.save()
+        snapshot_cache.refresh()
+        self.assertEqual(self.client.get(self.url)['ETag'], etag)
+
+    def test_stale_etag_after_revert(self):
+        """Курс вернули к прежнему значению: ETag снова совпадает с закешированным у клиента"""
+        etag = self.client.get(self.url)['ETag']
+        for rate in ('96.0000', '95.5000'):
+            self.rate.rate = Decimal(rate)
+            self.rate.save()
+            snapshot_cache.refresh()
+        self.assertEqual(self.client.get(self.url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
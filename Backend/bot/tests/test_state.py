@@ -0,0 +1,81 @@
+import time
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+from asgiref.sync import async_to_sync
+from django.test import TransactionTestCase
+
+from bot.bot import handle_contact
+from bot.models import Cityex24Transfer, ConversationState, NotificationOutbox
+from bot.state import ConversationStateStore, conversation_state
+from bot.users import profile_cache
+
+
+class ConversationStateStoreTests(TransactionTestCase):
+    """Состояние диалогов в общей БД: его видит узел, ставший ведущим (bot.leader)"""
+
+    def test_state_survives_node_change(self):
+        node = ConversationStateStore()
+        async_to_sync(node.set)(300, 'cityex24_country', 'turkey')
+        self.assertEqual(node.flush(), 1)
+        node.close()
+
+        other = ConversationStateStore()
+        self.assertEqual(async_to_sync(other.get)(300, 'cityex24_country'), 'turkey')
+
+    def test_pop_deletes_row(self):
+        store = ConversationStateStore()
+        async_to_sync(store.set)(301, 'cityex24_country', 'uae')
+        store.flush()
+        async_to_sync(store.pop)(301, 'cityex24_country')
+        store.flush()
+        self.assertFalse(ConversationState.objects.filter(user_id=301).exists())
+
+    def test_expired_state_is_ignored_and_purged(self):
+        ConversationState.objects.create(user_id=302, state='{"cityex24_country": "uae"}', updated_at=time.time() - 10)
+        store = ConversationStateStore(ttl=5)
+
+        self.assertIsNone(async_to_sync(store.get)(302, 'cityex24_country'))
+        async_to_sync(store.set)(303, 'cityex24_country', 'uae')
+        store.flush()
+        self.assertEqual(list(ConversationState.objects.values_list('user_id', flat=True)), [303])
+
+
+class ContactReplayTests(TransactionTestCase):
+    """Повтор обновления с контактом после смены ведущего не создает вторую заявку"""
+
+    def setUp(self):
+        profile_cache.clear()
+
+    def tearDown(self):
+        conversation_state.close()
+        profile_cache.clear()
+
+    def contact_update(self, update_id, user_id):
+        user = SimpleNamespace(id=user_id, username='user', first_name='A', last_name=None)
+        contact = SimpleNamespace(phone_number='+79990000000', first_name='A', last_name=None)
+        message = SimpleNamespace(contact=contact, reply_text=AsyncMock())
+        return SimpleNamespace(update_id=update_id, effective_user=user, message=message)
+
+    def test_replayed_contact_creates_one_transfer(self):
+        context = SimpleNamespace(bot=SimpleNamespace(id=1))
+        async_to_sync(conversation_state.set)(310, 'cityex24_country', 'turkey')
+        update = self.contact_update(500, 310)
+        async_to_sync(handle_contact)(update, context)
+
+        # Узел упал до записи offset и удаления черновика: новый ведущий видит старое состояние
+        async_to_sync(conversation_state.set)(310, 'cityex24_country', 'turkey')
+        replay = self.contact_update(500, 310)
+        async_to_sync(handle_contact)(replay, context)
+
+        transfer = Cityex24Transfer.objects.get()
+        self.assertEqual(transfer.telegram_update, '1:500')
+        self.assertEqual(NotificationOutbox.objects.filter(object_id=transfer.pk).count(), 1)
+        self.assertIsNone(async_to_sync(conversation_state.get)(310, 'cityex24_country'))
+        replay.message.reply_text.assert_awaited_once()
+
+    def test_same_update_id_of_other_bot_is_new_transfer(self):
+        for bot_id in (1, 2):
+            async_to_sync(conversation_state.set)(311, 'cityex24_country', 'uae')
+            async_to_sync(handle_contact)(self.contact_update(501, 311), SimpleNamespace(bot=SimpleNamespace(id=bot_id)))
+        self.assertEqual(Cityex24Transfer.objects.count(), 2)
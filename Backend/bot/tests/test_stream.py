@@ -0,0 +1,192 @@
+import asyncio
+import json
+from decimal import Decimal
+from types import SimpleNamespace
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from bot.stream import POLL_PATH, STREAM_PATH, RatesHub, RatesStreamApp
+
+
+def snapshot(version, **rates):
+    """Снимок справочников с курсами {'USDT_RUB': '95.5'} и версией version"""
+    items = [
+        SimpleNamespace(currency_from=pair.split('_')[0], currency_to=pair.split('_')[1], rate=Decimal(rate))
+        for pair, rate in rates.items()
+    ]
+    payload = json.dumps({'version': version}).encode()
+    return SimpleNamespace(rates_version=version, rates=items, rates_payload=payload, rates_etag=f'"{version}"')
+
+
+def started_hub(history_size=100):
+    """Хаб без наблюдателя за БД: снимки подаются в apply() вручную"""
+    hub = RatesHub(history_size)
+    loop = asyncio.get_running_loop()
+    hub._loop = loop
+    hub.changed = loop.create_future()
+    hub._ready = loop.create_future()
+    hub._ready.set_result(None)
+    return hub
+
+
+def event_data(event):
+    return json.loads(event.split(b'data: ', 1)[1])
+
+
+class RatesHubTests(SimpleTestCase):
+    """Изменения курсов и возобновление по Last-Event-ID (bot.stream.RatesHub)"""
+
+    def test_apply_publishes_diff(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v1', USDT_RUB='95.5', USDT_USD='1'))
+            changed = hub.changed
+            self.assertFalse(hub.apply(snapshot('v1', USDT_RUB='95.5', USDT_USD='1')))
+            self.assertFalse(changed.done())
+
+            self.assertTrue(hub.apply(snapshot('v2', USDT_RUB='96', BTC_USDT='60000')))
+            self.assertEqual(changed.result(), 'v2')
+            return hub
+
+        hub = async_to_sync(_run)()
+
+        self.assertEqual((hub.version, hub.etag, hub.published), ('v2', '"v2"', 2))
+        self.assertEqual(event_data(hub.events_since('v1')[0]), {
+            'changed': [
+                {'currency_from': 'USDT', 'currency_to': 'RUB', 'rate': '96'},
+                {'currency_from': 'BTC', 'currency_to': 'USDT', 'rate': '60000'},
+            ],
+            'removed': [{'currency_from': 'USDT', 'currency_to': 'USD'}],
+        })
+
+    def test_events_since(self):
+        async def _run():
+            hub = started_hub(history_size=2)
+            for index, rate in enumerate(('95', '96', '97', '98'), start=1):
+                hub.apply(snapshot(f'v{index}', USDT_RUB=rate))
+            return hub
+
+        hub = async_to_sync(_run)()
+
+        self.assertEqual(hub.events_since('v4'), [])
+        # Пропущенные изменения приходят по порядку, с id новой версии
+        events = hub.events_since('v2')
+        self.assertEqual([event.split(b'\n')[1] for event in events], [b'id: v3', b'id: v4'])
+        self.assertEqual(event_data(events[1])['changed'][0]['rate'], '98')
+        # Версия вытеснена из истории, неизвестна или не передана — полный снимок
+        for version in ('v1', 'other', None):
+            self.assertEqual(hub.events_since(version), [hub.snapshot_event])
+        self.assertTrue(hub.snapshot_event.startswith(b'event: snapshot\nid: v4\n'))
+
+
+class RatesStreamAppTests(SimpleTestCase):
+    """SSE и long-poll поверх хаба (bot.stream.RatesStreamApp)"""
+
+    def request(self, hub, path, headers=(), query=b'', on_body=None):
+        """Выполнить запрос к приложению; on_body(hub, n) вызывается после n-го куска тела"""
+        app = RatesStreamApp(None, hub=hub)
+        disconnect = asyncio.Event()
+        messages = []
+
+        async def receive():
+            await disconnect.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            messages.append(message)
+            if message['type'] == 'http.response.body' and on_body is not None:
+                on_body(hub, len(messages) - 1)
+            if not message.get('more_body'):
+                disconnect.set()
+
+        scope = {'type': 'http', 'method': 'GET', 'path': path, 'headers': list(headers), 'query_string': query}
+        return app(scope, receive, send), messages, disconnect
+
+    def test_stream_resumes_from_last_event_id(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v1', USDT_RUB='95'))
+            hub.apply(snapshot('v2', USDT_RUB='96'))
+
+            def on_body(hub, count):
+                if count == 1:
+                    hub.apply(snapshot('v3', USDT_RUB='97'))
+                else:
+                    disconnect.set()
+
+            call, messages, disconnect = self.request(hub, STREAM_PATH, [(b'last-event-id', b'v1')], on_body=on_body)
+            await asyncio.wait_for(call, 5)
+            return hub, messages
+
+        hub, messages = async_to_sync(_run)()
+
+        self.assertEqual(messages[0]['status'], 200)
+        first, second = messages[1]['body'], messages[2]['body']
+        self.assertTrue(first.startswith(b'retry: '))
+        self.assertIn(b'event: rates\nid: v2\n', first)
+        self.assertNotIn(b'event: snapshot', first)
+        self.assertTrue(second.startswith(b'event: rates\nid: v3\n'))
+        self.assertEqual(hub.subscribers, 0)
+
+    def test_stream_without_last_event_id_starts_with_snapshot(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v1', USDT_RUB='95'))
+            call, messages, disconnect = self.request(
+                hub, STREAM_PATH, on_body=lambda hub, count: disconnect.set()
+            )
+            await asyncio.wait_for(call, 5)
+            return messages
+
+        messages = async_to_sync(_run)()
+
+        self.assertIn(b'event: snapshot\nid: v1\n', messages[1]['body'])
+
+    @override_settings(API_RATES_LONG_POLL_TIMEOUT=0.05)
+    def test_long_poll_not_modified(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v1', USDT_RUB='95'))
+            call, messages, _ = self.request(hub, POLL_PATH, [(b'if-none-match', b'W/"v1"')])
+            await asyncio.wait_for(call, 5)
+            return hub, messages
+
+        hub, messages = async_to_sync(_run)()
+
+        self.assertEqual(messages[0]['status'], 304)
+        self.assertIn((b'etag', b'"v1"'), messages[0]['headers'])
+        self.assertEqual(messages[1]['body'], b'')
+        self.assertEqual(hub.subscribers, 0)
+
+    @override_settings(API_RATES_LONG_POLL_TIMEOUT=5)
+    def test_long_poll_returns_on_change(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v1', USDT_RUB='95'))
+            call, messages, _ = self.request(hub, POLL_PATH, query=b'version=v1')
+            task = asyncio.ensure_future(call)
+            await asyncio.sleep(0.01)
+            self.assertEqual(hub.subscribers, 1)
+            hub.apply(snapshot('v2', USDT_RUB='96'))
+            await asyncio.wait_for(task, 5)
+            return messages
+
+        messages = async_to_sync(_run)()
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'etag', b'"v2"'), messages[0]['headers'])
+        self.assertEqual(json.loads(messages[1]['body']), {'version': 'v2'})
+
+    def test_long_poll_with_stale_version_returns_at_once(self):
+        async def _run():
+            hub = started_hub()
+            hub.apply(snapshot('v2', USDT_RUB='96'))
+            call, messages, _ = self.request(hub, POLL_PATH, [(b'if-none-match', b'"v1"')])
+            await asyncio.wait_for(call, 1)
+            return messages
+
+        messages = async_to_sync(_run)()
+
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(json.loads(messages[1]['body']), {'version': 'v2'})
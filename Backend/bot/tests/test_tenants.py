@@ -0,0 +1,93 @@
+import asyncio
+from unittest.mock import AsyncMock, patch
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, TestCase, TransactionTestCase
+from telegram import Bot, Update, User
+from telegram.ext import ApplicationBuilder, TypeHandler
+
+from bot import tenants
+from bot.benchmark import make_update
+from bot.cache import snapshot_cache
+from bot.models import BotMessage, Branch
+from bot.state import ConversationStateStore
+from bot.tenants import branch_scope, current_branch, scoped_key
+
+
+class BranchScopeTests(SimpleTestCase):
+    """Филиал текущего обновления в contextvar (bot.tenants)"""
+
+    def test_branch_scope_is_visible_to_all_handlers(self):
+        application = ApplicationBuilder().token('1:TEST').updater(None).build()
+        tenants.install(application, 7)
+        seen = []
+
+        async def handler(update, context):
+            seen.append(current_branch.get())
+
+        application.add_handler(TypeHandler(Update, handler))
+        application.add_handler(TypeHandler(Update, handler), group=5)
+
+        async def _run():
+            with patch.object(Bot, 'get_me', AsyncMock(return_value=User(1, 'bot', True, username='test_bot'))):
+                await application.initialize()
+            try:
+                update = Update.de_json(make_update(1, 100, 'text', 'x'), None)
+                # Как Application: каждое обновление обрабатывается в своей задаче
+                await asyncio.create_task(application.process_update(update))
+            finally:
+                await application.shutdown()
+            return current_branch.get()
+
+        outside = async_to_sync(_run)()
+
+        self.assertEqual(seen, [7, 7])
+        # Филиал не протекает за пределы задачи обновления
+        self.assertIsNone(outside)
+
+    def test_scoped_key(self):
+        self.assertEqual(scoped_key('cityex24_country'), 'cityex24_country')
+        with branch_scope(3):
+            self.assertEqual(scoped_key('cityex24_country'), '3:cityex24_country')
+            with branch_scope(None):
+                self.assertEqual(scoped_key('cityex24_country'), 'cityex24_country')
+            self.assertEqual(current_branch.get(), 3)
+        self.assertIsNone(current_branch.get())
+
+
+class BranchStateTests(TransactionTestCase):
+    """Черновики диалогов одного пользователя в разных ботах-филиалах не смешиваются"""
+
+    def test_state_keys_are_scoped_by_branch(self):
+        store = ConversationStateStore()
+
+        async def _run():
+            await store.set(500, 'cityex24_country', 'turkey')
+            with branch_scope(3):
+                self.assertIsNone(await store.get(500, 'cityex24_country'))
+                await store.set(500, 'cityex24_country', 'uae')
+            with branch_scope(3):
+                self.assertEqual(await store.pop(500, 'cityex24_country'), 'uae')
+            return await store.get(500, 'cityex24_country')
+
+        self.assertEqual(async_to_sync(_run)(), 'turkey')
+        store.close()
+
+
+class BranchSnapshotTests(TestCase):
+    """Снимок справочников филиала: свои сообщения поверх общих"""
+
+    def test_branch_messages_override_defaults(self):
+        branch = Branch.objects.create(name='Филиал', slug='east', bot_token='2:EAST')
+        BotMessage.objects.create(message_type='about', text='Общий')
+        BotMessage.objects.create(message_type='contact', text='Общие контакты')
+        BotMessage.objects.create(message_type='about', text='Филиал', branch=branch)
+        snapshot_cache.refresh()
+        self.addCleanup(snapshot_cache.invalidate)
+
+        self.assertEqual(snapshot_cache.get().messages['about'], 'Общий')
+        with branch_scope(branch.pk):
+            snapshot = snapshot_cache.get()
+        self.assertEqual((snapshot.messages['about'], snapshot.messages['contact']), ('Филиал', 'Общие контакты'))
+        with branch_scope(branch.pk + 1):
+            self.assertEqual(snapshot_cache.get().messages['about'], 'Общий')
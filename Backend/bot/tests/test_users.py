@@ -0,0 +1,116 @@
+import json
+from datetime import timedelta
+
+from django.test import TestCase
+from django.utils import timezone
+
+from bot.broadcast import save_checkpoint
+from bot.models import BroadcastJob, Cityex24Transfer, TelegramUser
+from bot.users import forget_blocked_users, profile_cache, upsert_telegram_user
+
+
+class UpsertTelegramUserTests(TestCase):
+    """Upsert профиля одним запросом (bot.users)"""
+
+    def setUp(self):
+        profile_cache.clear()
+
+    def tearDown(self):
+        profile_cache.clear()
+
+    def test_insert_with_some_fields_uses_model_defaults(self):
+        """Новый пользователь без is_blocked: поле получает default модели, а не NULL"""
+        user = upsert_telegram_user(123, first_name='A')
+
+        row = TelegramUser.objects.get(telegram_id=123)
+        self.assertEqual(user.pk, row.pk)
+        self.assertEqual(row.first_name, 'A')
+        self.assertIsNone(row.username)
+        self.assertFalse(row.is_blocked)
+
+    def test_insert_without_fields(self):
+        upsert_telegram_user(124)
+        self.assertTrue(TelegramUser.objects.filter(telegram_id=124, is_blocked=False).exists())
+
+    def test_update_changes_only_passed_fields(self):
+        TelegramUser.objects.create(telegram_id=125, username='old', first_name='Old', is_blocked=True)
+
+        user = upsert_telegram_user(125, first_name='New')
+
+        row = TelegramUser.objects.get(telegram_id=125)
+        self.assertEqual(user.pk, row.pk)
+        self.assertEqual(row.first_name, 'New')
+        self.assertEqual(row.username, 'old')
+        # Поле с default не передано — при конфликте оно не перезаписывается
+        self.assertTrue(row.is_blocked)
+
+    def test_update_unblocks_user(self):
+        TelegramUser.objects.create(telegram_id=126, is_blocked=True)
+        upsert_telegram_user(126, is_blocked=False)
+        self.assertFalse(TelegramUser.objects.get(telegram_id=126).is_blocked)
+
+    def test_unchanged_profile_skips_database(self):
+        upsert_telegram_user(127, first_name='A', is_blocked=False)
+        with self.assertNumQueries(0):
+            user = upsert_telegram_user(127, first_name='A', is_blocked=False)
+        self.assertEqual(user.first_name, 'A')
+
+    def test_changed_profile_writes_once(self):
+        upsert_telegram_user(128, first_name='A')
+        with self.assertNumQueries(1):
+            upsert_telegram_user(128, first_name='B')
+        self.assertEqual(TelegramUser.objects.get(telegram_id=128).first_name, 'B')
+
+    def test_cityex24_transfer_for_unknown_user(self):
+        """POST /api/cityex24/ от пользователя, которого бот еще не видел"""
+        response = self.client.post('/api/cityex24/', json.dumps({
+            'country': 'turkey',
+            'contact_phone': '+79990000000',
+            'telegram_user_id': 129,
+            'contact_first_name': 'A',
+        }), content_type='application/json')
+
+        self.assertEqual(response.status_code, 201, response.content)
+        transfer = Cityex24Transfer.objects.get()
+        self.assertEqual(transfer.user.telegram_id, 129)
+        self.assertFalse(transfer.user.is_blocked)
+
+
+class BlockedSyncTests(TestCase):
+    """Отметка is_blocked, поставленная рассылкой в другом процессе, не застревает в LRU процесса бота"""
+
+    def setUp(self):
+        profile_cache.clear()
+
+    def tearDown(self):
+        profile_cache.clear()
+
+    def test_user_blocked_elsewhere_is_unblocked_by_next_message(self):
+        profile = {'first_name': 'A', 'is_blocked': False}
+        upsert_telegram_user(200, **profile)
+        since = timezone.now()
+        # Рассылка в другом процессе: пишет в БД, но discard() чистит чужой LRU
+        TelegramUser.objects.filter(telegram_id=200).update(is_blocked=True, updated_at=timezone.now())
+
+        forget_blocked_users(since)
+        with self.assertNumQueries(1):
+            upsert_telegram_user(200, **profile)
+        self.assertFalse(TelegramUser.objects.get(telegram_id=200).is_blocked)
+
+    def test_save_checkpoint_marks_blocked_with_updated_at(self):
+        user = TelegramUser.objects.create(telegram_id=201)
+        old = timezone.now() - timedelta(hours=1)
+        TelegramUser.objects.filter(pk=user.pk).update(updated_at=old)
+        job = BroadcastJob.objects.create(text='t', status='running')
+
+        save_checkpoint(job, user.pk, 0, 0, [201])
+
+        user.refresh_from_db()
+        self.assertTrue(user.is_blocked)
+        self.assertGreater(user.updated_at, old)
+
+    def test_other_users_stay_cached(self):
+        upsert_telegram_user(202, first_name='A', is_blocked=False)
+        forget_blocked_users(timezone.now())
+        with self.assertNumQueries(0):
+            upsert_telegram_user(202, first_name='A', is_blocked=False)
@@ -0,0 +1,42 @@
+import json
+
+from asgiref.sync import async_to_sync
+from django.test import SimpleTestCase, override_settings
+
+from bot.webhook import TelegramWebhookApp
+
+SECRET = 'secret'
+
+
+@override_settings(TELEGRAM_BOT_MODE='webhook', TELEGRAM_WEBHOOK_SECRET=SECRET)
+class WebhookStandbyTests(SimpleTestCase):
+    """Обновления принимает только держатель аренды бота"""
+
+    def post(self, app, update_id):
+        body = json.dumps({'update_id': update_id}).encode()
+        messages = iter([{'type': 'http.request', 'body': body, 'more_body': False}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message)
+
+        scope = {
+            'type': 'http',
+            'method': 'POST',
+            'path': '/telegram/webhook/',
+            'headers': [(b'x-telegram-bot-api-secret-token', SECRET.encode())],
+        }
+        async_to_sync(app)(scope, receive, send)
+        return sent[0]['status']
+
+    def test_standby_worker_rejects_updates(self):
+        app = TelegramWebhookApp(django_app=None)
+        # Application создан, но аренду держит другой процесс
+        app.application = object()
+
+        self.assertEqual(self.post(app, 1), 503)
+        # Отклоненное обновление не попадает в окно повторов: повторную доставку примет держатель
+        self.assertFalse(app.dedup.seen(1))
@@ -0,0 +1,213 @@
+import asyncio
+import logging
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.db import connection
+from django.db.models.signals import post_delete
+from django.utils import timezone
+
+from bot.models import TelegramUser
+
+logger = logging.getLogger(__name__)
+
+PROFILE_FIELDS = ('username', 'first_name', 'last_name', 'is_blocked')
+
+
+class ProfileLRU:
+    """Ограниченный LRU недавно виденных профилей пользователей Telegram"""
+
+    def __init__(self, maxsize=None):
+        self._maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+
+    @property
+    def maxsize(self):
+        if self._maxsize is not None:
+            return self._maxsize
+        return getattr(settings, 'BOT_USER_CACHE_SIZE', 10000)
+
+    def get(self, telegram_id):
+        with self._lock:
+            user = self._data.get(telegram_id)
+            if user is not None:
+                self._data.move_to_end(telegram_id)
+            return user
+
+    def put(self, user):
+        with self._lock:
+            self._data[user.telegram_id] = user
+            self._data.move_to_end(user.telegram_id)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def discard(self, telegram_id):
+        with self._lock:
+            self._data.pop(telegram_id, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        return {
+            'size': len(self._data),
+            'hits': self.hits,
+            'misses': self.misses,
+            'writes': self.writes,
+        }
+
+
+profile_cache = ProfileLRU()
+
+
+def _copy(user):
+    """Отдать вызывающему собственный экземпляр, чтобы он не портил закешированный"""
+    copy = TelegramUser(
+        pk=user.pk,
+        telegram_id=user.telegram_id,
+        username=user.username,
+        first_name=user.first_name,
+        last_name=user.last_name,
+        is_blocked=user.is_blocked,
+        created_at=user.created_at,
+        updated_at=user.updated_at,
+    )
+    copy._state.adding = False
+    copy._state.db = user._state.db
+    return copy
+
+
+def _upsert(telegram_id, fields):
+    """
+    Один запрос INSERT ... ON CONFLICT (telegram_id) DO UPDATE.
+
+    Конфликт разрешает сама БД, поэтому одновременные сообщения от одного
+    пользователя не приводят к IntegrityError. Обновляются только переданные поля.
+    """
+    now = timezone.now()
+    meta = TelegramUser._meta
+    qn = connection.ops.quote_name
+
+    # Остальные поля с default модели (например, is_blocked) в БД значения по умолчанию не имеют:
+    # новая строка получает default модели, а существующая при конфликте их не меняет
+    defaults = {
+        field.name: field.get_default()
+        for field in meta.concrete_fields
+        if field.has_default() and not field.primary_key and field.name not in fields
+    }
+    insert_fields = ['telegram_id', *fields, *defaults, 'created_at', 'updated_at']
+    params = [telegram_id]
+    params += [
+        meta.get_field(name).get_db_prep_value(value, connection)
+        for name, value in [*fields.items(), *defaults.items()]
+    ]
+    params += [meta.get_field('updated_at').get_db_prep_value(now, connection)] * 2
+
+    if not connection.features.can_return_columns_from_insert:
+        # Бэкенды без RETURNING: тот же upsert через ORM и отдельное чтение строки
+        TelegramUser.objects.bulk_create(
+            [TelegramUser(telegram_id=telegram_id, created_at=now, updated_at=now, **fields)],
+            update_conflicts=True,
+            unique_fields=['telegram_id'],
+            update_fields=[*fields, 'updated_at'],
+        )
+        return TelegramUser.objects.get(telegram_id=telegram_id)
+
+    columns = ', '.join(qn(meta.get_field(name).column) for name in insert_fields)
+    placeholders = ', '.join(['%s'] * len(insert_fields))
+    updates = ', '.join(
+        f"{qn(meta.get_field(name).column)} = EXCLUDED.{qn(meta.get_field(name).column)}"
+        for name in [*fields, 'updated_at']
+    )
+    returning = ', '.join(qn(field.column) for field in meta.concrete_fields)
+    sql = (
+        f"INSERT INTO {qn(meta.db_table)} ({columns}) VALUES ({placeholders}) "
+        f"ON CONFLICT ({qn(meta.get_field('telegram_id').column)}) DO UPDATE SET {updates} "
+        f"RETURNING {returning}"
+    )
+    return list(TelegramUser.objects.raw(sql, params))[0]
+
+
+def cached_telegram_user(telegram_id, **fields):
+    """
+    Вернуть пользователя из LRU, если переданные поля совпадают с закешированными, иначе None.
+
+    Не обращается к БД, поэтому безопасно вызывается прямо из event loop.
+    """
+    unknown = set(fields) - set(PROFILE_FIELDS)
+    if unknown:
+        raise ValueError(f"Неизвестные поля профиля: {', '.join(sorted(unknown))}")
+
+    cached = profile_cache.get(int(telegram_id))
+    if cached is None or any(getattr(cached, name) != value for name, value in fields.items()):
+        return None
+    profile_cache.hits += 1
+    return _copy(cached)
+
+
+def upsert_telegram_user(telegram_id, **fields):
+    """
+    Получить или создать пользователя, записывая в БД только изменившиеся данные.
+
+    Если профиль есть в LRU и переданные поля совпадают, запрос к БД не выполняется.
+    Иначе выполняется один upsert, результат которого кладется в LRU.
+    """
+    telegram_id = int(telegram_id)
+    cached = cached_telegram_user(telegram_id, **fields)
+    if cached is not None:
+        return cached
+
+    profile_cache.misses += 1
+    user = _upsert(telegram_id, fields)
+    profile_cache.writes += 1
+    profile_cache.put(user)
+    return _copy(user)
+
+
+def forget_blocked_users(since):
+    """
+    Убрать из LRU пользователей, которых пометили is_blocked начиная с since.
+
+    Отметку ставит рассылка, в том числе в другом процессе, где discard() не достает до этого
+    LRU: без синхронизации закешированный is_blocked=False совпал бы с профилем из следующего
+    сообщения пользователя, запись была бы пропущена, и он остался бы исключен из рассылок.
+    Возвращает отметку времени для следующего вызова.
+    """
+    now = timezone.now()
+    # Запас на расхождение часов процессов и задержку коммита
+    since -= timedelta(seconds=settings.BOT_USER_BLOCKED_SYNC_INTERVAL)
+    telegram_ids = TelegramUser.objects.filter(is_blocked=True, updated_at__gte=since).values_list(
+        'telegram_id', flat=True
+    )
+    for telegram_id in telegram_ids:
+        profile_cache.discard(telegram_id)
+    return now
+
+
+async def run_blocked_sync():
+    """Фоновая задача процесса бота: forget_blocked_users раз в BOT_USER_BLOCKED_SYNC_INTERVAL секунд"""
+    since = timezone.now()
+    while True:
+        await asyncio.sleep(settings.BOT_USER_BLOCKED_SYNC_INTERVAL)
+        try:
+            since = await sync_to_async(forget_blocked_users)(since)
+        except Exception as e:
+            logger.error("Ошибка синхронизации кеша профилей: %s", e, exc_info=True)
+
+
+def _forget_user(sender, instance, **kwargs):
+    profile_cache.discard(instance.telegram_id)
+
+
+def connect_signals():
+    """Убирать удаленных пользователей из LRU, чтобы не ссылаться на несуществующий pk"""
+    post_delete.connect(_forget_user, sender=TelegramUser, dispatch_uid='profile_cache_telegramuser_delete')
@@ -1,27 +1,57 @@
 from django.contrib.admin.views.decorators import staff_member_required
 from django.shortcuts import render, redirect
 from django.contrib import messages
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+from django.utils.cache import get_conditional_response
 from django.utils.decorators import method_decorator
+from django.db import transaction
+from django.db.models import Q
+from django.core import signing
+import base64
+import binascii
 import json
+from datetime import datetime
 from decimal import Decimal, InvalidOperation
 from bot.models import TelegramUser, ExchangeOrder, ExchangeRate, Cityex24Transfer, BotMessage
+from bot.cache import content_version, snapshot_cache
+from bot.quotes import QUOTE_PAIRS, calculate_amount_to_receive, issue_quote, quote_rate, verify_quote
+from bot.users import upsert_telegram_user
 from bot.bot import send_broadcast_message
-import asyncio
-from bot.bot import send_exchange_order_notification, send_notification_to_admin
+from bot.outbox import enqueue as enqueue_notification
+
+# Курсы можно отдавать из кеша браузера, CDN или nginx не дольше, чем их сверяет сам процесс
+RATES_CACHE_CONTROL = (
+    f'public, max-age={settings.API_RATES_MAX_AGE}, '
+    f'stale-while-revalidate={settings.API_RATES_STALE_WHILE_REVALIDATE}'
+)
+
+# Поля заявки в ответе /api/orders/user/ (читаются через values(), без экземпляров модели)
+ORDER_FIELDS = (
+    'id', 'order_type', 'amount', 'exchange_rate', 'amount_to_receive', 'full_name', 'wallet_address',
+    'status', 'created_at', 'updated_at',
+)
+ORDER_TYPE_LABELS = dict(ExchangeOrder.ORDER_TYPE_CHOICES)
+ORDER_STATUS_LABELS = dict(ExchangeOrder.STATUS_CHOICES)
 
 
 @csrf_exempt
 @require_http_methods(["POST"])
 def create_exchange_order(request):
-    """API endpoint для создания заявки на обмен"""
+    """
+    API endpoint для создания заявки на обмен.
+
+    Курс берется из токена котировки quote (/api/quote/): подпись и срок проверяются
+    без обращения к БД. Заявка без quote (Mini App прежней версии) создается по текущему
+    курсу из снимка справочников; exchange_rate от клиента не используется.
+    """
     try:
         data = json.loads(request.body)
         
         # Валидация обязательных полей
-        required_fields = ['order_type', 'amount', 'exchange_rate', 'full_name', 'wallet_address']
+        required_fields = ['order_type', 'amount', 'full_name', 'wallet_address']
         for field in required_fields:
             if field not in data:
                 return JsonResponse({
@@ -36,10 +66,38 @@ def create_exchange_order(request):
                 'error': 'Тип заявки должен быть "buy" или "sell"'
             }, status=400)
         
+        # Курс заявки: из котировки или, без нее, текущий из снимка справочников
+        if data.get('quote'):
+            try:
+                quote = verify_quote(data['quote'])
+            except signing.SignatureExpired:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Курс обновился, подтвердите заявку по новому курсу',
+                    'quote': issue_quote(data['order_type']),
+                }, status=409)
+            except signing.BadSignature:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Недействительная котировка'
+                }, status=400)
+            if quote.order_type != data['order_type']:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Котировка выдана для другого типа заявки'
+                }, status=400)
+            exchange_rate = quote.rate
+        else:
+            exchange_rate = quote_rate(data['order_type'], snapshot_cache.get().rate_table)
+            if exchange_rate is None:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Курс обмена не настроен'
+                }, status=400)
+
         # Валидация и преобразование числовых значений
         try:
             amount = Decimal(str(data['amount']))
-            exchange_rate = Decimal(str(data['exchange_rate']))
             
             if amount <= 0:
                 return JsonResponse({
@@ -47,19 +105,8 @@ def create_exchange_order(request):
                     'error': 'Сумма должна быть больше нуля'
                 }, status=400)
             
-            if exchange_rate <= 0:
-                return JsonResponse({
-                    'success': False,
-                    'error': 'Курс обмена должен быть больше нуля'
-                }, status=400)
-            
             # Расчет суммы к получению
-            if data['order_type'] == 'sell':
-                # Продажа USDT за рубли: amount * rate
-                amount_to_receive = amount * exchange_rate
-            else:
-                # Покупка USDT за рубли: amount / rate
-                amount_to_receive = amount / exchange_rate
+            amount_to_receive = calculate_amount_to_receive(data['order_type'], amount, exchange_rate)
             
         except (InvalidOperation, ValueError, TypeError) as e:
             return JsonResponse({
@@ -82,26 +129,20 @@ def create_exchange_order(request):
                 'error': 'Адрес кошелька не может быть пустым'
             }, status=400)
         
-        # Создание заявки
-        order = ExchangeOrder.objects.create(
-            telegram_user_id=data.get('telegram_user_id'),
-            order_type=data['order_type'],
-            amount=amount,
-            exchange_rate=exchange_rate,
-            amount_to_receive=amount_to_receive,
-            full_name=data['full_name'].strip(),
-            wallet_address=wallet_address,
-            status='pending'
-        )
-        
-        # Отправка уведомления в Telegram бот
-        try:
-            asyncio.run(send_exchange_order_notification(order))
-        except Exception as e:
-            # Логируем ошибку, но не прерываем создание заявки
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Ошибка при отправке уведомления о заявке {order.id}: {e}")
+        # Создание заявки и постановка уведомления в очередь в одной транзакции
+        with transaction.atomic():
+            order = ExchangeOrder.objects.create(
+                telegram_user_id=data.get('telegram_user_id'),
+                order_type=data['order_type'],
+                amount=amount,
+                exchange_rate=exchange_rate,
+                amount_to_receive=amount_to_receive,
+                full_name=data['full_name'].strip(),
+                wallet_address=wallet_address,
+                status='pending'
+            )
+            # Уведомление администраторам отправит диспетчер очереди (bot.outbox)
+            enqueue_notification('exchange_order', order.id)
         
         return JsonResponse({
             'success': True,
@@ -170,39 +211,26 @@ def create_cityex24_transfer(request):
         user = None
         telegram_user_id = data.get('telegram_user_id')
         if telegram_user_id:
-            user, created = TelegramUser.objects.get_or_create(
-                telegram_id=telegram_user_id,
-                defaults={
-                    'first_name': data.get('contact_first_name', ''),
-                    'last_name': data.get('contact_last_name', ''),
-                }
-            )
-            if not created:
-                # Обновляем данные пользователя если они переданы
-                if data.get('contact_first_name'):
-                    user.first_name = data.get('contact_first_name')
-                if data.get('contact_last_name'):
-                    user.last_name = data.get('contact_last_name')
-                user.save()
+            # Обновляем только переданные данные пользователя
+            profile = {}
+            if data.get('contact_first_name'):
+                profile['first_name'] = data.get('contact_first_name')
+            if data.get('contact_last_name'):
+                profile['last_name'] = data.get('contact_last_name')
+            user = upsert_telegram_user(telegram_user_id, **profile)
         
-        # Создание заявки
-        transfer = Cityex24Transfer.objects.create(
-            user=user,
-            country=data['country'],
-            contact_phone=contact_phone,
-            contact_first_name=data.get('contact_first_name', ''),
-            contact_last_name=data.get('contact_last_name', ''),
-            status='new'
-        )
-        
-        # Отправка уведомления в Telegram бот
-        try:
-            asyncio.run(send_notification_to_admin(transfer))
-        except Exception as e:
-            # Логируем ошибку, но не прерываем создание заявки
-            import logging
-            logger = logging.getLogger(__name__)
-            logger.error(f"Ошибка при отправке уведомления о заявке Cityex24 {transfer.id}: {e}")
+        # Создание заявки и постановка уведомления в очередь в одной транзакции
+        with transaction.atomic():
+            transfer = Cityex24Transfer.objects.create(
+                user=user,
+                country=data['country'],
+                contact_phone=contact_phone,
+                contact_first_name=data.get('contact_first_name', ''),
+                contact_last_name=data.get('contact_last_name', ''),
+                status='new'
+            )
+            # Уведомление администраторам отправит диспетчер очереди (bot.outbox)
+            enqueue_notification('cityex24_transfer', transfer.id)
         
         return JsonResponse({
             'success': True,
@@ -234,27 +262,18 @@ def create_cityex24_transfer(request):
 
 
 @csrf_exempt
-@require_http_methods(["GET"])
+@require_http_methods(["GET", "HEAD"])
 def get_exchange_rates(request):
-    """API endpoint для получения активных курсов обмена"""
+    """
+    API endpoint для получения активных курсов обмена.
+
+    Тело ответа заранее закодировано в снимке справочников и пересобирается
+    только при изменении курсов. ETag строится по содержимому курсов, поэтому
+    повторный запрос с If-None-Match получает 304 без тела, а Cache-Control
+    позволяет CDN или микрокешу nginx отвечать без обращения к Django.
+    """
     try:
-        # Получаем активные курсы
-        rates = ExchangeRate.objects.filter(is_active=True)
-        
-        # Формируем ответ
-        rates_data = []
-        for rate in rates:
-            rates_data.append({
-                'currency_from': rate.currency_from,
-                'currency_to': rate.currency_to,
-                'rate': str(rate.rate),
-            })
-        
-        return JsonResponse({
-            'success': True,
-            'rates': rates_data
-        }, status=200)
-        
+        snapshot = snapshot_cache.get()
     except Exception as e:
         import logging
         logger = logging.getLogger(__name__)
@@ -264,11 +283,79 @@ def get_exchange_rates(request):
             'error': 'Внутренняя ошибка сервера'
         }, status=500)
 
+    response = get_conditional_response(request, etag=snapshot.rates_etag)
+    if response is None:
+        response = HttpResponse(snapshot.rates_payload, content_type='application/json')
+    response['ETag'] = snapshot.rates_etag
+    response['Cache-Control'] = RATES_CACHE_CONTROL
+    return response
+
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_quote(request):
+    """
+    API endpoint котировки: курс для типа заявки (order_type) и подписанный токен quote,
+    по которому create_exchange_order создает заявку в течение API_QUOTE_TTL секунд.
+    С параметром amount в ответе есть и сумма к получению.
+
+    Курс берется из таблицы снимка справочников в памяти, без запросов к БД.
+    """
+    try:
+        order_type = request.GET.get('order_type')
+        if order_type not in QUOTE_PAIRS:
+            return JsonResponse({
+                'success': False,
+                'error': 'Тип заявки должен быть "buy" или "sell"'
+            }, status=400)
+
+        amount = request.GET.get('amount')
+        if amount:
+            try:
+                amount = Decimal(amount)
+                if amount <= 0 or not amount.is_finite():
+                    raise ValueError
+            except (InvalidOperation, ValueError):
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Сумма должна быть числом больше нуля'
+                }, status=400)
+        else:
+            amount = None
+
+        quote = issue_quote(order_type, amount)
+        if quote is None:
+            return JsonResponse({
+                'success': False,
+                'error': 'Курс обмена не настроен'
+            }, status=404)
+
+        response = JsonResponse({'success': True, **quote}, status=200)
+        # Каждая котировка подписана на момент запроса: не кешировать
+        response['Cache-Control'] = 'no-store'
+        return response
+
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Ошибка при расчете котировки: {e}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': 'Внутренняя ошибка сервера'
+        }, status=500)
+
 
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_user_orders(request):
-    """API endpoint для получения заявок пользователя"""
+    """
+    API endpoint для получения заявок пользователя.
+
+    Заявки отдаются страницами от новых к старым: limit (не больше API_ORDERS_MAX_PAGE_SIZE),
+    необязательный фильтр status и cursor — значение next_cursor предыдущей страницы.
+    Курсор указывает на (created_at, id) последней отданной заявки, поэтому страница
+    читается по индексу bot_order_user_recent_idx без OFFSET, на любой глубине одинаково быстро.
+    """
     try:
         # Получаем telegram_user_id из query параметров
         telegram_user_id = request.GET.get('telegram_user_id')
@@ -286,31 +373,43 @@ def get_user_orders(request):
                 'success': False,
                 'error': 'Неверный формат telegram_user_id'
             }, status=400)
-        
-        # Получаем заявки пользователя
-        orders = ExchangeOrder.objects.filter(telegram_user_id=telegram_user_id).order_by('-created_at')
-        
-        # Формируем ответ
-        orders_data = []
-        for order in orders:
-            orders_data.append({
-                'id': order.id,
-                'order_type': order.order_type,
-                'order_type_display': order.get_order_type_display(),
-                'amount': str(order.amount),
-                'exchange_rate': str(order.exchange_rate),
-                'amount_to_receive': str(order.amount_to_receive),
-                'full_name': order.full_name,
-                'wallet_address': order.wallet_address,
-                'status': order.status,
-                'status_display': order.get_status_display(),
-                'created_at': order.created_at.isoformat(),
-                'updated_at': order.updated_at.isoformat(),
-            })
+
+        try:
+            limit = min(int(request.GET.get('limit', settings.API_ORDERS_PAGE_SIZE)), settings.API_ORDERS_MAX_PAGE_SIZE)
+            if limit < 1:
+                raise ValueError(limit)
+        except ValueError:
+            return JsonResponse({
+                'success': False,
+                'error': 'Неверный формат limit'
+            }, status=400)
+
+        status = request.GET.get('status')
+        if status and status not in ORDER_STATUS_LABELS:
+            return JsonResponse({
+                'success': False,
+                'error': f'Неверный статус. Допустимые статусы: {", ".join(ORDER_STATUS_LABELS)}'
+            }, status=400)
+
+        cursor = request.GET.get('cursor')
+        if cursor:
+            try:
+                cursor_created_at, cursor_id = decode_order_cursor(cursor)
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Неверный курсор'
+                }, status=400)
+
+        # Получаем страницу заявок пользователя
+        orders_data, next_cursor = user_orders_page(
+            telegram_user_id, limit, status=status, after=(cursor_created_at, cursor_id) if cursor else None
+        )
         
         return JsonResponse({
             'success': True,
-            'orders': orders_data
+            'orders': orders_data,
+            'next_cursor': next_cursor,
         }, status=200)
         
     except Exception as e:
@@ -323,6 +422,56 @@ def get_user_orders(request):
         }, status=500)
 
 
+def user_orders_page(telegram_user_id, limit, status=None, after=None):
+    """
+    Страница заявок пользователя от новых к старым и курсор следующей страницы (None на последней).
+    after — (created_at, id) последней заявки предыдущей страницы.
+    """
+    orders = ExchangeOrder.objects.filter(telegram_user_id=telegram_user_id)
+    if status:
+        orders = orders.filter(status=status)
+    if after:
+        # (created_at, id) < курсора; условие created_at <= ... дает индексу границу диапазона
+        created_at, order_id = after
+        orders = orders.filter(Q(created_at__lt=created_at) | Q(id__lt=order_id), created_at__lte=created_at)
+    rows = list(orders.order_by('-created_at', '-id').values(*ORDER_FIELDS)[:limit + 1])
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    orders_data = []
+    for row in rows:
+        orders_data.append({
+            'id': row['id'],
+            'order_type': row['order_type'],
+            'order_type_display': ORDER_TYPE_LABELS.get(row['order_type'], row['order_type']),
+            'amount': str(row['amount']),
+            'exchange_rate': str(row['exchange_rate']),
+            'amount_to_receive': str(row['amount_to_receive']),
+            'full_name': row['full_name'],
+            'wallet_address': row['wallet_address'],
+            'status': row['status'],
+            'status_display': ORDER_STATUS_LABELS.get(row['status'], row['status']),
+            'created_at': row['created_at'].isoformat(),
+            'updated_at': row['updated_at'].isoformat(),
+        })
+    return orders_data, encode_order_cursor(rows[-1]) if has_more else None
+
+
+def encode_order_cursor(row):
+    """Непрозрачный курсор страницы заявок: created_at и id последней заявки"""
+    raw = f"{row['created_at'].isoformat()}|{row['id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_order_cursor(cursor):
+    try:
+        raw = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, order_id = raw.split('|')
+        return datetime.fromisoformat(created_at), int(order_id)
+    except (ValueError, UnicodeDecodeError, binascii.Error) as e:
+        raise ValueError(f"Неверный курсор: {cursor}") from e
+
+
 @csrf_exempt
 @require_http_methods(["GET"])
 def get_bot_message(request):
@@ -345,18 +494,11 @@ def get_bot_message(request):
                 'error': f'Неверный тип сообщения. Допустимые типы: {", ".join(valid_types)}'
             }, status=400)
         
-        # Получаем сообщение
-        try:
-            bot_message = BotMessage.objects.get(message_type=message_type)
-            return JsonResponse({
-                'success': True,
-                'text': bot_message.text
-            }, status=200)
-        except BotMessage.DoesNotExist:
-            return JsonResponse({
-                'success': True,
-                'text': 'Сообщение не настроено'
-            }, status=200)
+        # Получаем сообщение из кеша справочников
+        return JsonResponse({
+            'success': True,
+            'text': snapshot_cache.get_message(message_type)
+        }, status=200)
         
     except Exception as e:
         import logging
@@ -367,3 +509,61 @@ def get_bot_message(request):
             'error': 'Внутренняя ошибка сервера'
         }, status=500)
 
+
+@csrf_exempt
+@require_http_methods(["GET"])
+def get_bootstrap(request):
+    """
+    API endpoint для запуска Mini App: одним ответом курсы, тексты сообщений бота
+    и первая страница заявок пользователя (если передан telegram_user_id).
+
+    versions — версии разделов по содержимому. Клиент передает известные ему версии
+    в known (через запятую), и неизменившиеся разделы в ответ не попадают. Курсы и
+    сообщения берутся из кеша справочников, заявки — одним запросом по индексу.
+    """
+    try:
+        telegram_user_id = request.GET.get('telegram_user_id')
+        if telegram_user_id:
+            try:
+                telegram_user_id = int(telegram_user_id)
+            except ValueError:
+                return JsonResponse({
+                    'success': False,
+                    'error': 'Неверный формат telegram_user_id'
+                }, status=400)
+        known = set(filter(None, request.GET.get('known', '').split(',')))
+
+        snapshot = snapshot_cache.get()
+        sections = {
+            'rates': (snapshot.rates_version, [
+                {'currency_from': rate.currency_from, 'currency_to': rate.currency_to, 'rate': str(rate.rate)}
+                for rate in snapshot.rates
+            ]),
+            'messages': (snapshot.messages_version, snapshot.messages),
+        }
+        if telegram_user_id:
+            orders_data, next_cursor = user_orders_page(telegram_user_id, settings.API_ORDERS_PAGE_SIZE)
+            orders = {'items': orders_data, 'next_cursor': next_cursor}
+            # Версия заявок — по содержимому первой страницы (статусы, updated_at, курсор)
+            sections['orders'] = (content_version('orders', json.dumps(orders, sort_keys=True).encode()), orders)
+
+        data = {'success': True, 'versions': {}}
+        for name, (version, section) in sections.items():
+            data['versions'][name] = version
+            if version not in known:
+                data[name] = section
+
+        response = JsonResponse(data, status=200)
+        # Ответ содержит заявки пользователя: не кешировать в CDN и nginx
+        response['Cache-Control'] = 'private, no-store'
+        return response
+
+    except Exception as e:
+        import logging
+        logger = logging.getLogger(__name__)
+        logger.error(f"Ошибка при запуске Mini App: {e}", exc_info=True)
+        return JsonResponse({
+            'success': False,
+            'error': 'Внутренняя ошибка сервера'
+        }, status=500)
+
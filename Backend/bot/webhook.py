@@ -0,0 +1,251 @@
+import asyncio
+import hmac
+import json
+import logging
+from collections import deque
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from telegram import Update
+
+from bot.leader import GRACEFUL_TASKS, STOP_TIMEOUT, acquire_lease, default_node_id, lease_key, release_lease, renew_lease
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = b'x-telegram-bot-api-secret-token'
+MAX_BODY_SIZE = 1024 * 1024
+
+
+class UpdateDeduplicator:
+    """Окно последних update_id: Telegram повторяет доставку, если ответ не пришел вовремя"""
+
+    def __init__(self, size=1000):
+        self._order = deque(maxlen=size)
+        self._seen = set()
+
+    def seen(self, update_id):
+        """Вернуть True, если update_id уже обрабатывался, иначе запомнить его"""
+        if update_id in self._seen:
+            return True
+        if len(self._order) == self._order.maxlen:
+            self._seen.discard(self._order[0])
+        self._order.append(update_id)
+        self._seen.add(update_id)
+        return False
+
+
+class TelegramWebhookApp:
+    """
+    ASGI-приложение, принимающее обновления Telegram через webhook.
+
+    Запросы на TELEGRAM_WEBHOOK_PATH проверяются по секретному токену, дубликаты
+    update_id отбрасываются, а обновления передаются в очередь Application с
+    обычными обработчиками бота. Остальные запросы уходят в Django.
+
+    Обновления обрабатывает только один процесс: отсеивание дубликатов, порядок
+    обновлений чата и состояние диалогов живут в памяти процесса. Процесс занимает
+    аренду бота (BotLease, как run_bot --standby) и только с ней принимает обновления
+    и запускает фоновые задачи (очередь уведомлений, рассылки, запись состояния).
+    Остальные воркеры ASGI-сервера обслуживают Django, на webhook отвечают 503
+    (Telegram повторит доставку) и подхватывают аренду, если держатель остановится.
+    """
+
+    def __init__(self, django_app):
+        self.django_app = django_app
+        self.application = None
+        self.dedup = UpdateDeduplicator(getattr(settings, 'TELEGRAM_WEBHOOK_DEDUP_SIZE', 1000))
+        self.node_id = default_node_id()
+        self.key = None
+        self.epoch = None
+        self.leading = False
+        self._tasks = []
+        self._keeper = None
+        self._start_lock = None
+
+    @property
+    def enabled(self):
+        return settings.TELEGRAM_BOT_MODE == 'webhook'
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+        elif scope['type'] == 'http' and self.enabled and scope['path'] == settings.TELEGRAM_WEBHOOK_PATH:
+            await self.handle_webhook(scope, receive, send)
+        else:
+            await self.django_app(scope, receive, send)
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                try:
+                    if self.enabled:
+                        await self.start()
+                except Exception as e:
+                    logger.error("Ошибка при запуске webhook-бота: %s", e, exc_info=True)
+                    await send({'type': 'lifespan.startup.failed', 'message': str(e)})
+                    return
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                await self.stop()
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    async def start(self):
+        """Инициализировать Application и попробовать занять аренду (один раз на процесс)"""
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self.application is not None:
+                return
+            from bot.bot import build_application
+            from bot.cache import snapshot_cache
+
+            application = build_application(webhook=True)
+            await sync_to_async(snapshot_cache.warm)()
+            await application.initialize()
+            self.application = application
+            self.key = lease_key(application.bot.token)
+            lease = await sync_to_async(acquire_lease)(self.key, self.node_id, settings.BOT_LEASE_TTL)
+            if lease is not None:
+                await self.activate(lease)
+            else:
+                logger.warning(
+                    "Webhook %s обслуживает другой процесс: %s в резерве. "
+                    "Обновления принимает один процесс — направьте %s на ASGI-сервер с одним воркером",
+                    self.key, self.node_id, settings.TELEGRAM_WEBHOOK_PATH,
+                )
+            self._keeper = asyncio.create_task(self.keep_lease(), name="webhook_lease_keeper")
+
+    async def activate(self, lease):
+        """Начать прием обновлений и фоновые задачи процесса бота"""
+        from bot.bot import process_tasks
+
+        # Фоновые задачи ведем сами, как bot.leader: Application.stop() ждал бы бесконечные циклы
+        await self.application.start()
+        self._tasks = [asyncio.create_task(coroutine, name=name) for coroutine, name in process_tasks(self.application)]
+        self.epoch = lease.epoch
+        self.leading = True
+        logger.info("Бот запущен в режиме webhook (аренда %s, поколение %s)", self.key, self.epoch)
+
+    async def deactivate(self):
+        """Прекратить прием обновлений: дообработать принятые и остановить фоновые задачи"""
+        self.leading = False
+        application = self.application
+        await application.stop()
+        if application.post_stop:
+            await application.post_stop(application)
+        graceful = [task for task in self._tasks if task.get_name() in GRACEFUL_TASKS]
+        if graceful:
+            await asyncio.wait(graceful, timeout=STOP_TIMEOUT)
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def keep_lease(self):
+        """Продлевать аренду каждую треть срока; в резерве — пробовать захватить ее"""
+        ttl = settings.BOT_LEASE_TTL
+        loop = asyncio.get_running_loop()
+        renewed_at = loop.time()
+        while True:
+            await asyncio.sleep(ttl / 3 if self.leading else settings.BOT_LEASE_RETRY_INTERVAL)
+            try:
+                if self.leading:
+                    started = loop.time()
+                    if await sync_to_async(renew_lease)(self.key, self.node_id, self.epoch, ttl, 0):
+                        renewed_at = started
+                        continue
+                    logger.error("Аренду %s перехватил другой процесс: прием обновлений остановлен", self.key)
+                    await self.deactivate()
+                else:
+                    lease = await sync_to_async(acquire_lease)(self.key, self.node_id, ttl)
+                    if lease is not None:
+                        await self.activate(lease)
+                        renewed_at = loop.time()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error("Ошибка аренды webhook %s: %s", self.key, e, exc_info=True)
+                if self.leading and loop.time() - renewed_at >= ttl * 2 / 3:
+                    # Аренда вот-вот истечет: ее может занять другой процесс
+                    await self.deactivate()
+
+    async def stop(self):
+        if self.application is None:
+            return
+        application = self.application
+        if self._keeper is not None:
+            self._keeper.cancel()
+            await asyncio.gather(self._keeper, return_exceptions=True)
+            self._keeper = None
+        if self.leading:
+            await self.deactivate()
+            try:
+                await sync_to_async(release_lease)(self.key, self.node_id, self.epoch, 0)
+            except Exception as e:
+                logger.error("Не удалось освободить аренду %s: %s", self.key, e)
+        self.application = None
+        await application.shutdown()
+        if application.post_shutdown:
+            await application.post_shutdown(application)
+        logger.info("Webhook-бот остановлен")
+
+    async def handle_webhook(self, scope, receive, send):
+        if scope['method'] != 'POST':
+            await self.respond(send, 405)
+            return
+
+        headers = dict(scope['headers'])
+        secret = settings.TELEGRAM_WEBHOOK_SECRET.encode()
+        if not secret or not hmac.compare_digest(headers.get(SECRET_HEADER, b''), secret):
+            logger.warning("Webhook: запрос с неверным секретным токеном отклонен")
+            await self.respond(send, 403)
+            return
+
+        body = await self.read_body(receive)
+        if body is None:
+            await self.respond(send, 413)
+            return
+
+        try:
+            data = json.loads(body)
+            update_id = data['update_id']
+        except (ValueError, KeyError, TypeError):
+            await self.respond(send, 400)
+            return
+
+        if self.application is None:
+            await self.start()
+        if not self.leading:
+            # Обновления принимает держатель аренды; Telegram повторит доставку
+            logger.warning("Webhook: обновление %s отклонено, процесс %s в резерве", update_id, self.node_id)
+            await self.respond(send, 503)
+            return
+
+        # Telegram ждет быстрый ответ, поэтому обработка идет через очередь Application
+        if not self.dedup.seen(update_id):
+            await self.application.update_queue.put(Update.de_json(data, self.application.bot))
+        else:
+            logger.info("Webhook: повторное обновление %s пропущено", update_id)
+
+        await self.respond(send, 200)
+
+    async def read_body(self, receive):
+        body = b''
+        more_body = True
+        while more_body:
+            message = await receive()
+            body += message.get('body', b'')
+            more_body = message.get('more_body', False)
+            if len(body) > MAX_BODY_SIZE:
+                return None
+        return body
+
+    async def respond(self, send, status):
+        await send({
+            'type': 'http.response.start',
+            'status': status,
+            'headers': [(b'content-type', b'text/plain; charset=utf-8')],
+        })
+        await send({'type': 'http.response.body', 'body': b''})
@@ -13,5 +13,11 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'config.settings')
 
-application = get_asgi_application()
+django_application = get_asgi_application()
 
+# Webhook Telegram-бота обслуживается тем же ASGI-сервером (TELEGRAM_BOT_MODE=webhook)
+from bot.webhook import TelegramWebhookApp  # noqa: E402
+# Поток изменений курсов для Mini App (SSE и long-poll) держит соединения в event loop, минуя Django
+from bot.stream import RatesStreamApp  # noqa: E402
+
+application = TelegramWebhookApp(RatesStreamApp(django_application))
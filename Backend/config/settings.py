@@ -37,6 +37,121 @@ else:
 TELEGRAM_BOT_TOKEN = os.getenv('TELEGRAM_BOT_TOKEN', '')
 TELEGRAM_NOTIFICATION_BOT_TOKEN = os.getenv('TELEGRAM_NOTIFICATION_BOT_TOKEN', '')
 TELEGRAM_ADMIN_CHAT_ID = os.getenv('TELEGRAM_ADMIN_CHAT_ID', '')
+# Адрес Bot API (пусто — https://api.telegram.org); для нагрузочных тестов — локальный manage.py fake_bot_api
+TELEGRAM_API_BASE_URL = os.getenv('TELEGRAM_API_BASE_URL', '')
+
+# Режим получения обновлений: 'polling' (manage.py run_bot) или 'webhook' (через config.asgi)
+TELEGRAM_BOT_MODE = os.getenv('TELEGRAM_BOT_MODE', 'polling')
+# Публичный адрес сервера, например https://example.com (используется командой webhook set)
+TELEGRAM_WEBHOOK_URL = os.getenv('TELEGRAM_WEBHOOK_URL', '')
+TELEGRAM_WEBHOOK_PATH = os.getenv('TELEGRAM_WEBHOOK_PATH', '/telegram/webhook/')
+TELEGRAM_WEBHOOK_SECRET = os.getenv('TELEGRAM_WEBHOOK_SECRET', '')
+
+# Размер пула HTTP-соединений долгоживущих клиентов Bot API (уведомления, рассылки)
+BOT_CLIENT_POOL_SIZE = int(os.getenv('BOT_CLIENT_POOL_SIZE', '32'))
+
+# Общий лимит отправок уведомлений администраторам (сообщений в секунду, лимит Bot API ~30)
+BOT_NOTIFICATION_RATE = float(os.getenv('BOT_NOTIFICATION_RATE', '25'))
+# Максимум попыток доставки уведомления в один чат (RetryAfter, сетевые ошибки)
+BOT_NOTIFICATION_MAX_ATTEMPTS = int(os.getenv('BOT_NOTIFICATION_MAX_ATTEMPTS', '5'))
+
+# Сводки уведомлений администраторам (bot.digest): не больше MAX_MESSAGES сообщений за WINDOW секунд,
+# при всплеске заявки объединяются в одно сообщение; WINDOW=0 отключает сводки
+BOT_NOTIFICATION_DIGEST_WINDOW = float(os.getenv('BOT_NOTIFICATION_DIGEST_WINDOW', '60'))
+BOT_NOTIFICATION_DIGEST_MAX_MESSAGES = int(os.getenv('BOT_NOTIFICATION_DIGEST_MAX_MESSAGES', '6'))
+
+# Очередь уведомлений администраторам (bot.outbox)
+BOT_OUTBOX_BATCH_SIZE = int(os.getenv('BOT_OUTBOX_BATCH_SIZE', '20'))
+BOT_OUTBOX_POLL_INTERVAL = float(os.getenv('BOT_OUTBOX_POLL_INTERVAL', '2'))
+BOT_OUTBOX_MAX_ATTEMPTS = int(os.getenv('BOT_OUTBOX_MAX_ATTEMPTS', '8'))
+# Базовая задержка повтора в секундах (удваивается с каждой попыткой, не более часа)
+BOT_OUTBOX_RETRY_BASE = int(os.getenv('BOT_OUTBOX_RETRY_BASE', '10'))
+# Сколько секунд уведомление считается захваченным диспетчером
+BOT_OUTBOX_LEASE = int(os.getenv('BOT_OUTBOX_LEASE', '120'))
+# Сколько секунд может длиться отправка одного уведомления (с повторами); должно быть меньше BOT_OUTBOX_LEASE
+BOT_OUTBOX_SEND_TIMEOUT = int(os.getenv('BOT_OUTBOX_SEND_TIMEOUT', '60'))
+# Разбирать очередь внутри процесса бота (иначе нужен manage.py dispatch_notifications)
+BOT_OUTBOX_IN_BOT_PROCESS = os.getenv('BOT_OUTBOX_IN_BOT_PROCESS', 'True') == 'True'
+
+# Рассылки пользователям (bot.broadcast)
+BOT_BROADCAST_RATE = float(os.getenv('BOT_BROADCAST_RATE', '28'))
+BOT_BROADCAST_CONCURRENCY = int(os.getenv('BOT_BROADCAST_CONCURRENCY', '20'))
+# Размер пачки, после которой сохраняется контрольная точка
+BOT_BROADCAST_CHUNK_SIZE = int(os.getenv('BOT_BROADCAST_CHUNK_SIZE', '100'))
+BOT_BROADCAST_POLL_INTERVAL = float(os.getenv('BOT_BROADCAST_POLL_INTERVAL', '5'))
+# Через сколько секунд без heartbeat рассылка считается прерванной и продолжается другим исполнителем
+BOT_BROADCAST_STALE_AFTER = int(os.getenv('BOT_BROADCAST_STALE_AFTER', '120'))
+# Выполнять рассылки внутри процесса бота (иначе нужен manage.py run_broadcasts)
+BOT_BROADCAST_IN_BOT_PROCESS = os.getenv('BOT_BROADCAST_IN_BOT_PROCESS', 'True') == 'True'
+
+# Состояние диалогов бота (bot.state): LRU в памяти + отложенная запись в таблицу ConversationState
+BOT_STATE_MAX_USERS = int(os.getenv('BOT_STATE_MAX_USERS', '10000'))
+# Через сколько секунд незавершенный диалог считается брошенным
+BOT_STATE_TTL = int(os.getenv('BOT_STATE_TTL', '86400'))
+BOT_STATE_FLUSH_INTERVAL = float(os.getenv('BOT_STATE_FLUSH_INTERVAL', '1'))
+BOT_STATE_FLUSH_BATCH = int(os.getenv('BOT_STATE_FLUSH_BATCH', '100'))
+
+# Сколько обновлений разных чатов бот обрабатывает одновременно (1 — строго последовательно)
+BOT_CONCURRENT_UPDATES = int(os.getenv('BOT_CONCURRENT_UPDATES', '16'))
+# Предел принятых, но еще не обработанных обновлений (0 — в 4 раза больше BOT_CONCURRENT_UPDATES)
+BOT_MAX_PENDING_UPDATES = int(os.getenv('BOT_MAX_PENDING_UPDATES', '0'))
+# Интервал (в секундах) записи статистики очереди обновлений в лог (0 — отключено)
+BOT_DISPATCH_STATS_INTERVAL = int(os.getenv('BOT_DISPATCH_STATS_INTERVAL', '300'))
+# Режим догона после перезапуска бота (bot.catchup): бэклог забирается и подтверждается пачками
+# после обработки, контакты и /start идут первыми, устаревшие нажатия меню отбрасываются
+BOT_CATCHUP_ENABLED = os.getenv('BOT_CATCHUP_ENABLED', 'True') == 'True'
+# Нажатия кнопок меню старше этого числа секунд не обрабатываются
+BOT_CATCHUP_STALE_AFTER = int(os.getenv('BOT_CATCHUP_STALE_AFTER', '300'))
+# Максимум обновлений, забираемых в режиме догона
+BOT_CATCHUP_MAX_UPDATES = int(os.getenv('BOT_CATCHUP_MAX_UPDATES', '10000'))
+
+# Режим нескольких ботов в одном процессе (bot.host): основной бот и боты активных филиалов
+# (модель Branch) с общими пулом соединений, кешами и очередью уведомлений
+BOT_MULTI_TENANT = os.getenv('BOT_MULTI_TENANT', 'False') == 'True'
+
+# Горячий резерв (bot.leader): run_bot на нескольких узлах с общей БД; getUpdates ведет только
+# держатель аренды (BotLease), остальные захватывают ее после истечения и продолжают с сохраненного offset
+BOT_LEADER_ELECTION = os.getenv('BOT_LEADER_ELECTION', 'False') == 'True'
+# Срок аренды, сек.: ведущий продлевает ее каждую треть срока и прекращает прием, если не смог продлить
+BOT_LEASE_TTL = float(os.getenv('BOT_LEASE_TTL', '10'))
+# Как часто (в секундах) резервный узел пробует захватить аренду
+BOT_LEASE_RETRY_INTERVAL = float(os.getenv('BOT_LEASE_RETRY_INTERVAL', '1'))
+# Имя узла в аренде (по умолчанию hostname:pid)
+BOT_NODE_ID = os.getenv('BOT_NODE_ID', '')
+
+# Метрики процесса бота (bot.metrics): время обработчиков, SQL-запросы на обновление,
+# задержка Bot API по методам, задержка event loop; снимок читает manage.py bot_top
+BOT_METRICS_ENABLED = os.getenv('BOT_METRICS_ENABLED', 'True') == 'True'
+BOT_METRICS_PATH = os.getenv('BOT_METRICS_PATH', str(BASE_DIR / 'bot_metrics.json'))
+# Интервал (в секундах) сохранения снимка метрик в файл
+BOT_METRICS_INTERVAL = float(os.getenv('BOT_METRICS_INTERVAL', '5'))
+
+# Как часто (в секундах) процесс сверяет кеш справочников (сообщения, курсы, chat_id) с БД
+BOT_SNAPSHOT_TTL = int(os.getenv('BOT_SNAPSHOT_TTL', '5'))
+
+# Cache-Control ответа /api/exchange-rates/: сколько секунд браузер, CDN или микрокеш nginx
+# отдают курсы без запроса к Django, и сколько еще могут отдавать устаревшие, обновляя их в фоне
+API_RATES_MAX_AGE = int(os.getenv('API_RATES_MAX_AGE', '5'))
+API_RATES_STALE_WHILE_REVALIDATE = int(os.getenv('API_RATES_STALE_WHILE_REVALIDATE', '30'))
+
+# Поток курсов (ASGI, /api/exchange-rates/stream/ и /poll/): интервал комментариев-пингов SSE,
+# предельное ожидание long-poll и как часто сверять курсы с БД, чтобы заметить правки других процессов
+API_RATES_STREAM_HEARTBEAT = float(os.getenv('API_RATES_STREAM_HEARTBEAT', '15'))
+API_RATES_LONG_POLL_TIMEOUT = float(os.getenv('API_RATES_LONG_POLL_TIMEOUT', '25'))
+API_RATES_STREAM_CHECK_INTERVAL = float(os.getenv('API_RATES_STREAM_CHECK_INTERVAL', '1'))
+
+# Размер страницы /api/orders/user/ по умолчанию и предельный (параметр limit)
+API_ORDERS_PAGE_SIZE = int(os.getenv('API_ORDERS_PAGE_SIZE', '20'))
+API_ORDERS_MAX_PAGE_SIZE = int(os.getenv('API_ORDERS_MAX_PAGE_SIZE', '100'))
+
+# Срок действия котировки /api/quote/ в секундах: столько заявка создается по курсу из токена
+API_QUOTE_TTL = int(os.getenv('API_QUOTE_TTL', '60'))
+
+# Сколько недавно виденных профилей пользователей держать в памяти для пропуска лишних записей
+BOT_USER_CACHE_SIZE = int(os.getenv('BOT_USER_CACHE_SIZE', '10000'))
+# Как часто (в секундах) процесс бота убирает из этого кеша пользователей, которых пометили is_blocked
+# другие процессы (рассылка send_message/run_broadcasts), чтобы следующее сообщение пользователя сняло отметку
+BOT_USER_BLOCKED_SYNC_INTERVAL = float(os.getenv('BOT_USER_BLOCKED_SYNC_INTERVAL', '5'))
 
 
 # Application definition
@@ -57,6 +172,8 @@ INSTALLED_APPS = [
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # Публичные GET-эндпоинты Mini App (курсы) отвечают до сессий и CSRF
+    'bot.middleware.FastPathMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
@@ -136,7 +253,8 @@ WSGI_APPLICATION = 'config.wsgi.application'
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
+        # Файл БД (по умолчанию db.sqlite3 проекта; bench_failover передает узлам отдельную БД прогона)
+        'NAME': os.getenv('DATABASE_PATH', str(BASE_DIR / 'db.sqlite3')),
     }
 }
 
@@ -184,6 +302,54 @@ STATICFILES_DIRS = [
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Logging
+# Записи уходят в очередь и выводятся фоновым потоком (bot.log.QueueListenerHandler),
+# поэтому обработчики бота и views не ждут вывода в stderr
+LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO')
+# Формат вывода: 'text' (прежний текстовый формат) или 'json' (одна строка JSON на запись)
+LOG_FORMAT = os.getenv('LOG_FORMAT', 'text')
+# Не больше стольких информационных записей в секунду на логгер (0 — без ограничения)
+LOG_SAMPLE_RATE = int(os.getenv('LOG_SAMPLE_RATE', '50'))
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'formatters': {
+        'json': {
+            '()': 'bot.log.JsonFormatter',
+        },
+        'text': {
+            'format': '%(asctime)s - %(name)s - %(levelname)s - %(message)s',
+        },
+    },
+    'filters': {
+        'sampling': {
+            '()': 'bot.log.SamplingFilter',
+            'rate': LOG_SAMPLE_RATE,
+            # Успешные отправки уведомлений повторяются на каждую заявку
+            'rates': {'bot.notifications': 10, 'bot.outbox': 10},
+        },
+    },
+    'handlers': {
+        'queue': {
+            '()': 'bot.log.QueueListenerHandler',
+            'handler_class': 'logging.StreamHandler',
+            'formatter': LOG_FORMAT,
+            'filters': ['sampling'],
+        },
+    },
+    'root': {
+        'handlers': ['queue'],
+        'level': LOG_LEVEL,
+    },
+    'loggers': {
+        # httpx пишет INFO на каждый запрос к Bot API
+        'httpx': {'level': 'WARNING'},
+        'telegram': {'level': 'INFO'},
+        'django': {'level': LOG_LEVEL},
+    },
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.0/ref/settings/#default-auto-field
 
@@ -264,6 +430,16 @@ UNFOLD = {
                         "icon": "send",
                         "link": "/admin/bot/send-message/",
                     },
+                    {
+                        "title": "Рассылки",
+                        "icon": "campaign",
+                        "link": "/admin/bot/broadcastjob/",
+                    },
+                    {
+                        "title": "Очередь уведомлений",
+                        "icon": "outbox",
+                        "link": "/admin/bot/notificationoutbox/",
+                    },
                 ],
             },
             {
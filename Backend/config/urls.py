@@ -5,7 +5,7 @@ from django.contrib import admin
 from django.urls import path
 from django.conf import settings
 from django.conf.urls.static import static
-from bot.views import create_exchange_order, create_cityex24_transfer, get_exchange_rates, get_user_orders, get_bot_message
+from bot.views import create_exchange_order, create_cityex24_transfer, get_exchange_rates, get_user_orders, get_bot_message, get_bootstrap, get_quote
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,6 +14,8 @@ urlpatterns = [
     path('api/cityex24/', create_cityex24_transfer, name='create_cityex24_transfer'),
     path('api/exchange-rates/', get_exchange_rates, name='get_exchange_rates'),
     path('api/bot-message/', get_bot_message, name='get_bot_message'),
+    path('api/bootstrap/', get_bootstrap, name='get_bootstrap'),
+    path('api/quote/', get_quote, name='get_quote'),
 ]
 
 if settings.DEBUG:
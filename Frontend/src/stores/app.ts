@@ -1,14 +1,120 @@
 import { defineStore } from 'pinia'
+import WebApp from '@twa-dev/sdk'
+import { apiService } from '@/services/api'
+import type { ExchangeRate, OrdersPage } from '@/types'
+
+type Section = 'rates' | 'messages' | 'orders'
+
+interface BootstrapResponse {
+  success: boolean
+  versions: Partial<Record<Section, string>>
+  rates?: ExchangeRate[]
+  messages?: Record<string, string>
+  orders?: OrdersPage
+}
+
+interface BootstrapCache {
+  userId: number | null
+  versions: Partial<Record<Section, string>>
+  rates: ExchangeRate[]
+  messages: Record<string, string>
+  orders: OrdersPage
+}
+
+const CACHE_KEY = 'city-exchange-bootstrap'
+// Data younger than this is reused by pages without a new request (matches API_RATES_MAX_AGE)
+const MAX_AGE_MS = 5000
+const NOT_CONFIGURED = 'Сообщение не настроено'
+
+let pending: Promise<void> | null = null
+
+const readCache = (userId: number | null): BootstrapCache | null => {
+  try {
+    const cache = JSON.parse(localStorage.getItem(CACHE_KEY) || 'null') as BootstrapCache | null
+    return cache && cache.userId === userId ? cache : null
+  } catch {
+    return null
+  }
+}
 
 export const useAppStore = defineStore('app', {
   state: () => ({
-    // App state here
+    rates: [] as ExchangeRate[],
+    messages: {} as Record<string, string>,
+    orders: { items: [], next_cursor: null } as OrdersPage,
+    versions: {} as Partial<Record<Section, string>>,
+    loadedAt: 0
   }),
-  getters: {
-    // App getters here
-  },
   actions: {
-    // App actions here
+    // One /api/bootstrap/ request for rates, bot messages and the first page of orders.
+    // Sections the client already has (by version) are skipped by the server.
+    async bootstrap(force = false) {
+      if (pending) return pending
+      if (!force && this.loadedAt && Date.now() - this.loadedAt < MAX_AGE_MS) return
+
+      pending = (async () => {
+        const userId = WebApp.initDataUnsafe?.user?.id ?? null
+        if (!this.loadedAt) {
+          const cache = readCache(userId)
+          if (cache) {
+            this.rates = cache.rates
+            this.messages = cache.messages
+            this.orders = cache.orders
+            this.versions = cache.versions
+          }
+        }
+
+        const params = new URLSearchParams()
+        if (userId) params.set('telegram_user_id', String(userId))
+        const known = Object.values(this.versions).filter(Boolean)
+        if (known.length) params.set('known', known.join(','))
+
+        const response = await apiService.get<BootstrapResponse>(`/api/bootstrap/?${params.toString()}`)
+        if (!response.data.success) {
+          throw new Error('Bootstrap request failed')
+        }
+        const data = response.data
+        if (data.rates) this.rates = data.rates
+        if (data.messages) this.messages = data.messages
+        if (data.orders) this.orders = data.orders
+        this.versions = data.versions
+        this.loadedAt = Date.now()
+
+        try {
+          const cache: BootstrapCache = {
+            userId,
+            versions: this.versions,
+            rates: this.rates,
+            messages: this.messages,
+            orders: this.orders
+          }
+          localStorage.setItem(CACHE_KEY, JSON.stringify(cache))
+        } catch {
+          // Storage is unavailable or full: the next launch just downloads everything
+        }
+      })()
+
+      try {
+        await pending
+      } finally {
+        pending = null
+      }
+    },
+
+    async loadRates(): Promise<ExchangeRate[]> {
+      await this.bootstrap()
+      return this.rates
+    },
+
+    async loadMessage(messageType: string): Promise<string> {
+      await this.bootstrap()
+      return this.messages[messageType] || NOT_CONFIGURED
+    },
+
+    async loadOrders(): Promise<OrdersPage> {
+      // Always revalidate: the user may have just placed an order
+      await this.bootstrap(true)
+      return this.orders
+    }
   }
 })
-
@@ -13,3 +13,41 @@ export interface PaginatedResponse<T> {
   previous: string | null
 }
 
+
+export interface ExchangeRate {
+  currency_from: string
+  currency_to: string
+  rate: string
+}
+
+export interface Order {
+  id: number
+  order_type: 'buy' | 'sell'
+  order_type_display: string
+  amount: string
+  exchange_rate: string
+  amount_to_receive: string
+  full_name: string
+  wallet_address: string
+  status: 'pending' | 'processed' | 'cancelled'
+  status_display: string
+  created_at: string
+  updated_at: string
+}
+
+export interface OrdersPage {
+  items: Order[]
+  next_cursor: string | null
+}
+
+export interface Quote {
+  order_type: 'buy' | 'sell'
+  currency_from: string
+  currency_to: string
+  rate: string
+  quote: string
+  expires_in: number
+  expires_at: string
+  amount?: string
+  amount_to_receive?: string
+}